@@ -0,0 +1,84 @@
+"""
+离线玩家数据磁盘存档（PlayerDataArchive）的基准测试。
+
+记录 N 名玩家（缺省为50000）的数据后，将其中除 --resident 名以外的玩家移出到存档，比较：
+    存储结构（不含排名索引）占用的内存；
+    取快照、按名称查询单个玩家、按名称前缀查询、查询全部变化等操作在数据全部在内存中与大部分在存档中时的耗时；
+以及一次移出（重写存档）的耗时。
+注：store size 只计入存储结构本身，排名索引始终包含所有玩家，不受存档影响。
+
+用法：python benchmarks/bench_archive.py [--players N] [--resident N]
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+
+from common import load_plugin, measure
+
+
+msm = load_plugin()
+
+
+def build_store(players: list[str], archived: bool) -> msm.PlayerDataStore:
+    rand = random.Random(0)
+    store = msm.PlayerDataStore()
+    if archived:
+        store.archive = msm.PlayerDataArchive(tempfile.mkdtemp(prefix='msm_bench_'), store.epoch)
+    for player in players:
+        store.set_row(player, {item: rand.randint(0, 1000) for item in msm.PLAYER_DATA_ITEMS})
+    return store
+
+
+def evict(store: msm.PlayerDataStore, limit: int) -> None:
+    # 与 archive_offline_players 相同的步骤（所有玩家均视为离线）
+    records = store.plan_eviction(limit, ())
+    base = store.archive.state()
+    generation = store.archive.generation + 1
+    written = store.archive.write(generation, base, records)
+    store.archive.install(generation, written, base, store.evict(records, ()))
+
+
+def store_size(store: msm.PlayerDataStore) -> int:
+    # 估算存储结构占用的内存（名称字符串、索引及各数据列）
+    size = sys.getsizeof(store.index) + sys.getsizeof(store.names) + sum(sys.getsizeof(name) for name in store.names)
+    for column in (*store.columns, *store.versions, store.row_versions, store.touched):
+        size += sys.getsizeof(column)
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=50000)
+    parser.add_argument('--resident', type=int, default=1000)
+    args = parser.parse_args()
+
+    players = ['player_%d' % i for i in range(args.players)]
+    memory = build_store(players, False)
+    archived = build_store(players, True)
+    start = time.perf_counter()
+    evict(archived, args.resident)
+    elapsed = time.perf_counter() - start
+    print(f'--- {args.players} players, {len(archived.names)} resident ---')
+    print(f'eviction         {elapsed * 1000:10.1f} ms')
+    print(f'store size       memory {store_size(memory) / 1024 / 1024:8.2f} MiB   ' +
+          f'archived {store_size(archived) / 1024 / 1024:8.2f} MiB')
+
+    target = players[len(players) // 2]
+    prefix_query = msm.PlayerDataQuery.parse({'pattern': 'player_123*'})
+    for name, func in (
+        ('snapshot', lambda store: store.snapshot()),
+        ('get_row', lambda store: store.get_row(target)),
+        ('prefix query', lambda store: prefix_query.select(store, ())),
+        ('changes (full)', lambda store: store.changes_since(0, msm.ALL_ITEM_INDEXES)),
+        ('changes (delta)', lambda store: store.changes_since(store.version, msm.ALL_ITEM_INDEXES))
+    ):
+        memory_time = measure(lambda: func(memory))
+        archived_time = measure(lambda: func(archived))
+        print(f'{name:16s} memory {memory_time * 1e6:12.1f} us   archived {archived_time * 1e6:12.1f} us')
+
+
+if __name__ == '__main__':
+    main()
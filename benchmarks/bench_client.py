@@ -0,0 +1,120 @@
+"""
+asyncio 客户端（msm_client）与示例客户端的请求方式的对比基准测试，无需真实的MC服务器。
+
+以 FakeServerInterface 加载插件后，在同一时长内分别以以下方式循环发送请求，比较吞吐量及延迟：
+    demo-timeout：client_demo_python.py 原先的方式，逐个发送请求，以 0.5s 内未再收到消息判断响应接收完毕；
+    demo-marker：逐个发送请求，以结束标志（end_of_response）判断响应接收完毕（即 load_generator 的方式）；
+    client xN：MonitorClient 在一个连接上同时进行 N 个请求。
+请求为 get_all_players_data（'records' 格式，即示例客户端所用的请求）及只查询单个玩家的 query_players_data。
+
+用法：python benchmarks/bench_client.py [--players N] [--duration S] [--concurrency N] [--port N]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import sys
+import time
+
+import websockets
+
+from common import REPO_ROOT, load_plugin, percentiles
+from fake_server import FakeServerInterface
+
+sys.path.insert(0, REPO_ROOT)
+from msm_client import MonitorClient  # noqa: E402
+
+
+msm = load_plugin()
+
+
+def make_arguments(instruction: str, players: int, seq: int) -> dict:
+    if instruction == 'query_players_data':
+        return {'players': ['player_%d' % (seq % players)]}
+    return {}
+
+
+async def demo_client(url: str, instruction: str, players: int, duration: float, marker: bool) -> list[float]:
+    latencies = []
+    async with websockets.connect(url, max_size=None) as websocket:
+        deadline = time.monotonic() + duration
+        for id in itertools.count():
+            if time.monotonic() >= deadline:
+                break
+            arguments = make_arguments(instruction, players, id)
+            if marker:
+                arguments['end_marker'] = True
+            start = time.monotonic()
+            await websocket.send(json.dumps({'id': id, 'instruction': instruction, 'arguments': arguments}))
+            while True:
+                if marker:
+                    if json.loads(await websocket.recv())['instruction'] == 'end_of_response':
+                        break
+                    continue
+                # 示例客户端原先的方式：0.5s 内未再收到消息即认为响应接收完毕
+                try:
+                    await asyncio.wait_for(websocket.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    break
+            latencies.append(time.monotonic() - start)
+    return latencies
+
+
+async def multiplexed_client(url: str, instruction: str, players: int, duration: float,
+                             concurrency: int) -> list[float]:
+    latencies = []
+    seq = itertools.count()
+    async with MonitorClient(url) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker() -> None:
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                await client.request(instruction, make_arguments(instruction, players, next(seq)))
+                latencies.append(time.monotonic() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def report(name: str, latencies: list[float], duration: float) -> None:
+    p50, p90, p99 = percentiles(latencies)
+    print(f'{name:16s} {len(latencies) / duration:10.1f} req/s   latency (ms)  p50 {p50 * 1000:8.2f}   ' +
+          f'p90 {p90 * 1000:8.2f}   p99 {p99 * 1000:8.2f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--port', type=int, default=18766)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(message)s')
+    server = FakeServerInterface(msm, args.players, 0.002, 0.001, 0.0, 20.0, {
+        'commIP': '127.0.0.1',
+        'commPort': args.port,
+        'historyEnabled': False,
+        'schedulerStatsInterval': 0
+    })
+    server.start()
+    time.sleep(1.0)
+    url = f'ws://127.0.0.1:{args.port}'
+
+    for instruction in ('get_all_players_data', 'query_players_data'):
+        print(f'--- {instruction}, {args.players} players ---')
+        report('demo-timeout', asyncio.run(demo_client(url, instruction, args.players, args.duration, False)),
+               args.duration)
+        report('demo-marker', asyncio.run(demo_client(url, instruction, args.players, args.duration, True)),
+               args.duration)
+        for concurrency in sorted({1, args.concurrency}):
+            report(f'client x{concurrency}', asyncio.run(multiplexed_client(
+                url, instruction, args.players, args.duration, concurrency)), args.duration)
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+控制台输出处理（on_info）的吞吐量基准测试。
+
+将合成的（或从真实服务器日志中读取的）控制台输出逐行送入 ConsoleLineClassifier，统计每秒可处理的行数，
+并与旧版本 on_info 的处理方式（未预编译的 re.fullmatch + str.split）进行比较。
+
+用法：
+    python benchmarks/bench_console_ingest.py [--players N] [--lines N] [--log latest.log]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from common import load_plugin
+
+
+msm = load_plugin()
+
+# 服务器日志中每行的时间与线程信息前缀，如 "[12:00:00] [Server thread/INFO]: "
+LOG_PREFIX_PATTERN = re.compile(r'^\[[^\]]*\] \[[^\]]*\]: ')
+
+
+def synthesize_lines(player_count: int, line_count: int) -> list[str]:
+    """
+    生成模拟繁忙服务器的控制台输出：以聊天、存档、命令回显等无关输出为主，夹杂本插件的查询结果与批量采集结果。
+    """
+
+    rand = random.Random(0)
+    players = ['player_%d' % i for i in range(player_count)]
+    noise = [
+        lambda: '<%s> hello world %d' % (rand.choice(players), rand.randint(0, 1000)),
+        lambda: 'Saving the game (this may take a moment!)',
+        lambda: 'Saved the game',
+        lambda: 'Executed 3 commands from function \'msm:get_data_tagged\'',
+        lambda: 'Modified storage msm:results',
+        lambda: '%s joined the game' % rand.choice(players),
+        lambda: 'Can\'t keep up! Is the server overloaded? Running 2013ms or 40 ticks behind'
+    ]
+    collect = 'Storage msm:collect has the following contents: {id: %d, players: [%s]}' % (1, ', '.join(
+        '{name: "%s", %s}' % (player, ', '.join('%s: %d' % (item, rand.randint(0, 100))
+                                                 for item in msm.PLAYER_DATA_ITEMS))
+        for player in players))
+    results = 'Storage msm:results has the following contents: [%s]' % ', '.join(
+        '{id: %d, value: %d}' % (i, rand.randint(0, 100)) for i in range(len(msm.PLAYER_DATA_ITEMS) * player_count))
+    lines = []
+    for i in range(line_count):
+        roll = rand.random()
+        if roll < 0.002:
+            lines.append(collect)
+        elif roll < 0.004:
+            lines.append(results)
+        elif roll < 0.1:
+            lines.append('Function msm:get_data returned %d' % rand.randint(0, 100))
+        else:
+            lines.append(rand.choice(noise)())
+    return lines
+
+
+def read_log(path: str) -> list[str]:
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return [LOG_PREFIX_PATTERN.sub('', line.rstrip('\n')) for line in f]
+
+
+def legacy_on_info(content: str) -> None:
+    # 旧版本 on_info 的处理方式
+    pattern = r"Function [:\w]+ returned \d+"
+    if re.fullmatch(pattern, content):
+        parts = content.split(' ')
+        func = parts[1]
+        res = int(parts[3])
+
+
+def run(name: str, func, lines: list[str]) -> None:
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    elapsed = time.perf_counter() - start
+    print(f'{name:12s} {len(lines) / elapsed:14,.0f} lines/s   ({elapsed * 1000:.1f} ms for {len(lines)} lines)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--log', help='replay a real server log instead of synthetic output')
+    args = parser.parse_args()
+
+    lines = read_log(args.log) if args.log else synthesize_lines(args.players, args.lines)
+    classifier = msm.ConsoleLineClassifier()
+    relevant = sum(1 for line in lines if classifier.classify(line) is not None)
+    print(f'{len(lines)} lines, {relevant} relevant to the plugin')
+
+    run('legacy', legacy_on_info, lines)
+    run('classifier', classifier.classify, lines)
+    # 按输出类别分别统计，旧版本的处理方式不解析查询结果与批量采集结果，故仅对前两类进行比较
+    groups = {
+        'noise': [line for line in lines if not line.startswith(classifier.PREFIXES)],
+        'function': [line for line in lines if line.startswith('Function ')],
+        'results': [line for line in lines if line.startswith(classifier.RESULTS_PREFIX)],
+        'collect': [line for line in lines if line.startswith(classifier.COLLECT_RESULT_PREFIX)]
+    }
+    for kind, group in groups.items():
+        if len(group) == 0:
+            continue
+        print(f'[{kind} lines]')
+        if kind in ('noise', 'function'):
+            run('legacy', legacy_on_info, group)
+        run('classifier', classifier.classify, group)
+
+if __name__ == '__main__':
+    main()
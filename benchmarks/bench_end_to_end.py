@@ -0,0 +1,103 @@
+"""
+插件的端到端基准测试，无需真实的MC服务器。
+
+以 FakeServerInterface 模拟MC服务器（可配置命令延迟、抖动、输出丢失率及玩家数），加载插件后，
+以 load_generator 打开多个websocket客户端，统计：
+    轮询吞吐量：每秒发送的命令数、收到的结果数及更新的数据个数；
+    数据新鲜度：游戏内的数据发生变化，到订阅客户端收到该变化的延迟（不含每刻都在变化的 onlineTime）；
+    请求延迟：get_all_players_data 请求的延迟分位数，以及插件自身记录的命令往返延迟。
+
+用法：
+    python benchmarks/bench_end_to_end.py [--players N] [--latency MS] [--jitter MS] [--loss P]
+                                          [--change-rate N] [--clients N] [--subscribers N] [--duration S]
+                                          [--format records|columnar|binary] [--per-entry] [--port N]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any
+
+from common import load_plugin, percentiles
+from fake_server import FakeServerInterface
+from load_generator import report, run_load
+
+
+msm = load_plugin()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=5.0, help='command latency of the fake server (ms)')
+    parser.add_argument('--jitter', type=float, default=2.0, help='command latency jitter (ms)')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability of losing a console line')
+    parser.add_argument('--change-rate', type=float, default=50.0, help='random data changes per second')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--subscribers', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--format', default='records', choices=['records', 'columnar', 'binary'])
+    parser.add_argument('--per-entry', action='store_true', help='disable batched collection')
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    server = FakeServerInterface(msm, args.players, args.latency / 1000.0, args.jitter / 1000.0, args.loss,
+                                 args.change_rate, {
+                                     'commIP': '127.0.0.1',
+                                     'commPort': args.port,
+                                     'batchedCollection': not args.per_entry,
+                                     'historyEnabled': False,
+                                     'schedulerStatsInterval': 0
+                                 })
+    server.start()
+    # 等待websocket服务器启动，并完成首轮采集
+    time.sleep(1.0)
+
+    freshness = []
+
+    def on_delta(entry: dict[str, Any], received_at: float) -> None:
+        if entry['type'] == 'onlineTime':
+            return
+        change = server.last_change(entry['name'], entry['type'])
+        # 只统计收到的值即为最新值的变化（更早的变化已被覆盖，无法确定其发生的时刻）
+        if change is not None and change[0] == entry['quantity']:
+            freshness.append(received_at - change[1])
+
+    commands_before = server.commands_received
+    resolved_before = msm.pending_requests.stats()['resolved']
+    with msm.player_data_records_lock:
+        version_before = msm.player_data_records.version
+    stats = asyncio.run(run_load(f'ws://127.0.0.1:{args.port}', args.clients, args.subscribers, args.duration,
+                                 args.format, on_delta=on_delta))
+    elapsed = stats.elapsed
+    commands = server.commands_received - commands_before
+    request_stats = msm.pending_requests.stats()
+    resolved = request_stats['resolved'] - resolved_before
+    with msm.player_data_records_lock:
+        updates = msm.player_data_records.version - version_before
+    monitor_stats = msm.collect_monitor_stats()
+    server.stop()
+
+    print(f'{args.players} players, latency {args.latency:g}±{args.jitter:g}ms, loss {args.loss:g}, ' +
+          f'{"per-entry" if args.per_entry else "batched"} collection, {elapsed:.1f}s')
+    print('[polling]')
+    print(f'commands      {commands / elapsed:10.1f} /s')
+    print(f'results       {resolved / elapsed:10.1f} /s   {request_stats["expired"]} expired')
+    print(f'data updates  {updates / elapsed:10.1f} /s')
+    for func, summary in monitor_stats['request_latency_ms'].items():
+        if summary['count'] > 0:
+            print(f'{func:14s} round trip (ms)  p50 {summary["p50"]:g}   p90 {summary["p90"]:g}   p99 {summary["p99"]:g}')
+    print('[freshness]')
+    p50, p90, p99 = percentiles(freshness)
+    print(f'changes seen  {len(freshness):10d}')
+    print(f'staleness (ms)  p50 {p50 * 1000:8.1f}   p90 {p90 * 1000:8.1f}   p99 {p99 * 1000:8.1f}')
+    print('[websocket]')
+    report(stats)
+
+
+if __name__ == '__main__':
+    main()
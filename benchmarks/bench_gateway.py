@@ -0,0 +1,264 @@
+"""
+多服务器聚合网关（msm_gateway）的端到端基准测试，无需真实的MC服务器。
+
+在同一进程中以 FakeServerInterface 启动 --servers 个插件实例（各自独立加载插件模块，监听不同的端口），
+再启动连接到这些实例的网关，比较下游客户端取得所有服务器的全部玩家数据（'columnar' 格式）的两种方式：
+    direct：分别连接各插件实例，并发请求后在客户端合并；
+    gateway：只连接网关，由网关从合并视图回答；
+并同时直接订阅各插件实例及经网关订阅数据的变化，比较两者的数据新鲜度（游戏内的数据发生变化，到订阅客户端收到该变化的延迟），
+以及一个插件实例重新加载后，网关重新连接、重新订阅并收到第一次推送的耗时。
+数据新鲜度的绝对值主要取决于插件按 metricPollIntervals 采集数据的周期（缺省最长30s），直接订阅与经网关订阅均是如此；
+网关所增加的延迟以同一变化经两条路径到达的时刻之差（added）衡量。
+重新加载后的第一次推送须等待新实例采集到下一个变化，因而同样受采集周期的限制，远长于重新订阅本身的耗时。
+
+用法：
+    python benchmarks/bench_gateway.py [--servers N] [--players N] [--change-rate N] [--clients N] [--duration S]
+                                       [--base-port N] [--gateway-port N]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Any
+
+import websockets
+
+from common import REPO_ROOT, load_plugin, percentiles
+from fake_server import FakeServerInterface
+
+sys.path.insert(0, REPO_ROOT)
+from msm_gateway import GatewayServer, MergedView, UpstreamServer  # noqa: E402
+
+
+def start_server(port: int, players: int, change_rate: float, seed: int) -> FakeServerInterface:
+    server = FakeServerInterface(load_plugin(), players, 0.002, 0.001, 0.0, change_rate, {
+        'commIP': '127.0.0.1',
+        'commPort': port,
+        'historyEnabled': False,
+        'schedulerStatsInterval': 0
+    }, seed=seed)
+    server.start()
+    return server
+
+
+class GatewayThread(threading.Thread):
+    """
+    在单独的线程中运行网关的事件循环。
+    """
+
+    def __init__(self, urls: dict[str, str], port: int):
+        super().__init__(daemon=True)
+        self.view = MergedView()
+        self.upstreams = [UpstreamServer(name, url, self.view, reconnect_min=0.2, reconnect_max=1.0)
+                          for name, url in urls.items()]
+        self.server = GatewayServer(self.view, self.upstreams, '127.0.0.1', port)
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.stop_event: asyncio.Event | None = None
+        self.started = threading.Event()
+
+    def run(self) -> None:
+        asyncio.run(self.__main())
+
+    async def __main(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.started.set()
+        await self.server.run(self.stop_event)
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.join()
+
+
+def wait_until(condition, timeout: float) -> float:
+    start = time.monotonic()
+    while not condition():
+        if time.monotonic() - start > timeout:
+            raise TimeoutError('condition not met in time')
+        time.sleep(0.01)
+    return time.monotonic() - start
+
+
+async def request_columnar(websocket: Any, id: int) -> dict:
+    await websocket.send(json.dumps({'id': id, 'instruction': 'get_all_players_data',
+                                     'arguments': {'format': 'columnar', 'end_marker': True}}))
+    reply = None
+    while True:
+        data = json.loads(await websocket.recv())
+        if data['instruction'] == 'end_of_response':
+            return reply
+        reply = data
+
+
+async def direct_client(urls: list[str], deadline: float, latencies: list[float]) -> None:
+    websockets_ = [await websockets.connect(url, max_size=None) for url in urls]
+    try:
+        id = 0
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            replies = await asyncio.gather(*(request_columnar(websocket, id) for websocket in websockets_))
+            # 在客户端按 (服务器, 玩家) 合并各服务器的数据
+            merged = {}
+            for server, reply in enumerate(replies):
+                for index, player in enumerate(reply['players']):
+                    merged[(server, player)] = [column[index] for column in reply['values']]
+            latencies.append(time.monotonic() - start)
+            id += 1
+    finally:
+        for websocket in websockets_:
+            await websocket.close()
+
+
+async def gateway_client(url: str, deadline: float, latencies: list[float]) -> None:
+    async with websockets.connect(url, max_size=None) as websocket:
+        id = 0
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            await request_columnar(websocket, id)
+            latencies.append(time.monotonic() - start)
+            id += 1
+
+
+async def run_clients(factory, clients: int, duration: float) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    start = time.monotonic()
+    await asyncio.gather(*(factory(start + duration, latencies) for _ in range(clients)))
+    return latencies, time.monotonic() - start
+
+
+async def watch_freshness(url: str, servers: dict[str, FakeServerInterface], duration: float,
+                          server: str | None = None) -> dict[tuple, float]:
+    """
+    订阅 url 的数据变化 duration 秒，返回收到的各项变化的延迟，键为 (服务器, 玩家, 数据条目, 变化的时刻)。
+    server 为 None 时订阅的是网关（推送的每项数据含 server），否则为直接订阅该插件实例。
+    """
+
+    freshness = {}
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data'}))
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(websocket.recv(), remaining)
+            except asyncio.TimeoutError:
+                break
+            received_at = time.monotonic()
+            data = json.loads(message)
+            if data['instruction'] != 'players_data_delta':
+                continue
+            for entry in data['data']:
+                if entry['type'] == 'onlineTime':
+                    continue
+                name = entry.get('server', server)
+                change = servers[name].last_change(entry['name'], entry['type'])
+                # 只统计收到的值即为最新值的变化
+                if change is not None and change[0] == entry['quantity']:
+                    freshness.setdefault((name, entry['name'], entry['type'], change[1]), received_at - change[1])
+    return freshness
+
+
+async def compare_freshness(gateway_url: str, ports: dict[str, int], servers: dict[str, FakeServerInterface],
+                            duration: float) -> tuple[list[float], list[float], list[float]]:
+    """
+    同时直接订阅各插件实例及经网关订阅，返回 (直接订阅的延迟, 经网关的延迟, 同一变化经网关比直接订阅多出的延迟)。
+    """
+
+    results = await asyncio.gather(
+        watch_freshness(gateway_url, servers, duration),
+        *(watch_freshness(f'ws://127.0.0.1:{port}', servers, duration, name) for name, port in ports.items()))
+    direct = {key: value for result in results[1:] for key, value in result.items()}
+    through_gateway = results[0]
+    added = [through_gateway[key] - value for key, value in direct.items() if key in through_gateway]
+    return list(direct.values()), list(through_gateway.values()), added
+
+
+def reload_server(server: FakeServerInterface) -> None:
+    """
+    模拟 MCDR 重新加载插件：卸载旧实例，加载新的插件模块并迁移旧实例的数据（监听套接字随之移交，数据标识不变）。
+    """
+
+    old = server.plugin
+    old.on_unload(server)
+    server.plugin = load_plugin()
+    server.plugin.on_load(server, old)
+
+
+def report(name: str, latencies: list[float], elapsed: float) -> None:
+    p50, p90, p99 = percentiles(latencies)
+    print(f'{name:8s} {len(latencies) / elapsed:10.1f} snapshots/s   latency (ms)  p50 {p50 * 1000:8.2f}   ' +
+          f'p90 {p90 * 1000:8.2f}   p99 {p99 * 1000:8.2f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servers', type=int, default=3)
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--change-rate', type=float, default=50.0, help='random data changes per second per server')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--base-port', type=int, default=18770)
+    parser.add_argument('--gateway-port', type=int, default=18769)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    ports = {f'server{i}': args.base_port + i for i in range(args.servers)}
+    servers = {name: start_server(port, args.players, args.change_rate, seed)
+               for seed, (name, port) in enumerate(ports.items())}
+    gateway = GatewayThread({name: f'ws://127.0.0.1:{port}' for name, port in ports.items()}, args.gateway_port)
+    gateway.start()
+    gateway.started.wait()
+    expected_rows = args.servers * args.players
+    synced = wait_until(lambda: len(gateway.view) >= expected_rows, 30.0)
+    print(f'{args.servers} servers x {args.players} players, gateway synced {len(gateway.view)} rows in ' +
+          f'{synced * 1000:.0f} ms')
+
+    gateway_url = f'ws://127.0.0.1:{args.gateway_port}'
+    urls = [f'ws://127.0.0.1:{port}' for port in ports.values()]
+    print(f'[snapshot of all servers, {args.clients} clients]')
+    latencies, elapsed = asyncio.run(run_clients(lambda deadline, latencies: direct_client(urls, deadline, latencies),
+                                                 args.clients, args.duration))
+    report('direct', latencies, elapsed)
+    latencies, elapsed = asyncio.run(run_clients(
+        lambda deadline, latencies: gateway_client(gateway_url, deadline, latencies), args.clients, args.duration))
+    report('gateway', latencies, elapsed)
+
+    print('[freshness]')
+    direct, through_gateway, added = asyncio.run(compare_freshness(gateway_url, ports, servers, args.duration))
+    for name, freshness in (('direct', direct), ('gateway', through_gateway), ('added', added)):
+        p50, p90, p99 = percentiles(freshness)
+        print(f'{name:8s} {len(freshness):8d} changes   staleness (ms)  p50 {p50 * 1000:8.1f}   ' +
+              f'p90 {p90 * 1000:8.1f}   p99 {p99 * 1000:8.1f}')
+
+    print('[upstream reload]')
+    # 重新加载第一个插件实例：网关的订阅连接断开，重连后以 since_version 续传，只接收断线期间的变化
+    name = next(iter(ports))
+    upstream = gateway.upstreams[0]
+    reconnects = upstream.subscriber.reconnects
+    start = time.monotonic()
+    reload_server(servers[name])
+    wait_until(lambda: upstream.subscriber.reconnects > reconnects, 10.0)
+    wait_until(lambda: upstream.connected, 30.0)
+    reconnected = time.monotonic() - start
+    pushes = upstream.pushes
+    # 第一次推送须等待新实例采集到下一个变化
+    wait_until(lambda: upstream.pushes > pushes, 60.0)
+    print(f'reconnected after reload {reconnected * 1000:10.0f} ms   first push after reload ' +
+          f'{(time.monotonic() - start) * 1000:10.0f} ms   epoch kept: ' +
+          f'{upstream.epoch == servers[name].plugin.player_data_records.epoch}')
+
+    gateway.stop()
+    for server in servers.values():
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+排行榜（RankIndex）的微基准测试。
+
+在 10000 名玩家规模下，比较以排名索引与每次对全部玩家排序两种方式回答以下查询的耗时：
+    前10名、某一玩家的排名、第50页（每页20项）；
+并比较启用排名索引前后单个数据更新的耗时，即维护索引的开销；
+以及排名索引（分块的有序列表）与单个有序列表（删除后再插入，需移动 O(n) 个元素）的更新耗时，
+和每次更新后紧接着查询排名（需重建分块的起始位置）的耗时。
+
+用法：python benchmarks/bench_leaderboard.py [--players N]
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+from typing import Iterator
+
+from common import load_plugin, measure
+
+
+msm = load_plugin()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=10000)
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    item_index = msm.PLAYER_DATA_ITEM_INDEX['totalKillCount']
+    players = ['player_%d' % i for i in range(args.players)]
+    plain = msm.PlayerDataStore()
+    ranked = msm.PlayerDataStore()
+    for player in players:
+        # 取值范围较小，存在大量并列的玩家
+        value = rand.randint(0, 1000)
+        plain.set(player, item_index, value)
+        ranked.set(player, item_index, value)
+    ranked.enable_ranking([item_index])
+    rank = ranked.ranks[item_index]
+    column = ranked.columns[item_index]
+    target = players[rand.randrange(len(players))]
+
+    def sorted_rows() -> list[tuple[int, str]]:
+        return sorted((-value, name) for name, value in zip(plain.names, plain.columns[item_index]))
+
+    def sort_top() -> None:
+        sorted_rows()[:10]
+
+    def index_top() -> None:
+        rank.page(0, 10)
+
+    def sort_rank_of() -> None:
+        value = plain.columns[item_index][plain.index[target]]
+        sum(1 for other in plain.columns[item_index] if other > value)
+
+    def index_rank_of() -> None:
+        rank.rank_of(column[ranked.index[target]])
+
+    def sort_page() -> None:
+        sorted_rows()[1000:1020]
+
+    def index_page() -> None:
+        rank.page(1000, 20)
+
+    print(f'--- {args.players} players ---')
+    for name, sort_func, index_func in (
+        ('top 10', sort_top, index_top),
+        ('rank of player', sort_rank_of, index_rank_of),
+        ('page 50 (x20)', sort_page, index_page)
+    ):
+        sort_time = measure(sort_func)
+        index_time = measure(index_func)
+        print(f'{name:16s} full sort {sort_time * 1e6:10.1f} us   rank index {index_time * 1e6:8.2f} us   ' +
+              f'speedup {sort_time / index_time:8.1f}x')
+
+    # 轮流使用多批随机的更新，以免重复执行同一批更新时值均未变化
+    batches = [[(rand.choice(players), rand.randint(0, 1000)) for _ in range(1000)] for _ in range(16)]
+    updates = batches[0]
+
+    def update(store: msm.PlayerDataStore, batch: Iterator[list[tuple[str, int]]]) -> None:
+        for player, value in next(batch):
+            store.set(player, item_index, value)
+
+    plain_time = measure(lambda batch=itertools.cycle(batches): update(plain, batch)) / len(updates)
+    ranked_time = measure(lambda batch=itertools.cycle(batches): update(ranked, batch)) / len(updates)
+    print(f'{"update":16s} unranked  {plain_time * 1e6:10.2f} us   ranked     {ranked_time * 1e6:8.2f} us')
+
+    flat = sorted((-value, name) for name, value in zip(plain.names, plain.columns[item_index]))
+    flat_values = dict(zip(plain.names, plain.columns[item_index]))
+    index = msm.RankIndex(list(flat))
+    index_values = dict(flat_values)
+
+    def flat_update(batch: Iterator[list[tuple[str, int]]]) -> None:
+        for player, value in next(batch):
+            del flat[bisect.bisect_left(flat, (-flat_values[player], player))]
+            bisect.insort(flat, (-value, player))
+            flat_values[player] = value
+            bisect.bisect_left(flat, (-value, ''))
+
+    def index_update(batch: Iterator[list[tuple[str, int]]]) -> None:
+        for player, value in next(batch):
+            index.update(player, index_values[player], value)
+            index_values[player] = value
+            index.rank_of(value)
+
+    flat_time = measure(lambda batch=itertools.cycle(batches): flat_update(batch)) / len(updates)
+    index_time = measure(lambda batch=itertools.cycle(batches): index_update(batch)) / len(updates)
+    print(f'{"update + rank":16s} flat list {flat_time * 1e6:10.2f} us   rank index {index_time * 1e6:8.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+玩家数据存储结构的微基准测试。
+
+比较旧版本的 dict[str, PlayerData] 布局（线性查找 + match 语句）与 PlayerDataStore（索引 + 按列存储）
+在 10、100、1000 名玩家规模下，一轮逐条更新、一轮批量更新以及取快照并遍历的耗时。
+
+用法：python benchmarks/bench_player_store.py
+"""
+
+import threading
+
+from common import load_plugin, measure
+
+
+msm = load_plugin()
+
+
+# 旧版本插件中的玩家数据结构
+class LegacyPlayerData(object):
+    def __init__(self):
+        self.name = ''
+        for item in msm.PLAYER_DATA_ITEMS:
+            setattr(self, item, 0)
+
+
+def legacy_update(records: dict, lock: threading.RLock, player: str, entry: str, result: int) -> None:
+    # 与旧版本 msm_get_data_callback 相同的查找与更新方式（去除日志输出）
+    with lock:
+        exist_flag = False
+        for name, data in records.items():
+            if name == player:
+                legacy_assign(data, entry, result)
+                records[player] = data
+                exist_flag = True
+                break
+        if not exist_flag:
+            data = LegacyPlayerData()
+            data.name = player
+            legacy_assign(data, entry, result)
+            records[player] = data
+
+
+def legacy_assign(data: LegacyPlayerData, entry: str, result: int) -> None:
+    match entry:
+        case 'msm_deathCount':
+            data.deathCount = result
+        case 'msm_playerKillCount':
+            data.playerKillCount = result
+        case 'msm_totalKillCount':
+            data.totalKillCount = result
+        case 'msm_health':
+            data.health = result
+        case 'msm_xp':
+            data.xp = result
+        case 'msm_level':
+            data.level = result
+        case 'msm_food':
+            data.food = result
+        case 'msm_air':
+            data.air = result
+        case 'msm_armor':
+            data.armor = result
+        case 'msm_placeBlockCount':
+            data.placeBlockCount = result
+        case 'msm_breakBlockCount':
+            data.breakBlockCount = result
+        case 'msm_onlineTime':
+            data.onlineTime = result
+
+
+def bench(player_count: int) -> None:
+    players = ['player_%d' % i for i in range(player_count)]
+    entries = ['msm_' + item for item in msm.PLAYER_DATA_ITEMS]
+    rows = [dict({'name': player}, **{item: i for i, item in enumerate(msm.PLAYER_DATA_ITEMS)}) for player in players]
+    lock = threading.RLock()
+
+    legacy: dict = {}
+    store = msm.PlayerDataStore()
+
+    def legacy_cycle() -> None:
+        for player in players:
+            for entry in entries:
+                legacy_update(legacy, lock, player, entry, 1)
+
+    def store_cycle() -> None:
+        for player in players:
+            for entry in entries:
+                with lock:
+                    store.set(player, msm.PLAYER_DATA_ENTRY_INDEX[entry], 1)
+
+    def legacy_batch() -> None:
+        with lock:
+            for row in rows:
+                data = legacy.get(row['name'])
+                if data is None:
+                    data = legacy[row['name']] = LegacyPlayerData()
+                for item in msm.PLAYER_DATA_ITEMS:
+                    setattr(data, item, row[item])
+
+    def store_batch() -> None:
+        with lock:
+            for row in rows:
+                store.set_row(row['name'], row)
+
+    def legacy_snapshot() -> None:
+        with lock:
+            for player, data in legacy.items():
+                for item in msm.PLAYER_DATA_ITEMS:
+                    int(getattr(data, item))
+
+    def store_snapshot() -> None:
+        with lock:
+            snapshot = store.snapshot()
+        for player, values in snapshot.rows():
+            pass
+
+    print(f'--- {player_count} players ---')
+    for name, legacy_func, store_func in (
+        ('per-entry cycle', legacy_cycle, store_cycle),
+        ('batch cycle', legacy_batch, store_batch),
+        ('snapshot + scan', legacy_snapshot, store_snapshot)
+    ):
+        legacy_time = measure(legacy_func)
+        store_time = measure(store_func)
+        print(f'{name:16s} legacy {legacy_time * 1e6:12.1f} us   store {store_time * 1e6:12.1f} us   ' +
+              f'speedup {legacy_time / store_time:6.1f}x')
+
+
+def main() -> None:
+    for player_count in (10, 100, 1000):
+        bench(player_count)
+
+
+if __name__ == '__main__':
+    main()
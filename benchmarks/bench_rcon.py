@@ -0,0 +1,113 @@
+"""
+RCON传输（transport: 'rcon'）的基准测试，无需真实的MC服务器。
+
+以 FakeServerInterface 模拟MC服务器，并以其 start_rcon 启动模拟的 RCON 服务器，比较命令的以下几种发送方式：
+    console：经控制台发送命令，从控制台输出（on_info）中解析结果；
+    rcon：经RCON连接发送，每个连接收到回复后再发送下一条命令（rconMaxPipelined 为1，原版服务器须使用此方式）；
+    rcon-pipelined：经RCON连接以流水线方式发送（rconMaxPipelined 为 --pipelined）；
+控制台输出经 MCDR 转发到 on_info 的延迟由 --console-delay 模拟（RCON的回复不经过 MCDR）。
+统计启动预热的耗时、轮询吞吐量、命令往返延迟，及数据新鲜度（游戏内的数据发生变化，到订阅客户端收到该变化的延迟）。
+
+用法：
+    python benchmarks/bench_rcon.py [--players N] [--latency MS] [--jitter MS] [--change-rate N] [--duration S]
+                                    [--console-delay MS] [--connections N] [--pipelined N] [--per-entry] [--port N]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any
+
+from common import load_plugin, percentiles
+from fake_server import FakeServerInterface
+from load_generator import run_load
+
+
+def run(mode: str, args: argparse.Namespace, port: int) -> None:
+    server = FakeServerInterface(load_plugin(), args.players, args.latency / 1000.0, args.jitter / 1000.0, 0.0,
+                                 args.change_rate, {
+                                     'commIP': '127.0.0.1',
+                                     'commPort': port,
+                                     'batchedCollection': not args.per_entry,
+                                     'historyEnabled': False,
+                                     'schedulerStatsInterval': 0,
+                                     'transport': 'console' if mode == 'console' else 'rcon',
+                                     'rconPort': port + 1,
+                                     'rconPassword': 'bench',
+                                     'rconConnections': args.connections,
+                                     'rconMaxPipelined': args.pipelined if mode == 'rcon-pipelined' else 1
+                                 }, output_delay=args.console_delay / 1000.0)
+    server.start_rcon(port + 1, 'bench')
+    # 玩家在插件加载前就已在线，由启动预热取得在线玩家及其数据
+    server.start(join=False)
+    msm = server.plugin
+    while not msm.server_monitor.ready:
+        time.sleep(0.005)
+    warm_start = msm.server_monitor.ready_after
+
+    freshness = []
+
+    def on_delta(entry: dict[str, Any], received_at: float) -> None:
+        if entry['type'] == 'onlineTime':
+            return
+        change = server.last_change(entry['name'], entry['type'])
+        # 只统计收到的值即为最新值的变化
+        if change is not None and change[0] == entry['quantity']:
+            freshness.append(received_at - change[1])
+
+    commands_before = server.commands_received
+    resolved_before = msm.pending_requests.stats()['resolved']
+    lines_before = server.lines_emitted
+    stats = asyncio.run(run_load(f'ws://127.0.0.1:{port}', 0, 1, args.duration, on_delta=on_delta))
+    elapsed = stats.elapsed
+    request_stats = msm.pending_requests.stats()
+    monitor_stats = msm.collect_monitor_stats()
+    commands = server.commands_received - commands_before
+    resolved = request_stats['resolved'] - resolved_before
+    lines = server.lines_emitted - lines_before
+    server.stop()
+
+    p50, p90, p99 = percentiles(freshness)
+    print(f'[{mode}]')
+    print(f'warm start    {warm_start * 1000:10.1f} ms')
+    print(f'commands      {commands / elapsed:10.1f} /s   results {resolved / elapsed:10.1f} /s   ' +
+          f'{request_stats["expired"]} expired   {lines / elapsed:.1f} console lines/s')
+    for func, summary in monitor_stats['request_latency_ms'].items():
+        if summary['count'] > 0:
+            print(f'{func:14s} round trip (ms)  p50 {summary["p50"]:g}   p90 {summary["p90"]:g}   p99 {summary["p99"]:g}')
+    print(f'staleness (ms)  p50 {p50 * 1000:8.1f}   p90 {p90 * 1000:8.1f}   p99 {p99 * 1000:8.1f}   ' +
+          f'({len(freshness)} changes)')
+    if monitor_stats['rcon'] is not None:
+        rcon = monitor_stats['rcon']
+        print(f'rcon          {rcon["commands"]} commands   {rcon["lost"]} lost   {rcon["fallbacks"]} fallbacks')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=2.0, help='command latency of the fake server (ms)')
+    parser.add_argument('--jitter', type=float, default=0.5, help='command latency jitter (ms)')
+    parser.add_argument('--console-delay', type=float, default=5.0,
+                        help='delay of forwarding console output to on_info (ms)')
+    parser.add_argument('--change-rate', type=float, default=50.0, help='random data changes per second')
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--connections', type=int, default=4, help='RCON connections')
+    parser.add_argument('--pipelined', type=int, default=8, help='rconMaxPipelined of the rcon-pipelined mode')
+    parser.add_argument('--per-entry', action='store_true', help='disable batched collection')
+    parser.add_argument('--port', type=int, default=18790)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    print(f'{args.players} players, latency {args.latency:g}±{args.jitter:g}ms, ' +
+          f'console delay {args.console_delay:g}ms, ' +
+          f'{"per-entry" if args.per_entry else "batched"} collection, {args.duration:g}s each')
+    # 各方式使用不同的端口，以免与上一个插件实例移交的监听套接字冲突
+    for i, mode in enumerate(('console', 'rcon', 'rcon-pipelined')):
+        run(mode, args, args.port + i * 2)
+
+
+if __name__ == '__main__':
+    main()
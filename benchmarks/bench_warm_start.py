@@ -0,0 +1,78 @@
+"""
+启动预热（warmStart）的基准测试，无需真实的MC服务器。
+
+以 FakeServerInterface 模拟插件加载时已有 --players 个玩家在线的MC服务器（玩家数据不再变化），
+统计从加载插件到插件中的数据与游戏内的数据完全一致（取得完整快照）的耗时，比较以下三种情形：
+    joined：玩家在插件加载后才加入游戏（触发加入游戏的事件），作为参照；
+    cold：玩家在插件加载前就已在线，不进行启动预热（这些玩家在重新加入游戏前不会被轮询，无法取得完整快照）；
+    warm：玩家在插件加载前就已在线，进行启动预热。
+
+用法：
+    python benchmarks/bench_warm_start.py [--players N] [--latency MS] [--timeout S] [--port N]
+"""
+
+import argparse
+import logging
+import time
+
+from common import load_plugin
+from fake_server import FakeServerInterface
+
+
+def snapshot_complete(server: FakeServerInterface) -> bool:
+    # onlineTime 每刻都在变化，不参与比较
+    msm = server.plugin
+    with server.lock:
+        expected = {player: dict(scores) for player, scores in server.scores.items()}
+    with msm.player_data_records_lock:
+        snapshot = msm.player_data_records.snapshot()
+    rows = dict(snapshot.rows())
+    items = [(index, item) for index, item in enumerate(msm.PLAYER_DATA_ITEMS) if item != 'onlineTime']
+    for player, scores in expected.items():
+        values = rows.get(player)
+        if values is None or any(values[index] != scores[item] for index, item in items):
+            return False
+    return True
+
+
+def run(mode: str, players: int, latency: float, timeout: float, port: int) -> tuple[float | None, int]:
+    server = FakeServerInterface(load_plugin(), players, latency, latency / 4.0, 0.0, 0.0, {
+        'commIP': '127.0.0.1',
+        'commPort': port,
+        'historyEnabled': False,
+        'schedulerStatsInterval': 0,
+        'warmStart': mode == 'warm'
+    })
+    start = time.monotonic()
+    server.start(join=mode == 'joined')
+    elapsed = None
+    while time.monotonic() - start < timeout:
+        if snapshot_complete(server):
+            elapsed = time.monotonic() - start
+            break
+        time.sleep(0.002)
+    commands = server.commands_received
+    server.stop()
+    return elapsed, commands
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=5.0, help='command latency of the fake server (ms)')
+    parser.add_argument('--timeout', type=float, default=5.0, help='give up waiting for a complete snapshot (s)')
+    parser.add_argument('--port', type=int, default=18780)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    print(f'{args.players} players, command latency {args.latency:g} ms')
+    for i, mode in enumerate(('joined', 'cold', 'warm')):
+        elapsed, commands = run(mode, args.players, args.latency / 1000.0, args.timeout, args.port + i)
+        result = f'{elapsed * 1000:10.1f} ms' if elapsed is not None else f'  not within {args.timeout:g} s'
+        print(f'{mode:8s} complete snapshot {result}   {commands:8d} commands sent')
+
+
+if __name__ == '__main__':
+    main()
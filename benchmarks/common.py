@@ -0,0 +1,56 @@
+"""
+基准测试脚本的公共工具。
+
+各基准测试脚本直接从 plugins/ 目录加载插件源文件，因此运行前需安装插件的依赖（mcdreforged、websockets）。
+"""
+
+import importlib.util
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Callable
+
+
+# 仓库根目录
+REPO_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 插件源文件路径
+PLUGIN_PATH: str = os.path.join(REPO_ROOT, 'plugins', 'mc_server_monitor.py')
+
+
+def load_plugin() -> ModuleType:
+    """
+    以独立模块的形式加载插件源文件（不经过 MCDR），返回插件模块对象。
+    """
+
+    spec = importlib.util.spec_from_file_location('mc_server_monitor', PLUGIN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2) -> float:
+    """
+    重复执行 func 直至总耗时不少于 min_time 秒，返回单次执行的平均耗时（单位：s）。
+    """
+
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / count
+
+
+def percentiles(values: list[float], qs: tuple[float, ...] = (0.5, 0.9, 0.99)) -> list[float]:
+    """
+    计算 values 的各分位数（最近秩法），values 为空时均返回0。
+    """
+
+    if len(values) == 0:
+        return [0.0 for _ in qs]
+    ordered = sorted(values)
+    return [ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in qs]
@@ -0,0 +1,414 @@
+"""
+模拟的 MCDR 服务器接口（PluginServerInterface），用于在没有真实MC服务器的情况下对插件进行基准测试。
+
+FakeServerInterface 模拟了 MC 服务器执行本插件数据包中的函数的行为：
+发送到服务器的命令按顺序在模拟的服务器线程中执行（可配置延迟、抖动），执行结果以控制台输出的形式
+通过插件的 on_info 回传（可配置丢失率）；同时模拟游戏的进行，玩家数据按设定的频率随机变化。
+
+支持的命令（与 datapacks/mc_server_monitor 中的函数对应）：
+    function msm:get_data {player:P,entry:E}          -> Function msm:get_data returned N
+    function msm:get_data_tagged {player:P,entry:E,id:I}
+    data get storage msm:results pending               -> Storage msm:results has the following contents: [...]
+    data modify storage msm:results pending set value []
+    data modify storage msm:collect players set value [{player:"P",mode:"player"|"player_changed"},...]
+    function msm:collect/all {id:I}
+    data get storage msm:collect result                -> Storage msm:collect has the following contents: {...}
+    list                                               -> There are N of a max of M players online: P1, P2, ...
+
+start_rcon 另启动一个模拟的 RCON 服务器：经 RCON 发送的命令与控制台命令在同一队列中按顺序执行，
+其输出作为命令的回复返回（不经 on_info），超过4096字节的回复与原版服务器一样拆分为多个数据包。
+与原版服务器不同，同一连接上连续到达的多个数据包均会被依次处理（可用于测试流水线方式发送命令）。
+
+legacy_datapack 为 True 时模拟旧版本的数据包：只有 msm:get_data，不支持带关联ID的查询及批量采集。
+"""
+
+import heapq
+import logging
+import random
+import re
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from types import ModuleType
+from typing import Any, Callable
+
+
+# 游戏刻的时长（s）
+TICK: float = 0.05
+
+GET_DATA_PATTERN = re.compile(r'function msm:get_data \{player:(\w+),entry:msm_(\w+)\}')
+GET_DATA_TAGGED_PATTERN = re.compile(r'function msm:get_data_tagged \{player:(\w+),entry:msm_(\w+),id:(\d+)\}')
+COLLECT_PLAYERS_PATTERN = re.compile(r'data modify storage msm:collect players set value \[(.*)\]')
+COLLECT_PLAYER_ENTRY_PATTERN = re.compile(r'\{player:"(\w+)",mode:"(\w+)"\}')
+COLLECT_ALL_PATTERN = re.compile(r'function msm:collect/all \{id:(\d+)\}')
+
+# RCON数据包的类型
+RCON_TYPE_RESPONSE: int = 0
+RCON_TYPE_COMMAND: int = 2
+RCON_TYPE_LOGIN: int = 3
+RCON_HEADER = struct.Struct('<iii')
+
+
+class FakeInfo(object):
+    def __init__(self, content: str):
+        self.content: str = content
+        self.is_user: bool = False
+
+
+class FakeServerInterface(object):
+    def __init__(self, plugin: ModuleType, players: int, latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, change_rate: float = 0.0, config: dict[str, Any] | None = None, seed: int = 0,
+                 output_delay: float = 0.0, legacy_datapack: bool = False):
+        """
+        plugin 为插件模块，players 为在线玩家数，latency、jitter 为命令从发出到执行完毕的延迟及其抖动（s），
+        loss 为控制台输出丢失的概率，change_rate 为每秒随机变化的数据个数（不含每刻都会增加的 onlineTime），
+        config 为覆盖插件缺省配置的配置项，output_delay 为控制台输出经 MCDR 转发到 on_info 的延迟（s，不影响 RCON 的回复），
+        legacy_datapack 为是否模拟旧版本的数据包。
+        """
+
+        self.plugin: ModuleType = plugin
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.loss: float = loss
+        self.change_rate: float = change_rate
+        self.output_delay: float = output_delay
+        self.legacy_datapack: bool = legacy_datapack
+        self.config: dict[str, Any] = config or {}
+        self.rand = random.Random(seed)
+        self.logger = logging.getLogger('msm')
+        self.data_folder: str = tempfile.mkdtemp(prefix='msm_bench_')
+        self.items: list[str] = list(plugin.PLAYER_DATA_ITEMS)
+        self.players: list[str] = ['player_%d' % i for i in range(players)]
+
+        # 模拟的记分板，及各数据最后一次变化的 (值, 时刻)
+        self.lock = threading.Lock()
+        self.scores: dict[str, dict[str, int]] = {
+            player: {item: self.rand.randint(0, 20) for item in self.items} for player in self.players}
+        self.changes: dict[tuple[str, str], tuple[int, float]] = {}
+        # 数据包中的命令存储，及 msm:collect/player_changed 所比较的上次采集的值
+        self.results: list[tuple[int, int]] = []
+        self.collect_players: list[tuple[str, str]] = []
+        self.collect_result: tuple[int, list[tuple[str, dict[str, int]]]] = (0, [])
+        self.last_collected: dict[str, dict[str, int]] = {}
+
+        # 待执行的命令：(执行时刻, 序号, 命令, 回复执行结果的函数)，回复函数为 None 的是控制台命令
+        self.command_queue: list[tuple[float, int, str | None, Callable[[str | None], None] | None]] = []
+        self.command_seq: int = 0
+        self.last_due: float = 0.0
+        self.command_event = threading.Condition(self.lock)
+        self.running: bool = True
+
+        # 统计
+        self.commands_received: int = 0
+        self.lines_emitted: int = 0
+        self.lines_lost: int = 0
+        self.rcon_commands: int = 0
+
+        # 等待转发到 on_info 的控制台输出：(转发时刻, 输出)
+        self.outputs: deque[tuple[float, str]] = deque()
+        self.output_event = threading.Condition()
+        # 模拟的 RCON 服务器的监听套接字，未启动时为 None，及已建立的 RCON 连接
+        self.rcon_socket: socket.socket | None = None
+        self.rcon_connections: set[socket.socket] = set()
+
+        self.server_thread = threading.Thread(target=self.__server_loop, name='FakeServerThread', daemon=True)
+        self.output_thread = threading.Thread(target=self.__output_loop, name='FakeOutputThread', daemon=True)
+        self.game_thread = threading.Thread(target=self.__game_loop, name='FakeGameThread', daemon=True)
+
+
+    # ---------------
+    # PluginServerInterface 接口
+    # ---------------
+
+    def is_server_running(self) -> bool:
+        return self.running
+
+
+    def is_server_startup(self) -> bool:
+        return self.running
+
+
+    def get_data_folder(self) -> str:
+        return self.data_folder
+
+
+    def load_config_simple(self, file_name: str = 'config.json', target_class: Any = None, **kwargs) -> Any:
+        config = target_class()
+        for key, value in self.config.items():
+            setattr(config, key, value)
+        return config
+
+
+    def register_help_message(self, *args, **kwargs) -> None:
+        pass
+
+
+    def register_command(self, *args, **kwargs) -> None:
+        pass
+
+
+    def execute(self, command: str) -> None:
+        self.__enqueue(command, None)
+
+
+    def get_mcdr_config(self) -> dict[str, Any]:
+        return {}
+
+
+    def __enqueue(self, command: str | None, reply: Callable[[str | None], None] | None) -> None:
+        # 命令按发送的顺序执行，抖动不会打乱命令的顺序
+        with self.lock:
+            self.commands_received += 1
+            due = time.monotonic() + max(self.latency + self.rand.uniform(-self.jitter, self.jitter), 0.0)
+            due = max(due, self.last_due)
+            self.last_due = due
+            self.command_seq += 1
+            heapq.heappush(self.command_queue, (due, self.command_seq, command, reply))
+            self.command_event.notify()
+
+
+    # ---------------
+    # 模拟的服务器
+    # ---------------
+
+    def start(self, join: bool = True) -> None:
+        """
+        启动模拟的服务器，加载插件，并使所有玩家加入游戏。
+        join 为 False 时，模拟插件加载前玩家就已在线的情形（不触发加入游戏的事件）。
+        """
+
+        self.server_thread.start()
+        self.game_thread.start()
+        self.output_thread.start()
+        self.plugin.on_load(self, None)
+        if join:
+            for player in self.players:
+                self.plugin.on_player_joined(self, player, FakeInfo(f'{player} joined the game'))
+
+
+    def start_rcon(self, port: int, password: str) -> None:
+        """
+        启动模拟的 RCON 服务器，监听 127.0.0.1:port。
+        """
+
+        self.rcon_socket = socket.create_server(('127.0.0.1', port))
+        threading.Thread(target=self.__rcon_accept_loop, args=(self.rcon_socket, password), name='FakeRconThread',
+                         daemon=True).start()
+
+
+    def stop_rcon(self) -> None:
+        """
+        停止模拟的 RCON 服务器，并断开所有已建立的 RCON 连接（如MC服务器重启时）。
+        """
+
+        if self.rcon_socket is None:
+            return
+        with self.lock:
+            sockets = [self.rcon_socket, *self.rcon_connections]
+            self.rcon_socket = None
+            self.rcon_connections.clear()
+        for s in sockets:
+            # 先关闭读写以唤醒阻塞在 accept、recv 中的线程
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            s.close()
+
+
+    def stop(self) -> None:
+        self.plugin.on_unload(self)
+        with self.lock:
+            self.running = False
+            self.command_event.notify()
+        with self.output_event:
+            self.output_event.notify()
+        self.stop_rcon()
+
+
+    def last_change(self, player: str, item: str) -> tuple[int, float] | None:
+        """
+        取得某一数据最后一次变化的 (值, 时刻)，若从未变化则返回 None。
+        """
+
+        with self.lock:
+            return self.changes.get((player, item))
+
+
+    def __emit(self, content: str) -> None:
+        if self.loss > 0 and self.rand.random() < self.loss:
+            self.lines_lost += 1
+            return
+        self.lines_emitted += 1
+        self.plugin.on_info(self, FakeInfo(content))
+
+
+    def __server_loop(self) -> None:
+        while True:
+            with self.lock:
+                while self.running and (len(self.command_queue) == 0 or self.command_queue[0][0] > time.monotonic()):
+                    timeout = self.command_queue[0][0] - time.monotonic() if len(self.command_queue) > 0 else None
+                    self.command_event.wait(timeout)
+                if not self.running:
+                    return
+                _, _, command, reply = heapq.heappop(self.command_queue)
+                output = self.__run_command(command) if command is not None else None
+            # 在锁外回传执行结果，与 MCDR 在其自身的线程中调用 on_info 一致；经 RCON 发送的命令则直接回复
+            if reply is not None:
+                reply(output)
+            elif output is not None and self.output_delay > 0:
+                with self.output_event:
+                    self.outputs.append((time.monotonic() + self.output_delay, output))
+                    self.output_event.notify()
+            elif output is not None:
+                self.__emit(output)
+
+
+    def __output_loop(self) -> None:
+        # 按顺序在延迟 output_delay 后转发控制台输出
+        while True:
+            with self.output_event:
+                while self.running and (len(self.outputs) == 0 or self.outputs[0][0] > time.monotonic()):
+                    self.output_event.wait(self.outputs[0][0] - time.monotonic() if len(self.outputs) > 0 else None)
+                if not self.running:
+                    return
+                _, output = self.outputs.popleft()
+            self.__emit(output)
+
+
+    def __rcon_accept_loop(self, listen_socket: socket.socket, password: str) -> None:
+        while True:
+            try:
+                conn, _ = listen_socket.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock:
+                self.rcon_connections.add(conn)
+            threading.Thread(target=self.__rcon_serve, args=(conn, password), daemon=True).start()
+
+
+    def __rcon_serve(self, conn: socket.socket, password: str) -> None:
+        send_lock = threading.Lock()
+
+        def send(packet_id: int, packet_type: int, body: bytes) -> None:
+            try:
+                with send_lock:
+                    conn.sendall(RCON_HEADER.pack(len(body) + 10, packet_id, packet_type) + body + b'\x00\x00')
+            except OSError:
+                pass
+
+        def reply(packet_id: int, output: str | None) -> None:
+            # 与原版服务器相同，回复按4096字节拆分为多个数据包，至少发送一个
+            data = (output or '').encode('utf-8')
+            for start in range(0, max(len(data), 1), 4096):
+                send(packet_id, RCON_TYPE_RESPONSE, data[start:start + 4096])
+
+        authed = False
+        reader = conn.makefile('rb')
+        try:
+            while self.running:
+                header = reader.read(4)
+                if len(header) < 4:
+                    return
+                data = reader.read(struct.unpack('<i', header)[0])
+                packet_id, packet_type = struct.unpack_from('<ii', data)
+                body = data[8:-2].decode('utf-8')
+                if packet_type == RCON_TYPE_LOGIN:
+                    authed = body == password
+                    send(packet_id if authed else -1, RCON_TYPE_COMMAND, b'')
+                elif not authed:
+                    send(-1, RCON_TYPE_COMMAND, b'')
+                elif packet_type == RCON_TYPE_COMMAND:
+                    self.rcon_commands += 1
+                    self.__enqueue(body, lambda output, packet_id=packet_id: reply(packet_id, output))
+                else:
+                    # 未知类型的数据包同样按顺序回复
+                    self.__enqueue(None, lambda output, packet_id=packet_id, packet_type=packet_type:
+                                   reply(packet_id, 'Unknown request %x' % packet_type))
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.rcon_connections.discard(conn)
+            reader.close()
+            conn.close()
+
+
+    def __run_command(self, command: str) -> str | None:
+        if self.legacy_datapack:
+            if command.startswith(('function msm:get_data_tagged ', 'function msm:collect/')):
+                return 'Unknown function %s' % command.split(' ')[1]
+            if command.startswith(('data get storage msm:', 'data modify storage msm:')):
+                return 'Found no elements matching %s' % command.split(' ')[4]
+        match = GET_DATA_TAGGED_PATTERN.fullmatch(command)
+        if match:
+            self.results.append((int(match[3]), self.scores.get(match[1], {}).get(match[2], 0)))
+            return None
+        match = GET_DATA_PATTERN.fullmatch(command)
+        if match:
+            return 'Function msm:get_data returned %d' % self.scores.get(match[1], {}).get(match[2], 0)
+        if command == 'data get storage msm:results pending':
+            return 'Storage msm:results has the following contents: [%s]' % ', '.join(
+                '{id: %d, value: %d}' % result for result in self.results)
+        if command == 'data modify storage msm:results pending set value []':
+            self.results = []
+            return None
+        match = COLLECT_PLAYERS_PATTERN.fullmatch(command)
+        if match:
+            self.collect_players = COLLECT_PLAYER_ENTRY_PATTERN.findall(match[1])
+            return None
+        match = COLLECT_ALL_PATTERN.fullmatch(command)
+        if match:
+            rows = []
+            for player, mode in self.collect_players:
+                scores = self.scores.get(player)
+                if scores is None:
+                    continue
+                last = self.last_collected.setdefault(player, {})
+                # 与数据包相同：只采集变化的记分项时 onlineTime 不参与比较，只在有其他记分项变化时顺带采集
+                row = {item: value for item, value in scores.items()
+                       if mode == 'player' or (item != 'onlineTime' and last.get(item) != value)}
+                if mode != 'player' and len(row) > 0:
+                    row['onlineTime'] = scores['onlineTime']
+                last.update(scores)
+                if len(row) > 0:
+                    rows.append((player, row))
+            self.collect_result = (int(match[1]), rows)
+            return None
+        if command == 'list':
+            return 'There are %d of a max of %d players online: %s' % (
+                len(self.players), max(len(self.players), 20), ', '.join(self.players))
+        if command == 'data get storage msm:collect result':
+            request_id, rows = self.collect_result
+            return 'Storage msm:collect has the following contents: {id: %d, players: [%s]}' % (request_id, ', '.join(
+                '{name: "%s", %s}' % (player, ', '.join('%s: %d' % (item, value) for item, value in row.items()))
+                for player, row in rows))
+        return None
+
+
+    def __game_loop(self) -> None:
+        # 每个游戏刻增加所有玩家的 onlineTime，并按 change_rate 随机改变其他数据
+        next_tick = time.monotonic()
+        carry = 0.0
+        other_items = [item for item in self.items if item != 'onlineTime']
+        while self.running:
+            now = time.monotonic()
+            with self.lock:
+                for player in self.players:
+                    scores = self.scores[player]
+                    scores['onlineTime'] += 1
+                    self.changes[(player, 'onlineTime')] = (scores['onlineTime'], now)
+                carry += self.change_rate * TICK
+                while carry >= 1.0:
+                    carry -= 1.0
+                    player = self.rand.choice(self.players)
+                    item = self.rand.choice(other_items)
+                    value = self.scores[player][item] + 1
+                    self.scores[player][item] = value
+                    self.changes[(player, item)] = (value, now)
+            next_tick += TICK
+            time.sleep(max(next_tick - time.monotonic(), 0.0))
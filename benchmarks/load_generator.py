@@ -0,0 +1,148 @@
+"""
+websocket 负载生成器。
+
+在 client_demo_python.py 的基础上，同时打开多个websocket客户端：
+请求客户端循环发送 get_all_players_data 请求，并以结束标志（end_of_response）判断响应接收完毕，统计请求延迟；
+订阅客户端订阅玩家数据的变化，统计收到的推送。可单独对运行中的插件使用，也可由 bench_end_to_end.py 调用。
+
+用法：
+    python benchmarks/load_generator.py [--url ws://localhost:8765] [--clients N] [--subscribers N]
+                                        [--duration S] [--format records|columnar|binary] [--interval S]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable
+
+import websockets
+
+from common import percentiles
+
+
+class LoadStats(object):
+    def __init__(self):
+        # 各请求从发出到收到结束标志的延迟（s）
+        self.latencies: list[float] = []
+        # 收到的响应消息数及字节数（不含结束标志）
+        self.messages: int = 0
+        self.bytes: int = 0
+        # 出错的请求数（包括连接出错）
+        self.errors: int = 0
+        # 收到的推送数，及推送中的数据个数
+        self.deltas: int = 0
+        self.delta_entries: int = 0
+        # 实际的测试时长（s）
+        self.elapsed: float = 0.0
+
+
+async def request_client(url: str, stats: LoadStats, deadline: float, format: str, interval: float) -> None:
+    async with websockets.connect(url, max_size=None) as websocket:
+        id = 0
+        while time.monotonic() < deadline:
+            request = {
+                'id': id,
+                'instruction': 'get_all_players_data',
+                'arguments': {
+                    'format': format,
+                    'end_marker': True
+                }
+            }
+            id += 1
+            start = time.monotonic()
+            await websocket.send(json.dumps(request))
+            while True:
+                response = await websocket.recv()
+                # 二进制响应不是JSON，直接计入
+                if isinstance(response, str):
+                    instruction = json.loads(response)['instruction']
+                    # 服务器在所有响应信息之后发送结束标志，收到即说明本请求的响应已全部接收
+                    if instruction == 'end_of_response':
+                        break
+                    if instruction == 'error':
+                        stats.errors += 1
+                stats.messages += 1
+                stats.bytes += len(response)
+            stats.latencies.append(time.monotonic() - start)
+            if interval > 0:
+                await asyncio.sleep(interval)
+
+
+async def subscribe_client(url: str, stats: LoadStats, deadline: float,
+                           on_delta: Callable[[dict[str, Any], float], None] | None) -> None:
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(json.dumps({'id': 'subscription', 'instruction': 'subscribe_players_data'}))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(websocket.recv(), remaining)
+            except asyncio.TimeoutError:
+                break
+            received_at = time.monotonic()
+            data = json.loads(message)
+            if data['instruction'] != 'players_data_delta':
+                continue
+            stats.deltas += 1
+            stats.delta_entries += len(data['data'])
+            if on_delta is not None:
+                for entry in data['data']:
+                    on_delta(entry, received_at)
+
+
+async def run_load(url: str, clients: int, subscribers: int, duration: float, format: str = 'records',
+                   interval: float = 0.0, on_delta: Callable[[dict[str, Any], float], None] | None = None) -> LoadStats:
+    """
+    打开 clients 个请求客户端与 subscribers 个订阅客户端，持续 duration 秒。
+    on_delta 在订阅客户端收到推送中的每项数据时被调用，参数为该项数据及收到的时刻（time.monotonic() 时间）。
+    """
+
+    stats = LoadStats()
+    start = time.monotonic()
+    deadline = start + duration
+
+    async def guarded(coroutine) -> None:
+        try:
+            await coroutine
+        except Exception as ex:
+            stats.errors += 1
+            print(f'client error: {ex!r}')
+
+    await asyncio.gather(
+        *[guarded(request_client(url, stats, deadline, format, interval)) for _ in range(clients)],
+        *[guarded(subscribe_client(url, stats, deadline, on_delta)) for _ in range(subscribers)]
+    )
+    stats.elapsed = time.monotonic() - start
+    return stats
+
+
+def report(stats: LoadStats) -> None:
+    p50, p90, p99 = percentiles(stats.latencies)
+    elapsed = max(stats.elapsed, 1e-9)
+    print(f'requests      {len(stats.latencies):10d}   {len(stats.latencies) / elapsed:10.1f} req/s   ' +
+          f'{stats.errors} errors')
+    print(f'responses     {stats.messages:10d}   {stats.messages / elapsed:10.1f} msg/s   ' +
+          f'{stats.bytes / elapsed / 1024 / 1024:.2f} MiB/s')
+    print(f'latency (ms)  p50 {p50 * 1000:8.2f}   p90 {p90 * 1000:8.2f}   p99 {p99 * 1000:8.2f}')
+    if stats.deltas > 0:
+        print(f'pushes        {stats.deltas:10d}   {stats.delta_entries} entries')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='ws://localhost:8765')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--subscribers', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--format', default='records', choices=['records', 'columnar', 'binary'])
+    parser.add_argument('--interval', type=float, default=0.0, help='pause between requests of each client (s)')
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_load(args.url, args.clients, args.subscribers, args.duration, args.format, args.interval))
+    report(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,10 @@ def main():
                 break
             req_json = {
                 'id': id,
-                'instruction': 'get_all_players_data'
+                'instruction': 'get_all_players_data',
+                'arguments': {
+                    'end_marker': True
+                }
             }
             id += 1
             req = json.dumps(req_json)
@@ -22,12 +25,12 @@ def main():
             websocket.send(req)
             print("Waiting for response...")
             while True:
-                try:
-                    response = websocket.recv(0.5)
-                    print("Received response from server: " + response)
-                except TimeoutError:
+                response = websocket.recv()
+                # 服务器在所有响应信息之后发送结束标志，收到即说明本请求的响应已全部接收
+                if json.loads(response)['instruction'] == 'end_of_response':
                     print("Receiving finished.")
                     break
+                print("Received response from server: " + response)
 
 
 if __name__ == "__main__":
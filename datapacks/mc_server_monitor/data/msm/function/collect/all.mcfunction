@@ -0,0 +1,8 @@
+# 批量采集指定玩家的 msm_* 记分项。
+# 调用前需先将待采集的玩家列表写入 storage msm:collect players，每项形如 {player:"玩家名称",mode:"采集方式"}，
+# 采集方式为 player（采集全部记分项）或 player_changed（只采集自上次采集以来发生变化的记分项）。
+# 采集结果（连同本次请求的关联ID）将写入 storage msm:collect result，随后由插件通过 data get 命令一次性取回。
+
+$data modify storage msm:collect result set value {id:$(id),players:[]}
+data modify storage msm:collect queue set from storage msm:collect players
+execute if data storage msm:collect queue[0] run function msm:collect/next
@@ -0,0 +1,3 @@
+# 按照指定的采集方式（msm:collect/player 或 msm:collect/player_changed）采集单个玩家的数据。
+
+$function msm:collect/$(mode) with storage msm:collect cursor
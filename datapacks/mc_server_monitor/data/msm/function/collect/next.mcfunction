@@ -0,0 +1,6 @@
+# 从待采集队列中取出一名玩家并采集其数据，然后递归处理队列的剩余部分。
+
+data modify storage msm:collect cursor set from storage msm:collect queue[0]
+function msm:collect/dispatch with storage msm:collect cursor
+data remove storage msm:collect queue[0]
+execute if data storage msm:collect queue[0] run function msm:collect/next
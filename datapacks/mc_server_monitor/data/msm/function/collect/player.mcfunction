@@ -0,0 +1,28 @@
+# 采集单个玩家的全部 msm_* 记分项，并追加到 storage msm:collect result.players 的末尾。
+# 同时将各记分项的当前值记为上次采集的值（msm_last_*），作为之后只采集变化的记分项的基准。
+
+$data modify storage msm:collect result.players append value {name:"$(player)"}
+$execute store result storage msm:collect result.players[-1].deathCount int 1 run scoreboard players get $(player) msm_deathCount
+$scoreboard players operation $(player) msm_last_deathCount = $(player) msm_deathCount
+$execute store result storage msm:collect result.players[-1].playerKillCount int 1 run scoreboard players get $(player) msm_playerKillCount
+$scoreboard players operation $(player) msm_last_playerKillCount = $(player) msm_playerKillCount
+$execute store result storage msm:collect result.players[-1].totalKillCount int 1 run scoreboard players get $(player) msm_totalKillCount
+$scoreboard players operation $(player) msm_last_totalKillCount = $(player) msm_totalKillCount
+$execute store result storage msm:collect result.players[-1].health int 1 run scoreboard players get $(player) msm_health
+$scoreboard players operation $(player) msm_last_health = $(player) msm_health
+$execute store result storage msm:collect result.players[-1].xp int 1 run scoreboard players get $(player) msm_xp
+$scoreboard players operation $(player) msm_last_xp = $(player) msm_xp
+$execute store result storage msm:collect result.players[-1].level int 1 run scoreboard players get $(player) msm_level
+$scoreboard players operation $(player) msm_last_level = $(player) msm_level
+$execute store result storage msm:collect result.players[-1].food int 1 run scoreboard players get $(player) msm_food
+$scoreboard players operation $(player) msm_last_food = $(player) msm_food
+$execute store result storage msm:collect result.players[-1].air int 1 run scoreboard players get $(player) msm_air
+$scoreboard players operation $(player) msm_last_air = $(player) msm_air
+$execute store result storage msm:collect result.players[-1].armor int 1 run scoreboard players get $(player) msm_armor
+$scoreboard players operation $(player) msm_last_armor = $(player) msm_armor
+$execute store result storage msm:collect result.players[-1].placeBlockCount int 1 run scoreboard players get $(player) msm_placeBlockCount
+$scoreboard players operation $(player) msm_last_placeBlockCount = $(player) msm_placeBlockCount
+$execute store result storage msm:collect result.players[-1].breakBlockCount int 1 run scoreboard players get $(player) msm_breakBlockCount
+$scoreboard players operation $(player) msm_last_breakBlockCount = $(player) msm_breakBlockCount
+$execute store result storage msm:collect result.players[-1].onlineTime int 1 run scoreboard players get $(player) msm_onlineTime
+$scoreboard players operation $(player) msm_last_onlineTime = $(player) msm_onlineTime
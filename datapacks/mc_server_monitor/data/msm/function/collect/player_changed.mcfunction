@@ -0,0 +1,56 @@
+# 只采集单个玩家自上次采集以来发生变化的 msm_* 记分项，并追加到 storage msm:collect result.players 的末尾。
+# 若该玩家没有任何记分项发生变化，则不追加。
+# msm_onlineTime 每刻都在增加，不参与比较（否则每个在线玩家每次都会被采集）：只在该玩家有其他记分项发生变化时顺带采集，
+# 其余时候由全量采集（msm:collect/player）更新。
+
+$data modify storage msm:collect result.players append value {name:"$(player)"}
+scoreboard players set #changed msm_var 0
+
+$execute unless score $(player) msm_deathCount = $(player) msm_last_deathCount store result storage msm:collect result.players[-1].deathCount int 1 run scoreboard players get $(player) msm_deathCount
+$execute unless score $(player) msm_deathCount = $(player) msm_last_deathCount run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_deathCount = $(player) msm_deathCount
+
+$execute unless score $(player) msm_playerKillCount = $(player) msm_last_playerKillCount store result storage msm:collect result.players[-1].playerKillCount int 1 run scoreboard players get $(player) msm_playerKillCount
+$execute unless score $(player) msm_playerKillCount = $(player) msm_last_playerKillCount run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_playerKillCount = $(player) msm_playerKillCount
+
+$execute unless score $(player) msm_totalKillCount = $(player) msm_last_totalKillCount store result storage msm:collect result.players[-1].totalKillCount int 1 run scoreboard players get $(player) msm_totalKillCount
+$execute unless score $(player) msm_totalKillCount = $(player) msm_last_totalKillCount run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_totalKillCount = $(player) msm_totalKillCount
+
+$execute unless score $(player) msm_health = $(player) msm_last_health store result storage msm:collect result.players[-1].health int 1 run scoreboard players get $(player) msm_health
+$execute unless score $(player) msm_health = $(player) msm_last_health run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_health = $(player) msm_health
+
+$execute unless score $(player) msm_xp = $(player) msm_last_xp store result storage msm:collect result.players[-1].xp int 1 run scoreboard players get $(player) msm_xp
+$execute unless score $(player) msm_xp = $(player) msm_last_xp run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_xp = $(player) msm_xp
+
+$execute unless score $(player) msm_level = $(player) msm_last_level store result storage msm:collect result.players[-1].level int 1 run scoreboard players get $(player) msm_level
+$execute unless score $(player) msm_level = $(player) msm_last_level run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_level = $(player) msm_level
+
+$execute unless score $(player) msm_food = $(player) msm_last_food store result storage msm:collect result.players[-1].food int 1 run scoreboard players get $(player) msm_food
+$execute unless score $(player) msm_food = $(player) msm_last_food run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_food = $(player) msm_food
+
+$execute unless score $(player) msm_air = $(player) msm_last_air store result storage msm:collect result.players[-1].air int 1 run scoreboard players get $(player) msm_air
+$execute unless score $(player) msm_air = $(player) msm_last_air run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_air = $(player) msm_air
+
+$execute unless score $(player) msm_armor = $(player) msm_last_armor store result storage msm:collect result.players[-1].armor int 1 run scoreboard players get $(player) msm_armor
+$execute unless score $(player) msm_armor = $(player) msm_last_armor run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_armor = $(player) msm_armor
+
+$execute unless score $(player) msm_placeBlockCount = $(player) msm_last_placeBlockCount store result storage msm:collect result.players[-1].placeBlockCount int 1 run scoreboard players get $(player) msm_placeBlockCount
+$execute unless score $(player) msm_placeBlockCount = $(player) msm_last_placeBlockCount run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_placeBlockCount = $(player) msm_placeBlockCount
+
+$execute unless score $(player) msm_breakBlockCount = $(player) msm_last_breakBlockCount store result storage msm:collect result.players[-1].breakBlockCount int 1 run scoreboard players get $(player) msm_breakBlockCount
+$execute unless score $(player) msm_breakBlockCount = $(player) msm_last_breakBlockCount run scoreboard players add #changed msm_var 1
+$scoreboard players operation $(player) msm_last_breakBlockCount = $(player) msm_breakBlockCount
+
+$execute unless score #changed msm_var matches 0 store result storage msm:collect result.players[-1].onlineTime int 1 run scoreboard players get $(player) msm_onlineTime
+$execute unless score #changed msm_var matches 0 run scoreboard players operation $(player) msm_last_onlineTime = $(player) msm_onlineTime
+
+execute if score #changed msm_var matches 0 run data remove storage msm:collect result.players[-1]
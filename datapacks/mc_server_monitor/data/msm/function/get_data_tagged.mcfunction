@@ -0,0 +1,5 @@
+# 带关联ID的 get_data：将查询结果连同请求的关联ID一并追加到 storage msm:results pending 中，
+# 由插件通过 data get 命令批量取回，因此结果与请求的对应关系不依赖于控制台输出的先后顺序。
+
+$data modify storage msm:results pending append value {id:$(id)}
+$execute store result storage msm:results pending[-1].value int 1 run scoreboard players get $(player) $(entry)
@@ -2,6 +2,9 @@
 
 scoreboard objectives add msm_var dummy
 
+# 初始化带关联ID的查询结果缓冲区
+data modify storage msm:results pending set value []
+
 gamerule commandBlockOutput false
 gamerule maxCommandChainLength 200000
 gamerule snowAccumulationHeight 8
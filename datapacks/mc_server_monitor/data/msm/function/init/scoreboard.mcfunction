@@ -36,4 +36,20 @@ scoreboard objectives add msm_breakBlockCount trigger
 # 在线时长（以游戏刻为单位）
 # 注：受限于记分板数据类型（32位有符号整型），上限值为2,147,483,647，
 # 也就是最多只能记录约1242.76天的时长。
-scoreboard objectives add msm_onlineTime trigger
\ No newline at end of file
+scoreboard objectives add msm_onlineTime trigger
+# -----
+# 下列记分项用于记录各记分项上次被采集时的值（参见 msm:collect/player_changed），只在本数据包内部使用。
+# -----
+
+scoreboard objectives add msm_last_deathCount dummy
+scoreboard objectives add msm_last_playerKillCount dummy
+scoreboard objectives add msm_last_totalKillCount dummy
+scoreboard objectives add msm_last_health dummy
+scoreboard objectives add msm_last_xp dummy
+scoreboard objectives add msm_last_level dummy
+scoreboard objectives add msm_last_food dummy
+scoreboard objectives add msm_last_air dummy
+scoreboard objectives add msm_last_armor dummy
+scoreboard objectives add msm_last_placeBlockCount dummy
+scoreboard objectives add msm_last_breakBlockCount dummy
+scoreboard objectives add msm_last_onlineTime dummy
@@ -14,4 +14,17 @@ scoreboard objectives remove msm_placeBlockCount
 scoreboard objectives remove msm_breakBlockCount
 scoreboard objectives remove msm_onlineTime
 
+scoreboard objectives remove msm_last_deathCount
+scoreboard objectives remove msm_last_playerKillCount
+scoreboard objectives remove msm_last_totalKillCount
+scoreboard objectives remove msm_last_health
+scoreboard objectives remove msm_last_xp
+scoreboard objectives remove msm_last_level
+scoreboard objectives remove msm_last_food
+scoreboard objectives remove msm_last_air
+scoreboard objectives remove msm_last_armor
+scoreboard objectives remove msm_last_placeBlockCount
+scoreboard objectives remove msm_last_breakBlockCount
+scoreboard objectives remove msm_last_onlineTime
+
 function msm:init/scoreboard
\ No newline at end of file
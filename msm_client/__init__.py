@@ -0,0 +1,29 @@
+"""
+【MC Server Monitor asyncio 客户端】
+
+用于网站后端等程序访问 MC Server Monitor 插件（或多服务器聚合网关 msm_gateway）的 asyncio 客户端，只需安装 websockets。
+与 client_demo_python.py 逐个发送请求的方式不同：
+    同一连接上可同时进行任意多个请求，响应按流水号（id）分发给各自的请求；
+    每个请求都带上 end_marker，收到结束标志（end_of_response）即完成，无需等待接收超时；
+    连接断开后在后台按指数退避自动重连，并以 epoch、since_version 恢复订阅，只补发断线期间的变化；
+    MonitorClientPool 为多个服务器各维护若干连接，请求发往负载最小的连接，并可向各服务器并发发送同一请求。
+
+用法：
+    async with MonitorClient('ws://127.0.0.1:8765') as client:
+        snapshot = await client.get_all_players_data()            # 'binary' 格式，解码为 'columnar' 形式
+        top = await client.call('get_leaderboard', {'metric': 'totalKillCount', 'limit': 10})
+        results = await asyncio.gather(*(client.call('query_players_data', {'players': [p]}) for p in players))
+        subscription = await client.subscribe(metrics=['deathCount'])
+        async for delta in subscription:
+            ...
+
+    async with MonitorClientPool({'survival': 'ws://10.0.0.2:8765', 'creative': 'ws://10.0.0.3:8765'}, size=2) as pool:
+        replies = await pool.broadcast('get_monitor_stats')      # {服务器名称: 响应或 MonitorError}
+
+请求出错时：无法连接、连接断开或超时抛出 MonitorConnectionError，服务器回复错误信息时（call）抛出 MonitorRequestError，
+两者均为 MonitorError 的子类。客户端的所有方法须在同一个事件循环中调用。
+"""
+
+from .client import (MonitorClient, MonitorConnectionError, MonitorError, MonitorRequestError, Subscription,
+                     decode_binary)
+from .pool import MonitorClientPool
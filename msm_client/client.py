@@ -0,0 +1,415 @@
+"""
+到单个 MC Server Monitor 插件（或网关）的 asyncio 客户端。
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import random
+import struct
+import sys
+from array import array
+from typing import Any
+
+import websockets
+
+
+logger = logging.getLogger('msm_client')
+
+# 二进制响应信息的魔数，与插件相同
+BINARY_RESPONSE_MAGIC: bytes = b'MSMB'
+
+
+class MonitorError(Exception):
+    pass
+
+
+# 无法建立连接，或连接在请求收到全部响应之前断开
+class MonitorConnectionError(MonitorError):
+    pass
+
+
+# 服务器对请求回复了错误信息（instruction 为 'error'）
+class MonitorRequestError(MonitorError):
+    pass
+
+
+def decode_binary_header(message: bytes) -> tuple[dict, int]:
+    """
+    解析 'binary' 格式的响应信息的JSON头部，返回 (头部, 数据部分的起始位置)。
+    """
+
+    if message[:len(BINARY_RESPONSE_MAGIC)] != BINARY_RESPONSE_MAGIC:
+        raise ValueError('Not a binary response')
+    header_length = struct.unpack_from('<I', message, len(BINARY_RESPONSE_MAGIC))[0]
+    start = len(BINARY_RESPONSE_MAGIC) + 4
+    return json.loads(message[start:start + header_length]), start + header_length
+
+
+def decode_binary(message: bytes) -> dict:
+    """
+    将 'binary' 格式的响应信息解码为与 'columnar' 格式相同的形式（values 中的各列为 array('i')）。
+    """
+
+    header, offset = decode_binary_header(message)
+    count = len(header['players'])
+    values = []
+    for _ in header['items']:
+        column = array('i')
+        column.frombytes(message[offset:offset + count * 4])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        values.append(column)
+        offset += count * 4
+    header['values'] = values
+    return header
+
+
+# 对玩家数据变化的订阅，以 async for 逐条取得推送（players_data_delta 消息）。
+# 连接断开重连后自动以 epoch、since_version 重新订阅，只补发断线期间的变化；
+# 服务器的数据标识（epoch）改变时（如插件重启），将重新推送全部数据，可由推送消息中的 epoch 判断。
+class Subscription(object):
+    def __init__(self, client: 'MonitorClient', id: str, arguments: dict):
+        self.client: 'MonitorClient' = client
+        # 订阅请求的流水号，推送时原样带回
+        self.id: str = id
+        # 订阅的参数（metrics、min_interval 等，不含 epoch、since_version）
+        self.arguments: dict = arguments
+        # 服务器的数据标识及已收到的数据版本号
+        self.epoch: str | None = None
+        self.version: int = 0
+        # 尚未取走的推送，订阅结束时放入 None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed: bool = False
+
+
+    def resume_arguments(self) -> dict:
+        """
+        (重新)订阅时的参数：从已收到的版本号之后续传。
+        """
+
+        arguments = {**self.arguments, 'since_version': self.version}
+        if self.epoch is not None:
+            arguments['epoch'] = self.epoch
+        return arguments
+
+
+    def deliver(self, message: dict) -> None:
+        if self.closed:
+            return
+        # 数据标识改变时，服务器会从头推送全部数据
+        if message.get('epoch') != self.epoch:
+            self.epoch = message.get('epoch')
+            self.version = 0
+        if message['instruction'] == 'players_data_delta':
+            self.version = message['version']
+            self.queue.put_nowait(message)
+
+
+    def __aiter__(self) -> 'Subscription':
+        return self
+
+
+    async def __anext__(self) -> dict:
+        message = await self.queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+    async def close(self) -> None:
+        """
+        取消订阅，正在等待推送的 async for 随之结束。
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put_nowait(None)
+        if self.client.subscription is self:
+            self.client.subscription = None
+            if self.client.connected:
+                try:
+                    await self.client.request('unsubscribe_players_data')
+                except MonitorError:
+                    pass
+
+
+# 到单个插件（或网关）的客户端。
+# 同一连接上可同时进行任意多个请求：每个请求带上唯一的流水号及 end_marker，响应按流水号分发，
+# 收到结束标志即完成，无需等待超时；连接断开后（若 reconnect 为 True）在后台按指数退避重连，并恢复订阅。
+class MonitorClient(object):
+    def __init__(self, url: str, request_timeout: float = 10.0, reconnect: bool = True,
+                 reconnect_min: float = 0.5, reconnect_max: float = 30.0, compression: bool = False):
+        # 插件（或网关）的websocket地址，如 ws://127.0.0.1:8765
+        self.url: str = url
+        # 建立连接及等待每个请求的全部响应的超时（s）
+        self.request_timeout: float = request_timeout
+        # 连接断开后是否在后台自动重连；为 False 时在下一次请求时重新连接
+        self.reconnect: bool = reconnect
+        # 重连的最短及最长间隔（s），连续失败时间隔加倍
+        self.reconnect_min: float = reconnect_min
+        self.reconnect_max: float = reconnect_max
+        # 是否启用 permessage-deflate 压缩扩展（需服务器的 websocketCompression 同样开启）
+        self.compression: bool = compression
+
+        self.websocket: Any = None
+        # 维护连接的任务：建立连接、读取响应，断开后重连
+        self.runner: asyncio.Task | None = None
+        # 连接已建立的信号，及下一次连接尝试完成（无论成败）的信号
+        self.ready: asyncio.Event = asyncio.Event()
+        self.attempt: asyncio.Future | None = None
+        # 当前连接上等待响应的请求，键为流水号，值为 (完成时设置结果的future, 已收到的响应)
+        self.pending: dict[Any, tuple[asyncio.Future, list[dict | bytes]]] = {}
+        # 尚未完成的请求数（包括正在等待连接建立的请求）
+        self.active: int = 0
+        # 当前的订阅（服务器每个连接只保留最后一个订阅）
+        self.subscription: Subscription | None = None
+        self.ids = itertools.count()
+        self.closed: bool = False
+
+        # 重连次数、最近一次出错的信息，及发出的请求数
+        self.reconnects: int = 0
+        self.last_error: str | None = None
+        self.requests: int = 0
+
+
+    @property
+    def connected(self) -> bool:
+        return self.ready.is_set()
+
+
+    def load(self) -> int:
+        """
+        尚未完成的请求数，用于在连接池中选择负载最小的连接。
+        """
+
+        return self.active
+
+
+    async def __aenter__(self) -> 'MonitorClient':
+        await self.connect()
+        return self
+
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+    async def connect(self) -> None:
+        """
+        确保连接已建立。连接尝试失败时抛出 MonitorConnectionError（若 reconnect 为 True，后台仍会继续重连）。
+        """
+
+        if self.closed:
+            raise MonitorConnectionError('Client is closed')
+        if self.ready.is_set():
+            return
+        if self.runner is None or self.runner.done():
+            self.attempt = asyncio.get_running_loop().create_future()
+            self.runner = asyncio.ensure_future(self.__run())
+        try:
+            await asyncio.wait_for(asyncio.shield(self.attempt), self.request_timeout)
+        except asyncio.TimeoutError:
+            raise MonitorConnectionError(f'Cannot connect to {self.url}: timed out after {self.request_timeout:g}s')
+        if not self.ready.is_set():
+            raise MonitorConnectionError(f'Cannot connect to {self.url}: {self.last_error}')
+
+
+    async def __run(self) -> None:
+        delay = self.reconnect_min
+        while not self.closed:
+            try:
+                websocket = await asyncio.wait_for(
+                    websockets.connect(self.url, max_size=None, compression='deflate' if self.compression else None),
+                    self.request_timeout)
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as ex:
+                # 连续以相同的原因失败时只记录一次
+                if f'{ex!r}' != self.last_error:
+                    logger.warning(f'Cannot connect to {self.url}: {ex!r}')
+                self.last_error = f'{ex!r}'
+                self.__finish_attempt()
+                if not self.reconnect:
+                    return
+                self.reconnects += 1
+                # 加入随机抖动，避免大量客户端同时重连
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            delay = self.reconnect_min
+            self.last_error = None
+            # 每个连接有自己的等待表，旧连接断开时只会使其上的请求失败
+            pending = self.pending = {}
+            self.websocket = websocket
+            self.ready.set()
+            self.__finish_attempt()
+            if self.subscription is not None:
+                asyncio.ensure_future(self.__resubscribe(self.subscription))
+            try:
+                await self.__read_loop(websocket, pending)
+            finally:
+                self.ready.clear()
+                self.websocket = None
+                for future, _ in pending.values():
+                    if not future.done():
+                        future.set_exception(MonitorConnectionError(f'Connection to {self.url} closed'))
+                await websocket.close()
+            if self.closed or not self.reconnect:
+                return
+            logger.warning(f'Connection to {self.url} lost, reconnecting')
+            self.reconnects += 1
+
+
+    def __finish_attempt(self) -> None:
+        if self.attempt is not None and not self.attempt.done():
+            self.attempt.set_result(None)
+        self.attempt = asyncio.get_running_loop().create_future()
+
+
+    async def __read_loop(self, websocket: Any, pending: dict[Any, tuple[asyncio.Future, list[dict | bytes]]]) -> None:
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    id = decode_binary_header(message)[0].get('id')
+                    data = None
+                else:
+                    data = json.loads(message)
+                    id = data.get('id')
+                subscription = self.subscription
+                if data is not None and subscription is not None and id == subscription.id and \
+                        data.get('instruction') in ('players_data_subscribed', 'players_data_delta'):
+                    subscription.deliver(data)
+                    # 订阅请求的首条回复（players_data_subscribed）同时作为该请求的响应
+                    if data['instruction'] == 'players_data_delta':
+                        continue
+                entry = pending.get(id)
+                if entry is None:
+                    continue
+                future, responses = entry
+                if data is not None and data.get('instruction') == 'end_of_response':
+                    if not future.done():
+                        future.set_result(responses)
+                else:
+                    responses.append(data if data is not None else message)
+        except websockets.ConnectionClosed:
+            pass
+        except ValueError as ex:
+            logger.error(f'Invalid message from {self.url}: {ex}')
+
+
+    async def request(self, instruction: str, arguments: dict | None = None,
+                      timeout: float | None = None) -> list[dict | bytes]:
+        """
+        发送一个请求，返回其全部响应（JSON响应为 dict，二进制响应为 bytes，不含结束标志）。
+        未连接时先建立连接；连接断开或超时时抛出 MonitorConnectionError。
+        """
+
+        self.active += 1
+        self.requests += 1
+        try:
+            await self.connect()
+        except MonitorConnectionError:
+            self.active -= 1
+            raise
+        websocket, pending = self.websocket, self.pending
+        id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        pending[id] = (future, [])
+        try:
+            await websocket.send(json.dumps({
+                'id': id,
+                'instruction': instruction,
+                'arguments': {**(arguments or {}), 'end_marker': True}
+            }))
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.request_timeout)
+        except websockets.ConnectionClosed:
+            raise MonitorConnectionError(f'Connection to {self.url} closed')
+        except asyncio.TimeoutError:
+            raise MonitorConnectionError(f'Request to {self.url} timed out')
+        finally:
+            pending.pop(id, None)
+            self.active -= 1
+
+
+    async def call(self, instruction: str, arguments: dict | None = None, timeout: float | None = None) -> dict:
+        """
+        发送一个只有一条响应的请求（如 query_players_data、get_leaderboard），返回该响应；
+        服务器回复错误信息时抛出 MonitorRequestError。
+        """
+
+        responses = await self.request(instruction, arguments, timeout)
+        if len(responses) == 0:
+            raise MonitorRequestError(f'No response to {instruction}')
+        response = responses[0]
+        if isinstance(response, bytes):
+            return decode_binary(response)
+        if response.get('instruction') == 'error':
+            raise MonitorRequestError(response.get('message'))
+        return response
+
+
+    async def get_all_players_data(self, format: str = 'binary') -> dict | list[dict]:
+        """
+        取得全部玩家数据。'binary'、'columnar' 格式返回 'columnar' 形式的 dict，'records' 格式返回各条数据的列表。
+        """
+
+        if format == 'records':
+            return [response['data'] for response in await self.request('get_all_players_data') if 'data' in response]
+        return await self.call('get_all_players_data', {'format': format})
+
+
+    async def subscribe(self, metrics: list[str] | None = None, min_interval: int = 0, **arguments) -> Subscription:
+        """
+        订阅玩家数据的变化，返回 Subscription（以 async for 取得推送）。
+        未连接时立即返回，连接建立后再发送订阅请求；新的订阅替换之前的订阅。
+        """
+
+        if self.subscription is not None:
+            await self.subscription.close()
+        if metrics is not None:
+            arguments['metrics'] = metrics
+        if min_interval > 0:
+            arguments['min_interval'] = min_interval
+        subscription = self.subscription = Subscription(self, f'subscription-{next(self.ids)}', arguments)
+        if self.ready.is_set():
+            await self.__resubscribe(subscription)
+        else:
+            try:
+                await self.connect()
+            except MonitorConnectionError:
+                # 后台重连成功后再订阅
+                if not self.reconnect:
+                    raise
+        return subscription
+
+
+    async def __resubscribe(self, subscription: Subscription) -> None:
+        websocket, pending = self.websocket, self.pending
+        future = asyncio.get_running_loop().create_future()
+        pending[subscription.id] = (future, [])
+        try:
+            await websocket.send(json.dumps({
+                'id': subscription.id,
+                'instruction': 'subscribe_players_data',
+                'arguments': {**subscription.resume_arguments(), 'end_marker': True}
+            }))
+            await asyncio.wait_for(future, self.request_timeout)
+        except (websockets.ConnectionClosed, MonitorError, asyncio.TimeoutError) as ex:
+            # 连接断开时由重连后的下一次订阅恢复
+            logger.warning(f'Cannot subscribe to {self.url}: {ex!r}')
+        finally:
+            pending.pop(subscription.id, None)
+
+
+    async def close(self) -> None:
+        self.closed = True
+        if self.subscription is not None:
+            subscription, self.subscription = self.subscription, None
+            subscription.closed = True
+            subscription.queue.put_nowait(None)
+        if self.websocket is not None:
+            await self.websocket.close()
+        if self.runner is not None:
+            self.runner.cancel()
+            await asyncio.gather(self.runner, return_exceptions=True)
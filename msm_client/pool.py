@@ -0,0 +1,86 @@
+"""
+到多个 MC Server Monitor 插件（或网关）的连接池。
+"""
+
+import asyncio
+from typing import Any
+
+from .client import MonitorClient, MonitorConnectionError, MonitorError
+
+
+# 多个服务器的连接池：每个服务器 size 个连接，请求发往该服务器上等待响应最少的连接
+class MonitorClientPool(object):
+    def __init__(self, urls: dict[str, str], size: int = 1, **options):
+        """
+        urls 为 {服务器名称: websocket地址}，options 为传给各 MonitorClient 的参数（如 request_timeout）。
+        """
+
+        self.clients: dict[str, list[MonitorClient]] = {
+            name: [MonitorClient(url, **options) for _ in range(max(size, 1))] for name, url in urls.items()}
+
+
+    async def __aenter__(self) -> 'MonitorClientPool':
+        return self
+
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+    def client(self, server: str) -> MonitorClient:
+        """
+        取得服务器 server 的连接中负载最小的一个（连接在第一次请求时建立）。
+        """
+
+        return min(self.clients[server], key=MonitorClient.load)
+
+
+    async def request(self, server: str, instruction: str, arguments: dict | None = None,
+                      timeout: float | None = None) -> list[dict | bytes]:
+        """
+        向服务器 server 发送一个请求，返回其全部响应。
+        请求均为只读的查询，连接在请求过程中断开时换一个连接重试一次。
+        """
+
+        try:
+            return await self.client(server).request(instruction, arguments, timeout)
+        except MonitorConnectionError:
+            return await self.client(server).request(instruction, arguments, timeout)
+
+
+    async def call(self, server: str, instruction: str, arguments: dict | None = None,
+                   timeout: float | None = None) -> dict:
+        try:
+            return await self.client(server).call(instruction, arguments, timeout)
+        except MonitorConnectionError:
+            return await self.client(server).call(instruction, arguments, timeout)
+
+
+    async def broadcast(self, instruction: str, arguments: dict | None = None, servers: list[str] | None = None,
+                        timeout: float | None = None) -> dict[str, dict | MonitorError]:
+        """
+        向各服务器（为 None 时为全部服务器）并发发送同一个只有一条响应的请求，
+        返回 {服务器名称: 响应或 MonitorError}，一个服务器出错不影响其他服务器的结果。
+        """
+
+        names = list(servers) if servers is not None else list(self.clients)
+        results = await asyncio.gather(*(self.call(name, instruction, arguments, timeout) for name in names),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, MonitorError):
+                raise result
+        return dict(zip(names, results))
+
+
+    def status(self) -> dict[str, list[dict[str, Any]]]:
+        return {name: [{
+            'connected': client.connected,
+            'pending': client.load(),
+            'requests': client.requests,
+            'reconnects': client.reconnects,
+            'last_error': client.last_error
+        } for client in clients] for name, clients in self.clients.items()}
+
+
+    async def close(self) -> None:
+        await asyncio.gather(*(client.close() for clients in self.clients.values() for client in clients))
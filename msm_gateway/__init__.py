@@ -0,0 +1,47 @@
+"""
+【MC Server Monitor 多服务器聚合网关】
+
+独立运行的网关（不依赖 MCDR），连接多个MC服务器上的 MC Server Monitor 插件（上游服务器），
+将各服务器的玩家数据合并为一个按服务器标记的视图，以与插件相同的 websocket 协议为下游客户端（如网站后端）提供服务。
+下游客户端只需保持一个到网关的连接，而无需分别连接、合并各服务器的数据。
+
+用法：
+    python -m msm_gateway --upstream 名称=ws://地址:端口 [--upstream ...] [--ip 0.0.0.0] [--port 8766]
+                          [--pool-size N] [--request-timeout S]
+如：python -m msm_gateway --upstream survival=ws://10.0.0.2:8765 --upstream creative=ws://10.0.0.3:8765
+需在仓库根目录下运行（与上游服务器的连接基于同在根目录下的 msm_client），只需安装 websockets。
+
+一、与上游服务器的连接
+网关对每个上游服务器保持一个订阅连接（subscribe_players_data），断线后按指数退避重连，并以 epoch、since_version 续传，
+只补发断线期间的变化；另有一组（--pool-size个）请求连接，用于转发需要由上游服务器回答的请求，
+同一连接上可同时进行多个请求，网关选择等待响应最少的连接发送。
+上游服务器断开期间，合并视图中保留其最后的数据，可通过 get_servers 查询各上游服务器的连接状态。
+上游服务器的 epoch 改变时（如插件重启后数据从头计数），网关删除视图中该服务器的所有行，再应用其重新推送的全部数据。
+
+二、下游协议
+请求格式及 end_marker 参数与插件相同（参见插件的数据传输协议规范），所有指令另可指定以下参数：
+servers: 只查询其中列出的服务器（可选，缺省为全部上游服务器，未知的服务器名称将回复错误信息）
+各指令的回复与插件的区别如下：
+get_all_players_data: 'records' 格式的每条数据另含 server；'columnar'、'binary' 格式另含与 players 一一对应的 servers，
+    同一玩家在多个服务器上有数据时各占一项。由合并视图回答，全部服务器的编码结果在视图的同一版本内缓存。
+subscribe_players_data: epoch、version 为合并视图的数据标识及版本号（与各上游服务器的无关），推送的每项数据另含 server。
+    有上游服务器的 epoch 改变时，合并视图的 epoch 随之改变，订阅者将收到带有新 epoch 的全部数据（data 可能为空），
+    应丢弃此前收到的数据。
+query_players_data: 回复另含与 players 一一对应的 servers。另可指定
+    merge: 按玩家名称合并各服务器上的同名玩家（可选，取值为 'sum'、'max'、'min'，即合并的运算），
+        合并时每个玩家只占一项，servers 为该玩家所在的服务器列表，where 中的条件作用于合并后的值；
+    online_only 为 true 时，查询被转发到各上游服务器（在线状态只有上游服务器知道），where 中的条件作用于各服务器的值。
+get_leaderboard: 可对任意数据条目查询，无需在 leaderboardMetrics 之中。entries 及 players 的每项另含 server，
+    after / next 为 [值, 玩家名称, 服务器名称]；指定 merge 时按合并后的值排列，各项不含 server，after / next 为 [值, 玩家名称]。
+get_players_history、get_players_rates: 转发到各上游服务器，data 中的每项另含 server，其余字段取自第一个成功回复的服务器；
+    部分服务器出错时另含 errors: {服务器名称: 错误信息}，全部出错时回复错误信息。
+get_monitor_stats、get_snapshot_cache_stats: 回复网关自身的运行指标及快照缓存的统计信息。
+新增指令：
+get_servers（查询各上游服务器的连接状态）：
+    回复 {id, instruction: 'servers', data: [{name, url, connected, epoch, version, players, last_update, reconnects,
+        last_error, pushes, requests, pool（各请求连接上等待响应的请求数）}, ...]}
+"""
+
+from .server import GatewayServer
+from .upstream import UpstreamServer
+from .view import MergedView, PLAYER_DATA_ITEMS
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import logging
+import signal
+
+from .server import GatewayServer
+from .upstream import UpstreamServer
+from .view import MergedView
+
+
+def parse_upstream(text: str) -> tuple[str, str]:
+    name, sep, url = text.partition('=')
+    if not sep or not name or not url:
+        raise argparse.ArgumentTypeError(f'expected NAME=URL, got {text!r}')
+    return name, url
+
+
+async def serve(args: argparse.Namespace) -> None:
+    view = MergedView()
+    upstreams = [UpstreamServer(name, url, view, args.pool_size, args.request_timeout) for name, url in args.upstream]
+    server = GatewayServer(view, upstreams, args.ip, args.port, args.max_pipelined)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows 不支持，由 KeyboardInterrupt 结束
+            pass
+    await server.run(stop_event)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m msm_gateway')
+    parser.add_argument('--upstream', type=parse_upstream, action='append', required=True,
+                        help='upstream plugin websocket as NAME=URL, may be repeated')
+    parser.add_argument('--ip', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--pool-size', type=int, default=2, help='request connections per upstream server')
+    parser.add_argument('--request-timeout', type=float, default=10.0, help='timeout of forwarded requests (s)')
+    parser.add_argument('--max-pipelined', type=int, default=16, help='concurrent requests per downstream connection')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    names = [name for name, _ in args.upstream]
+    if len(set(names)) != len(names):
+        parser.error('upstream server names must be unique')
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
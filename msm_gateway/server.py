@@ -0,0 +1,591 @@
+"""
+网关面向下游客户端的 websocket 服务器。
+
+能由合并视图回答的请求（get_all_players_data、subscribe_players_data、query_players_data、get_leaderboard）
+直接由视图回答，不访问上游服务器；其余请求（get_players_history、get_players_rates，及按在线状态的查询）
+转发到各上游服务器，合并各服务器的结果后回复。
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Collection
+
+import websockets
+
+from msm_client import MonitorError
+
+from .upstream import UpstreamServer
+from .view import (ALL_ITEM_INDEXES, MERGE_FUNCTIONS, PLAYER_DATA_ITEM_INDEX, PLAYER_DATA_ITEMS, MergedRow,
+                   MergedView, ViewQuery, current_hour, merge_rows, rank_of)
+
+
+logger = logging.getLogger('msm_gateway')
+
+# 二进制响应信息的魔数，与插件相同
+BINARY_RESPONSE_MAGIC: bytes = b'MSMB'
+# get_leaderboard 指令每页的缺省条数及最大条数，与插件相同
+LEADERBOARD_DEFAULT_LIMIT: int = 10
+LEADERBOARD_MAX_LIMIT: int = 1000
+# 转发到上游服务器的请求中，由网关自身处理而不转发的参数
+GATEWAY_ARGUMENTS: tuple[str, ...] = ('servers', 'merge', 'end_marker')
+
+
+def make_error_response(id: Any, message: str) -> str:
+    """
+    生成请求出错时的JSON响应信息。
+    """
+
+    return json.dumps({
+        'id': id,
+        'instruction': 'error',
+        'message': message
+    })
+
+
+# 一个下游连接对合并视图的数据变化的订阅
+class ViewSubscription(object):
+    def __init__(self, websocket: Any, id: Any, item_indexes: list[int], min_interval: int, epoch: str,
+                 version: int, servers: Collection[str] | None):
+        # 订阅者所在的websocket连接
+        self.websocket: Any = websocket
+        # 订阅请求的流水号，推送时原样带回
+        self.id: Any = id
+        # 订阅的数据条目在 PLAYER_DATA_ITEMS 中的下标
+        self.item_indexes: list[int] = item_indexes
+        # 两次推送之间的最小间隔（s）
+        self.min_interval: float = float(max(min_interval, 0)) / 1000.0
+        # 已推送给订阅者的视图数据标识及版本号
+        self.epoch: str = epoch
+        self.version: int = version
+        # 只订阅其中列出的服务器的数据，为 None 时不限
+        self.servers: Collection[str] | None = servers
+        # 上次推送的时刻（time.monotonic() 时间）
+        self.last_push: float = 0.0
+        # 是否已安排了一次尚未执行的推送
+        self.push_scheduled: bool = False
+
+
+class GatewayServer(object):
+    def __init__(self, view: MergedView, upstreams: list[UpstreamServer], ip: str, port: int,
+                 max_pipelined: int = 16):
+        self.view: MergedView = view
+        # 各上游服务器，键为服务器名称
+        self.upstreams: dict[str, UpstreamServer] = {upstream.name: upstream for upstream in upstreams}
+        # 监听的IP地址及端口号
+        self.ip: str = ip
+        self.port: int = port
+        # 每个连接同时处理的请求数上限
+        self.max_pipelined: int = max(max_pipelined, 1)
+        # 各连接的发送锁（同一请求的多条响应连续发送，不与其他请求的响应交错），键为websocket连接
+        self.send_locks: dict[Any, asyncio.Lock] = {}
+        # 各连接对数据变化的订阅，键为websocket连接
+        self.subscriptions: dict[Any, ViewSubscription] = {}
+        # 全部数据的编码结果缓存，键为响应格式，值为 ((视图数据标识, 视图版本号, 小时), 编码结果)
+        self.snapshot_cache: dict[str, tuple[tuple, Any]] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+        # 运行指标：收到的请求数、转发到上游服务器的请求数及其中失败的个数、快照缓存的命中及未命中次数
+        self.requests: int = 0
+        self.forwarded: int = 0
+        self.forward_errors: int = 0
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.encode_time_total: float = 0.0
+        self.started_at: float = time.time()
+        view.listeners.append(self.__schedule_pushes)
+
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        self.loop = asyncio.get_running_loop()
+        upstream_tasks = [asyncio.ensure_future(upstream.run()) for upstream in self.upstreams.values()]
+        try:
+            async with websockets.serve(self.__handle_connection, self.ip, self.port, max_size=None):
+                logger.info(f'Gateway listening on {self.ip}:{self.port} for {len(self.upstreams)} upstream servers')
+                await stop_event.wait()
+        finally:
+            for task in upstream_tasks:
+                task.cancel()
+            await asyncio.gather(*upstream_tasks, return_exceptions=True)
+            await asyncio.gather(*(upstream.close() for upstream in self.upstreams.values()))
+
+
+    async def __handle_connection(self, websocket: Any) -> None:
+        self.send_locks[websocket] = asyncio.Lock()
+        slots = asyncio.Semaphore(self.max_pipelined)
+        tasks: set[asyncio.Future] = set()
+        try:
+            async for message in websocket:
+                # 同时处理的请求数达到上限时，暂停读取新请求
+                await slots.acquire()
+                task = asyncio.ensure_future(self.__serve_request(websocket, message, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.send_locks.pop(websocket, None)
+            self.subscriptions.pop(websocket, None)
+
+
+    async def __send(self, websocket: Any, messages: list[str | bytes]) -> None:
+        lock = self.send_locks.get(websocket)
+        if lock is None or len(messages) == 0:
+            return
+        async with lock:
+            for message in messages:
+                await websocket.send(message)
+
+
+    async def __serve_request(self, websocket: Any, message: str | bytes, slots: asyncio.Semaphore) -> None:
+        self.requests += 1
+        id = None
+        arguments = None
+        try:
+            data = json.loads(message)
+            id = data['id']
+            arguments = data.get('arguments')
+            responses = await self.__process_message(websocket, data)
+        except Exception as ex:
+            # 请求无法处理（如格式有误）时，回传错误信息（尽可能带上请求的流水号），要求了结束标志时同样追加
+            responses = [make_error_response(id, f'Invalid request: {ex}')]
+            if isinstance(arguments, dict) and arguments.get('end_marker', False):
+                responses.append(json.dumps({'id': id, 'instruction': 'end_of_response', 'count': 1}))
+        finally:
+            slots.release()
+        try:
+            await self.__send(websocket, responses)
+        except websockets.ConnectionClosed:
+            pass
+
+
+    def __schedule_pushes(self) -> None:
+        # 为每个订阅安排一次推送，距上次推送不足最小间隔的，延迟到间隔满足时再推送
+        if self.loop is None:
+            return
+        now = time.monotonic()
+        for sub in self.subscriptions.values():
+            if sub.push_scheduled:
+                continue
+            sub.push_scheduled = True
+            delay = max(sub.last_push + sub.min_interval - now, 0.0)
+            self.loop.call_later(delay, self.__push, sub)
+
+
+    def __push(self, sub: ViewSubscription) -> None:
+        sub.push_scheduled = False
+        # 订阅在安排推送后已被取消或替换
+        if self.subscriptions.get(sub.websocket) is not sub:
+            return
+        response = self.__build_delta(sub)
+        if response is not None:
+            asyncio.ensure_future(self.__send_push(sub.websocket, response))
+
+
+    async def __send_push(self, websocket: Any, response: str) -> None:
+        try:
+            await self.__send(websocket, [response])
+        except websockets.ConnectionClosed:
+            pass
+
+
+    def __build_delta(self, sub: ViewSubscription) -> str | None:
+        """
+        生成订阅者自上次推送以来发生变化的数据的推送消息，若没有变化则返回 None。
+        """
+
+        # 视图的数据标识改变（有上游服务器的数据被整体删除）后，从头推送全部数据，即使没有数据也推送一次，
+        # 使订阅者得知数据标识已改变、应丢弃此前收到的数据
+        reset = sub.epoch != self.view.epoch
+        if reset:
+            sub.epoch = self.view.epoch
+            sub.version = 0
+        changes = self.view.changes_since(sub.version, sub.item_indexes, sub.servers)
+        sub.version = self.view.version
+        if len(changes) == 0 and not reset:
+            return None
+        sub.last_push = time.monotonic()
+        cur_hour = current_hour()
+        return json.dumps({
+            'id': sub.id,
+            'instruction': 'players_data_delta',
+            'epoch': self.view.epoch,
+            'version': sub.version,
+            'data': [{
+                'server': server,
+                'name': player,
+                'type': PLAYER_DATA_ITEMS[item_index],
+                'quantity': value,
+                'time': cur_hour
+            } for server, player, item_index, value in changes]
+        })
+
+
+    def __parse_servers(self, arguments: dict) -> list[str] | None:
+        """
+        取得请求所限定的服务器（arguments 中的 servers），未限定时返回 None。存在未知的服务器时抛出 ValueError。
+        """
+
+        servers = arguments.get('servers')
+        if servers is None:
+            return None
+        if not isinstance(servers, list) or not all(isinstance(server, str) for server in servers):
+            raise ValueError('servers must be a list of server names')
+        unknown = [server for server in servers if server not in self.upstreams]
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown servers: {", ".join(unknown)}')
+        return servers
+
+
+    async def __process_message(self, websocket: Any, data: dict) -> list[str | bytes]:
+        """
+        处理来自客户端的（已解析的）JSON请求信息，并返回将要回传给客户端的一系列响应信息。
+        """
+
+        id = data['id']
+        instruction = data['instruction']
+        arguments = data.get('arguments') or {}
+        result = []
+        try:
+            servers = self.__parse_servers(arguments)
+            merge = arguments.get('merge')
+            if merge is not None and merge not in MERGE_FUNCTIONS:
+                raise ValueError(f'Unknown merge: {merge} (expected one of {", ".join(MERGE_FUNCTIONS)})')
+        except ValueError as ex:
+            result.append(make_error_response(id, str(ex)))
+            instruction = None
+        match instruction:
+            case None:
+                pass
+            case 'get_all_players_data': # 返回所有服务器的玩家数据
+                result.extend(self.__get_all_players_data(id, arguments.get('format', 'records'), servers))
+            case 'subscribe_players_data': # 订阅合并视图的数据变化
+                result.extend(self.__subscribe_players_data(websocket, id, arguments, servers))
+            case 'unsubscribe_players_data': # 取消订阅
+                self.subscriptions.pop(websocket, None)
+            case 'query_players_data': # 按条件查询各服务器的玩家数据
+                if arguments.get('online_only', False):
+                    result.append(await self.__query_online_players(id, arguments, servers, merge))
+                else:
+                    result.append(self.__query_players_data(id, arguments, servers, merge))
+            case 'get_leaderboard': # 跨服务器的排行榜
+                result.append(self.__get_leaderboard(id, arguments, servers, merge))
+            case 'get_players_rates' | 'get_players_history': # 转发到各上游服务器，合并各服务器的结果
+                result.append(await self.__forward_and_merge(id, instruction, arguments, servers))
+            case 'get_servers': # 返回各上游服务器的连接状态
+                result.append(json.dumps({
+                    'id': id,
+                    'instruction': 'servers',
+                    'data': [self.upstreams[name].status() for name in servers or self.upstreams]
+                }))
+            case 'get_monitor_stats': # 返回网关自身的运行指标
+                result.append(json.dumps({
+                    'id': id,
+                    'instruction': 'monitor_stats',
+                    'data': self.stats()
+                }))
+            case 'get_snapshot_cache_stats': # 返回网关的快照缓存的统计信息
+                result.append(json.dumps({
+                    'id': id,
+                    'instruction': 'snapshot_cache_stats',
+                    'data': {
+                        'hits': self.cache_hits,
+                        'misses': self.cache_misses,
+                        'encode_time_total_ms': self.encode_time_total * 1000.0
+                    }
+                }))
+
+        # 若客户端要求，在所有响应信息之后追加结束标志
+        if arguments.get('end_marker', False):
+            result.append(json.dumps({
+                'id': id,
+                'instruction': 'end_of_response',
+                'count': len(result)
+            }))
+        return result
+
+
+    def __get_all_players_data(self, id: Any, format: str, servers: list[str] | None) -> list[str | bytes]:
+        # 全部服务器的数据按 (视图版本号, 小时) 缓存编码结果（不含流水号），限定了服务器时则每次重新编码
+        cur_hour = current_hour()
+        key = (self.view.epoch, self.view.version, cur_hour)
+        format = format if format in ('columnar', 'binary') else 'records'
+        cached = self.snapshot_cache.get(format) if servers is None else None
+        if cached is not None and cached[0] == key:
+            self.cache_hits += 1
+            encoded = cached[1]
+        else:
+            start = time.perf_counter()
+            encoded = self.__encode_rows(format, self.view.select(servers), cur_hour)
+            self.encode_time_total += time.perf_counter() - start
+            self.cache_misses += 1
+            if servers is None:
+                self.snapshot_cache[format] = (key, encoded)
+        prefix = '{"id": ' + json.dumps(id) + ', '
+        match format:
+            case 'columnar':
+                return [prefix + encoded]
+            case 'binary':
+                header = (prefix + encoded[0]).encode('utf-8')
+                return [b''.join((BINARY_RESPONSE_MAGIC, struct.pack('<I', len(header)), header, encoded[1]))]
+            case _:
+                return [prefix + tail for tail in encoded]
+
+
+    @staticmethod
+    def __encode_rows(format: str, rows: list[MergedRow], cur_hour: int) -> Any:
+        # 编码结果不含开头的 '{'，发送前再拼接上流水号，与插件的 encode_snapshot_* 相同
+        match format:
+            case 'columnar':
+                return json.dumps({
+                    'instruction': 'all_players_data',
+                    'format': 'columnar',
+                    'time': cur_hour,
+                    'items': PLAYER_DATA_ITEMS,
+                    'servers': [row.server for row in rows],
+                    'players': [row.name for row in rows],
+                    'values': [[row.values[item_index] for row in rows] for item_index in ALL_ITEM_INDEXES]
+                })[1:]
+            case 'binary':
+                header = json.dumps({
+                    'instruction': 'all_players_data',
+                    'format': 'binary',
+                    'time': cur_hour,
+                    'items': PLAYER_DATA_ITEMS,
+                    'servers': [row.server for row in rows],
+                    'players': [row.name for row in rows]
+                })[1:]
+                parts = []
+                for item_index in ALL_ITEM_INDEXES:
+                    column = array('i', (row.values[item_index] for row in rows))
+                    if sys.byteorder == 'big':
+                        column.byteswap()
+                    parts.append(column.tobytes())
+                return header, b''.join(parts)
+            case _:
+                return [json.dumps({
+                    'instruction': 'all_players_data',
+                    'data': {
+                        'server': row.server,
+                        'name': row.name,
+                        'type': item,
+                        'quantity': value,
+                        'time': cur_hour
+                    }
+                })[1:] for row in rows for item, value in zip(PLAYER_DATA_ITEMS, row.values)]
+
+
+    def __subscribe_players_data(self, websocket: Any, id: Any, arguments: dict,
+                                 servers: list[str] | None) -> list[str]:
+        metrics = arguments.get('metrics') or PLAYER_DATA_ITEMS
+        if not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics):
+            return [make_error_response(id, 'metrics must be a list of metric names')]
+        unknown = [item for item in metrics if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            return [make_error_response(id, f'Unknown metrics: {", ".join(unknown)}')]
+        item_indexes = [PLAYER_DATA_ITEM_INDEX[item] for item in metrics]
+        since_version = int(arguments.get('since_version', 0))
+        version = self.view.version
+        epoch = self.view.epoch
+        # 网关已重启，或版本号无效时，重新推送全部数据
+        if arguments.get('epoch', epoch) != epoch or since_version > version or since_version < 0:
+            since_version = 0
+        sub = ViewSubscription(websocket, id, item_indexes, int(arguments.get('min_interval', 0)), epoch,
+                               since_version, set(servers) if servers is not None else None)
+        self.subscriptions[websocket] = sub
+        result = [json.dumps({
+            'id': id,
+            'instruction': 'players_data_subscribed',
+            'epoch': epoch,
+            'version': version
+        })]
+        delta = self.__build_delta(sub)
+        if delta is not None:
+            result.append(delta)
+        return result
+
+
+    def __query_players_data(self, id: Any, arguments: dict, servers: list[str] | None, merge: str | None) -> str:
+        try:
+            query = ViewQuery.parse(arguments)
+        except ValueError as ex:
+            return make_error_response(id, str(ex))
+        rows = [row for row in self.view.select(servers) if query.matches_name(row.name)]
+        # 合并同名玩家时，数值条件作用于合并后的值
+        if merge is not None:
+            entries = [(name, merged, found_servers) for name, (merged, found_servers) in merge_rows(rows, merge).items()]
+        else:
+            entries = [(row.name, row.values, row.server) for row in rows]
+        entries = [entry for entry in entries if query.matches_values(entry[1])]
+        return self.__players_data_response(id, query.item_indexes, entries, merge)
+
+
+    async def __query_online_players(self, id: Any, arguments: dict, servers: list[str] | None,
+                                     merge: str | None) -> str:
+        # 玩家的在线状态只有上游服务器知道，因此转发查询（数值条件由各服务器按其自身的值判断）
+        try:
+            query = ViewQuery.parse(arguments)
+        except ValueError as ex:
+            return make_error_response(id, str(ex))
+        forwarded = {**arguments, 'metrics': PLAYER_DATA_ITEMS}
+        replies, errors = await self.__fan_out('query_players_data', forwarded, servers)
+        rows = []
+        for server, reply in replies.items():
+            for index, name in enumerate(reply['players']):
+                row = MergedRow(server, name)
+                row.values = [column[index] for column in reply['values']]
+                rows.append(row)
+        if len(rows) == 0 and len(errors) > 0:
+            return make_error_response(id, '; '.join(f'{server}: {message}' for server, message in errors.items()))
+        rows.sort(key=lambda row: (row.server, row.name))
+        if merge is not None:
+            entries = [(name, merged, found_servers) for name, (merged, found_servers) in merge_rows(rows, merge).items()]
+        else:
+            entries = [(row.name, row.values, row.server) for row in rows]
+        return self.__players_data_response(id, query.item_indexes, entries, merge, errors)
+
+
+    def __players_data_response(self, id: Any, item_indexes: list[int], entries: list[tuple[str, list[int], Any]],
+                                merge: str | None, errors: dict[str, str] | None = None) -> str:
+        response = {
+            'id': id,
+            'instruction': 'players_data',
+            'time': current_hour(),
+            'epoch': self.view.epoch,
+            'version': self.view.version,
+            'items': [PLAYER_DATA_ITEMS[item_index] for item_index in item_indexes],
+            'players': [name for name, _, _ in entries],
+            # 未合并时为各玩家所在的服务器，合并时为各玩家所在的服务器列表
+            'servers': [servers for _, _, servers in entries],
+            'values': [[values[item_index] for _, values, _ in entries] for item_index in item_indexes]
+        }
+        if merge is not None:
+            response['merge'] = merge
+        if errors:
+            response['errors'] = errors
+        return json.dumps(response)
+
+
+    def __get_leaderboard(self, id: Any, arguments: dict, servers: list[str] | None, merge: str | None) -> str:
+        metric = arguments.get('metric')
+        item_index = PLAYER_DATA_ITEM_INDEX.get(metric) if isinstance(metric, str) else None
+        if item_index is None:
+            return make_error_response(id, f'Unknown metric: {metric}')
+        try:
+            limit = int(arguments.get('limit', LEADERBOARD_DEFAULT_LIMIT))
+            offset = int(arguments.get('offset', 0))
+            after = arguments.get('after')
+            if after is not None:
+                # 未合并时为 [值, 玩家名称, 服务器名称]，合并时为 [值, 玩家名称]
+                after = (-int(after[0]), str(after[1])) + ((str(after[2]),) if merge is None else ())
+        except (TypeError, ValueError, IndexError, KeyError):
+            return make_error_response(id, 'Invalid limit, offset or after')
+        if limit < 0 or limit > LEADERBOARD_MAX_LIMIT or offset < 0:
+            return make_error_response(id, f'limit must be between 0 and {LEADERBOARD_MAX_LIMIT}, ' +
+                                       f'and offset must not be negative')
+        players = arguments.get('players') or []
+        if not isinstance(players, list) or not all(isinstance(p, str) for p in players):
+            return make_error_response(id, 'players must be a list of player names')
+        keys, values = self.view.ranking(item_index, merge, servers)
+        if after is not None:
+            offset = bisect.bisect_right(keys, after)
+        page = keys[offset:offset + limit]
+        entries = []
+        for key in page:
+            value = values[key]
+            entry = {'rank': rank_of(keys, value), 'name': key[1], 'value': value}
+            if merge is None:
+                entry['server'] = key[2]
+            entries.append(entry)
+        response = {
+            'id': id,
+            'instruction': 'leaderboard',
+            'metric': metric,
+            'epoch': self.view.epoch,
+            'version': self.view.version,
+            'total': len(keys),
+            'offset': offset,
+            'entries': entries,
+            # 下一页的 after 参数，已到末尾时为 null
+            'next': [values[page[-1]], *page[-1][1:]] if len(page) > 0 and offset + len(page) < len(keys) else None
+        }
+        if len(players) > 0:
+            wanted = set(players)
+            ranks_of_players = []
+            # 未合并时，同一玩家在各服务器上的排名各占一项
+            for key, value in values.items():
+                if key[1] in wanted:
+                    entry = {'name': key[1], 'value': value, 'rank': rank_of(keys, value),
+                             'position': bisect.bisect_left(keys, key)}
+                    if merge is None:
+                        entry['server'] = key[2]
+                    ranks_of_players.append(entry)
+            ranks_of_players.sort(key=lambda entry: entry['position'])
+            response['players'] = ranks_of_players
+        if merge is not None:
+            response['merge'] = merge
+        return json.dumps(response)
+
+
+    async def __fan_out(self, instruction: str, arguments: dict,
+                        servers: list[str] | None) -> tuple[dict[str, dict], dict[str, str]]:
+        """
+        将请求转发到各上游服务器（为 None 时为全部服务器），返回 (各服务器的回复, 各服务器的错误信息)。
+        """
+
+        names = list(servers) if servers is not None else list(self.upstreams)
+        forwarded = {key: value for key, value in arguments.items() if key not in GATEWAY_ARGUMENTS}
+        self.forwarded += len(names)
+        results = await asyncio.gather(*(self.upstreams[name].request(instruction, forwarded) for name in names),
+                                       return_exceptions=True)
+        replies, errors = {}, {}
+        for name, responses in zip(names, results):
+            if isinstance(responses, BaseException):
+                if not isinstance(responses, MonitorError):
+                    logger.error(f'Error occurred while forwarding {instruction} to {name}: {responses!r}')
+                errors[name] = str(responses)
+            elif len(responses) == 0:
+                errors[name] = 'No response'
+            elif responses[0].get('instruction') == 'error':
+                errors[name] = responses[0].get('message', '')
+            else:
+                replies[name] = responses[0]
+        self.forward_errors += len(errors)
+        return replies, errors
+
+
+    async def __forward_and_merge(self, id: Any, instruction: str, arguments: dict, servers: list[str] | None) -> str:
+        # 各服务器的回复中 data 为 [{name, ...}, ...]，合并后每项另加 server；其余字段取自第一个成功回复的服务器
+        replies, errors = await self.__fan_out(instruction, arguments, servers)
+        if len(replies) == 0:
+            if len(errors) == 0:
+                return make_error_response(id, 'No upstream server')
+            return make_error_response(id, '; '.join(f'{server}: {message}' for server, message in errors.items()))
+        response = {'id': id}
+        response.update((key, value) for key, value in next(iter(replies.values())).items() if key not in ('id', 'data'))
+        response['data'] = [{'server': server, **entry} for server, reply in replies.items() for entry in reply['data']]
+        if errors:
+            response['errors'] = errors
+        return json.dumps(response)
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'uptime': time.time() - self.started_at,
+            'connections': len(self.send_locks),
+            'subscriptions': len(self.subscriptions),
+            'requests': self.requests,
+            'forwarded_requests': self.forwarded,
+            'forward_errors': self.forward_errors,
+            'view_rows': len(self.view),
+            'view_version': self.view.version,
+            'servers_connected': sum(1 for upstream in self.upstreams.values() if upstream.connected),
+            'servers_total': len(self.upstreams)
+        }
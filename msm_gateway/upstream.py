@@ -0,0 +1,99 @@
+"""
+与上游服务器（各MC服务器上的 MC Server Monitor 插件）的连接，基于 msm_client。
+
+每个上游服务器有一个订阅连接与一组请求连接：
+订阅连接订阅玩家数据的变化，将推送的数据应用到合并视图，断线后按指数退避重连，并以 epoch、since_version 续传；
+上游服务器的 epoch 改变时（如插件重启），先从合并视图中删除该服务器的所有行，再应用其重新推送的全部数据；
+请求连接（msm_client 的连接池）用于转发合并视图无法回答的请求（如历史记录、滑动窗口统计），同一连接上的多个请求
+按流水号区分，以结束标志判断响应接收完毕；请求连接按需建立，断开后在下一次请求时重新建立。
+"""
+
+import asyncio
+import time
+from typing import Any
+
+from msm_client import MonitorClient, MonitorClientPool, Subscription
+
+from .view import MergedView
+
+
+# 一个上游服务器：订阅其数据变化并应用到合并视图，以及转发请求的连接池
+class UpstreamServer(object):
+    def __init__(self, name: str, url: str, view: MergedView, pool_size: int = 2, request_timeout: float = 10.0,
+                 reconnect_min: float = 0.5, reconnect_max: float = 30.0):
+        # 服务器名称，即合并视图中各行所标记的服务器
+        self.name: str = name
+        # 插件的websocket地址，如 ws://127.0.0.1:8765
+        self.url: str = url
+        self.view: MergedView = view
+        # 订阅连接，断开后在后台自动重连并恢复订阅
+        self.subscriber: MonitorClient = MonitorClient(url, request_timeout, True, reconnect_min, reconnect_max)
+        self.subscription: Subscription | None = None
+        # 已应用到合并视图的数据所属的上游服务器数据标识
+        self.applied_epoch: str | None = None
+        # 转发请求的连接池
+        self.pool: MonitorClientPool = MonitorClientPool({name: url}, pool_size, request_timeout=request_timeout,
+                                                         reconnect=False)
+
+        # 最近一次收到推送的时刻（Unix时间）
+        self.last_update: float = 0.0
+        # 收到的推送数及转发的请求数
+        self.pushes: int = 0
+        self.requests: int = 0
+
+
+    @property
+    def connected(self) -> bool:
+        return self.subscriber.connected
+
+
+    @property
+    def epoch(self) -> str | None:
+        return self.subscription.epoch if self.subscription is not None else None
+
+
+    async def run(self) -> None:
+        """
+        订阅上游服务器的数据变化并应用到合并视图，直至被取消。
+        """
+
+        self.subscription = await self.subscriber.subscribe()
+        async for delta in self.subscription:
+            # 数据标识改变后上游服务器从头推送全部数据，不在其中的玩家（如重启前已删除的）不会再出现，须先删除旧的行
+            if delta.get('epoch') != self.applied_epoch:
+                if self.applied_epoch is not None:
+                    self.view.remove_server(self.name)
+                self.applied_epoch = delta.get('epoch')
+            self.view.apply(self.name, delta['data'])
+            self.last_update = time.time()
+            self.pushes += 1
+
+
+    async def request(self, instruction: str, arguments: dict) -> list[dict]:
+        """
+        通过连接池中负载最小的连接转发一个请求，返回其全部响应（连接在请求过程中断开时，连接池换一个连接重试一次）。
+        """
+
+        self.requests += 1
+        return await self.pool.request(self.name, instruction, arguments)
+
+
+    def status(self) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'url': self.url,
+            'connected': self.connected,
+            'epoch': self.epoch,
+            'version': self.subscription.version if self.subscription is not None else 0,
+            'players': self.view.server_rows.get(self.name, 0),
+            'last_update': self.last_update,
+            'reconnects': self.subscriber.reconnects,
+            'last_error': self.subscriber.last_error,
+            'pushes': self.pushes,
+            'requests': self.requests,
+            'pool': [client.load() for client in self.pool.clients[self.name]]
+        }
+
+
+    async def close(self) -> None:
+        await asyncio.gather(self.subscriber.close(), self.pool.close())
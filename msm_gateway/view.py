@@ -0,0 +1,284 @@
+"""
+网关所维护的合并视图：各上游服务器推送的玩家数据，按 (服务器名称, 玩家名称) 存放。
+"""
+
+import bisect
+import fnmatch
+import operator
+import re
+import uuid
+from datetime import datetime
+from typing import Callable, Collection, Iterable
+
+
+# 玩家数据条目，与插件的 PLAYER_DATA_ITEMS 一致（顺序即 'columnar'、'binary' 格式中各列的顺序）
+PLAYER_DATA_ITEMS: list[str] = [
+    'deathCount',
+    'playerKillCount',
+    'totalKillCount',
+    'health',
+    'xp',
+    'level',
+    'food',
+    'air',
+    'armor',
+    'placeBlockCount',
+    'breakBlockCount',
+    'onlineTime'
+]
+# 数据条目名称到其在 PLAYER_DATA_ITEMS 中的下标的映射
+PLAYER_DATA_ITEM_INDEX: dict[str, int] = {item: index for index, item in enumerate(PLAYER_DATA_ITEMS)}
+ALL_ITEM_INDEXES: list[int] = list(range(len(PLAYER_DATA_ITEMS)))
+
+# 跨服务器合并同名玩家的数据时所用的运算
+MERGE_FUNCTIONS: dict[str, Callable[[Iterable[int]], int]] = {
+    'sum': sum,
+    'max': max,
+    'min': min
+}
+
+# query_players_data 指令的数值条件，与插件相同，形如 'deathCount >= 10'
+QUERY_PREDICATE_PATTERN: re.Pattern = re.compile(r'\s*(\w+)\s*(==|!=|>=|<=|>|<)\s*(-?\d+)\s*')
+QUERY_OPERATORS: dict[str, Callable[[int, int], bool]] = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+
+
+def current_hour() -> int:
+    """
+    获取当前时间（精确到小时且以半小时为准进行舍入，如11:30-12:29都归为12:00），与插件相同。
+    """
+
+    now = datetime.now()
+    if now.minute < 30:
+        return now.hour
+    # 如果达到了24小时（到明天去了），归为0
+    return (now.hour + 1) % 24
+
+
+# 合并视图中的一行：某一服务器上的某一玩家的各项数据
+class MergedRow(object):
+    __slots__ = ('server', 'name', 'values', 'versions')
+
+    def __init__(self, server: str, name: str):
+        self.server: str = server
+        self.name: str = name
+        # 各数据条目的值，按 PLAYER_DATA_ITEMS 的顺序存放
+        self.values: list[int] = [0] * len(PLAYER_DATA_ITEMS)
+        # 各数据条目最后一次变化时视图的版本号
+        self.versions: list[int] = [0] * len(PLAYER_DATA_ITEMS)
+
+
+# 所有上游服务器的玩家数据的合并视图。
+# 只在网关的事件循环内访问，无需加锁。视图有自己的数据标识（epoch）与版本号，
+# 下游客户端以此订阅合并后的数据变化，与各上游服务器的 epoch、版本号无关。
+class MergedView(object):
+    def __init__(self):
+        # 视图的数据标识，网关重启后会改变
+        self.epoch: str = uuid.uuid4().hex
+        # 视图的版本号，每次有数据发生变化时加一
+        self.version: int = 0
+        # 各行，键为 (服务器名称, 玩家名称)
+        self.rows: dict[tuple[str, str], MergedRow] = {}
+        # 各服务器的行数
+        self.server_rows: dict[str, int] = {}
+        # 按 (服务器名称, 玩家名称) 排序的各行，数据版本变化后重新生成
+        self.sorted_rows: list[MergedRow] | None = None
+        # 排行榜的缓存，键为 (数据条目下标, 合并方式, 服务器列表)，值为 (版本号, 排序键列表, 排序键到值的映射)
+        self.rankings: dict[tuple, tuple[int, list[tuple], dict[tuple, int]]] = {}
+        # 数据发生变化时调用的回调
+        self.listeners: list[Callable[[], None]] = []
+
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+    def apply(self, server: str, entries: list[dict]) -> int:
+        """
+        应用上游服务器 server 推送的一组数据（每项形如 {name, type, quantity, time}），返回发生变化的数据个数。
+        未知的数据条目被忽略；有数据发生变化时视图的版本号加一，并通知各回调。
+        """
+
+        version = self.version + 1
+        changed = 0
+        for entry in entries:
+            item_index = PLAYER_DATA_ITEM_INDEX.get(entry.get('type'))
+            name = entry.get('name')
+            if item_index is None or not isinstance(name, str):
+                continue
+            value = int(entry.get('quantity', 0))
+            key = (server, name)
+            row = self.rows.get(key)
+            if row is None:
+                row = self.rows[key] = MergedRow(server, name)
+                self.server_rows[server] = self.server_rows.get(server, 0) + 1
+                self.sorted_rows = None
+            elif row.values[item_index] == value and row.versions[item_index] != 0:
+                continue
+            row.values[item_index] = value
+            row.versions[item_index] = version
+            changed += 1
+        if changed > 0:
+            self.version = version
+            self.rankings.clear()
+            for listener in self.listeners:
+                listener()
+        return changed
+
+
+    def remove_server(self, server: str) -> int:
+        """
+        删除服务器 server 的所有行，返回删除的行数（用于上游服务器的数据标识改变，将从头推送全部数据时）。
+        推送的变化无法表达行的删除，因此有行被删除时视图的数据标识随之改变，订阅者将重新收到全部数据。
+        """
+
+        keys = [key for key in self.rows if key[0] == server]
+        if len(keys) == 0:
+            return 0
+        for key in keys:
+            del self.rows[key]
+        self.server_rows.pop(server, None)
+        self.sorted_rows = None
+        self.epoch = uuid.uuid4().hex
+        self.version += 1
+        self.rankings.clear()
+        for listener in self.listeners:
+            listener()
+        return len(keys)
+
+
+    def select(self, servers: Collection[str] | None = None) -> list[MergedRow]:
+        """
+        取得指定服务器（为 None 时为全部服务器）上的所有行，按 (服务器名称, 玩家名称) 排序。
+        """
+
+        if self.sorted_rows is None:
+            self.sorted_rows = [self.rows[key] for key in sorted(self.rows)]
+        if servers is None:
+            return self.sorted_rows
+        return [row for row in self.sorted_rows if row.server in servers]
+
+
+    def changes_since(self, version: int, item_indexes: list[int],
+                      servers: Collection[str] | None = None) -> list[tuple[str, str, int, int]]:
+        """
+        取得版本号 version 之后发生变化的数据，每项为 (服务器名称, 玩家名称, 数据条目下标, 值)。
+        """
+
+        if version >= self.version:
+            return []
+        result = []
+        for row in self.select(servers):
+            versions = row.versions
+            values = row.values
+            for item_index in item_indexes:
+                if versions[item_index] > version:
+                    result.append((row.server, row.name, item_index, values[item_index]))
+        return result
+
+
+    def ranking(self, item_index: int, merge: str | None,
+                servers: Collection[str] | None) -> tuple[list[tuple], dict[tuple, int]]:
+        """
+        取得数据条目 item_index 的排行榜：(排序键列表, 排序键到值的映射)。
+        未合并时排序键为 (-值, 玩家名称, 服务器名称)，按 merge 合并同名玩家时为 (-值, 玩家名称)。
+        同一数据版本内的结果被缓存，由各页的请求共享。
+        """
+
+        cache_key = (item_index, merge, tuple(sorted(servers)) if servers is not None else None)
+        cached = self.rankings.get(cache_key)
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+        rows = self.select(servers)
+        if merge is None:
+            values = {(-row.values[item_index], row.name, row.server): row.values[item_index] for row in rows}
+        else:
+            merged = merge_rows(rows, merge)
+            values = {(-entry[0][item_index], name): entry[0][item_index] for name, entry in merged.items()}
+        keys = sorted(values)
+        self.rankings[cache_key] = (self.version, keys, values)
+        return keys, values
+
+
+def merge_rows(rows: list[MergedRow], merge: str) -> dict[str, tuple[list[int], list[str]]]:
+    """
+    按玩家名称合并各服务器上的同名玩家，返回 {玩家名称: (合并后的各数据条目的值, 所在的服务器列表)}，按玩家名称排序。
+    merge 为 MERGE_FUNCTIONS 中的键。
+    """
+
+    func = MERGE_FUNCTIONS[merge]
+    grouped: dict[str, list[MergedRow]] = {}
+    for row in rows:
+        grouped.setdefault(row.name, []).append(row)
+    return {
+        name: ([func(values) for values in zip(*(row.values for row in group))], [row.server for row in group])
+        for name, group in sorted(grouped.items())
+    }
+
+
+def rank_of(keys: list[tuple], value: int) -> int:
+    """
+    值为 value 的项在排行榜中的排名（值相同的项排名相同）。
+    """
+
+    return bisect.bisect_left(keys, (-value,)) + 1
+
+
+# 对合并视图的按条件查询，参数与插件的 query_players_data 指令相同（在线状态除外，由上游服务器判断）
+class ViewQuery(object):
+    def __init__(self, players: list[str] | None, pattern: str | None, item_indexes: list[int],
+                 predicates: list[tuple[int, Callable[[int, int], bool], int]]):
+        # 只查询其中列出的玩家，为 None 时不限
+        self.players: set[str] | None = set(players) if players is not None else None
+        # 玩家名称需匹配的通配符模式，为 None 时不限
+        self.pattern_regex: re.Pattern | None = re.compile(fnmatch.translate(pattern)) if pattern is not None else None
+        # 返回的数据条目在 PLAYER_DATA_ITEMS 中的下标
+        self.item_indexes: list[int] = item_indexes
+        # 数值条件：(数据条目下标, 比较运算, 比较的值)，须全部满足
+        self.predicates: list[tuple[int, Callable[[int, int], bool], int]] = predicates
+
+
+    @staticmethod
+    def parse(arguments: dict) -> 'ViewQuery':
+        """
+        由 query_players_data 指令的参数构造查询，参数有误时抛出 ValueError（错误信息与插件相同）。
+        """
+
+        players = arguments.get('players')
+        if players is not None and (not isinstance(players, list) or not all(isinstance(p, str) for p in players)):
+            raise ValueError('players must be a list of player names')
+        pattern = arguments.get('pattern')
+        if pattern is not None and not isinstance(pattern, str):
+            raise ValueError('pattern must be a string')
+        metrics = arguments.get('metrics') or PLAYER_DATA_ITEMS
+        if not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics):
+            raise ValueError('metrics must be a list of metric names')
+        unknown = [item for item in metrics if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown metrics: {", ".join(unknown)}')
+        where = arguments.get('where') or []
+        if not isinstance(where, list):
+            raise ValueError('where must be a list of conditions')
+        predicates = []
+        for predicate in where:
+            match = QUERY_PREDICATE_PATTERN.fullmatch(predicate) if isinstance(predicate, str) else None
+            if match is None or match[1] not in PLAYER_DATA_ITEM_INDEX:
+                raise ValueError(f'Invalid condition: {predicate}')
+            predicates.append((PLAYER_DATA_ITEM_INDEX[match[1]], QUERY_OPERATORS[match[2]], int(match[3])))
+        return ViewQuery(players, pattern, [PLAYER_DATA_ITEM_INDEX[item] for item in metrics], predicates)
+
+
+    def matches_name(self, name: str) -> bool:
+        if self.players is not None and name not in self.players:
+            return False
+        return self.pattern_regex is None or self.pattern_regex.match(name) is not None
+
+
+    def matches_values(self, values: list[int]) -> bool:
+        return all(compare(values[item_index], value) for item_index, compare, value in self.predicates)
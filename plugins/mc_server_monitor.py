@@ -1,13 +1,26 @@
 from mcdreforged.api.all import *
 import re
-from typing import Callable
-from queue import Queue
+from typing import Any, Callable, Collection, Iterator
+from array import array
+import uuid
 import threading
 import time
 import asyncio
+import socket
+import http
 import websockets
 import websockets.server
 import json
+import struct
+import sys
+import os
+import mmap
+import bisect
+import fnmatch
+import operator
+import math
+import contextlib
+from collections import deque
 from datetime import datetime
 
 
@@ -31,149 +44,2614 @@ class PluginConfig(Serializable):
     commIP: str = '127.0.0.1'
     # 与远程网站服务器通信而监听的端口号
     commPort: int = 8765
-    # MC服务器数据同步线程（ServerMonitorThread）的轮询间隔（单位：ms）
+    # MC服务器数据同步（ServerMonitor）的轮询间隔（单位：ms）
     serverMonitorThreadInterval: int = 1000
-    # 远程网站服务器联络线程（WebsocketThread）的轮询间隔（单位：ms）
+    # 远程网站服务器联络（WebsocketServer）启动失败（如端口被占用）时，重试的间隔（单位：ms）
     websocketThreadInterval: int = 1000
+    # 插件卸载时，等待已建立的websocket连接处理完当前请求的最长时间（单位：ms），超时后强制断开
+    shutdownDrainTimeout: int = 3000
+    # 是否在客户端支持时启用 websocket 的 permessage-deflate 压缩扩展
+    websocketCompression: bool = True
+    # websocket连接数上限，超出上限的新连接将被拒绝，0为不限制
+    websocketMaxConnections: int = 64
+    # 每个websocket连接同时处理的请求数上限，达到上限后暂停读取该连接的新请求
+    websocketMaxPipelinedRequests: int = 16
+    # 每个websocket连接的待发送队列的大小上限（单位：字节），0为不限制
+    websocketSendQueueLimit: int = 8388608
+    # 待发送队列超出上限时的处理方式：'drop' 丢弃本次响应（改为回传一条错误信息），'disconnect' 断开该连接
+    websocketSendQueuePolicy: str = 'drop'
+    # websocket连接的空闲超时（单位：ms），超过该时间未收到任何请求（且未订阅数据变化）的连接将被断开，0为不限制
+    websocketIdleTimeout: int = 300000
+    # 在websocket端口上以 Prometheus 文本格式提供插件自身运行指标的HTTP路径，为空时不提供
+    metricsPath: str = '/metrics'
+    # 是否使用批量采集模式（每次轮询只调用一次 msm:collect/all 函数获取所有在线玩家的数据）
+    # 若数据包版本过旧导致批量采集无响应，将自动回退为逐条采集模式；若数据包也不支持带关联ID的逐条查询
+    # （msm:get_data_tagged），经控制台发送的逐条查询将进一步回退为 msm:get_data，其结果按控制台输出的先后顺序匹配
+    # （输出丢失时，之后的结果可能被错配给相邻的请求，直至等待中的请求超时）
+    batchedCollection: bool = True
+    # 批量采集模式下，是否只采集自上次采集以来发生变化的记分项（由数据包在游戏内进行比较）
+    # 注：onlineTime 每刻都在变化，不参与比较，只在玩家有其他记分项变化时顺带采集，其余时候随全量采集更新
+    collectChangesOnly: bool = True
+    # 只采集变化的记分项时，每隔多久（单位：ms）进行一次全量采集，以纠正可能的偏差（如采集结果丢失）
+    fullCollectionInterval: int = 60000
+    # 向MC服务器发起的请求（MC函数调用）等待结果的超时时间（单位：ms），超时未返回结果的请求将被丢弃
+    requestTimeout: int = 5000
+    # 是否将玩家数据的变化记录到插件数据文件夹下的历史记录中（history 文件夹）
+    historyEnabled: bool = True
+    # 写入历史记录的间隔（单位：ms），每次只写入自上次以来发生变化的数据
+    historyInterval: int = 60000
+    # 将历史记录同步到磁盘（fsync）的最小间隔（单位：ms）
+    historyFsyncInterval: int = 5000
+    # 各数据条目的轮询间隔（单位：ms）。键可以是数据条目的类别（fast、normal、slow，参见 PLAYER_DATA_ITEM_CLASSES），
+    # 也可以是具体的数据条目名称（优先于其所属类别）。serverMonitorThreadInterval 为轮询的最小粒度。
+    # 批量采集模式下，每次采集总是取得玩家的全部数据条目（数据包中采集一名玩家的开销与条目数无关），
+    # 因此玩家的任一数据条目到期时即采集该玩家，实际的采集间隔为其各数据条目中最短的轮询间隔
+    metricPollIntervals: dict[str, int] = {'fast': 1000, 'normal': 5000, 'slow': 30000}
+    # 每秒最多向MC服务器发送的控制台命令数，超出的轮询将顺延到下一轮。
+    # 批量采集模式下，每次（经RCON时为每段）采集需3条命令，每轮至少进行一次采集
+    commandBudgetPerSecond: int = 500
+    # 请求延迟（指数加权移动平均值）超过该值（单位：ms）时，认为MC服务器负载过高，自动延长所有轮询间隔
+    latencyBackoffThreshold: int = 1000
+    # 输出轮询调度统计信息的间隔（单位：ms），为0时不输出
+    schedulerStatsInterval: int = 60000
+    # 维护排名索引（用于 get_leaderboard 指令）的数据条目
+    leaderboardMetrics: list[str] = ['playerKillCount', 'totalKillCount', 'deathCount', 'onlineTime',
+                                     'placeBlockCount', 'breakBlockCount']
+    # 内存中最多保留数据的玩家数，0为不限制。超出时，最久未活跃的离线玩家的数据将被移出到插件数据文件夹下的存档中（archive 文件夹），
+    # 在查询或玩家重新加入游戏时再从磁盘读取，查询结果与数据在内存中时相同
+    maxResidentPlayers: int = 10000
+    # 滑动窗口统计（get_players_rates 指令）的区间长度（单位：s）及保留的区间数，
+    # 最长可统计最近 rateBucketSeconds × rateBuckets 秒内的数据，rateBuckets 为0时不统计
+    rateBucketSeconds: int = 60
+    rateBuckets: int = 60
+    # 是否在插件加载后进行启动预热：以 list 命令取得已在线的玩家，并以一轮批量采集同步在线玩家及所有已知玩家的数据，
+    # 完成后再开始常规轮询（重新加载插件时，若旧实例已完成预热则不再进行）
+    warmStart: bool = True
+    # 向MC服务器发送命令并取得其结果的方式：'console' 经控制台发送，从控制台输出中解析结果；
+    # 'rcon' 经RCON连接发送，结果直接在命令的回复中返回（RCON不可用时自动回退为经控制台发送）
+    transport: str = 'console'
+    # RCON的地址、端口及密码，密码为空时使用 MCDR 配置文件中的 rcon 设置
+    rconAddress: str = '127.0.0.1'
+    rconPort: int = 25575
+    rconPassword: str = ''
+    # RCON的连接数
+    rconConnections: int = 4
+    # 每个RCON连接上同时等待回复的命令数上限。原版服务器每次读取只处理一个数据包，同时到达的多个数据包会使其断开连接，
+    # 因此缺省为1（收到回复后再发送下一条命令）；服务器的RCON实现能连续读取多个数据包时，可调大以流水线方式发送命令
+    rconMaxPipelined: int = 1
 
 
 # 当从MC服务器收到函数执行结果时执行的回调
 class MCFuncResultSchedule(object):
-    def __init__(self, mc_func: str, args: dict, callback: Callable[[str, dict, int], None]):
+    def __init__(self, mc_func: str, args: dict, callback: Callable[[str, dict, Any], None]):
         # MC函数名称
         self.mc_func: str = mc_func
         # MC函数的参数列表，为一个字典
         self.args: dict = args
         # 当MC函数执行完成时，触发该回调函数
-        self.callback: Callable[[str, dict, int], None] = callback
+        self.callback: Callable[[str, dict, Any], None] = callback
+        # 本请求的关联ID，随命令发送至MC服务器，并随执行结果一同返回（由 PendingRequestTable 分配）
+        self.request_id: int = 0
+        # 本请求的发出时刻及超时时刻（time.monotonic() 时间，单位：s）
+        self.sent_at: float = 0.0
+        self.deadline: float = 0.0
 
     
-    def execute(self, result: int) -> None:
+    def execute(self, result: Any) -> None:
         self.callback(self.mc_func, self.args, result)
 
 
+# 耗时类直方图的分桶上界（单位：s），覆盖10µs至10s
+METRIC_TIME_BUCKETS: tuple[float, ...] = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# 数量类直方图的分桶上界
+METRIC_COUNT_BUCKETS: tuple[float, ...] = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+# 插件自身运行状况的计数指标（只增不减）
+class MetricCounter(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value: int = 0
+
+
+    def inc(self, amount: int = 1) -> None:
+        with self.lock:
+            self.value += amount
+
+
+# 插件自身运行状况的直方图指标，按固定的分桶统计观测值的分布
+class MetricHistogram(object):
+    def __init__(self, bounds: tuple[float, ...]):
+        self.lock = threading.Lock()
+        # 各分桶的上界（不含最后一个上界为无穷大的分桶）
+        self.bounds: tuple[float, ...] = bounds
+        # 各分桶的观测次数（非累计）
+        self.buckets: list[int] = [0] * (len(bounds) + 1)
+        # 观测次数及观测值之和
+        self.count: int = 0
+        self.sum: float = 0.0
+
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.buckets[index] += 1
+            self.count += 1
+            self.sum += value
+
+
+    def snapshot(self) -> tuple[list[int], int, float]:
+        """
+        取得 (各分桶的观测次数, 观测次数, 观测值之和)。
+        """
+
+        with self.lock:
+            return list(self.buckets), self.count, self.sum
+
+
+    def quantile(self, q: float) -> float:
+        """
+        估算观测值的 q 分位数（取其所在分桶的上界，落在最后一个分桶时取最大的有限上界）。
+        """
+
+        buckets, count, _ = self.snapshot()
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket in enumerate(buckets):
+            cumulative += bucket
+            if cumulative >= rank:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+
+    def summary(self, scale: float = 1.0) -> dict[str, float]:
+        """
+        取得观测次数、平均值及常用分位数，各值乘以 scale（如将s换算为ms）。
+        """
+
+        _, count, total = self.snapshot()
+        return {
+            'count': count,
+            'mean': total / count * scale if count > 0 else 0.0,
+            'p50': self.quantile(0.5) * scale,
+            'p90': self.quantile(0.9) * scale,
+            'p99': self.quantile(0.99) * scale
+        }
+
+
+# 插件自身运行状况的各项指标。
+# 只记录计数与直方图，当前值（如请求表深度、连接数）在导出时再从相应的对象中读取。
+class MonitorMetrics(object):
+    def __init__(self):
+        # 命令从 psi.execute 发出到 on_info 收到结果的延迟（s），按MC函数区分
+        self.request_latency: dict[str, MetricHistogram] = {
+            'msm:get_data': MetricHistogram(METRIC_TIME_BUCKETS),
+            'msm:collect/all': MetricHistogram(METRIC_TIME_BUCKETS)
+        }
+        # 每轮轮询开始时，请求表中等待结果的请求数
+        self.pending_depth: MetricHistogram = MetricHistogram(METRIC_COUNT_BUCKETS)
+        # 每轮轮询的耗时（s，逐条采集模式下包含各批命令之间的等待时间）
+        self.poll_cycle: MetricHistogram = MetricHistogram(METRIC_TIME_BUCKETS)
+        # 发送到MC服务器的命令数
+        self.commands_sent: MetricCounter = MetricCounter()
+        # 等待及持有 player_data_records_lock 的时间（s）
+        self.lock_wait: MetricHistogram = MetricHistogram(METRIC_TIME_BUCKETS)
+        self.lock_hold: MetricHistogram = MetricHistogram(METRIC_TIME_BUCKETS)
+        # websocket请求的处理（含响应的编码）耗时，及每条消息的发送耗时（s）
+        self.websocket_encode: MetricHistogram = MetricHistogram(METRIC_TIME_BUCKETS)
+        self.websocket_send: MetricHistogram = MetricHistogram(METRIC_TIME_BUCKETS)
+        # 收到的websocket请求数
+        self.websocket_requests: MetricCounter = MetricCounter()
+        # 因待发送队列已满而被丢弃的响应数，及被断开的连接数
+        self.websocket_dropped: MetricCounter = MetricCounter()
+        self.websocket_overflowed: MetricCounter = MetricCounter()
+        # 因连接数超出上限而被拒绝的连接数
+        self.websocket_rejected: MetricCounter = MetricCounter()
+
+
+    def observe_request_latency(self, mc_func: str, latency: float) -> None:
+        histogram = self.request_latency.get(mc_func)
+        if histogram is not None:
+            histogram.observe(latency)
+
+
+# 对 player_data_records_lock 的包装，统计等待及持有锁的时间（可重入的锁只统计最外层的获取）
+class InstrumentedLock(object):
+    def __init__(self, lock: Any, wait: MetricHistogram, hold: MetricHistogram):
+        self.lock: Any = lock
+        self.wait: MetricHistogram = wait
+        self.hold: MetricHistogram = hold
+        # 持有锁的线程的重入深度，及最外层获取锁的时刻（只由持有锁的线程修改）
+        self.depth: int = 0
+        self.acquired_at: float = 0.0
+
+
+    def __enter__(self) -> 'InstrumentedLock':
+        start = time.perf_counter()
+        self.lock.acquire()
+        self.depth += 1
+        if self.depth == 1:
+            self.acquired_at = time.perf_counter()
+            self.wait.observe(self.acquired_at - start)
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.depth -= 1
+        if self.depth == 0:
+            self.hold.observe(time.perf_counter() - self.acquired_at)
+        self.lock.release()
+
+
+# 计算请求延迟的指数加权移动平均值时，最新一次延迟所占的权重
+PENDING_REQUEST_LATENCY_ALPHA: float = 0.2
+
+
+# 等待执行结果的请求表，以关联ID为键，将MC服务器返回的执行结果与发起请求时登记的回调一一对应
+class PendingRequestTable(object):
+    def __init__(self, timeout: int, metrics: MonitorMetrics | None = None):
+        # 请求的超时时间（ms）
+        self.timeout: int = timeout if timeout > 0 else 5000 # 缺省值为5000ms
+        # 记录请求延迟的指标，可为 None
+        self.metrics: MonitorMetrics | None = metrics
+        self.lock = threading.Lock()
+        # 下一个待分配的关联ID
+        self.next_id: int = 1
+        # 尚未收到结果的请求，键为关联ID
+        self.entries: dict[int, MCFuncResultSchedule] = {}
+
+        # 成功匹配的结果数
+        self.resolved_count: int = 0
+        # 超时未收到结果而被丢弃的请求数
+        self.expired_count: int = 0
+        # 找不到对应请求的结果数（请求已超时，或并非由本插件发起）
+        self.orphaned_count: int = 0
+        # 关联ID对应的请求与结果所属的MC函数不一致的次数
+        self.mismatched_count: int = 0
+        # 未携带关联ID的函数执行结果数（如其他插件或玩家手动执行的函数）
+        self.untagged_count: int = 0
+        # 请求从发出到收到结果的延迟（s）的指数加权移动平均值，可反映MC服务器的负载情况
+        self.latency: float = 0.0
+
+
+    def register(self, sched: MCFuncResultSchedule) -> int:
+        """
+        登记一个等待结果的请求，返回为其分配的关联ID。
+        """
+
+        with self.lock:
+            request_id = self.next_id
+            # 关联ID需能以32位有符号整型存入NBT，超出范围后从1重新开始
+            self.next_id = request_id + 1 if request_id < 2147483647 else 1
+            sched.request_id = request_id
+            sched.sent_at = time.monotonic()
+            sched.deadline = sched.sent_at + float(self.timeout) / 1000.0
+            self.entries[request_id] = sched
+        return request_id
+
+
+    def adopt(self, old_table: Any, callbacks: dict[str, Callable[[str, dict, Any], None]]) -> None:
+        """
+        接管旧版本插件的请求表中尚未收到结果的请求（重新加载插件时使用），
+        各请求的回调按其MC函数名称替换为 callbacks 中对应的回调，找不到对应回调的请求将被丢弃。
+        """
+
+        with old_table.lock:
+            next_id = old_table.next_id
+            entries = list(old_table.entries.values())
+        with self.lock:
+            self.next_id = next_id
+            for old_sched in entries:
+                callback = callbacks.get(old_sched.mc_func)
+                if callback is None:
+                    continue
+                sched = MCFuncResultSchedule(old_sched.mc_func, old_sched.args, callback)
+                sched.request_id = old_sched.request_id
+                sched.sent_at = old_sched.sent_at
+                sched.deadline = old_sched.deadline
+                self.entries[sched.request_id] = sched
+
+
+    def resolve(self, request_id: int, mc_func: str, result: Any) -> bool:
+        """
+        根据关联ID取出对应的请求并执行其回调，返回是否匹配成功。
+        """
+
+        with self.lock:
+            sched = self.entries.get(request_id)
+            if sched is None:
+                self.orphaned_count += 1
+                return False
+            if sched.mc_func != mc_func:
+                # 不出队，该请求自己的结果可能仍会到达
+                self.mismatched_count += 1
+                return False
+            del self.entries[request_id]
+            self.resolved_count += 1
+            latency = time.monotonic() - sched.sent_at
+            self.latency += (latency - self.latency) * PENDING_REQUEST_LATENCY_ALPHA
+        if self.metrics is not None:
+            self.metrics.observe_request_latency(mc_func, latency)
+        # 回调在锁外执行，避免阻塞其他请求的登记与匹配
+        sched.execute(result)
+        return True
+
+
+    def resolve_oldest(self, mc_func: str, result: Any) -> bool:
+        """
+        将无法携带关联ID的结果（如 list 命令的输出）匹配给最早发出的、属于 mc_func 的请求，返回是否匹配成功。
+        MC服务器按顺序执行控制台命令，因此最早发出的请求即为该结果所对应的请求。
+        """
+
+        with self.lock:
+            request_id = min((request_id for request_id, sched in self.entries.items() if sched.mc_func == mc_func),
+                             key=lambda request_id: self.entries[request_id].sent_at, default=None)
+        if request_id is None:
+            self.count_untagged()
+            return False
+        return self.resolve(request_id, mc_func, result)
+
+
+    def retag(self, request_id: int, mc_func: str) -> None:
+        """
+        将请求改为属于 mc_func，并以当前时刻为其发出时刻（请求改为以无法携带关联ID的命令发送、由 resolve_oldest 匹配时使用，
+        须在发送该命令前、持有 console_command_lock 时调用，使各请求的发出时刻与命令的发送顺序一致）。
+        """
+
+        with self.lock:
+            sched = self.entries.get(request_id)
+            if sched is not None:
+                sched.mc_func = mc_func
+                sched.sent_at = time.monotonic()
+
+
+    def expire(self) -> int:
+        """
+        丢弃所有已超时的请求，返回本次丢弃的请求数。
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            expired = [request_id for request_id, sched in self.entries.items() if sched.deadline <= now]
+            for request_id in expired:
+                del self.entries[request_id]
+            self.expired_count += len(expired)
+        return len(expired)
+
+
+    def count_untagged(self) -> None:
+        with self.lock:
+            self.untagged_count += 1
+
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                'pending': len(self.entries),
+                'resolved': self.resolved_count,
+                'expired': self.expired_count,
+                'orphaned': self.orphaned_count,
+                'mismatched': self.mismatched_count,
+                'untagged': self.untagged_count,
+                'latency_ms': self.latency * 1000.0
+            }
+
+
 # MC服务器上所记录的玩家数据的所有条目名称（均已去除'msm_'前缀）
 PLAYER_DATA_ITEMS: list[str] = [
     # -----
     # 下列记分项为游戏自动更新。
     # -----
 
-    # 死亡数
-    'deathCount',
-    # 击杀玩家数
-    'playerKillCount',
-    # 击杀数（包括玩家和生物）
-    'totalKillCount',
-    # 生命值（包括伤害吸收值）【只读】
-    'health',
-    # 经验值【只读】
-    'xp',
-    # 等级【只读】
-    'level',
-    # 饥饿值【只读】
-    'food',
-    # 空气值【只读】
-    'air',
-    # 护甲值【只读】
-    'armor',
+    # 死亡数
+    'deathCount',
+    # 击杀玩家数
+    'playerKillCount',
+    # 击杀数（包括玩家和生物）
+    'totalKillCount',
+    # 生命值（包括伤害吸收值）【只读】
+    'health',
+    # 经验值【只读】
+    'xp',
+    # 等级【只读】
+    'level',
+    # 饥饿值【只读】
+    'food',
+    # 空气值【只读】
+    'air',
+    # 护甲值【只读】
+    'armor',
+
+    # -----
+    # 下列记分项游戏不会自动更新，需通过监听游戏状态进行手动更新。
+    # -----
+
+    # 放置方块数
+    'placeBlockCount',
+    # 破坏方块数
+    'breakBlockCount',
+    # 在线时长（以游戏刻为单位）
+    # 注：受限于记分板数据类型（32位有符号整型），上限值为2,147,483,647，
+    # 也就是最多只能记录约1242.76天的时长。
+    'onlineTime'
+]
+
+
+# 批量采集模式下，连续多少次轮询未收到采集结果后回退为逐条采集模式
+BATCH_COLLECTION_MAX_UNANSWERED: int = 3
+# 逐条采集模式下，连续多少次轮询未收到带关联ID的查询结果后回退为不带关联ID的查询（msm:get_data）
+TAGGED_QUERY_MAX_UNANSWERED: int = 3
+# 不带关联ID的逐条查询在请求表中所属的MC函数名称，以便与经RCON发送（按关联ID匹配）的 msm:get_data 请求相区分
+UNTAGGED_GET_DATA: str = 'msm:get_data/untagged'
+
+
+# 各数据条目在 PLAYER_DATA_ITEMS 中的下标，键为数据条目名称
+PLAYER_DATA_ITEM_INDEX: dict[str, int] = {item: i for i, item in enumerate(PLAYER_DATA_ITEMS)}
+# 各记分项在 PLAYER_DATA_ITEMS 中的下标，键为带'msm_'前缀的记分项名称
+PLAYER_DATA_ENTRY_INDEX: dict[str, int] = {'msm_' + item: i for i, item in enumerate(PLAYER_DATA_ITEMS)}
+# 所有数据条目的下标
+ALL_ITEM_INDEXES: list[int] = list(range(len(PLAYER_DATA_ITEMS)))
+# 各数据条目按变化频率所属的类别：fast（几乎每刻都在变化），normal，slow（很少变化）
+PLAYER_DATA_ITEM_CLASSES: dict[str, str] = {
+    'deathCount': 'slow',
+    'playerKillCount': 'slow',
+    'totalKillCount': 'normal',
+    'health': 'fast',
+    'xp': 'normal',
+    'level': 'slow',
+    'food': 'fast',
+    'air': 'fast',
+    'armor': 'fast',
+    'placeBlockCount': 'normal',
+    'breakBlockCount': 'normal',
+    'onlineTime': 'normal'
+}
+# 累计型的数据条目（只增不减，除非记分板被重置），其余均为瞬时值（如生命值、饥饿值）
+PLAYER_DATA_COUNTERS: set[str] = {
+    'deathCount', 'playerKillCount', 'totalKillCount', 'placeBlockCount', 'breakBlockCount', 'onlineTime'
+}
+
+
+# 玩家数据的某一时刻的快照，与 PlayerDataStore 使用相同的按列存储的布局
+class PlayerDataSnapshot(object):
+    __slots__ = ('names', 'columns', 'version')
+
+    def __init__(self, names: list[str], columns: list[array], version: int):
+        # 所有玩家的名称，下标即为该玩家的数据在各列中的位置
+        self.names: list[str] = names
+        # 各数据条目的数据列，顺序与 PLAYER_DATA_ITEMS 一致
+        self.columns: list[array] = columns
+        # 取得快照时存储结构的数据版本号
+        self.version: int = version
+
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+    def rows(self) -> Iterator[tuple[str, list[int]]]:
+        """
+        按玩家逐行遍历快照，每行为 (玩家名称, 各数据条目的值)。
+        """
+
+        columns = self.columns
+        for slot, name in enumerate(self.names):
+            yield name, [column[slot] for column in columns]
+
+
+    def extend(self, names: list[str], columns: list[array]) -> None:
+        """
+        在快照末尾追加一批玩家（如在锁外读取的存档中的玩家）。
+        """
+
+        self.names.extend(names)
+        for column, extra in zip(self.columns, columns):
+            column.extend(extra)
+
+
+# 排名索引中每个分块的目标长度，分块超过其两倍时对半拆分
+RANK_BLOCK_SIZE: int = 512
+
+
+# 单个数据条目的排名索引：所有玩家按 (-值, 玩家名称) 排序，即按值从大到小排列，值相同的玩家按名称排列，
+# 因此同一版本的数据分页时顺序稳定。
+# 排序的列表被切分为若干个长度不超过 2 * RANK_BLOCK_SIZE 的分块，并记录各分块的最大项，及以各分块的长度构成的树状数组
+# （用于求某一分块之前的项数）。更新时只需在一个分块内移动元素，查找某一位置或某一值的排名时先二分查找分块，
+# 两者的开销均为 O(log n + RANK_BLOCK_SIZE)，与玩家总数基本无关；只有分块拆分或移除时需重建树状数组。
+class RankIndex(object):
+    __slots__ = ('blocks', 'maxes', 'tree', 'size')
+
+    def __init__(self, keys: list[tuple[int, str]] | None = None):
+        """
+        keys 为已排序的 (-值, 玩家名称) 列表。
+        """
+
+        keys = keys or []
+        # 各分块，依次相接即为完整的排序列表
+        self.blocks: list[list[tuple[int, str]]] = [keys[i:i + RANK_BLOCK_SIZE]
+                                                    for i in range(0, len(keys), RANK_BLOCK_SIZE)]
+        # 各分块的最后一项（即最大项）
+        self.maxes: list[tuple[int, str]] = [block[-1] for block in self.blocks]
+        # 以各分块的长度构成的树状数组（下标从1开始），为 None 时需重建
+        self.tree: list[int] | None = None
+        self.size: int = len(keys)
+
+
+    def __len__(self) -> int:
+        return self.size
+
+
+    def __tree(self) -> list[int]:
+        tree = self.tree
+        if tree is None:
+            tree = [0]
+            tree.extend(len(block) for block in self.blocks)
+            for i in range(1, len(tree)):
+                parent = i + (i & -i)
+                if parent < len(tree):
+                    tree[parent] += tree[i]
+            self.tree = tree
+        return tree
+
+
+    def __resize(self, block_index: int, delta: int) -> None:
+        tree = self.tree
+        if tree is not None:
+            i = block_index + 1
+            while i < len(tree):
+                tree[i] += delta
+                i += i & -i
+
+
+    def __count_before(self, block_index: int) -> int:
+        """
+        取得第 block_index 个分块之前的项数。
+        """
+
+        tree = self.__tree()
+        count = 0
+        i = block_index
+        while i > 0:
+            count += tree[i]
+            i &= i - 1
+        return count
+
+
+    def __insert(self, key: tuple[int, str]) -> None:
+        blocks = self.blocks
+        maxes = self.maxes
+        self.size += 1
+        if len(blocks) == 0:
+            blocks.append([key])
+            maxes.append(key)
+            self.tree = None
+            return
+        i = bisect.bisect_left(maxes, key)
+        if i == len(maxes):
+            # 大于所有项时追加到最后一个分块的末尾
+            i -= 1
+            blocks[i].append(key)
+            maxes[i] = key
+        else:
+            bisect.insort(blocks[i], key)
+        block = blocks[i]
+        if len(block) > 2 * RANK_BLOCK_SIZE:
+            blocks[i:i + 1] = [block[:RANK_BLOCK_SIZE], block[RANK_BLOCK_SIZE:]]
+            maxes[i:i + 1] = [block[RANK_BLOCK_SIZE - 1], block[-1]]
+            self.tree = None
+        else:
+            self.__resize(i, 1)
+
+
+    def __remove(self, key: tuple[int, str]) -> None:
+        blocks = self.blocks
+        maxes = self.maxes
+        i = bisect.bisect_left(maxes, key)
+        block = blocks[i]
+        del block[bisect.bisect_left(block, key)]
+        self.size -= 1
+        if len(block) == 0:
+            del blocks[i]
+            del maxes[i]
+            self.tree = None
+        else:
+            maxes[i] = block[-1]
+            self.__resize(i, -1)
+
+
+    def __position(self, key: tuple[int, str], right: bool) -> int:
+        """
+        取得 key 在排序列表中的插入位置（right 为 True 时位于与其相等的项之后）。
+        """
+
+        find = bisect.bisect_right if right else bisect.bisect_left
+        i = find(self.maxes, key)
+        if i == len(self.maxes):
+            return self.size
+        return self.__count_before(i) + find(self.blocks[i], key)
+
+
+    def __locate(self, position: int) -> tuple[int, int]:
+        """
+        取得排序列表中位置 position（须小于列表长度）所在的分块，及其在分块中的位置。
+        """
+
+        tree = self.__tree()
+        block_index = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step > 0:
+            if block_index + step < len(tree) and tree[block_index + step] <= position:
+                block_index += step
+                position -= tree[block_index]
+            step >>= 1
+        return block_index, position
+
+
+    def add(self, player: str, value: int) -> None:
+        self.__insert((-value, player))
+
+
+    def update(self, player: str, old_value: int, new_value: int) -> None:
+        self.__remove((-old_value, player))
+        self.__insert((-new_value, player))
+
+
+    def rank_of(self, value: int) -> int:
+        """
+        取得值为 value 的玩家的排名（从1开始，值相同的玩家排名相同，即比该值大的玩家数加1）。
+        """
+
+        return self.__position((-value, ''), False) + 1
+
+
+    def position_of(self, player: str, value: int) -> int:
+        """
+        取得玩家在排名列表中的位置（从0开始）。
+        """
+
+        return self.__position((-value, player), False)
+
+
+    def position_after(self, player: str, value: int) -> int:
+        """
+        取得排名列表中紧随 (值, 玩家名称) 之后的位置（该玩家可以已不在列表中，用于以上一页的最后一项分页）。
+        """
+
+        return self.__position((-value, player), True)
+
+
+    def page(self, start: int, count: int) -> list[tuple[int, str, int]]:
+        """
+        取得排名列表中从位置 start 开始的至多 count 项，每项为 (排名, 玩家名称, 值)。
+        """
+
+        result = []
+        if count <= 0 or start >= self.size:
+            return result
+        i, offset = self.__locate(start)
+        position = start
+        rank = 0
+        previous = None
+        while i < len(self.blocks) and len(result) < count:
+            for negative_value, player in self.blocks[i][offset:offset + count - len(result)]:
+                value = -negative_value
+                if value != previous:
+                    # 本页的第一项需查找其排名，此后值发生变化的项的排名即为其位置加1
+                    rank = self.rank_of(value) if previous is None else position + 1
+                    previous = value
+                result.append((rank, player, value))
+                position += 1
+            i += 1
+            offset = 0
+        return result
+
+
+# 移除已离线玩家的过期滑动窗口统计数据的间隔（s）
+RATE_EXPIRE_INTERVAL: float = 60.0
+# 滑动窗口统计中，瞬时值数据条目在某一区间内尚无数据时的最小值及最大值标记
+RATE_NO_MIN: int = 2 ** 31 - 1
+RATE_NO_MAX: int = -2 ** 31
+
+
+# 单个玩家的滑动窗口统计数据：以固定长度的时间区间为单位，在环形缓冲区中保存最近若干个区间内各数据条目的统计值。
+# 累计型数据条目记录各区间内的增量及检测到的重置次数；瞬时值数据条目记录各区间内的最小值、最大值及值对时间的积分
+# （用于计算时间加权的平均值）。第 k 个累计型（或瞬时值）条目的数据位于各数组的 [k * 区间数, (k + 1) * 区间数)。
+class PlayerRateWindow(object):
+    __slots__ = ('ids', 'deltas', 'resets', 'mins', 'maxs', 'sums', 'last', 'missing', 'last_time', 'since', 'seen')
+
+    def __init__(self, buckets: int, counters: int, gauges: int, since: float):
+        # 环形缓冲区各位置当前保存的区间编号（时间戳整除区间长度），-1 表示尚未使用
+        self.ids: array = array('q', [-1]) * buckets
+        # 累计型数据条目在各区间内的增量，及检测到的重置次数
+        self.deltas: array = array('q', [0]) * (buckets * counters)
+        self.resets: array = array('I', [0]) * (buckets * counters)
+        # 瞬时值数据条目在各区间内的最小值、最大值，及值对时间的积分（单位：值 × s）
+        self.mins: array = array('i', [RATE_NO_MIN]) * (buckets * gauges)
+        self.maxs: array = array('i', [RATE_NO_MAX]) * (buckets * gauges)
+        self.sums: array = array('d', [0.0]) * (buckets * gauges)
+        # 各数据条目最近一次的值（None 表示尚无数据），顺序与 PLAYER_DATA_ITEMS 一致
+        self.last: list[int | None] = [None] * len(PLAYER_DATA_ITEMS)
+        # 尚无数据的数据条目数
+        self.missing: int = len(PLAYER_DATA_ITEMS)
+        # 各瞬时值数据条目的积分已累计到的时刻（Unix时间，单位：s）
+        self.last_time: array = array('d', [since]) * gauges
+        # 开始统计的时刻，及最近一次数据变化的时刻（Unix时间，单位：s）
+        self.since: float = since
+        self.seen: float = since
+
+
+# 玩家数据的滑动窗口统计（用于 get_players_rates 指令）。
+# 随 PlayerDataStore 的每次数据变化增量更新，每次更新只涉及当前区间（瞬时值条目还涉及上次变化以来经过的区间），
+# 查询时合并窗口内各区间的统计值，开销与区间数成正比，而与数据变化的次数无关。
+# 各玩家的首个值只作为基准，不计入增量；累计型条目的值变小时视为记分板已被重置（如执行了 msm:reset_scoreboard），
+# 重置后的值即为重置以来的增量。
+# 注：本类自身不加锁，访问前需先获取 player_data_records_lock。
+class PlayerRateTracker(object):
+    def __init__(self, bucket_seconds: int, buckets: int, old: Any = None):
+        # 区间的长度（s）及保留的区间数
+        self.width: float = float(max(bucket_seconds, 1))
+        self.buckets: int = max(buckets, 1)
+        # 各数据条目是否为累计型，及其在累计型（或瞬时值）条目中的序号，顺序与 PLAYER_DATA_ITEMS 一致
+        self.is_counter: list[bool] = [item in PLAYER_DATA_COUNTERS for item in PLAYER_DATA_ITEMS]
+        self.positions: list[int] = []
+        counters = 0
+        gauges = 0
+        for is_counter in self.is_counter:
+            self.positions.append(counters if is_counter else gauges)
+            if is_counter:
+                counters += 1
+            else:
+                gauges += 1
+        self.counters: int = counters
+        self.gauges: int = gauges
+        # 瞬时值条目在 PLAYER_DATA_ITEMS 中的下标
+        self.gauge_indexes: list[int] = [i for i, is_counter in enumerate(self.is_counter) if not is_counter]
+        # 各玩家的统计数据
+        self.entries: dict[str, PlayerRateWindow] = {}
+
+        # 重新加载插件时，若区间的设置及数据条目均未变化，则沿用旧实例的统计数据
+        if old is not None and getattr(old, 'width', None) == self.width and getattr(old, 'buckets', None) == self.buckets \
+                and getattr(old, 'is_counter', None) == self.is_counter:
+            for player, old_entry in old.entries.items():
+                entry = PlayerRateWindow(self.buckets, counters, gauges, old_entry.since)
+                for name in PlayerRateWindow.__slots__:
+                    value = getattr(old_entry, name)
+                    setattr(entry, name, array(value.typecode, value) if isinstance(value, array) else
+                            list(value) if isinstance(value, list) else value)
+                self.entries[player] = entry
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def observe(self, player: str, item_index: int, value: int, now: float) -> None:
+        """
+        记录玩家的某一数据条目在 now 时刻（Unix时间，单位：s）变为 value。
+        """
+
+        entry = self.entries.get(player)
+        if entry is None:
+            entry = self.entries[player] = PlayerRateWindow(self.buckets, self.counters, self.gauges, now)
+        # 系统时间被向前调整时，按最近一次变化的时刻计算，以免写入已被覆盖的区间
+        now = max(now, entry.seen)
+        entry.seen = now
+        last = entry.last[item_index]
+        offset = self.positions[item_index] * self.buckets
+        if self.is_counter[item_index]:
+            slot = self.__touch(entry, int(now // self.width))
+            if last is not None:
+                if value >= last:
+                    entry.deltas[offset + slot] += value - last
+                else:
+                    # 值变小说明记分板已被重置，重置后从0开始计数
+                    entry.deltas[offset + slot] += value
+                    entry.resets[offset + slot] += 1
+        else:
+            position = self.positions[item_index]
+            # 先将上次变化以来的值累计到积分中（首个值视为自开始统计时即为该值）
+            self.__integrate(entry, position, value if last is None else last, entry.last_time[position], now)
+            slot = self.__touch(entry, int(now // self.width))
+            if value < entry.mins[offset + slot]:
+                entry.mins[offset + slot] = value
+            if value > entry.maxs[offset + slot]:
+                entry.maxs[offset + slot] = value
+            entry.last_time[position] = now
+        if last is None:
+            entry.missing -= 1
+        entry.last[item_index] = value
+
+
+    def has_baseline(self, player: str) -> bool:
+        """
+        玩家的所有数据条目是否均已有基准值。
+        """
+
+        entry = self.entries.get(player)
+        return entry is not None and entry.missing == 0
+
+
+    def baseline(self, player: str, item_index: int, value: int, now: float) -> None:
+        """
+        玩家的某一数据条目在 now 时刻的值为 value（但未发生变化），若该条目尚无基准值，则以此作为基准值。
+        注：新登记的玩家各数据条目的初始值0只是占位，只有在收到其实际值后（无论是否与0相同）才能作为基准值。
+        """
+
+        entry = self.entries.get(player)
+        if entry is None or entry.last[item_index] is None:
+            self.observe(player, item_index, value, now)
+
+
+    def query(self, player: str, item_indexes: list[int], window: float, now: float) -> tuple[float, dict] | None:
+        """
+        取得玩家在最近 window 秒（按区间对齐，最长为 区间长度 × 区间数）内各数据条目的统计值，
+        返回 (统计的时长, {数据条目名称: 统计值})，若该玩家尚无统计数据则返回 None。
+        累计型条目的统计值为 {delta, rate（平均每秒的增量）, resets}，瞬时值条目的统计值为 {current, min, max, avg}。
+        """
+
+        entry = self.entries.get(player)
+        if entry is None:
+            return None
+        now = max(now, entry.seen)
+        buckets = self.buckets
+        # 先截断到最长的窗口，window 可为 math.inf
+        count = max(int(math.ceil(min(window, self.width * buckets) / self.width)), 1)
+        last_bucket = int(now // self.width)
+        first_bucket = last_bucket - count + 1
+        start = max(first_bucket * self.width, entry.since)
+        span = now - start
+        slots = [bucket % buckets for bucket in range(first_bucket, last_bucket + 1)
+                 if entry.ids[bucket % buckets] == bucket]
+        result = {}
+        for item_index in item_indexes:
+            last = entry.last[item_index]
+            if last is None:
+                continue
+            offset = self.positions[item_index] * buckets
+            if self.is_counter[item_index]:
+                delta = sum(entry.deltas[offset + slot] for slot in slots)
+                result[PLAYER_DATA_ITEMS[item_index]] = {
+                    'delta': delta,
+                    'rate': delta / span if span > 0 else 0.0,
+                    'resets': sum(entry.resets[offset + slot] for slot in slots)
+                }
+            else:
+                position = self.positions[item_index]
+                # 当前值从上次变化起一直保持到现在，同样计入最小值、最大值及积分
+                integral = sum(entry.sums[offset + slot] for slot in slots) + \
+                    last * max(now - max(entry.last_time[position], start), 0.0)
+                result[PLAYER_DATA_ITEMS[item_index]] = {
+                    'current': last,
+                    'min': min(min((entry.mins[offset + slot] for slot in slots), default=last), last),
+                    'max': max(max((entry.maxs[offset + slot] for slot in slots), default=last), last),
+                    'avg': integral / span if span > 0 else float(last)
+                }
+        return span, result
+
+
+    def expire(self, now: float, online: Collection[str]) -> int:
+        """
+        移除离线、且在整个统计窗口内都没有数据变化的玩家的统计数据，返回移除的玩家数。
+        """
+
+        online = set(online)
+        deadline = now - self.width * self.buckets
+        expired = [player for player, entry in self.entries.items() if entry.seen < deadline and player not in online]
+        for player in expired:
+            del self.entries[player]
+        return len(expired)
+
+
+    def __touch(self, entry: PlayerRateWindow, bucket: int) -> int:
+        # 取得区间在环形缓冲区中的位置，若该位置保存的是更早的区间，则先将其清空，
+        # 瞬时值条目的最小值、最大值以区间开始时的值（即当前的值）为初始值
+        slot = bucket % self.buckets
+        if entry.ids[slot] != bucket:
+            entry.ids[slot] = bucket
+            buckets = self.buckets
+            for offset in range(slot, buckets * self.counters, buckets):
+                entry.deltas[offset] = 0
+                entry.resets[offset] = 0
+            for position, item_index in enumerate(self.gauge_indexes):
+                last = entry.last[item_index]
+                offset = position * buckets + slot
+                entry.mins[offset] = RATE_NO_MIN if last is None else last
+                entry.maxs[offset] = RATE_NO_MAX if last is None else last
+                entry.sums[offset] = 0.0
+        return slot
+
+
+    def __integrate(self, entry: PlayerRateWindow, position: int, value: int, start: float, end: float) -> None:
+        # 将 [start, end) 期间保持不变的值 value 按区间累计到积分中（只涉及仍保留在环形缓冲区中的区间）
+        width = self.width
+        last_bucket = int(end // width)
+        offset = position * self.buckets
+        for bucket in range(max(int(start // width), last_bucket - self.buckets + 1), last_bucket + 1):
+            duration = min(end, (bucket + 1) * width) - max(start, bucket * width)
+            if duration > 0:
+                entry.sums[offset + self.__touch(entry, bucket)] += value * duration
+
+
+# 离线玩家数据存档文件的文件名格式，{} 处为文件的代号（每次重写时递增）
+ARCHIVE_FILE_NAME: str = 'players-{}.dat'
+ARCHIVE_FILE_PATTERN: re.Pattern = re.compile(r'players-\d+\.dat(\.tmp)?')
+# 在锁外读取存档时，存档文件恰好被重写（原文件已删除）后重试的次数，仍失败则改为在锁内读取
+ARCHIVE_READ_ATTEMPTS: int = 3
+
+
+# 离线玩家数据的磁盘存档（冷数据表）。
+# 内存中的玩家数超出上限时，最久未活跃的离线玩家的数据（各数据条目的值及版本号）被移出到存档文件中，
+# 需要时再按名称从文件中读取，内存中只保留文件的代号及少量元数据。
+# 存档文件按玩家名称排序且写入后不再修改：首行为JSON格式的文件头，其后依次为各玩家名称的偏移量（'I' 数组）、
+# 玩家名称（UTF-8，每个名称后跟一个换行符，以便连续读取多个名称时一次解码）、各数据条目的值（每个条目一列 'i' 数组）及其版本号（每个条目一列 'Q' 数组），
+# 因此按名称查找只需二分查找，读取任意一段连续的玩家也只需每列读取一次。
+# 移出新的玩家时，将原文件与新移出的玩家合并写入新的文件（代号加1），再删除原文件；
+# 已被移回内存的玩家在下次重写前只在 removed 中记录，读取时跳过。
+# 注：存档中的版本号只在同一数据标识（epoch）下有意义，故插件重启后会丢弃原有的存档；本类自身不加锁，除 write 外的方法均需在锁内调用。
+class PlayerDataArchive(object):
+    def __init__(self, folder: str, epoch: str, old: Any = None):
+        # 存档文件所在的文件夹
+        self.folder: str = folder
+        # 存档所属的数据标识
+        self.epoch: str = epoch
+        # 当前存档文件的代号及路径（尚无存档时为 None）
+        self.generation: int = 0
+        self.path: str | None = None
+        # 存档文件中的玩家数，及文件头的长度
+        self.count: int = 0
+        self.header_size: int = 0
+        # 存档中所有数据的最大版本号，用于快速判断某一版本之后存档中是否有发生变化的数据
+        self.max_version: int = 0
+        # 已被移回内存（但仍在存档文件中）的玩家
+        self.removed: set[str] = set()
+
+        os.makedirs(self.folder, exist_ok=True)
+        # 重新加载插件时，若数据标识不变，则沿用旧实例的存档
+        if old is not None and getattr(old, 'epoch', None) == epoch and getattr(old, 'path', None) is not None \
+                and os.path.isfile(old.path):
+            self.generation = old.generation
+            self.path = old.path
+            self.count = old.count
+            self.header_size = old.header_size
+            self.max_version = old.max_version
+            self.removed = set(old.removed)
+        # 删除不属于当前存档的文件（如插件重启前留下的存档）
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if ARCHIVE_FILE_PATTERN.fullmatch(name) and path != self.path:
+                self.__delete(path)
+
+
+    def __len__(self) -> int:
+        return self.count - len(self.removed)
+
+
+    def __contains__(self, player: str) -> bool:
+        return self.find(player) is not None
+
+
+    def find(self, player: str) -> tuple[list[int], list[int]] | None:
+        """
+        取得存档中某一玩家的 (各数据条目的值, 各数据条目的版本号)，若该玩家不在存档中则返回 None。
+        """
+
+        names, columns, versions = self.find_players([player])
+        if len(names) == 0:
+            return None
+        return [column[0] for column in columns], [column[0] for column in versions]
+
+
+    def find_prefix(self, prefix: str) -> tuple[list[str], list[array], list[array]]:
+        """
+        取得存档中名称以 prefix 开头的所有玩家，返回 (玩家名称, 各数据条目的值的列, 各数据条目的版本号的列)。
+        """
+
+        return self.find_players(prefix)
+
+
+    def find_players(self, players: Collection[str] | str,
+                     state: tuple[str | None, int, int, Collection[str]] | None = None
+                     ) -> tuple[list[str], list[array], list[array]]:
+        """
+        取得存档中的一批玩家（players 为字符串时，取得名称以其开头的所有玩家），返回格式同 find_prefix，
+        按名称排序，不含不在存档中的玩家。只打开一次存档文件，每个玩家二分查找一次。
+        state 为由 state 取得的状态，用于在锁外读取（参见 read_file）；缺省为当前的状态。
+        """
+
+        path, count, header_size, removed = state if state is not None else \
+            (self.path, self.count, self.header_size, self.removed)
+        if path is None:
+            return self.empty()
+        with open(path, 'rb') as f:
+            if isinstance(players, str):
+                start = self.__bisect(f, players, count, header_size)
+                # 以前缀的下一个字符串作为上界（所有以前缀开头的名称均小于它）
+                end = self.__bisect(f, players + '\U0010ffff', count, header_size) if players else count
+                return self.exclude(*self.__read_range(f, start, end, count, header_size), removed)
+            names = []
+            columns = [array('i') for _ in PLAYER_DATA_ITEMS]
+            versions = [array('Q') for _ in PLAYER_DATA_ITEMS]
+            for player in sorted(set(players)):
+                if player in removed:
+                    continue
+                pos = self.__bisect(f, player, count, header_size)
+                if pos >= count or self.__name_at(f, pos, count, header_size) != player:
+                    continue
+                _, found_columns, found_versions = self.__read_range(f, pos, pos + 1, count, header_size)
+                names.append(player)
+                for column, found in zip(columns, found_columns):
+                    column.extend(found)
+                for column, found in zip(versions, found_versions):
+                    column.extend(found)
+        return names, columns, versions
+
+
+    def read_all(self) -> tuple[list[str], list[array], list[array]]:
+        """
+        取得存档中的所有玩家，返回格式同 find_prefix。
+        """
+
+        return self.read_file(self.path, self.count, self.header_size, self.removed)
+
+
+    def read_file(self, path: str | None, count: int, header_size: int,
+                  removed: Collection[str]) -> tuple[list[str], list[array], list[array]]:
+        if path is None:
+            return self.empty()
+        with open(path, 'rb') as f:
+            names, columns, versions = self.__read_range(f, 0, count, count, header_size)
+        return self.exclude(names, columns, versions, removed)
+
+
+    def discard(self, player: str) -> None:
+        """
+        标记某一玩家已被移回内存，此后读取存档时将跳过该玩家。
+        """
+
+        self.removed.add(player)
+
+
+    def write(self, generation: int, base: tuple[str | None, int, int, set[str]],
+              records: list[tuple[str, list[int], list[int]]]) -> tuple[str, int, int, int]:
+        """
+        将原存档文件（base 为调用 state 时取得的状态）与新移出的玩家 records（每项为 (玩家名称, 值, 版本号)）
+        合并写入代号为 generation 的新文件，返回新文件的 (路径, 玩家数, 文件头长度, 最大版本号)。
+        原存档文件写入后不再修改，故本方法可在锁外调用。
+        """
+
+        path, count, header_size, removed = base
+        new_names = {record[0] for record in records}
+        names, columns, versions = self.read_file(path, count, header_size, removed | new_names)
+        # 按名称排序合并后的行：非负数为原存档中的行号，负数 -1-j 为 records 中的第 j 项
+        rows = sorted([(name, i) for i, name in enumerate(names)] +
+                      [(record[0], -1 - j) for j, record in enumerate(records)])
+        encoded_names = [name.encode('utf-8') + b'\n' for name, _ in rows]
+        offsets = array('I', [0])
+        for encoded in encoded_names:
+            offsets.append(offsets[-1] + len(encoded))
+        max_version = 0
+        value_columns = []
+        version_columns = []
+        for item_index in range(len(PLAYER_DATA_ITEMS)):
+            value_columns.append(array('i', (columns[item_index][i] if i >= 0 else records[-1 - i][1][item_index]
+                                             for _, i in rows)))
+            version_column = array('Q', (versions[item_index][i] if i >= 0 else records[-1 - i][2][item_index]
+                                         for _, i in rows))
+            if len(version_column) > 0:
+                max_version = max(max_version, max(version_column))
+            version_columns.append(version_column)
+        header = (json.dumps({
+            'epoch': self.epoch,
+            'items': PLAYER_DATA_ITEMS,
+            'count': len(rows),
+            'max_version': max_version
+        }) + '\n').encode('utf-8')
+        new_path = os.path.join(self.folder, ARCHIVE_FILE_NAME.format(generation))
+        temp_path = new_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(offsets.tobytes())
+            f.write(b''.join(encoded_names))
+            for column in value_columns:
+                f.write(column.tobytes())
+            for column in version_columns:
+                f.write(column.tobytes())
+        os.replace(temp_path, new_path)
+        return new_path, len(rows), len(header), max_version
+
+
+    def state(self) -> tuple[str | None, int, int, set[str]]:
+        """
+        取得当前存档的状态（供 write 在锁外读取原存档文件）。
+        """
+
+        return self.path, self.count, self.header_size, set(self.removed)
+
+
+    def install(self, generation: int, written: tuple[str, int, int, int], base: tuple[str | None, int, int, set[str]],
+                stale: Collection[str]) -> None:
+        """
+        以 write 写入的新文件替换当前的存档文件。stale 为已写入新文件、但在写入期间又被更新而仍留在内存中的玩家。
+        """
+
+        old_path = self.path
+        self.generation = generation
+        self.path, self.count, self.header_size, self.max_version = written
+        # 写入新文件前已被移回内存的玩家不在新文件中，无需再记录；写入期间被移回内存的玩家仍在新文件中
+        self.removed = (self.removed - base[3]) | set(stale)
+        if old_path is not None and old_path != self.path:
+            self.__delete(old_path)
+
+
+    def __bisect(self, f: Any, name: str, count: int, header_size: int) -> int:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__name_at(f, mid, count, header_size) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+    def __name_at(self, f: Any, pos: int, count: int, header_size: int) -> str:
+        offsets = array('I')
+        f.seek(header_size + pos * 4)
+        offsets.frombytes(f.read(8))
+        f.seek(header_size + (count + 1) * 4 + offsets[0])
+        return f.read(offsets[1] - offsets[0] - 1).decode('utf-8')
+
+
+    def __read_range(self, f: Any, start: int, end: int, count: int,
+                     header_size: int) -> tuple[list[str], list[array], list[array]]:
+        size = end - start
+        if size <= 0:
+            return self.empty()
+        offsets = array('I')
+        f.seek(header_size + start * 4)
+        offsets.frombytes(f.read(4))
+        f.seek(header_size + end * 4)
+        offsets.frombytes(f.read(4))
+        f.seek(header_size + (count + 1) * 4 + offsets[0])
+        # 去掉最后一个名称之后的换行符再分割
+        names = f.read(offsets[1] - offsets[0] - 1).decode('utf-8').split('\n')
+        f.seek(0, os.SEEK_END)
+        # 各列位于文件末尾，由文件长度倒推值的列的起始位置
+        values_start = f.tell() - count * 12 * len(PLAYER_DATA_ITEMS)
+        columns = []
+        versions = []
+        for item_index in range(len(PLAYER_DATA_ITEMS)):
+            column = array('i')
+            f.seek(values_start + (item_index * count + start) * 4)
+            column.frombytes(f.read(size * 4))
+            columns.append(column)
+        versions_start = values_start + count * 4 * len(PLAYER_DATA_ITEMS)
+        for item_index in range(len(PLAYER_DATA_ITEMS)):
+            column = array('Q')
+            f.seek(versions_start + (item_index * count + start) * 8)
+            column.frombytes(f.read(size * 8))
+            versions.append(column)
+        return names, columns, versions
+
+
+    @staticmethod
+    def exclude(names: list[str], columns: list[array], versions: list[array],
+                removed: Collection[str]) -> tuple[list[str], list[array], list[array]]:
+        """
+        从读取的玩家中去掉 removed 中的玩家（如已被移回内存的玩家）。
+        """
+
+        if len(removed) == 0:
+            return names, columns, versions
+        keep = [i for i, name in enumerate(names) if name not in removed]
+        if len(keep) == len(names):
+            return names, columns, versions
+        return ([names[i] for i in keep], [array('i', (column[i] for i in keep)) for column in columns],
+                [array('Q', (column[i] for i in keep)) for column in versions])
+
+
+    @staticmethod
+    def empty() -> tuple[list[str], list[array], list[array]]:
+        return [], [array('i') for _ in PLAYER_DATA_ITEMS], [array('Q') for _ in PLAYER_DATA_ITEMS]
+
+
+    @staticmethod
+    def __delete(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            # 文件可能仍被占用（如 Windows 下），留待下次加载时删除
+            pass
+
+
+# 用于记录服务器上玩家数据的存储结构。
+# 以玩家名称到行号（slot）的索引，加上每个数据条目一列的定长整型数组构成，
+# 单个数据的更新为O(1)操作，快照只需复制各数据列，开销很小。
+# 每个数据的值发生变化时，都会为其记录一个递增的版本号，以便查询某一版本之后发生变化的数据。
+# 设置了磁盘存档（archive）时，离线玩家的数据可被移出到存档中，此时 index、names 及各列只包含内存中的玩家，
+# 而按玩家名称查找、快照、变化查询等方法均同时涵盖存档中的玩家，结果与数据全部在内存中时相同。
+# 注：本类自身不加锁，访问前需先获取 player_data_records_lock。
+class PlayerDataStore(object):
+    __slots__ = ('index', 'names', 'columns', 'versions', 'row_versions', 'touched', 'version', 'epoch',
+                 'sorted_names', 'ranks', 'archive', 'rates')
+
+    def __init__(self):
+        # 玩家名称到行号的索引
+        self.index: dict[str, int] = {}
+        # 所有玩家的名称，下标即为行号
+        self.names: list[str] = []
+        # 各数据条目的数据列，顺序与 PLAYER_DATA_ITEMS 一致
+        # 注：记分板数据类型为32位有符号整型，故使用 'i' 类型的数组
+        self.columns: list[array] = [array('i') for _ in PLAYER_DATA_ITEMS]
+        # 各数据最后一次发生变化时的版本号，布局与 columns 相同
+        self.versions: list[array] = [array('Q') for _ in PLAYER_DATA_ITEMS]
+        # 各玩家的数据最后一次发生变化时的版本号（即该行各数据版本号的最大值），用于快速跳过未变化的玩家
+        self.row_versions: array = array('Q')
+        # 各玩家的数据最后一次被写入（或从存档移回内存）的时刻（time.monotonic() 时间），用于选出最久未活跃的玩家
+        self.touched: array = array('d')
+        # 当前的数据版本号，每当有数据发生变化时递增
+        self.version: int = 0
+        # 本存储结构的标识，版本号仅在同一标识下有意义（如插件重启后版本号将从头计数）
+        self.epoch: str = uuid.uuid4().hex
+        # 按名称排序的（内存中的）玩家名称，用于按名称前缀查找玩家（玩家发生增减后，在首次查找时重建）
+        self.sorted_names: list[str] | None = None
+        # 各数据条目的排名索引，键为数据条目在 PLAYER_DATA_ITEMS 中的下标，随数据的更新同步维护
+        # 注：排名索引始终包含所有玩家（包括存档中的玩家），以免排行榜因数据所在的位置而不同
+        self.ranks: dict[int, RankIndex] = {}
+        # 离线玩家数据的磁盘存档，为 None 时所有玩家的数据均保留在内存中
+        self.archive: PlayerDataArchive | None = None
+        # 滑动窗口统计，为 None 时不统计；随数据的更新同步维护
+        self.rates: PlayerRateTracker | None = None
+
+
+    def __len__(self) -> int:
+        return len(self.names) + (len(self.archive) if self.archive is not None else 0)
+
+
+    def __contains__(self, player: str) -> bool:
+        return player in self.index or (self.archive is not None and player in self.archive)
+
+
+    def slot_of(self, player: str) -> int:
+        """
+        取得玩家数据所在的行号，并记录该玩家为最近活跃。
+        若该玩家的数据在存档中，则将其移回内存；若该玩家尚未登记，则为其新增一行（各数据条目初始为0）。
+        """
+
+        slot = self.index.get(player)
+        if slot is None:
+            slot = self.restore(player)
+        if slot is None:
+            # 新增的玩家视为其所有数据均发生了变化
+            self.version += 1
+            slot = self.__append(player, [0] * len(PLAYER_DATA_ITEMS), [self.version] * len(PLAYER_DATA_ITEMS))
+            for rank in self.ranks.values():
+                rank.add(player, 0)
+        self.touched[slot] = time.monotonic()
+        return slot
+
+
+    def restore(self, player: str) -> int | None:
+        """
+        若玩家的数据在存档中，则将其移回内存（数据及版本号保持不变），返回其行号；否则返回 None。
+        """
+
+        if self.archive is None or player in self.index:
+            return self.index.get(player)
+        archived = self.archive.find(player)
+        if archived is None:
+            return None
+        self.archive.discard(player)
+        return self.__append(player, *archived)
+
+
+    def restore_rows(self, archived: tuple[list[str], list[array], list[array]]) -> None:
+        """
+        将在锁外从存档中读取的玩家 archived（格式同 PlayerDataArchive.find_players）移回内存，已在内存中的玩家被忽略。
+        """
+
+        names, columns, versions = archived
+        for i, player in enumerate(names):
+            if player not in self.index:
+                self.archive.discard(player)
+                self.__append(player, [column[i] for column in columns], [column[i] for column in versions])
+
+
+    def __append(self, player: str, values: list[int], versions: list[int]) -> int:
+        slot = len(self.names)
+        self.index[player] = slot
+        self.names.append(player)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        for column, version in zip(self.versions, versions):
+            column.append(version)
+        self.row_versions.append(max(versions))
+        self.touched.append(time.monotonic())
+        self.sorted_names = None
+        return slot
+
+
+    def __remove(self, slot: int) -> None:
+        # 以最后一行填补被移除的行，其余玩家的行号保持不变
+        last = len(self.names) - 1
+        player = self.names[slot]
+        if slot != last:
+            moved = self.names[last]
+            self.names[slot] = moved
+            self.index[moved] = slot
+            for column in (*self.columns, *self.versions, self.row_versions, self.touched):
+                column[slot] = column[last]
+        del self.index[player]
+        self.names.pop()
+        for column in (*self.columns, *self.versions, self.row_versions, self.touched):
+            column.pop()
+        self.sorted_names = None
+
+
+    def enable_ranking(self, item_indexes: list[int]) -> None:
+        """
+        为指定的数据条目建立排名索引，此后随数据的更新同步维护。
+        """
+
+        archived = None
+        for item_index in item_indexes:
+            if item_index in self.ranks:
+                continue
+            if archived is None:
+                archived = self.archive.read_all() if self.archive is not None else ([], [], [])
+            column = self.columns[item_index]
+            keys = [(-column[slot], name) for slot, name in enumerate(self.names)]
+            if len(archived[0]) > 0:
+                keys.extend((-value, name) for name, value in zip(archived[0], archived[1][item_index]))
+            keys.sort()
+            self.ranks[item_index] = RankIndex(keys)
+
+
+    def set(self, player: str, item_index: int, value: int) -> None:
+        """
+        更新玩家的某一数据条目，item_index 为该条目在 PLAYER_DATA_ITEMS 中的下标。
+        """
+
+        slot = self.slot_of(player)
+        column = self.columns[item_index]
+        if column[slot] != value:
+            rank = self.ranks.get(item_index)
+            if rank is not None:
+                rank.update(player, column[slot], value)
+            if self.rates is not None:
+                self.rates.observe(player, item_index, value, time.time())
+            column[slot] = value
+            self.version += 1
+            self.versions[item_index][slot] = self.version
+            self.row_versions[slot] = self.version
+        elif self.rates is not None:
+            self.rates.baseline(player, item_index, value, time.time())
+
+
+    def set_row(self, player: str, row: dict[str, int]) -> None:
+        """
+        批量更新玩家的多个数据条目，row 的键为数据条目名称（不含'msm_'前缀），值须为整型，不在 PLAYER_DATA_ITEMS 中的键将被忽略。
+        """
+
+        slot = self.slot_of(player)
+        changed = False
+        ranks = self.ranks
+        rates = self.rates
+        now = time.time() if rates is not None else 0.0
+        # 只有尚未取得所有数据条目的基准值时，才需为未变化的数据条目设置基准值
+        baseline = rates is not None and not rates.has_baseline(player)
+        for item_index, (item, column, versions) in enumerate(zip(PLAYER_DATA_ITEMS, self.columns, self.versions)):
+            value = row.get(item)
+            if value is None:
+                continue
+            if column[slot] != value:
+                if not changed:
+                    # 同一行内的所有变化共用一个版本号
+                    self.version += 1
+                    changed = True
+                if item_index in ranks:
+                    ranks[item_index].update(player, column[slot], value)
+                if rates is not None:
+                    rates.observe(player, item_index, value, now)
+                column[slot] = value
+                versions[slot] = self.version
+            elif baseline:
+                rates.baseline(player, item_index, value, now)
+        if changed:
+            self.row_versions[slot] = self.version
+
+
+    def row_version(self, player: str) -> int:
+        """
+        取得玩家的数据最后一次发生变化时的版本号，若该玩家尚未登记则返回0。
+        """
+
+        slot = self.index.get(player)
+        if slot is not None:
+            return self.row_versions[slot]
+        archived = self.archive.find(player) if self.archive is not None else None
+        return 0 if archived is None else max(archived[1])
+
+
+    def get_row(self, player: str) -> dict[str, int] | None:
+        """
+        取得玩家的所有数据条目，若该玩家尚未登记则返回 None。
+        """
+
+        slot = self.index.get(player)
+        if slot is not None:
+            return {item: column[slot] for item, column in zip(PLAYER_DATA_ITEMS, self.columns)}
+        # 从存档中读取，但不将其移回内存
+        archived = self.archive.find(player) if self.archive is not None else None
+        return None if archived is None else dict(zip(PLAYER_DATA_ITEMS, archived[0]))
+
+
+    def slots_with_prefix(self, prefix: str) -> list[int]:
+        """
+        取得名称以 prefix 开头的所有（内存中的）玩家的行号。借助按名称排序的索引查找，开销与结果的数量成正比。
+        """
+
+        if self.sorted_names is None:
+            self.sorted_names = sorted(self.names)
+        sorted_names = self.sorted_names
+        result = []
+        for i in range(bisect.bisect_left(sorted_names, prefix), len(sorted_names)):
+            name = sorted_names[i]
+            if not name.startswith(prefix):
+                break
+            result.append(self.index[name])
+        return result
+
+
+    def snapshot(self, include_archive: bool = True) -> PlayerDataSnapshot:
+        """
+        取得当前所有玩家数据的快照（存档中的玩家排在内存中的玩家之后）。快照与本存储结构互不影响，可在锁外使用。
+        include_archive 为 False 时只包含内存中的玩家，存档可由 archive_state 取得状态后在锁外读取（参见 snapshot_player_data）。
+        """
+
+        snapshot = PlayerDataSnapshot(list(self.names), [array('i', column) for column in self.columns], self.version)
+        if include_archive and self.archive is not None and len(self.archive) > 0:
+            archived_names, archived_columns, _ = self.archive.read_all()
+            snapshot.extend(archived_names, archived_columns)
+        return snapshot
+
+
+    def archive_state(self, since_version: int = -1) -> tuple[str | None, int, int, Collection[str]] | None:
+        """
+        取得在锁外读取存档（PlayerDataArchive.read_file）所需的状态；存档为空，或存档中没有版本号 since_version 之后的数据时返回 None。
+        存档文件写入后不再修改，但重写后原文件将被删除，锁外读取时需处理 FileNotFoundError。
+        """
+
+        if self.archive is None or len(self.archive) == 0 or self.archive.max_version <= since_version:
+            return None
+        return self.archive.state()
+
+
+    @staticmethod
+    def archived_changes(archived: tuple[list[str], list[array], list[array]], version: int,
+                         item_indexes: list[int]) -> list[tuple[str, int, int]]:
+        """
+        取得从存档中读取的数据 archived 中版本号 version 之后发生变化的数据，格式同 changes_since。
+        """
+
+        result = []
+        names, columns, versions = archived
+        for i, name in enumerate(names):
+            for item_index in item_indexes:
+                if versions[item_index][i] > version:
+                    result.append((name, item_index, columns[item_index][i]))
+        return result
+
+
+    def changes_since(self, version: int, item_indexes: list[int],
+                      include_archive: bool = True) -> list[tuple[str, int, int]]:
+        """
+        取得版本号 version 之后发生变化的数据，仅包含 item_indexes 所指定的数据条目。
+        返回的每项为 (玩家名称, 数据条目下标, 当前值)。include_archive 为 False 时只包含内存中的玩家。
+        """
+
+        result = []
+        row_versions = self.row_versions
+        for slot, name in enumerate(self.names):
+            if row_versions[slot] <= version:
+                continue
+            for item_index in item_indexes:
+                if self.versions[item_index][slot] > version:
+                    result.append((name, item_index, self.columns[item_index][slot]))
+        # 存档中的数据不再变化，只有在其最大版本号大于 version 时（如订阅者重新获取全部数据时）才需读取存档
+        if include_archive and self.archive_state(version) is not None:
+            result.extend(self.archived_changes(self.archive.read_all(), version, item_indexes))
+        return result
+
+
+    def plan_eviction(self, limit: int, online: Collection[str]) -> list[tuple[str, list[int], list[int]]]:
+        """
+        内存中的玩家数超出 limit 时，按最后活跃的时刻从早到晚选出需移出到存档的离线玩家，
+        直至剩余的玩家数降到 limit 的90%（以免每轮轮询都要重写存档）。返回各玩家的 (玩家名称, 值, 版本号)。
+        """
+
+        if self.archive is None or limit <= 0 or len(self.names) <= limit:
+            return []
+        online = set(online)
+        candidates = sorted((self.touched[slot], slot) for slot, name in enumerate(self.names) if name not in online)
+        count = len(self.names) - (limit - limit // 10)
+        return [(self.names[slot], [column[slot] for column in self.columns], [column[slot] for column in self.versions])
+                for _, slot in candidates[:count]]
+
+
+    def evict(self, records: list[tuple[str, list[int], list[int]]], online: Collection[str]) -> list[str]:
+        """
+        将 plan_eviction 选出、且已写入存档的玩家从内存中移除。
+        返回在写入存档期间数据又发生变化（或重新加入游戏）而需留在内存中的玩家，存档中这些玩家的数据已过时。
+        """
+
+        online = set(online)
+        stale = []
+        for player, values, versions in records:
+            slot = self.index.get(player)
+            if slot is None:
+                continue
+            if player in online or any(column[slot] != version for column, version in zip(self.versions, versions)):
+                stale.append(player)
+            else:
+                self.__remove(slot)
+        # 字典及数组在移除元素后不会释放已分配的空间，需复制一份以释放内存
+        self.index = dict(self.index)
+        self.names = list(self.names)
+        self.columns = [array('i', column) for column in self.columns]
+        self.versions = [array('Q', column) for column in self.versions]
+        self.row_versions = array('Q', self.row_versions)
+        self.touched = array('d', self.touched)
+        return stale
+
+
+    @staticmethod
+    def migrate(old_records: Any, old_items: Any = None) -> 'PlayerDataStore':
+        """
+        将旧版本插件中的玩家数据（PlayerDataStore，或旧版本中以玩家名称为键、PlayerData 对象为值的字典）转换为当前版本的存储结构。
+        old_items 为旧版本插件的 PLAYER_DATA_ITEMS。
+        """
+
+        store = PlayerDataStore()
+        if hasattr(old_records, 'columns') and hasattr(old_records, 'versions') \
+                and old_items is not None and list(old_items) == PLAYER_DATA_ITEMS:
+            # 数据条目未发生变化时，直接复制各数据列，并保留版本号及存储结构的标识，
+            # 以便订阅者重新连接后只需获取增量数据
+            store.index = dict(old_records.index)
+            store.names = list(old_records.names)
+            store.columns = [array('i', column) for column in old_records.columns]
+            store.versions = [array('Q', column) for column in old_records.versions]
+            store.row_versions = array('Q', old_records.row_versions)
+            store.touched = array('d', old_records.touched) if hasattr(old_records, 'touched') \
+                else array('d', [time.monotonic()] * len(store.names))
+            store.version = old_records.version
+            store.epoch = old_records.epoch
+        elif isinstance(old_records, dict):
+            for player, data in old_records.items():
+                store.set_row(player, {item: getattr(data, item, 0) for item in PLAYER_DATA_ITEMS})
+        elif hasattr(old_records, 'snapshot'):
+            for player, values in old_records.snapshot().rows():
+                store.set_row(player, dict(zip(PLAYER_DATA_ITEMS, values)))
+        return store
+
+
+# 查询条件中的比较运算符
+QUERY_OPERATORS: dict[str, Callable[[int, int], bool]] = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le
+}
+# 查询条件的格式，如 'deathCount > 10'
+QUERY_PREDICATE_PATTERN: re.Pattern = re.compile(r'\s*(\w+)\s*(==|!=|>=|<=|>|<)\s*(-?\d+)\s*')
+
+
+# 对玩家数据的按条件查询（query_players_data 指令），由请求参数解析而来。
+# 先由玩家名称列表、名称模式或在线玩家列表中最具选择性的一项确定候选玩家（均可借助索引查找），
+# 再逐项以数值条件筛选，因此开销与候选玩家的数量成正比，而与玩家总数无关。
+class PlayerDataQuery(object):
+    def __init__(self, players: list[str] | None, pattern: str | None, item_indexes: list[int], online_only: bool,
+                 predicates: list[tuple[int, Callable[[int, int], bool], int]]):
+        # 只查询其中列出的玩家，为 None 时不限
+        self.players: list[str] | None = players
+        # 玩家名称需匹配的通配符模式（'*'、'?'、'[...]'），为 None 时不限
+        self.pattern: str | None = pattern
+        self.pattern_regex: re.Pattern | None = re.compile(fnmatch.translate(pattern)) if pattern is not None else None
+        # 模式中第一个通配符之前的部分，用于按名称前缀查找
+        self.pattern_prefix: str = re.split(r'[*?\[]', pattern, maxsplit=1)[0] if pattern is not None else ''
+        # 返回的数据条目在 PLAYER_DATA_ITEMS 中的下标
+        self.item_indexes: list[int] = item_indexes
+        # 是否只查询在线玩家
+        self.online_only: bool = online_only
+        # 数值条件：(数据条目下标, 比较运算, 比较的值)，须全部满足
+        self.predicates: list[tuple[int, Callable[[int, int], bool], int]] = predicates
+
+
+    @staticmethod
+    def parse(arguments: dict) -> 'PlayerDataQuery':
+        """
+        由 query_players_data 指令的参数构造查询，参数有误时抛出 ValueError。
+        """
+
+        players = arguments.get('players')
+        if players is not None and (not isinstance(players, list) or not all(isinstance(p, str) for p in players)):
+            raise ValueError('players must be a list of player names')
+        pattern = arguments.get('pattern')
+        if pattern is not None and not isinstance(pattern, str):
+            raise ValueError('pattern must be a string')
+        metrics = arguments.get('metrics') or PLAYER_DATA_ITEMS
+        if not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics):
+            raise ValueError('metrics must be a list of metric names')
+        unknown = [item for item in metrics if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            raise ValueError(f'Unknown metrics: {", ".join(unknown)}')
+        where = arguments.get('where') or []
+        if not isinstance(where, list):
+            raise ValueError('where must be a list of conditions')
+        predicates = []
+        for predicate in where:
+            match = QUERY_PREDICATE_PATTERN.fullmatch(predicate) if isinstance(predicate, str) else None
+            if match is None or match[1] not in PLAYER_DATA_ITEM_INDEX:
+                raise ValueError(f'Invalid condition: {predicate}')
+            predicates.append((PLAYER_DATA_ITEM_INDEX[match[1]], QUERY_OPERATORS[match[2]], int(match[3])))
+        return PlayerDataQuery(players, pattern, [PLAYER_DATA_ITEM_INDEX[item] for item in metrics],
+                               bool(arguments.get('online_only', False)), predicates)
+
+
+    def archive_candidates(self, store: PlayerDataStore, online: Collection[str]) -> list[str] | str:
+        """
+        取得需从存档中读取的候选玩家：玩家名称列表，或名称前缀（读取名称以其开头的所有玩家，可为空字符串）。
+        可在锁内取得后，在锁外以 PlayerDataArchive.find_players 读取，再传给 select。
+        注：调用前需先获取 player_data_records_lock。
+        """
 
-    # -----
-    # 下列记分项游戏不会自动更新，需通过监听游戏状态进行手动更新。
-    # -----
+        index = store.index
+        if self.players is not None:
+            players = list(dict.fromkeys(self.players))
+            if self.online_only:
+                online = set(online)
+                players = [player for player in players if player in online]
+            return [player for player in players if player not in index]
+        if self.online_only:
+            return [player for player in online if player not in index]
+        return self.pattern_prefix
 
-    # 放置方块数
-    'placeBlockCount',
-    # 破坏方块数
-    'breakBlockCount',
-    # 在线时长（以游戏刻为单位）
-    # 注：受限于记分板数据类型（32位有符号整型），上限值为2,147,483,647，
-    # 也就是最多只能记录约1242.76天的时长。
-    'onlineTime'
-]
 
+    def select(self, store: PlayerDataStore, online: Collection[str],
+               archived: tuple[list[str], list[array], list[array]] | None = None
+               ) -> tuple[list[int], list[tuple[str, list[int]]]]:
+        """
+        取得满足查询条件的玩家。online 为当前在线的玩家；archived 为在锁外读取的存档中的候选玩家（参见 archive_candidates），
+        为 None 时在此从存档中读取。
+        返回 (内存中的玩家在 store 中的行号（按行号排序）, 存档中的玩家的 (玩家名称, 各数据条目的值) 列表)。
+        注：调用前需先获取 player_data_records_lock。
+        """
 
-# 服务器上的玩家数据
-class PlayerData(object):
-    def __init__(self):
-        # 玩家名称
-        self.name: str = ''
-
-        # -----
-        # 下列记分项为游戏自动更新。
-        # -----
-
-        # 死亡数
-        self.deathCount: int = 0
-        # 击杀玩家数
-        self.playerKillCount: int = 0
-        # 击杀数（包括玩家和生物）
-        self.totalKillCount: int = 0
-        # 生命值（包括伤害吸收值）【只读】
-        self.health: int = 0
-        # 经验值【只读】
-        self.xp: int = 0
-        # 等级【只读】
-        self.level: int = 0
-        # 饥饿值【只读】
-        self.food: int = 0
-        # 空气值【只读】
-        self.air: int = 0
-        # 护甲值【只读】
-        self.armor: int = 0
-
-        # -----
-        # 下列记分项游戏不会自动更新，需通过监听游戏状态进行手动更新。
-        # -----
-
-        # 放置方块数
-        self.placeBlockCount: int = 0
-        # 破坏方块数
-        self.breakBlockCount: int = 0
-        # 在线时长（以游戏刻为单位）
-        # 注：受限于记分板数据类型（32位有符号整型），上限值为2,147,483,647，
-        # 也就是最多只能记录约1242.76天的时长。
-        self.onlineTime: int = 0
-
-
-# 用于时刻同步MC服务器数据的线程
-class ServerMonitorThread(threading.Thread):
-    def __init__(self, interval: int):
-        super().__init__()
-        self.name = 'ServerMonitorThread'
-        self.stop_event = threading.Event()
-        self.daemon = False # 本线程不是守护线程，以确保对于服务器数据同步的完整性
+        index = store.index
+        names = store.names
+        # 确定候选玩家：依次取玩家名称列表、在线玩家列表（在线玩家通常只占所记录玩家的一小部分）、名称前缀范围
+        if self.players is not None:
+            players = list(dict.fromkeys(self.players))
+            if self.online_only:
+                online = set(online)
+                players = [player for player in players if player in online]
+            slots = [index[player] for player in players if player in index]
+        elif self.online_only:
+            slots = [index[player] for player in online if player in index]
+        elif self.pattern_prefix:
+            slots = store.slots_with_prefix(self.pattern_prefix)
+        else:
+            slots = range(len(names))
+        # 存档中的候选玩家，以 (玩家名称, 各数据条目的值的列) 表示
+        if archived is None:
+            if store.archive is not None and len(store.archive) > 0:
+                archived = store.archive.find_players(self.archive_candidates(store, online))
+            else:
+                archived = PlayerDataArchive.empty()
+        else:
+            # 读取之后已被移回内存的玩家，以内存中的数据为准
+            archived = PlayerDataArchive.exclude(*archived, index)
+        archived_names, archived_columns, _ = archived
+        archived = range(len(archived_names))
+        if self.pattern_regex is not None:
+            regex = self.pattern_regex
+            slots = [slot for slot in slots if regex.match(names[slot])]
+            archived = [i for i in archived if regex.match(archived_names[i])]
+        # 逐项以数值条件筛选
+        for item_index, compare, value in self.predicates:
+            column = store.columns[item_index]
+            slots = [slot for slot in slots if compare(column[slot], value)]
+            column = archived_columns[item_index]
+            archived = [i for i in archived if compare(column[i], value)]
+        return sorted(slots), [(archived_names[i], [column[i] for column in archived_columns]) for i in archived]
+
+
+# 玩家数据历史记录中每条记录的格式：时间戳（Unix时间，单位：s），玩家ID与数据条目下标的组合键，数据的值
+HISTORY_RECORD_STRUCT: struct.Struct = struct.Struct('<IIi')
+# 组合键中数据条目下标所占的位数（组合键 = 玩家ID << HISTORY_ITEM_BITS | 数据条目下标）
+HISTORY_ITEM_BITS: int = 4
+# 每天的历史记录按玩家ID划分的分片数，查询少数玩家时只需读取其所在的分片
+HISTORY_SHARDS: int = 8
+
+
+# 玩家数据的历史记录存储。
+# 以追加写入的方式，将玩家数据的变化按定长记录写入按天（UTC）及玩家ID分片划分的分段文件（<YYYYMMDD>-<分片>.seg），
+# 每个分段文件以一份所有数据的完整记录（关键帧）开头，其后只记录发生变化的数据。
+# 读取时以内存映射的方式打开分段文件，并按时间戳二分查找查询范围。
+# 玩家名称与玩家ID的对应关系记录在 players.txt 中（第N行的玩家名称即对应ID为N的玩家）。
+class PlayerHistoryStore(object):
+    def __init__(self, folder: str, fsync_interval: int):
+        # 历史记录所在的文件夹
+        self.folder: str = folder
+        # 两次将数据同步到磁盘（fsync）之间的最小间隔（s）
+        self.fsync_interval: float = float(fsync_interval if fsync_interval > 0 else 5000) / 1000.0
+        self.lock = threading.Lock()
+        # 玩家名称与玩家ID的对应关系
+        self.player_ids: dict[str, int] = {}
+        self.player_names: list[str] = []
+        # 当前正在写入的各分片的分段文件，及其对应的日期
+        self.segment_files: list[Any] = [None] * HISTORY_SHARDS
+        self.segment_day: str = ''
+        # 玩家列表文件
+        self.players_file: Any = None
+        # 已写入历史记录的数据版本号（及对应的数据标识）
+        self.version: int = 0
+        self.epoch: str = ''
+        # 上次 fsync 的时刻（time.monotonic() 时间）
+        self.last_fsync: float = 0.0
+        # 是否已关闭（插件卸载时，线程池中可能仍有未完成的查询）
+        self.closed: bool = False
+
+        os.makedirs(self.folder, exist_ok=True)
+        players_path = os.path.join(self.folder, 'players.txt')
+        if os.path.isfile(players_path):
+            with open(players_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    name = line.rstrip('\n')
+                    if len(name) > 0:
+                        self.player_ids[name] = len(self.player_names)
+                        self.player_names.append(name)
+        self.players_file = open(players_path, 'a', encoding='utf-8')
+
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.__sync()
+            self.__close_segments()
+            self.players_file.close()
+
+
+    def known_players(self) -> list[str]:
+        """
+        取得历史记录中出现过的所有玩家（插件重启后仍保留在磁盘上）。
+        """
+
+        with self.lock:
+            return list(self.player_names)
+
+
+    def record(self, timestamp: int) -> int:
+        """
+        将玩家数据中自上次记录以来发生变化的数据追加到历史记录中，返回写入的记录数。
+        """
+
+        day = time.strftime('%Y%m%d', time.gmtime(timestamp))
+        with self.lock:
+            if self.closed:
+                return 0
+            # 访问player_data_records前先加锁
+            with player_data_records_lock:
+                epoch = player_data_records.epoch
+            # 进入新的一天（或首次写入、数据被重置）时，需写入所有数据作为新分段的关键帧（存档在锁外读取）
+            since = self.version if day == self.segment_day and epoch == self.epoch else 0
+            changes, self.version, self.epoch = player_data_changes_since(since, ALL_ITEM_INDEXES)
+            if day != self.segment_day:
+                self.__sync()
+                self.__close_segments()
+                self.segment_files = [open(self.__segment_path(day, shard), 'ab') for shard in range(HISTORY_SHARDS)]
+                self.segment_day = day
+            if len(changes) == 0:
+                return 0
+            buffers = [bytearray() for _ in range(HISTORY_SHARDS)]
+            for player, item_index, value in changes:
+                player_id = self.__player_id(player)
+                buffers[player_id % HISTORY_SHARDS] += HISTORY_RECORD_STRUCT.pack(
+                    timestamp, (player_id << HISTORY_ITEM_BITS) | item_index, value)
+            for segment_file, buffer in zip(self.segment_files, buffers):
+                if len(buffer) > 0:
+                    segment_file.write(buffer)
+            # 批量同步到磁盘，避免每次写入都进行 fsync
+            if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                self.__sync()
+            return len(changes)
+
+
+    def __player_id(self, player: str) -> int:
+        player_id = self.player_ids.get(player)
+        if player_id is None:
+            player_id = len(self.player_names)
+            self.player_ids[player] = player_id
+            self.player_names.append(player)
+            self.players_file.write(player + '\n')
+        return player_id
+
+
+    def __segment_path(self, day: str, shard: int) -> str:
+        return os.path.join(self.folder, '%s-%d.seg' % (day, shard))
+
+
+    def __close_segments(self) -> None:
+        for segment_file in self.segment_files:
+            if segment_file is not None:
+                segment_file.close()
+        self.segment_files = [None] * HISTORY_SHARDS
+
+
+    def __sync(self) -> None:
+        self.players_file.flush()
+        os.fsync(self.players_file.fileno())
+        for segment_file in self.segment_files:
+            if segment_file is not None:
+                segment_file.flush()
+                os.fsync(segment_file.fileno())
+        self.last_fsync = time.monotonic()
+
+
+    def query(self, players: list[str] | None, items: list[str] | None,
+              start: int, end: int, step: int, max_points: int = 0) -> list[dict]:
+        """
+        查询时间范围 [start, end]（Unix时间，单位：s）内指定玩家（None 为全部玩家）的指定数据条目（None 为全部条目）的历史记录。
+        每个玩家的每个数据条目对应一个序列，序列的第一个点为 start 时刻（所在分段内）已知的值。
+        step 大于0时，在服务器端降采样：以 step 秒为一个区间，每个区间只保留区间内最后的值（无变化的区间沿用之前的值）。
+        不降采样时，若读取到的点数超过 max_points（大于0时），抛出 ValueError；存储已关闭时同样抛出 ValueError。
+        """
+
+        item_indexes = ALL_ITEM_INDEXES if items is None else [PLAYER_DATA_ITEM_INDEX[item] for item in items]
+        with self.lock:
+            if self.closed:
+                raise ValueError('History store is closed')
+            # 先将缓冲区中的数据写入文件，以便内存映射时能读取到
+            for segment_file in self.segment_files:
+                if segment_file is not None:
+                    segment_file.flush()
+            if players is None:
+                player_ids = range(len(self.player_names))
+            else:
+                player_ids = [self.player_ids[player] for player in players if player in self.player_ids]
+            names = list(self.player_names)
+        keys = {(player_id << HISTORY_ITEM_BITS) | item_index for player_id in player_ids for item_index in item_indexes}
+        shards = sorted({player_id % HISTORY_SHARDS for player_id in player_ids})
+        # 各序列，键为组合键，值为 [(时间戳, 值), ...]
+        series: dict[int, list[tuple[int, int]]] = {}
+        days = self.__days_between(start, end)
+        for shard in shards:
+            first = True
+            for day in days:
+                path = self.__segment_path(day, shard)
+                if not os.path.isfile(path) or os.path.getsize(path) < HISTORY_RECORD_STRUCT.size:
+                    continue
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    self.__scan_segment(mm, keys, start, end, series, first)
+                first = False
+                # 不降采样时逐个分段检查点数，避免读取过多的记录
+                if step == 0 and max_points > 0 and sum(len(points) for points in series.values()) > max_points:
+                    raise ValueError(f'Too many points (more than {max_points}), narrow the range or use step')
+        result = []
+        for key, points in series.items():
+            result.append({
+                'name': names[key >> HISTORY_ITEM_BITS],
+                'type': PLAYER_DATA_ITEMS[key & ((1 << HISTORY_ITEM_BITS) - 1)],
+                'points': self.__downsample(points, start, end, step) if step > 0 else points
+            })
+        return result
+
+
+    @staticmethod
+    def __scan_segment(mm: mmap.mmap, keys: set[int], start: int, end: int,
+                       series: dict[int, list[tuple[int, int]]], first: bool) -> None:
+        size = HISTORY_RECORD_STRUCT.size
+        count = len(mm) // size
+        timestamp_at = lambda i: HISTORY_RECORD_STRUCT.unpack_from(mm, i * size)[0]
+        hi = bisect.bisect_right(range(count), end, key=timestamp_at)
+        # 在第一个分段中，取得各序列在 start 时刻已知的值（包括恰好在 start 时刻的变化）作为序列的起点，
+        # 以免同一序列在 start 时刻出现两个点
+        if first:
+            lo = bisect.bisect_right(range(count), start, key=timestamp_at)
+            initial: dict[int, int] = {}
+            for timestamp, key, value in HISTORY_RECORD_STRUCT.iter_unpack(mm[:lo * size]):
+                if key in keys:
+                    initial[key] = value
+            for key, value in initial.items():
+                series[key] = [(start, value)]
+        else:
+            lo = bisect.bisect_left(range(count), start, key=timestamp_at)
+        for timestamp, key, value in HISTORY_RECORD_STRUCT.iter_unpack(mm[lo * size:hi * size]):
+            if key in keys:
+                points = series.get(key)
+                if points is None:
+                    series[key] = [(timestamp, value)]
+                else:
+                    points.append((timestamp, value))
+
+
+    @staticmethod
+    def __downsample(points: list[tuple[int, int]], start: int, end: int, step: int) -> list[tuple[int, int]]:
+        result = []
+        i = 0
+        value = None
+        for bucket_start in range(start, end + 1, step):
+            # 取区间内最后的值
+            while i < len(points) and points[i][0] < bucket_start + step:
+                value = points[i][1]
+                i += 1
+            if value is not None:
+                result.append((bucket_start, value))
+        return result
+
+
+    def __days_between(self, start: int, end: int) -> list[str]:
+        # 分段文件以UTC日期命名，按名称即可筛选出与时间范围有交集的分段
+        first = time.strftime('%Y%m%d', time.gmtime(start))
+        last = time.strftime('%Y%m%d', time.gmtime(end))
+        days = set()
+        for name in os.listdir(self.folder):
+            if name.endswith('.seg') and first <= name[:8] <= last:
+                days.add(name[:8])
+        return sorted(days)
+
+
+# SNBT（字符串形式的NBT）中数值类型的后缀
+SNBT_NUMBER_SUFFIXES: str = 'bBsSlLfFdD'
+
+
+def parse_snbt(text: str) -> object:
+    """
+    解析MC服务器输出的SNBT文本（如 data get storage 命令的输出），将其转换为对应的Python对象。
+    复合标签转换为字典，列表及数组转换为列表，数值转换为 int 或 float，字符串保持为 str。
+    """
+
+    value, pos = _parse_snbt_value(text, _skip_snbt_spaces(text, 0))
+    if _skip_snbt_spaces(text, pos) != len(text):
+        raise ValueError(f'Unexpected trailing data at position {pos} of SNBT text')
+    return value
+
+
+def _skip_snbt_spaces(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos].isspace():
+        pos += 1
+    return pos
+
+
+def _parse_snbt_value(text: str, pos: int) -> tuple[object, int]:
+    if pos >= len(text):
+        raise ValueError('Unexpected end of SNBT text')
+    ch = text[pos]
+    # 复合标签
+    if ch == '{':
+        result = {}
+        pos = _skip_snbt_spaces(text, pos + 1)
+        if text[pos] == '}':
+            return result, pos + 1
+        while True:
+            key, pos = _parse_snbt_string(text, _skip_snbt_spaces(text, pos))
+            pos = _skip_snbt_spaces(text, pos)
+            if text[pos] != ':':
+                raise ValueError(f'Expected \':\' at position {pos} of SNBT text')
+            result[key], pos = _parse_snbt_value(text, _skip_snbt_spaces(text, pos + 1))
+            pos = _skip_snbt_spaces(text, pos)
+            if text[pos] == '}':
+                return result, pos + 1
+            if text[pos] != ',':
+                raise ValueError(f'Expected \',\' or \'}}\' at position {pos} of SNBT text')
+            pos += 1
+    # 列表或数组（数组形如 [I; 1, 2, 3]）
+    if ch == '[':
+        result = []
+        pos = _skip_snbt_spaces(text, pos + 1)
+        if text[pos:pos + 2] in ('B;', 'I;', 'L;'):
+            pos = _skip_snbt_spaces(text, pos + 2)
+        if text[pos] == ']':
+            return result, pos + 1
+        while True:
+            item, pos = _parse_snbt_value(text, _skip_snbt_spaces(text, pos))
+            result.append(item)
+            pos = _skip_snbt_spaces(text, pos)
+            if text[pos] == ']':
+                return result, pos + 1
+            if text[pos] != ',':
+                raise ValueError(f'Expected \',\' or \']\' at position {pos} of SNBT text')
+            pos += 1
+    # 字符串或数值
+    token, end = _parse_snbt_string(text, pos)
+    if ch in '"\'':
+        return token, end
+    if len(token) > 1 and token[-1] in SNBT_NUMBER_SUFFIXES:
+        number = token[:-1]
+    else:
+        number = token
+    try:
+        return int(number), end
+    except ValueError:
+        pass
+    try:
+        return float(number), end
+    except ValueError:
+        pass
+    # 无法解析为数值，则视为不带引号的字符串
+    return token, end
+
+
+def _parse_snbt_string(text: str, pos: int) -> tuple[str, int]:
+    quote = text[pos]
+    # 带引号的字符串，处理其中的转义字符
+    if quote in '"\'':
+        chars = []
+        pos += 1
+        while text[pos] != quote:
+            if text[pos] == '\\':
+                pos += 1
+            chars.append(text[pos])
+            pos += 1
+        return ''.join(chars), pos + 1
+    # 不带引号的字符串，一直读取到分隔符为止
+    end = pos
+    while end < len(text) and (text[end].isalnum() or text[end] in '_-.+'):
+        end += 1
+    if end == pos:
+        raise ValueError(f'Unexpected character \'{text[pos]}\' at position {pos} of SNBT text')
+    return text[pos:end], end
+
+
+# 控制台输出的类别：未携带关联ID的MC函数执行结果（Function X returned N）
+CONSOLE_LINE_FUNCTION_RESULT: str = 'function_result'
+# 控制台输出的类别：逐条查询的结果（data get storage msm:results pending 命令的输出）
+CONSOLE_LINE_QUERY_RESULTS: str = 'query_results'
+# 控制台输出的类别：批量采集的结果（data get storage msm:collect result 命令的输出）
+CONSOLE_LINE_COLLECT_RESULT: str = 'collect_result'
+# 控制台输出的类别：在线玩家列表（list 命令的输出）
+CONSOLE_LINE_PLAYER_LIST: str = 'player_list'
+
+
+# 只读的空列表，作为 ConsoleLine 中列表字段的缺省值，避免为每行输出都创建新的空列表
+EMPTY_LIST: list = []
+
+
+# 经过分类与解析的一行控制台输出
+class ConsoleLine(object):
+    __slots__ = ('kind', 'func', 'value', 'request_id', 'results', 'rows', 'players')
+
+    def __init__(self, kind: str):
+        # 本行输出的类别，为 CONSOLE_LINE_* 之一
+        self.kind: str = kind
+        # MC函数名称及其返回值（仅 CONSOLE_LINE_FUNCTION_RESULT）
+        self.func: str = ''
+        self.value: int = 0
+        # 关联ID（仅 CONSOLE_LINE_COLLECT_RESULT）
+        self.request_id: int = 0
+        # 各条查询结果，每项为 (关联ID, 查询结果)（仅 CONSOLE_LINE_QUERY_RESULTS）
+        self.results: list[tuple[int, int]] = EMPTY_LIST
+        # 各玩家的数据，每项为以数据条目名称为键的字典（仅 CONSOLE_LINE_COLLECT_RESULT）
+        self.rows: list[dict] = EMPTY_LIST
+        # 在线玩家的名称（仅 CONSOLE_LINE_PLAYER_LIST）
+        self.players: list[str] = EMPTY_LIST
+
+
+# 控制台输出的分类器，用于从MC服务器的大量控制台输出中快速识别并解析本插件关心的输出。
+# 先以 str.startswith 进行前缀预筛选，与本插件无关的输出（聊天、存档、命令回显等）无需经过正则表达式引擎。
+class ConsoleLineClassifier(object):
+    # 所有需要关注的输出的共同前缀，用于预筛选
+    PREFIXES: tuple[str, ...] = ('Function ', 'Storage msm:', 'There are ')
+    # 逐条查询结果的前缀
+    RESULTS_PREFIX: str = 'Storage msm:results has the following contents: '
+    # 批量采集结果的前缀
+    COLLECT_RESULT_PREFIX: str = 'Storage msm:collect has the following contents: '
+    # MC函数执行结果
+    FUNCTION_RESULT_PATTERN: re.Pattern = re.compile(r'Function ([:\w/.-]+) returned (-?\d+)')
+    # 逐条查询结果中的一项，形如 {id: 1, value: 20}（两个键的先后顺序不固定）
+    RESULT_ENTRY_PATTERN: re.Pattern = re.compile(r'\{(\w+): (-?\d+), (\w+): (-?\d+)\}')
+    # 批量采集结果中的关联ID，形如 {id: 1, players: [...]}
+    COLLECT_ID_PATTERN: re.Pattern = re.compile(r'[{,] ?id: (-?\d+)')
+    # 批量采集结果中单个玩家的数据，形如 {name: "Steve", deathCount: 0, ...}
+    COLLECT_ROW_PATTERN: re.Pattern = re.compile(r'\{([^{}\[\]]*)\}')
+    # list 命令的输出，形如 There are 2 of a max of 20 players online: Steve, Alex
+    PLAYER_LIST_PATTERN: re.Pattern = re.compile(r'There are (\d+) of a max of (\d+) players online:(.*)')
+
+    def classify(self, content: str) -> ConsoleLine | None:
+        """
+        对一行控制台输出进行分类与解析，若该输出与本插件无关则返回 None。
+        输出格式有误时抛出 ValueError 或 IndexError。
+        """
+
+        if not content.startswith(self.PREFIXES):
+            return None
+        if content[0] == 'F':
+            match = self.FUNCTION_RESULT_PATTERN.fullmatch(content)
+            if match is None:
+                return None
+            line = ConsoleLine(CONSOLE_LINE_FUNCTION_RESULT)
+            line.func = match.group(1)
+            line.value = int(match.group(2))
+            return line
+        if content[0] == 'T':
+            match = self.PLAYER_LIST_PATTERN.fullmatch(content)
+            if match is None:
+                return None
+            line = ConsoleLine(CONSOLE_LINE_PLAYER_LIST)
+            line.players = [name for name in match.group(3).strip().split(', ') if len(name) > 0]
+            return line
+        if content.startswith(self.RESULTS_PREFIX):
+            return self.__parse_query_results(content[len(self.RESULTS_PREFIX):])
+        if content.startswith(self.COLLECT_RESULT_PREFIX):
+            return self.__parse_collect_result(content[len(self.COLLECT_RESULT_PREFIX):])
+        return None
+
+
+    def __parse_query_results(self, payload: str) -> ConsoleLine:
+        line = ConsoleLine(CONSOLE_LINE_QUERY_RESULTS)
+        results = line.results = []
+        # 快速路径：结果的格式固定，直接用正则表达式逐项提取
+        for key1, value1, key2, value2 in self.RESULT_ENTRY_PATTERN.findall(payload):
+            if key1 == 'id':
+                results.append((int(value1), int(value2)))
+            else:
+                results.append((int(value2), int(value1)))
+        # 若快速路径未能提取出任何结果而输出又不是空列表，则退回通用的SNBT解析
+        if len(results) == 0 and payload != '[]':
+            for result in parse_snbt(payload):
+                if isinstance(result, dict) and isinstance(result.get('id'), int):
+                    results.append((result['id'], result.get('value', 0)))
+        return line
+
+
+    def __parse_collect_result(self, payload: str) -> ConsoleLine | None:
+        # 快速路径：各玩家的数据均为不含嵌套结构的复合标签，直接按分隔符切分
+        id_match = self.COLLECT_ID_PATTERN.search(payload)
+        if id_match is not None:
+            try:
+                rows = []
+                for body in self.COLLECT_ROW_PATTERN.findall(payload):
+                    row = {}
+                    for pair in body.split(', '):
+                        key, value = pair.split(': ', 1)
+                        row[key] = value.strip('"\'') if key == 'name' else int(value)
+                    rows.append(row)
+            except ValueError:
+                # 格式与预期不符，退回通用的SNBT解析
+                pass
+            else:
+                line = ConsoleLine(CONSOLE_LINE_COLLECT_RESULT)
+                line.request_id = int(id_match.group(1))
+                line.rows = rows
+                return line
+        result = parse_snbt(payload)
+        if not isinstance(result, dict) or not isinstance(result.get('id'), int):
+            return None
+        line = ConsoleLine(CONSOLE_LINE_COLLECT_RESULT)
+        line.request_id = result['id']
+        line.rows = [row for row in result.get('players', []) if isinstance(row, dict)]
+        return line
+
+
+# 延迟过高时，轮询间隔最多延长到原来的多少倍
+SCHEDULER_MAX_BACKOFF: float = 8.0
+# 玩家的数据在上次轮询后发生了变化时（活跃玩家），其轮询间隔缩短为原来的几分之一
+SCHEDULER_HOT_PLAYER_SPEEDUP: float = 2.0
+# 逐条采集模式下，每轮轮询的命令最多分为几批，均匀分布在本轮的时间间隔内发送
+SCHEDULER_SLICES: int = 4
+# 启动预热时，每次批量采集最多包含的玩家数（玩家更多时分为多次批量采集，一并发送）
+WARM_START_BATCH_SIZE: int = 500
+# 启动预热连续多少次未能取得在线玩家列表后放弃预热，直接开始轮询（玩家列表改由加入游戏的事件逐渐补全）
+WARM_START_MAX_ATTEMPTS: int = 3
+# 启动预热时，检查请求是否均已收到结果的间隔（s）
+WARM_START_POLL_INTERVAL: float = 0.005
+
+
+# 轮询调度器，决定每一轮轮询需要采集哪些玩家的哪些数据条目。
+# 各数据条目按其轮询间隔各自计时；数据发生变化的活跃玩家轮询得更频繁；
+# 请求延迟升高（MC服务器负载过高）时自动延长所有轮询间隔，延迟恢复后再逐渐缩短。
+# 批量采集模式下以玩家为单位调度：任一数据条目到期的玩家即被采集，并刷新其全部数据条目的轮询时刻。
+class PollScheduler(object):
+    def __init__(self, intervals: dict[str, int], budget: int, latency_threshold: int):
+        # 各数据条目的轮询间隔（s），顺序与 PLAYER_DATA_ITEMS 一致
+        self.item_intervals: list[float] = []
+        for item in PLAYER_DATA_ITEMS:
+            interval = intervals.get(item, intervals.get(PLAYER_DATA_ITEM_CLASSES[item], 1000))
+            self.item_intervals.append(float(max(interval, 0)) / 1000.0)
+        # 每秒最多发送的控制台命令数
+        self.budget: int = budget if budget > 0 else 500 # 缺省值为500
+        # 触发退避的请求延迟阈值（s）
+        self.latency_threshold: float = float(latency_threshold if latency_threshold > 0 else 1000) / 1000.0
+        # 当前的退避倍数，所有轮询间隔均乘以该倍数
+        self.backoff: float = 1.0
+        # 各玩家各数据条目上次被轮询的时刻（time.monotonic() 时间），顺序与 PLAYER_DATA_ITEMS 一致
+        self.last_polled: dict[str, list[float]] = {}
+        # 各玩家上次轮询时的数据版本号，用于判断玩家的数据是否发生了变化
+        self.row_versions: dict[str, int] = {}
+        # 数据在上次轮询后发生了变化的玩家
+        self.hot_players: set[str] = set()
+
+        # 统计信息（自上次输出统计信息以来）
+        self.commands_sent: int = 0
+        self.entries_polled: int = 0
+        self.entries_deferred: int = 0
+
+
+    def update(self, players: list[str], latency: float) -> None:
+        """
+        在每一轮轮询开始时调用，根据当前在线玩家、各玩家的数据版本号及请求延迟更新调度状态。
+        调用者需持有 player_data_records_lock。
+        """
+
+        # 移除已离线玩家的调度状态
+        online = set(players)
+        for player in [player for player in self.last_polled if player not in online]:
+            del self.last_polled[player]
+            self.row_versions.pop(player, None)
+            self.hot_players.discard(player)
+        # 数据版本号变化的玩家视为活跃玩家
+        for player in players:
+            row_version = player_data_records.row_version(player)
+            if row_version != self.row_versions.get(player, row_version):
+                self.hot_players.add(player)
+            else:
+                self.hot_players.discard(player)
+            self.row_versions[player] = row_version
+        # 延迟过高时加倍退避，延迟回落到阈值的一半以下时逐渐恢复
+        if latency > self.latency_threshold:
+            self.backoff = min(self.backoff * 2.0, SCHEDULER_MAX_BACKOFF)
+        elif latency < self.latency_threshold / 2.0:
+            self.backoff = max(self.backoff / 2.0, 1.0)
+
+
+    def due(self, players: list[str], now: float) -> list[tuple[str, list[int]]]:
+        """
+        取得当前到期需要轮询的数据，每项为 (玩家名称, 到期的数据条目下标列表)，按逾期时间从长到短排列。
+        """
 
-        # 本线程的轮询间隔（ms）
+        result = []
+        for player in players:
+            last_polled = self.last_polled.get(player)
+            if last_polled is None:
+                # 新加入的玩家，所有数据条目均立即到期
+                result.append((float('inf'), player, ALL_ITEM_INDEXES))
+                continue
+            factor = self.backoff / SCHEDULER_HOT_PLAYER_SPEEDUP if player in self.hot_players else self.backoff
+            items = []
+            overdue = 0.0
+            for item_index, interval in enumerate(self.item_intervals):
+                late = now - last_polled[item_index] - interval * factor
+                if late >= 0.0:
+                    items.append(item_index)
+                    overdue = max(overdue, late)
+            if len(items) > 0:
+                result.append((overdue, player, items))
+        result.sort(key=lambda entry: entry[0], reverse=True)
+        return [(player, items) for overdue, player, items in result]
+
+
+    def mark_polled(self, player: str, item_indexes: list[int], now: float) -> None:
+        last_polled = self.last_polled.get(player)
+        if last_polled is None:
+            last_polled = self.last_polled[player] = [0.0] * len(PLAYER_DATA_ITEMS)
+        for item_index in item_indexes:
+            last_polled[item_index] = now
+        self.entries_polled += len(item_indexes)
+
+
+    def stats(self) -> dict[str, Any]:
+        """
+        取得自上次调用以来的调度统计信息，并清零计数。
+        """
+
+        result = {
+            'commands_sent': self.commands_sent,
+            'entries_polled': self.entries_polled,
+            'entries_deferred': self.entries_deferred,
+            'hot_players': len(self.hot_players),
+            'backoff': self.backoff
+        }
+        self.commands_sent = 0
+        self.entries_polled = 0
+        self.entries_deferred = 0
+        return result
+
+
+async def wait_event(event: asyncio.Event, timeout: float) -> bool:
+    """
+    等待 event 被设置，最多等待 timeout 秒，返回 event 是否已被设置。
+    """
+
+    if event.is_set():
+        return True
+    try:
+        await asyncio.wait_for(event.wait(), max(timeout, 0.0))
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+# 用于时刻同步MC服务器数据的轮询任务，运行于 MonitorRuntime 的事件循环中
+class ServerMonitor(object):
+    def __init__(self, interval: int, batched: bool, changes_only: bool, full_interval: int,
+                 history_interval: int, scheduler: PollScheduler, stats_interval: int, resident_limit: int):
+        # 轮询间隔（ms），即轮询调度的最小粒度
         self.interval: int = interval if interval > 0 else 1000 # 缺省值为1000ms
+        # 是否使用批量采集模式
+        self.batched: bool = batched
+        # 连续未收到批量采集结果的轮询次数，收到结果时由回调函数清零
+        self.batch_unanswered: int = 0
+        # 逐条采集模式下，连续未收到带关联ID的查询结果的轮询次数，收到结果时由 on_info 清零
+        self.tagged_unanswered: int = 0
+        # 批量采集模式下，是否只采集发生变化的记分项
+        self.changes_only: bool = changes_only
+        # 只采集变化的记分项时，全量采集的间隔（s）
+        self.full_interval: float = float(full_interval if full_interval > 0 else 60000) / 1000.0
+        # 上次全量采集的时刻（time.monotonic() 时间），初始时需先进行一次全量采集
+        self.last_full: float = -math.inf
+        # 写入历史记录的间隔（s）
+        self.history_interval: float = float(history_interval if history_interval > 0 else 60000) / 1000.0
+        # 上次写入历史记录的时刻（time.monotonic() 时间）
+        self.last_history_record: float = 0.0
+        # 轮询调度器
+        self.scheduler: PollScheduler = scheduler
+        # 输出调度统计信息的间隔（s），为0时不输出
+        self.stats_interval: float = float(max(stats_interval, 0)) / 1000.0
+        # 上次输出调度统计信息的时刻（time.monotonic() 时间）
+        self.last_stats: float = time.monotonic()
+        # 内存中最多保留数据的玩家数，0为不限制
+        self.resident_limit: int = max(resident_limit, 0)
+        # 上次移除过期的滑动窗口统计数据的时刻（time.monotonic() 时间）
+        self.last_rates_expire: float = time.monotonic()
+        # 是否已完成启动预热（同步了在线玩家及所有已知玩家的数据），完成前不进行常规轮询
+        self.ready: bool = False
+        # 插件加载（即本对象创建）的时刻（time.monotonic() 时间），用于统计从加载到取得完整数据的耗时
+        self.created_at: float = time.monotonic()
+        # 启动预热的尝试次数、同步的玩家数、预热本身的耗时（s），及从插件加载到预热完成的耗时（s）
+        self.warm_start_attempts: int = 0
+        self.warm_start_players: int = 0
+        self.warm_start_duration: float = 0.0
+        self.ready_after: float = 0.0
 
 
-    def run(self) -> None:
-        while not self.stop_event.is_set():
+    async def run(self, stop_event: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        interval = float(self.interval) / 1000.0
+        # 按固定的节拍轮询，本轮的耗时不会推迟下一轮的开始时刻
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
             try:
                 # 先检查MC服务器是否已启动
-                if psi.is_server_running():
-                    # 定时执行MC函数，获取服务器数据
-                    for player in online_players:
-                        execute_msm_get_data(player,'msm_deathCount')
-                        execute_msm_get_data(player,'msm_playerKillCount')
-                        execute_msm_get_data(player,'msm_totalKillCount')
-                        execute_msm_get_data(player,'msm_health')
-                        execute_msm_get_data(player,'msm_xp')
-                        execute_msm_get_data(player,'msm_level')
-                        execute_msm_get_data(player,'msm_food')
-                        execute_msm_get_data(player,'msm_air')
-                        execute_msm_get_data(player,'msm_armor')
-                        execute_msm_get_data(player,'msm_placeBlockCount')
-                        execute_msm_get_data(player,'msm_breakBlockCount')
-                        execute_msm_get_data(player,'msm_onlineTime')
+                if not psi.is_server_running():
+                    pass
+                elif not self.ready:
+                    # MC服务器启动完成后，先进行启动预热，再开始常规轮询
+                    if psi.is_server_startup():
+                        await self.__warm_start(stop_event)
+                else:
+                    monitor_metrics.pending_depth.observe(len(pending_requests.entries))
+                    poll_start = time.perf_counter()
+                    await self.__poll(interval, stop_event)
+                    monitor_metrics.poll_cycle.observe(time.perf_counter() - poll_start)
+                # 定期将发生变化的数据写入历史记录（涉及磁盘IO，放到线程池中执行，避免阻塞事件循环）
+                now = time.monotonic()
+                if player_history is not None and now - self.last_history_record >= self.history_interval:
+                    await loop.run_in_executor(None, player_history.record, int(time.time()))
+                    self.last_history_record = now
+                # 内存中的玩家数超出上限时，将离线玩家的数据移出到磁盘存档（同样涉及磁盘IO）
+                if self.resident_limit > 0 and len(player_data_records.names) > self.resident_limit:
+                    await loop.run_in_executor(None, archive_offline_players, self.resident_limit)
+                # 定期移除已离线玩家的过期滑动窗口统计数据
+                if now - self.last_rates_expire >= RATE_EXPIRE_INTERVAL:
+                    self.last_rates_expire = now
+                    with player_data_records_lock:
+                        if player_data_records.rates is not None:
+                            player_data_records.rates.expire(time.time(), online_players)
+                # 丢弃超时未收到结果的请求
+                expired = pending_requests.expire()
+                if expired > 0:
+                    psi.logger.warning(f'{expired} requests to the server timed out, ' +
+                                       f'request stats: {pending_requests.stats()}')
+                # 定期输出调度统计信息
+                if self.stats_interval > 0 and now - self.last_stats >= self.stats_interval:
+                    elapsed = now - self.last_stats
+                    self.last_stats = now
+                    stats = self.scheduler.stats()
+                    psi.logger.info(f'Poll scheduler stats over the last {elapsed:.0f}s: ' +
+                                    f'{stats["commands_sent"] / elapsed:.1f} commands/s, ' +
+                                    f'{stats["entries_polled"]} entries polled, ' +
+                                    f'{stats["entries_deferred"]} entries deferred by the command budget, ' +
+                                    f'{stats["hot_players"]} active players, backoff x{stats["backoff"]:g}, ' +
+                                    f'request latency {pending_requests.latency * 1000.0:.0f}ms')
             except Exception as ex:
                 psi.logger.error(f'Error occurred while updating player data: {ex}')
-            # 休眠一段时间
-            time.sleep(float(self.interval) / 1000.0)
+            # 休眠到下一轮的开始时刻；若本轮耗时已超过一个间隔，则不再补偿落后的轮次
+            next_tick += interval
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now
+            await wait_event(stop_event, next_tick - now)
 
 
-    def stop(self) -> None:
-        self.stop_event.set()
+    async def __warm_start(self, stop_event: asyncio.Event) -> None:
+        """
+        启动预热：以 list 命令一次性取得当前在线的玩家（插件加载前就已在线的玩家不会触发加入游戏的事件），
+        再以一轮批量采集同步这些玩家及所有已知玩家（内存中及历史记录中的玩家）的全部数据，完成后将插件标记为就绪。
+        """
+
+        start = time.monotonic()
+        self.warm_start_attempts += 1
+        # 启用了RCON传输时，等待其完成首次连接尝试，以便预热的命令经RCON发送
+        if rcon_transport is not None:
+            await wait_event(rcon_transport.attempted, RCON_CONNECT_TIMEOUT)
+        # 取得在线玩家列表，由其回调更新 online_players
+        if await self.__wait_requests([execute_list_players()], stop_event) > 0:
+            if stop_event.is_set():
+                return
+            if self.warm_start_attempts >= WARM_START_MAX_ATTEMPTS:
+                psi.logger.warning(f'No player list received in {self.warm_start_attempts} attempts, ' +
+                                   f'skipping the warm start')
+                self.ready = True
+            return
+        online = list(online_players)
+        if self.batched:
+            # 在线玩家在前，其次为内存中的其他玩家及历史记录中的玩家（已移出到存档中的玩家除外，其数据在存档中）
+            players = list(dict.fromkeys(online))
+            known = set(players)
+            history_players = player_history.known_players() if player_history is not None else []
+            with player_data_records_lock:
+                players += [player for player in player_data_records.names if player not in known]
+                known.update(players)
+                players += [player for player in dict.fromkeys(history_players)
+                            if player not in known and player not in player_data_records]
+            # 限制了内存中的玩家数时，不同步超出上限的离线玩家，以免其数据随即又被移出到存档
+            if self.resident_limit > 0:
+                players = players[:max(self.resident_limit, len(online))]
+            batches = [players[i:i + WARM_START_BATCH_SIZE] for i in range(0, len(players), WARM_START_BATCH_SIZE)]
+            commands = 3 * sum(len(plan_collect_chunks(batch)) for batch in batches)
+            request_ids = [execute_msm_collect_all(batch) for batch in batches]
+        else:
+            # 逐条采集模式下每个数据条目都需一条命令，只同步在线玩家
+            players = online
+            request_ids = [execute_msm_get_data(player, 'msm_' + item) for player in players for item in PLAYER_DATA_ITEMS]
+            commands = len(request_ids) + execute_msm_fetch_results()
+        self.scheduler.commands_sent += commands
+        monitor_metrics.commands_sent.inc(commands)
+        now = time.monotonic()
+        unanswered = await self.__wait_requests(request_ids, stop_event)
+        if stop_event.is_set():
+            return
+        if unanswered == 0:
+            # 已采集的数据无需在第一轮轮询中再次采集
+            for player in online:
+                self.scheduler.mark_polled(player, ALL_ITEM_INDEXES, now)
+            if self.batched:
+                self.last_full = now
+        elif self.batched:
+            # 计入未收到的批量采集结果，使之后的轮询进行全量采集（数据包可能不支持批量采集时，同样据此回退）
+            self.batch_unanswered += unanswered
+        self.ready = True
+        self.warm_start_players = len(players)
+        self.warm_start_duration = time.monotonic() - start
+        self.ready_after = time.monotonic() - self.created_at
+        psi.logger.info(f'Warm start completed in {self.warm_start_duration * 1000.0:.0f}ms: ' +
+                        f'{len(online)} online players, {len(players)} players resynced with {commands} commands' +
+                        (f', {unanswered} requests unanswered' if unanswered > 0 else '') +
+                        f'; complete snapshot {self.ready_after * 1000.0:.0f}ms after the plugin was loaded')
+
+
+    async def __wait_requests(self, request_ids: list[int], stop_event: asyncio.Event) -> int:
+        """
+        等待 request_ids 中的请求均收到结果（或超时、插件卸载），返回尚未收到结果的请求数。
+        """
+
+        deadline = time.monotonic() + float(pending_requests.timeout) / 1000.0
+        while True:
+            request_ids = [request_id for request_id in request_ids if request_id in pending_requests.entries]
+            if len(request_ids) == 0 or time.monotonic() >= deadline:
+                return len(request_ids)
+            if await wait_event(stop_event, WARM_START_POLL_INTERVAL):
+                return len(request_ids)
+
+
+    async def __poll(self, interval: float, stop_event: asyncio.Event) -> None:
+        global untagged_get_data
+
+        scheduler = self.scheduler
+        players = list(online_players)
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            scheduler.update(players, pending_requests.latency)
+        now = time.monotonic()
+        # 在下一轮开始前就会到期的数据也在本轮轮询，以免节拍的微小抖动使其推迟一整轮
+        due = scheduler.due(players, now + interval / 2.0)
+        # 本轮可发送的命令数
+        budget = max(int(scheduler.budget * interval), 1)
+        # 若连续多次未收到批量采集结果，说明数据包可能不支持批量采集，回退为逐条采集模式
+        if self.batched and self.batch_unanswered >= BATCH_COLLECTION_MAX_UNANSWERED:
+            psi.logger.warning(f'No result of batched collection received in {self.batch_unanswered} ' +
+                               f'polls, falling back to per-entry collection')
+            self.batched = False
+        if self.batched:
+            # 批量采集模式下，每次采集（经RCON时为每段）发送3条命令，到期的玩家的所有数据条目一次性采集
+            if len(due) > 0:
+                players = [player for player, items in due]
+                # 只采集变化的记分项时，数据包中记录的上次采集的值须与插件中的数据一致。
+                # 因此上次采集的结果未能收到（可能已丢失）时，或到了定期全量采集的时刻，需进行全量采集；
+                # 此外，本次启动后首次采集的玩家也需全量采集
+                full = not self.changes_only or self.batch_unanswered > 0 or now - self.last_full >= self.full_interval
+                full_players = players if full else [player for player in players
+                                                     if player not in scheduler.last_polled]
+                # 按逾期时间从长到短选取不超过预算的玩家（至少采集一段），其余玩家顺延到下一轮
+                chunks = plan_collect_chunks(players, not full, full_players)
+                allowed = max(budget // 3, 1)
+                deferred = len(chunks) > allowed
+                if deferred:
+                    chunks = chunks[:allowed]
+                    collected = sum(len(chunk) for chunk in chunks)
+                    scheduler.entries_deferred += sum(len(items) for player, items in due[collected:])
+                    due = due[:collected]
+                    players = players[:collected]
+                # 须在发送命令前计数，以免采集结果先于计数到达
+                self.batch_unanswered += 1
+                if full:
+                    # 有玩家顺延时，下一轮仍进行全量采集
+                    if not deferred:
+                        self.last_full = now
+                    execute_msm_collect_all(players)
+                else:
+                    execute_msm_collect_all(players, True, full_players)
+                scheduler.commands_sent += 3 * len(chunks)
+                monitor_metrics.commands_sent.inc(3 * len(chunks))
+                for player, items in due:
+                    scheduler.mark_polled(player, ALL_ITEM_INDEXES, now)
+            return
+        # 若连续多次未收到带关联ID的查询结果，说明数据包可能不支持 msm:get_data_tagged，改为按输出顺序匹配的 msm:get_data
+        if not untagged_get_data and self.tagged_unanswered >= TAGGED_QUERY_MAX_UNANSWERED:
+            psi.logger.warning(f'No result of tagged queries received in {self.tagged_unanswered} polls, ' +
+                               f'falling back to untagged queries matched in the order of the console output')
+            untagged_get_data = True
+        # 逐条采集模式下，按逾期时间从长到短选取不超过预算的数据条目（每批命令之后还需2条命令取回结果）
+        entries = []
+        for player, items in due:
+            for item_index in items:
+                entries.append((player, item_index))
+        if len(entries) == 0 and len(pending_requests.entries) == 0:
+            return
+        slices = min(SCHEDULER_SLICES, max(len(entries), 1))
+        allowed = max(budget - 2 * slices, 0)
+        if len(entries) > allowed:
+            scheduler.entries_deferred += len(entries) - allowed
+            entries = entries[:allowed]
+        # 将命令分批均匀分布在本轮的时间间隔内发送，避免集中在同一时刻
+        slice_size = (len(entries) + slices - 1) // slices if len(entries) > 0 else 0
+        commands = 0
+        counted = False
+        for i in range(slices):
+            if i > 0 and await wait_event(stop_event, interval / slices):
+                return
+            batch = entries[i * slice_size:(i + 1) * slice_size]
+            for player, item_index in batch:
+                execute_msm_get_data(player, 'msm_' + PLAYER_DATA_ITEMS[item_index])
+                scheduler.mark_polled(player, [item_index], now)
+            # 有经控制台发送的带关联ID的查询时，每轮计数一次（须在取回结果前计数，以免结果先于计数到达）
+            if console_results_pending and not counted:
+                counted = True
+                self.tagged_unanswered += 1
+            # 取回本批及之前尚未取回的逐条查询结果
+            fetched = execute_msm_fetch_results()
+            monitor_metrics.commands_sent.inc(len(batch) + fetched)
+            commands += len(batch) + fetched
+        scheduler.commands_sent += commands
 
 
 """
@@ -193,7 +2671,20 @@ arguments: {
 ... 该指令附带的参数 ...
 }
 }
-目前只有一种指令：get_all_players_data（获取所有玩家数据）
+目前支持的指令：
+get_all_players_data（获取所有玩家数据）
+subscribe_players_data（订阅玩家数据的变化，详见下文第3节）
+unsubscribe_players_data（取消订阅玩家数据的变化）
+get_snapshot_cache_stats（获取快照缓存的统计信息：命中次数、未命中次数及编码耗时）
+get_monitor_stats（获取插件自身的运行指标，回复 {id, instruction: 'monitor_stats', data: 各项指标}，
+    耗时类指标单位为ms，均给出 count、mean、p50、p90、p99；同样的指标也以 Prometheus 文本格式在 websocket 端口的
+    metricsPath（缺省为 /metrics）路径上以HTTP提供。其中 warm_start 为启动预热的状态，ready 为 false 时插件尚未完成
+    启动时的数据同步，此时的玩家数据可能不完整）
+get_players_history（获取玩家数据的历史记录，详见下文第4节）
+query_players_data（按条件查询玩家数据，详见下文第6节）
+get_leaderboard（获取某一数据条目的排行榜，详见下文第7节）
+get_players_rates（获取玩家数据的滑动窗口统计，详见下文第8节）
+请求有误时，mc服务器回复：{id, instruction: 'error', message: 错误信息}
 
 2.Mc服务器向网站后端发送数据：
 类型为json格式，具体格式如下：
@@ -221,119 +2712,1430 @@ type的种类：
 在线时长（以游戏刻为单位） onlineTime
 如上为一条数据。
 网站后端服务器向mc服务器发送命令后，mc服务器每次向网站后端服务器发送一条数据，直到所有数据发送完毕
+
+get_all_players_data 的 arguments 中可指定以下参数：
+format: 响应格式（可选），取值如下：
+    'records'（缺省）：即上述格式，每条数据一条消息；
+    'columnar'：所有数据合并为一条JSON消息，按数据条目分列存放：
+        {id, instruction: 'all_players_data', format: 'columnar', time, items: [数据条目名称...],
+         players: [玩家名称...], values: [[items[0]的各玩家的值...], [items[1]的各玩家的值...], ...]}
+    'binary'：所有数据合并为一条二进制消息，依次为：
+        4字节的魔数 b'MSMB'；
+        4字节的头部长度 H（无符号整型，小端序）；
+        H字节的UTF-8编码的JSON头部，内容同 'columnar' 格式，但不含 values；
+        len(items) × len(players) 个4字节有符号整型（小端序），按数据条目分列依次存放，与 'columnar' 格式的 values 对应。
+end_marker: 为 true 时，在本请求的所有响应消息之后再发送一条结束标志（可选，缺省为 false，适用于所有指令）：
+    {id, instruction: 'end_of_response', count: 此前发送的响应消息数}
+
+3.订阅玩家数据的变化（subscribe_players_data）：
+arguments: {
+metrics: 只订阅其中列出的数据条目（可选，缺省为全部条目；含未知的数据条目时回复错误）,
+min_interval: 两次推送之间的最小间隔，单位为ms（可选，缺省为0）,
+since_version: 断线重连后，从该版本号之后的变化开始推送（可选，缺省为0，即先推送全部数据）,
+epoch: 上次订阅时服务器返回的epoch（可选，与服务器当前的epoch不一致时，since_version无效，将重新推送全部数据）
+}
+mc服务器先回复：
+{
+id: 订阅请求的流水号,
+instruction: 'players_data_subscribed',
+epoch: 服务器数据的标识（插件重启后会改变）,
+version: 当前的数据版本号
+}
+之后，每当订阅的数据发生变化，mc服务器即以一条消息推送所有变化的数据（每个连接只保留最后一个订阅）：
+{
+id: 订阅请求的流水号,
+instruction: 'players_data_delta',
+epoch: 服务器数据的标识,
+version: 本次推送后的数据版本号（断线重连时作为since_version使用）,
+data: [{name, type, quantity, time}, ...]（每项格式与all_players_data中的data相同）
+}
+
+4.获取玩家数据的历史记录（get_players_history）：
+插件每隔一段时间（historyInterval）将发生变化的数据写入插件数据文件夹下的历史记录中，插件重启后历史记录不会丢失。
+arguments: {
+players: 只查询其中列出的玩家（可选，缺省为全部玩家）,
+metrics: 只查询其中列出的数据条目（可选，缺省为全部条目）,
+start: 查询范围的起始时间，Unix时间戳，单位为s（可选，缺省为end之前1小时）,
+end: 查询范围的结束时间，Unix时间戳，单位为s（可选，缺省为当前时间）,
+step: 降采样的区间长度，单位为s（可选，缺省为0，即不降采样，返回范围内的每一次变化）
+}
+不降采样时，查询范围不能超过7天，且返回的点数不能超过100000，否则回复错误，请缩小范围或指定step。
+mc服务器回复：
+{
+id: 请求的流水号,
+instruction: 'players_history',
+start, end, step: 同请求参数,
+data: [{name: 玩家名称, type: 数据条目, points: [[时间戳, 值], ...]}, ...]
+}
+每个序列的第一个点为start时刻已知的值；降采样时，每个区间取区间内最后的值，无变化的区间沿用之前的值。
+
+5.连接与并发：
+同一连接上可以连续发送多个请求而无需等待之前的响应（最多同时处理 websocketMaxPipelinedRequests 个请求），
+各请求的响应按处理完成的先后发送，不同请求的响应之间的顺序不作保证，请以响应中的id区分；同一请求的多条响应之间保持顺序。
+待发送的数据超出 websocketSendQueueLimit 时（客户端接收过慢），视 websocketSendQueuePolicy 的设置：
+    'drop'：丢弃本次响应，改为回复 {id, instruction: 'error', message: 'Send queue is full'}，
+        数据变化的推送将推迟到队列有空余时再合并推送，不会丢失；
+    'disconnect'：以关闭码1008断开连接。
+连接数超出 websocketMaxConnections 时，新连接以关闭码1013断开；
+超过 websocketIdleTimeout 未发送任何请求（且未订阅数据变化）的连接以关闭码1000断开；
+插件卸载或重新加载时，连接在处理完已收到的请求后以关闭码1001断开。
+
+6.按条件查询玩家数据（query_players_data）：
+arguments: {
+players: 只查询其中列出的玩家（可选，至多1000名）,
+pattern: 玩家名称需匹配的通配符模式，支持 '*'、'?' 及 '[...]'，区分大小写（可选，如 'Steve*'）,
+metrics: 只返回其中列出的数据条目（可选，缺省为全部条目）,
+online_only: 为 true 时只查询在线玩家（可选，缺省为 false）,
+where: 数值条件的列表，须全部满足，每个条件形如 '数据条目 运算符 整数'，运算符为 ==、!=、>、>=、<、<=
+    （可选，如 ['deathCount > 10', 'level >= 30']）
+}
+mc服务器回复（格式与 get_all_players_data 的 'columnar' 格式相同，只包含满足条件的玩家及所需的数据条目）：
+{id, instruction: 'players_data', time, epoch, version, items: [数据条目名称...], players: [玩家名称...],
+ values: [[items[0]的各玩家的值...], ...]}
+参数有误（如未知的数据条目、格式有误的条件）时回复错误信息。
+
+7.排行榜（get_leaderboard）：
+插件为配置项 leaderboardMetrics 中的数据条目维护排名索引，随数据的更新同步更新，查询无需对全部玩家排序。
+排行榜按值从大到小排列，值相同的玩家按名称排列；排名从1开始，值相同的玩家排名相同（如 1、2、2、4）。
+arguments: {
+metric: 数据条目（须在 leaderboardMetrics 之中）,
+limit: 每页的条数（可选，缺省为10，最大为1000）,
+offset: 从排行榜的第几项（从0开始）开始返回（可选，缺省为0）,
+after: 上一页回复中的 next（可选，优先于 offset；数据在两次请求之间发生变化时，也不会重复或遗漏值未变化的玩家）,
+players: 同时查询其中列出的玩家的排名（可选，至多100名）
+}
+mc服务器回复：
+{
+id: 请求的流水号,
+instruction: 'leaderboard',
+metric, epoch, version: 数据条目、服务器数据的标识及版本号,
+total: 排行榜的总项数,
+offset: 本页第一项在排行榜中的位置,
+entries: [{rank, name, value}, ...],
+next: 下一页的 after 参数（[值, 玩家名称]），已到末尾时为 null,
+players: [{name, value, rank, position（在排行榜中的位置）}, ...]（仅在请求了 players 时返回，不包含未记录的玩家）
+}
+
+8.滑动窗口统计（get_players_rates）：
+插件以 rateBucketSeconds 秒为一个区间，为在线（及离线未久）的玩家保留最近 rateBuckets 个区间的统计数据，随数据的变化增量更新。
+累计型数据条目（deathCount、playerKillCount、totalKillCount、placeBlockCount、breakBlockCount、onlineTime）统计增量，
+值变小时视为记分板已被重置（如执行了 msm:reset_scoreboard），重置后的值计为增量，而不会得到负的增量；
+其余为瞬时值数据条目（如 health），统计最小值、最大值及时间加权的平均值。
+arguments: {
+players: 只查询其中列出的玩家（可选，缺省为所有有统计数据的玩家）,
+metrics: 只查询其中列出的数据条目（可选，缺省为全部条目）,
+window: 统计最近多少秒内的数据（可选，按区间向上取整，缺省及最大均为 rateBucketSeconds × rateBuckets）
+}
+mc服务器回复：
+{
+id: 请求的流水号,
+instruction: 'players_rates',
+time: 统计截至的时刻（Unix时间，单位：s）,
+window: 实际统计的窗口长度（s）,
+bucket: 区间长度（s）,
+data: [{
+    name: 玩家名称,
+    span: 实际统计的时长（s，开始统计不久的玩家可能短于 window）,
+    data: {
+        累计型数据条目: {delta: 窗口内的增量, rate: 平均每秒的增量, resets: 窗口内检测到的重置次数},
+        瞬时值数据条目: {current: 当前值, min: 窗口内的最小值, max: 窗口内的最大值, avg: 窗口内的时间加权平均值}
+    }
+}, ...]（不包含尚无统计数据的玩家及数据条目）
+}
 """
 
 
-# 用于与远程网站服务器进行数据交流的线程
-class WebsocketThread(threading.Thread):
-    def __init__(self, interval: int, ip: str, port: int):
-        super().__init__()
-        self.name = 'WebsocketThread'
-        self.stop_event = threading.Event()
-        self.daemon = False # 本线程不是守护线程，以确保与远程网站服务器的交流不会被异常地中断
+def current_hour() -> int:
+    """
+    获取当前时间（精确到小时且以半小时为准进行舍入，如11:30-12:29都归为12:00）。
+    """
+
+    now = datetime.now()
+    if now.minute < 30:
+        return now.hour
+    # 如果达到了24小时（到明天去了），归为0
+    return (now.hour + 1) % 24
+
+
+# 以下 encode_snapshot_* 函数生成的是不含请求流水号的编码结果，以便在多个请求之间共享（参见 SnapshotCache）。
+# JSON消息被编码为去掉开头的 '{' 的形式（即 '"instruction": ...}'），
+# 发送前再由 attach_response_id 在其前面拼接上 '{"id": 流水号, '，结果与直接编码完整的JSON消息一致。
+
+
+def attach_response_id(id: Any, tail: str) -> str:
+    """
+    在不含流水号的JSON消息编码结果之前拼接上流水号，得到完整的JSON消息。
+    """
+
+    return '{"id": ' + json.dumps(id) + ', ' + tail
+
+
+def encode_snapshot_records(snapshot: PlayerDataSnapshot, cur_hour: int) -> list[str]:
+    """
+    将玩家数据快照编码为逐条的JSON响应信息（'records' 格式），每个玩家的每个数据条目各一条。
+    """
+
+    result = []
+    # 遍历当前的所有玩家的数据记录，依次以其为基准生成客户端响应JSON信息
+    for player, values in snapshot.rows():
+        # 遍历所有数据条目类型
+        for item, item_val in zip(PLAYER_DATA_ITEMS, values):
+            json_data = {
+                'instruction': 'all_players_data',
+                'data': {
+                    'name': player,
+                    'type': item,
+                    'quantity': item_val,
+                    'time': cur_hour
+                }
+            }
+            result.append(json.dumps(json_data)[1:])
+    return result
+
+
+def encode_snapshot_columnar(snapshot: PlayerDataSnapshot, cur_hour: int) -> str:
+    """
+    将玩家数据快照编码为单条按列存放的JSON响应信息（'columnar' 格式）。
+    """
+
+    return json.dumps({
+        'instruction': 'all_players_data',
+        'format': 'columnar',
+        'time': cur_hour,
+        'items': PLAYER_DATA_ITEMS,
+        'players': snapshot.names,
+        'values': [column.tolist() for column in snapshot.columns]
+    })[1:]
+
+
+# 二进制响应信息的魔数
+BINARY_RESPONSE_MAGIC: bytes = b'MSMB'
+
+
+def encode_snapshot_binary(snapshot: PlayerDataSnapshot, cur_hour: int) -> tuple[str, bytes]:
+    """
+    将玩家数据快照编码为单条二进制响应信息（'binary' 格式）的两部分：不含流水号的JSON头部，以及各数据列的二进制数据。
+    完整的格式参见数据传输协议规范，由 assemble_binary_response 组装。
+    """
+
+    header = json.dumps({
+        'instruction': 'all_players_data',
+        'format': 'binary',
+        'time': cur_hour,
+        'items': PLAYER_DATA_ITEMS,
+        'players': snapshot.names
+    })[1:]
+    parts = []
+    for column in snapshot.columns:
+        # 数据列在内存中即为连续的32位整型，仅需在大端序平台上转换字节序
+        if sys.byteorder == 'big':
+            column = array('i', column)
+            column.byteswap()
+        parts.append(column.tobytes())
+    return header, b''.join(parts)
+
+
+def assemble_binary_response(id: Any, encoded: tuple[str, bytes]) -> bytes:
+    header = attach_response_id(id, encoded[0]).encode('utf-8')
+    return b''.join((BINARY_RESPONSE_MAGIC, struct.pack('<I', len(header)), header, encoded[1]))
+
+
+# 玩家数据快照的编码结果缓存。
+# 同一数据版本（且同一小时）内，各格式的快照只编码一次，由所有请求该格式的客户端共享。
+# 快照在 player_data_records_lock 内复制，编码则在锁外进行，不会阻塞数据的更新。
+class SnapshotCache(object):
+    # 各响应格式对应的编码函数
+    ENCODERS: dict[str, Callable[[PlayerDataSnapshot, int], Any]] = {
+        'records': encode_snapshot_records,
+        'columnar': encode_snapshot_columnar,
+        'binary': encode_snapshot_binary
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # 各格式的缓存项，值为 (缓存键, 编码结果)，缓存键为 (数据标识, 数据版本号, 小时)
+        self.entries: dict[str, tuple[tuple, Any]] = {}
+        # 各格式正在线程池中进行的编码（只在事件循环中访问），同时未命中的请求共用同一次编码
+        self.encoding: dict[str, asyncio.Future] = {}
+
+        # 命中缓存的次数
+        self.hit_count: int = 0
+        # 未命中缓存（需重新编码）的次数
+        self.miss_count: int = 0
+        # 累计的编码耗时（s）
+        self.encode_time_total: float = 0.0
+        # 最近一次的编码耗时（s）
+        self.encode_time_last: float = 0.0
+
+
+    def get(self, format: str) -> Any:
+        """
+        取得当前数据的指定格式的编码结果，format 须为 ENCODERS 中的键。
+        """
+
+        encoded = self.lookup(format)
+        return encoded if encoded is not None else self.encode(format)
+
+
+    async def get_async(self, format: str) -> Any:
+        """
+        与 get 相同，但未命中时在线程池中进行编码，避免阻塞事件循环中的轮询任务及其他连接。
+        """
+
+        encoded = self.lookup(format)
+        if encoded is not None:
+            return encoded
+        future = self.encoding.get(format)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self.encode, format)
+            self.encoding[format] = future
+            future.add_done_callback(lambda _: self.encoding.pop(format, None))
+        # 以 shield 保护共用的编码，某一请求被取消时不影响其他等待者
+        return await asyncio.shield(future)
+
+
+    def lookup(self, format: str) -> Any:
+        """
+        取得缓存中当前数据的指定格式的编码结果，未命中时返回 None。
+        """
+
+        cur_hour = current_hour()
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            key = (player_data_records.epoch, player_data_records.version, cur_hour)
+        with self.lock:
+            entry = self.entries.get(format)
+            if entry is not None and entry[0] == key:
+                self.hit_count += 1
+                return entry[1]
+        return None
+
+
+    def encode(self, format: str) -> Any:
+        """
+        对当前数据重新进行指定格式的编码，并存入缓存。
+        """
+
+        cur_hour = current_hour()
+        # 复制一份快照后在锁外进行编码
+        snapshot, epoch = snapshot_player_data()
+        key = (epoch, snapshot.version, cur_hour)
+        start = time.perf_counter()
+        encoded = self.ENCODERS[format](snapshot, cur_hour)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.miss_count += 1
+            self.encode_time_total += elapsed
+            self.encode_time_last = elapsed
+            self.entries[format] = (key, encoded)
+        return encoded
+
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                'hits': self.hit_count,
+                'misses': self.miss_count,
+                'encode_time_total_ms': self.encode_time_total * 1000.0,
+                'encode_time_last_ms': self.encode_time_last * 1000.0
+            }
+
+
+# 降采样时，每个序列最多返回的点数；不降采样时，一次查询最多返回的点数
+HISTORY_MAX_POINTS: int = 100000
+# 不降采样时，查询的时间范围的最大长度（s）
+HISTORY_MAX_RAW_RANGE: int = 7 * 86400
+
+
+# get_leaderboard 指令每页的缺省条数及最大条数
+LEADERBOARD_DEFAULT_LIMIT: int = 10
+LEADERBOARD_MAX_LIMIT: int = 1000
+# get_leaderboard 指令一次最多查询其排名的玩家数
+LEADERBOARD_MAX_PLAYERS: int = 100
+# query_players_data 指令的玩家名称列表的最大长度
+QUERY_MAX_PLAYERS: int = 1000
+
+
+def make_error_response(id: Any, message: str) -> str:
+    """
+    生成请求出错时的JSON响应信息。
+    """
+
+    return json.dumps({
+        'id': id,
+        'instruction': 'error',
+        'message': message
+    })
+
+
+# 一个websocket连接对玩家数据变化的订阅
+class PlayersDataSubscription(object):
+    def __init__(self, websocket: Any, id: Any, item_indexes: list[int], min_interval: int, version: int):
+        # 订阅者所在的websocket连接
+        self.websocket: Any = websocket
+        # 订阅请求的流水号，推送时原样带回
+        self.id: Any = id
+        # 订阅的数据条目在 PLAYER_DATA_ITEMS 中的下标
+        self.item_indexes: list[int] = item_indexes
+        # 两次推送之间的最小间隔（s）
+        self.min_interval: float = float(max(min_interval, 0)) / 1000.0
+        # 已推送给订阅者的数据版本号
+        self.version: int = version
+        # 上次推送的时刻（time.monotonic() 时间）
+        self.last_push: float = 0.0
+        # 是否已安排了一次尚未执行的推送
+        self.push_scheduled: bool = False
+
+
+def create_listen_socket(ip: str, port: int) -> socket.socket:
+    """
+    创建 websocket 服务器所监听的套接字。
+    """
+
+    family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+    return socket.create_server((ip, port), family=family)
+
+
+def set_tcp_nodelay(websocket: Any) -> None:
+    """
+    关闭websocket连接的 Nagle 算法。
+    监听套接字由 create_listen_socket 创建（proto 为0），asyncio 不会为由其接受的连接设置 TCP_NODELAY，
+    同一请求的多条较小的响应（如响应与其后的结束标志）之间将因对端的延迟确认而相隔约40ms。
+    """
+
+    sock = websocket.transport.get_extra_info('socket')
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+# 待发送队列已满、无法推送数据变化时，重试推送的延迟（s）
+SEND_QUEUE_RETRY_DELAY: float = 0.1
+# 发送任务每连续发送多少条消息后让出一次事件循环，以免一个连接的大量响应长时间独占事件循环
+SEND_QUEUE_YIELD_INTERVAL: int = 64
+# 待发送队列超出上限时的处理方式
+SEND_QUEUE_POLICY_DROP: str = 'drop'
+SEND_QUEUE_POLICY_DISCONNECT: str = 'disconnect'
+
+
+def format_remote_address(websocket: Any) -> str:
+    """
+    取得websocket连接的对端地址（'IP地址:端口号'）。
+    """
+
+    address = websocket.remote_address
+    return f'{address[0]}:{address[1]}' if address is not None else 'unknown'
+
+
+# 一个websocket连接的状态：正在处理的请求，以及待发送的消息队列（由该连接的发送任务依次发送）
+class WebsocketConnection(object):
+    def __init__(self, websocket: Any, max_pipelined: int):
+        self.websocket: Any = websocket
+        # 对端地址（连接断开后将无法再取得，故预先保存）
+        self.remote: str = format_remote_address(websocket)
+        # 限制同时处理的请求数
+        self.slots: asyncio.Semaphore = asyncio.Semaphore(max(max_pipelined, 1))
+        # 正在处理的请求
+        self.tasks: set[asyncio.Future] = set()
+        # 读取请求的任务
+        self.reader: asyncio.Future | None = None
+        # 待发送的消息，及其总大小（字节，字符串按字符数计）
+        self.queue: deque[str | bytes] = deque()
+        self.queued_bytes: int = 0
+        # 有新消息待发送的信号
+        self.wakeup: asyncio.Event = asyncio.Event()
+        # 待发送队列已清空（且没有正在发送的消息）的信号
+        self.flushed: asyncio.Event = asyncio.Event()
+        self.flushed.set()
+        # 连接是否已失效（发送出错或因待发送队列溢出而被断开）
+        self.closed: bool = False
+
 
-        # 本线程的轮询间隔（ms）
-        self.interval: int = interval if interval > 0 else 1000 # 缺省值为1000ms
+    def has_room(self, limit: int) -> bool:
+        """
+        待发送队列是否还有空余。队列为空时总有空余，以免超出上限的单个响应永远无法发送。
+        """
+
+        return limit <= 0 or self.queued_bytes == 0 or self.queued_bytes < limit
+
+
+    def enqueue(self, messages: list[str | bytes]) -> None:
+        """
+        将同一请求的一组消息依次加入待发送队列。
+        """
+
+        if self.closed or len(messages) == 0:
+            return
+        for message in messages:
+            self.queue.append(message)
+            self.queued_bytes += len(message)
+        self.flushed.clear()
+        self.wakeup.set()
+
+
+    async def write_loop(self) -> None:
+        """
+        依次发送待发送队列中的消息，直至连接失效。慢速的客户端只会阻塞其自身的发送任务。
+        """
+
+        websocket = self.websocket
+        try:
+            while True:
+                sent = 0
+                while len(self.queue) > 0:
+                    message = self.queue.popleft()
+                    send_start = time.perf_counter()
+                    await websocket.send(message)
+                    monitor_metrics.websocket_send.observe(time.perf_counter() - send_start)
+                    self.queued_bytes -= len(message)
+                    sent += 1
+                    if sent % SEND_QUEUE_YIELD_INTERVAL == 0:
+                        await asyncio.sleep(0)
+                self.flushed.set()
+                self.wakeup.clear()
+                await self.wakeup.wait()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            # 连接失效后丢弃所有待发送的消息，并唤醒等待发送完毕的任务
+            self.closed = True
+            self.queue.clear()
+            self.queued_bytes = 0
+            self.flushed.set()
+
+
+# 用于与远程网站服务器进行数据交流的 websocket 服务器，运行于 MonitorRuntime 的事件循环中
+class WebsocketServer(object):
+    def __init__(self, retry_interval: int, ip: str, port: int, compression: bool, drain_timeout: int,
+                 max_connections: int, max_pipelined: int, send_queue_limit: int, send_queue_policy: str,
+                 idle_timeout: int, metrics_path: str, listen_socket: socket.socket | None = None):
+        # 启动失败时重试的间隔（ms）
+        self.retry_interval: int = retry_interval if retry_interval > 0 else 1000 # 缺省值为1000ms
         # WebSocket 监听的IP地址
         self.ip: str = ip
         # WebSocket 监听的端口号
         self.port: int = port
+        # 是否启用 permessage-deflate 压缩扩展（需客户端同样支持）
+        self.compression: bool = compression
+        # 停止时等待已建立的连接处理完当前请求的最长时间（s）
+        self.drain_timeout: float = float(max(drain_timeout, 0)) / 1000.0
+        # 连接数上限，0为不限制
+        self.max_connections: int = max(max_connections, 0)
+        # 每个连接同时处理的请求数上限
+        self.max_pipelined: int = max(max_pipelined, 1)
+        # 每个连接的待发送队列的大小上限（字节），0为不限制
+        self.send_queue_limit: int = max(send_queue_limit, 0)
+        # 待发送队列超出上限时的处理方式
+        if send_queue_policy not in (SEND_QUEUE_POLICY_DROP, SEND_QUEUE_POLICY_DISCONNECT):
+            psi.logger.warning(f'Unknown websocket send queue policy {send_queue_policy!r}, ' +
+                               f'using {SEND_QUEUE_POLICY_DROP!r} instead')
+            send_queue_policy = SEND_QUEUE_POLICY_DROP
+        self.send_queue_policy: str = send_queue_policy
+        # 连接的空闲超时（s），0为不限制
+        self.idle_timeout: float = float(max(idle_timeout, 0)) / 1000.0
+        # 提供运行指标的HTTP路径，为空时不提供
+        self.metrics_path: str = metrics_path
+        # 所监听的套接字，可由旧版本插件移交而来，否则在启动时创建
+        self.listen_socket: socket.socket | None = listen_socket
+        # 所在的 asyncio 事件循环，启动后才可用
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # 是否正在停止
+        self.stopping: bool = False
+        # 已建立的连接，键为websocket连接（只在事件循环内访问）
+        self.connections: dict[Any, WebsocketConnection] = {}
+        # 各连接对玩家数据变化的订阅，键为websocket连接（只在事件循环内访问）
+        self.subscriptions: dict[Any, PlayersDataSubscription] = {}
 
 
-    def run(self) -> None:
-        # 因为 websockets 模块使用异步函数，所以提前切换到 asyncio 运行时
-        asyncio.run(self.__async_run())
-    
-
-    async def __async_run(self) -> None:
-        # 创建 websocket 服务器
-        serve = websockets.server.serve(self.__websocket_echo, self.ip, self.port)
-        # 在死循环内开始运行 websocket 服务器，出错了就重新启动，正常停止就退出死循环
-        while True:
+    async def run(self, stop_event: asyncio.Event) -> None:
+        self.loop = asyncio.get_running_loop()
+        # 启动 websocket 服务器，出错了（如端口被占用）就等待一段时间后重试，直到启动成功或被要求停止
+        server = None
+        while server is None:
             try:
-                async with serve:
-                    while not self.stop_event.is_set():
-                        # 若线程仍在运行，执行休眠挂起
-                        await asyncio.sleep(float(self.interval) / 1000.0)
+                if self.listen_socket is None:
+                    self.listen_socket = create_listen_socket(self.ip, self.port)
+                server = await websockets.server.serve(self.__handle_connection, sock=self.listen_socket,
+                                                       compression='deflate' if self.compression else None,
+                                                       process_request=self.__process_http_request)
             except OSError as ex:
                 psi.logger.error(f'Error occurred while starting the websocket server: {ex}')
-                interval = float(self.interval) / 1000.0
+                interval = float(self.retry_interval) / 1000.0
                 psi.logger.error(f'Retrying in {interval} seconds...')
-                await asyncio.sleep(interval)
-            else:
-                # 服务器正常停止，退出死循环
-                break
-        
-        psi.logger.info('The websocket thread is stopping...')
+                if await wait_event(stop_event, interval):
+                    return
 
-    
-    async def __websocket_echo(self, websocket: websockets.WebSocketClientProtocol) -> None:
-        iter = aiter(websocket)
+        # 等待停止信号
+        await stop_event.wait()
+        psi.logger.info('The websocket server is stopping...')
+        self.stopping = True
+        # 停止接受新的连接，并停止读取已建立的连接的新请求，各连接在处理完已收到的请求、发送完所有响应后由其处理函数关闭
+        server.close(close_connections=False)
+        for conn in list(self.connections.values()):
+            conn.reader.cancel()
+        try:
+            await asyncio.wait_for(server.wait_closed(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            psi.logger.warning(f'{len(server.websockets)} websocket connections did not finish their requests ' +
+                               f'in {self.drain_timeout:g}s, closing them forcibly')
+            for websocket in list(server.websockets):
+                websocket.transport.abort()
+
+
+    async def __handle_connection(self, websocket: websockets.WebSocketServerProtocol) -> None:
+        if self.max_connections > 0 and len(self.connections) >= self.max_connections:
+            psi.logger.warning(f'Too many websocket connections, rejecting remote server {format_remote_address(websocket)}')
+            monitor_metrics.websocket_rejected.inc()
+            await websocket.close(1013, 'Too many connections')
+            return
+        set_tcp_nodelay(websocket)
+        conn = WebsocketConnection(websocket, self.max_pipelined)
+        conn.reader = asyncio.ensure_future(self.__read_loop(conn))
+        writer = asyncio.ensure_future(conn.write_loop())
+        self.connections[websocket] = conn
         try:
-            while not self.stop_event.is_set():
-                message = await anext(iter)
-                responses = await self.__process_message(message)
-                for response in responses:
-                    await websocket.send(response)
-            psi.logger.info(f'The websocket thread is stopping, consequently closing the existing ' +
-                            f'websocket connection with remote server {websocket.host}:{websocket.port}...')
+            # 读取任务在连接断开、空闲超时或服务器停止时结束（被取消）
+            await asyncio.wait([conn.reader])
+            if not conn.reader.cancelled() and conn.reader.exception() is not None:
+                raise conn.reader.exception()
+            # 等待已收到的请求处理完毕，且响应全部发送完毕
+            if len(conn.tasks) > 0:
+                await asyncio.wait(list(conn.tasks))
+            await conn.flushed.wait()
+            if self.stopping:
+                psi.logger.info(f'The websocket server is stopping, consequently closing the existing ' +
+                                f'websocket connection with remote server {conn.remote}...')
         except Exception as ex:
-            psi.logger.error(f'Error occurred while echoing data to remote server {websocket.host}:{websocket.port}: {ex}')
+            psi.logger.error(f'Error occurred while echoing data to remote server {conn.remote}: {ex}')
         finally:
-            await websocket.close()
+            conn.reader.cancel()
+            for task in conn.tasks:
+                task.cancel()
+            writer.cancel()
+            # 连接断开时一并取消该连接的订阅
+            self.connections.pop(websocket, None)
+            self.subscriptions.pop(websocket, None)
+            await websocket.close(1001 if self.stopping else 1000)
 
 
-    async def __process_message(self, message: str | bytes) -> list[str]:
+    async def __process_http_request(self, path: str, request_headers: Any) -> tuple | None:
+        # 访问运行指标的HTTP路径时，直接以 Prometheus 文本格式回复，不进行websocket握手
+        if not self.metrics_path or path.split('?', 1)[0] != self.metrics_path:
+            return None
+        return (http.HTTPStatus.OK, [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')],
+                render_monitor_metrics().encode('utf-8'))
+
+
+    async def __read_loop(self, conn: WebsocketConnection) -> None:
+        websocket = conn.websocket
+        while True:
+            try:
+                if self.idle_timeout > 0:
+                    message = await asyncio.wait_for(websocket.recv(), self.idle_timeout)
+                else:
+                    message = await websocket.recv()
+            except asyncio.TimeoutError:
+                # 订阅了数据变化的连接只接收推送，不视为空闲
+                if websocket in self.subscriptions:
+                    continue
+                psi.logger.info(f'Closing idle websocket connection with remote server {conn.remote}')
+                return
+            except websockets.ConnectionClosed:
+                return
+            # 同时处理的请求数达到上限时，暂停读取新请求，直到有请求处理完毕
+            await conn.slots.acquire()
+            task = asyncio.ensure_future(self.__serve_request(conn, message))
+            conn.tasks.add(task)
+            task.add_done_callback(conn.tasks.discard)
+
+
+    async def __serve_request(self, conn: WebsocketConnection, message: str | bytes) -> None:
+        monitor_metrics.websocket_requests.inc()
+        id = None
+        arguments = None
+        try:
+            # 解析JSON数据，并取得本消息的id
+            data = json.loads(message)
+            id = data['id']
+            arguments = data.get('arguments')
+            # 待发送队列已满时，响应必然被丢弃，无需处理本请求
+            if not conn.has_room(self.send_queue_limit):
+                responses = None
+            else:
+                process_start = time.perf_counter()
+                responses = await self.__process_message(conn.websocket, data)
+                monitor_metrics.websocket_encode.observe(time.perf_counter() - process_start)
+        except Exception as ex:
+            # 请求无法处理（如格式有误）时，回传错误信息（尽可能带上请求的流水号）
+            responses = [make_error_response(id, f'Invalid request: {ex}')]
+            # 客户端要求了结束标志时同样追加，否则客户端将一直等待
+            if isinstance(arguments, dict) and arguments.get('end_marker', False):
+                responses.append(json.dumps({'id': id, 'instruction': 'end_of_response', 'count': 1}))
+        finally:
+            conn.slots.release()
+        if responses is not None and conn.has_room(self.send_queue_limit):
+            conn.enqueue(responses)
+        elif self.send_queue_policy == SEND_QUEUE_POLICY_DISCONNECT:
+            self.__disconnect_overflowed(conn)
+        else:
+            # 丢弃本次响应，改为回传一条错误信息（客户端要求了结束标志时同样追加）
+            monitor_metrics.websocket_dropped.inc()
+            responses = [make_error_response(id, 'Send queue is full')]
+            if isinstance(arguments, dict) and arguments.get('end_marker', False):
+                responses.append(json.dumps({'id': id, 'instruction': 'end_of_response', 'count': 1}))
+            conn.enqueue(responses)
+
+
+    def __disconnect_overflowed(self, conn: WebsocketConnection) -> None:
+        websocket = conn.websocket
+        if conn.closed:
+            return
+        monitor_metrics.websocket_overflowed.inc()
+        psi.logger.warning(f'Send queue of the websocket connection with remote server {conn.remote} ' +
+                           f'overflowed, disconnecting')
+        conn.closed = True
+        conn.reader.cancel()
+        conn.queue.clear()
+        conn.queued_bytes = 0
+        conn.flushed.set()
+        asyncio.ensure_future(websocket.close(1008, 'Send queue overflow'))
+
+
+    def notify_data_changed(self) -> None:
+        """
+        通知 websocket 服务器玩家数据已发生变化，以便向订阅者推送。可在任意线程中调用。
         """
-        处理来自客户端的JSON请求信息，并返回将要回传给客户端的一系列JSON响应信息（以字符串形式）。
+
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.__schedule_pushes)
+            except RuntimeError:
+                # 事件循环恰好已关闭
+                pass
+
+
+    def __schedule_pushes(self) -> None:
+        # 为每个订阅安排一次推送，距上次推送不足最小间隔的，延迟到间隔满足时再推送
+        now = time.monotonic()
+        for sub in self.subscriptions.values():
+            if sub.push_scheduled:
+                continue
+            sub.push_scheduled = True
+            delay = max(sub.last_push + sub.min_interval - now, 0.0)
+            self.loop.call_later(delay, self.__push, sub)
+
+
+    def __push(self, sub: PlayersDataSubscription) -> None:
+        sub.push_scheduled = False
+        # 订阅在安排推送后已被取消或替换
+        conn = self.connections.get(sub.websocket)
+        if self.subscriptions.get(sub.websocket) is not sub or conn is None:
+            return
+        if not conn.has_room(self.send_queue_limit):
+            if self.send_queue_policy == SEND_QUEUE_POLICY_DISCONNECT:
+                self.__disconnect_overflowed(conn)
+                return
+            # 待发送队列已满时推迟推送（届时合并推送期间的所有变化），订阅的版本号保持不变，因而不会丢失变化
+            sub.push_scheduled = True
+            self.loop.call_later(SEND_QUEUE_RETRY_DELAY, self.__push, sub)
+            return
+        response = self.__build_delta(sub)
+        if response is not None:
+            conn.enqueue([response])
+
+
+    def __build_delta(self, sub: PlayersDataSubscription) -> str | None:
+        """
+        生成订阅者自上次推送以来发生变化的数据的推送消息，若没有变化则返回 None。
+        """
+
+        changes, version, epoch = player_data_changes_since(sub.version, sub.item_indexes)
+        sub.version = version
+        if len(changes) == 0:
+            return None
+        sub.last_push = time.monotonic()
+        cur_hour = current_hour()
+        return json.dumps({
+            'id': sub.id,
+            'instruction': 'players_data_delta',
+            'epoch': epoch,
+            'version': version,
+            'data': [{
+                'name': player,
+                'type': PLAYER_DATA_ITEMS[item_index],
+                'quantity': value,
+                'time': cur_hour
+            } for player, item_index, value in changes]
+        })
+
+
+    async def __process_message(self, websocket: Any, data: dict) -> list[str | bytes]:
+        """
+        处理来自客户端的（已解析的）JSON请求信息，并返回将要回传给客户端的一系列响应信息
+        （JSON响应信息以字符串形式，二进制响应信息以字节串形式）。
         """
 
-        # 解析JSON数据
-        data = json.loads(message)
         # 取得本消息的id
         id = data['id']
         # 取得本消息的指令
         instruction = data['instruction']
+        # 取得本消息的参数
+        arguments = data.get('arguments') or {}
         # 判断指令类型并生成回传响应信息
         result = []
         match instruction:
             case 'get_all_players_data': # 返回所有玩家的数据记录
-                # 先获取当前时间（精确到小时且以半小时为准进行舍入，如11:30-12:29都归为12:00）
-                now = datetime.now()
-                cur_hour = 0
-                if now.minute < 30:
-                    cur_hour = now.hour
-                else:
-                    cur_hour = now.hour + 1
-                    # 如果达到了24小时（到明天去了），归为0
-                    if cur_hour >= 24:
-                        cur_hour = 0
-                # 再遍历当前的所有玩家的数据记录，依次以其为基准生成客户端响应JSON信息
-                # 访问player_data_records前先加锁
-                with player_data_records_lock:
-                    for player, data in player_data_records.items():
-                        # 遍历所有数据条目类型
-                        for item in PLAYER_DATA_ITEMS:
-                            # 注：此处能保证所有数据条目皆为整型
-                            item_val = int(getattr(data, item))
-                            json_data = {
-                                'id': id,
-                                'instruction': 'all_players_data',
-                                'data': {
-                                    'name': player,
-                                    'type': item,
-                                    'quantity': item_val,
-                                    'time': cur_hour
-                                }
-                            }
-                            result.append(json.dumps(json_data))
+                # 按客户端要求的格式，从缓存中取得（或生成）当前数据的编码结果，再拼接上本请求的流水号
+                match arguments.get('format', 'records'):
+                    case 'columnar':
+                        result.append(attach_response_id(id, await snapshot_cache.get_async('columnar')))
+                    case 'binary':
+                        result.append(assemble_binary_response(id, await snapshot_cache.get_async('binary')))
+                    case _:
+                        result.extend(attach_response_id(id, tail) for tail in await snapshot_cache.get_async('records'))
+            case 'subscribe_players_data': # 订阅玩家数据的变化
+                result.extend(self.__subscribe_players_data(websocket, id, arguments))
+            case 'unsubscribe_players_data': # 取消订阅玩家数据的变化
+                self.subscriptions.pop(websocket, None)
+            case 'query_players_data': # 按条件查询玩家数据
+                result.append(await self.__query_players_data(id, arguments))
+            case 'get_leaderboard': # 返回某一数据条目的排行榜
+                result.append(await self.__get_leaderboard(id, arguments))
+            case 'get_players_rates': # 返回玩家数据的滑动窗口统计
+                result.append(self.__get_players_rates(id, arguments))
+            case 'get_players_history': # 返回玩家数据的历史记录
+                result.append(await self.__get_players_history(id, arguments))
+            case 'get_monitor_stats': # 返回插件自身的运行指标
+                result.append(json.dumps({
+                    'id': id,
+                    'instruction': 'monitor_stats',
+                    'data': collect_monitor_stats()
+                }))
+            case 'get_snapshot_cache_stats': # 返回快照缓存的统计信息
+                result.append(json.dumps({
+                    'id': id,
+                    'instruction': 'snapshot_cache_stats',
+                    'data': snapshot_cache.stats()
+                }))
+
+        # 若客户端要求，在所有响应信息之后追加结束标志
+        if arguments.get('end_marker', False):
+            result.append(json.dumps({
+                'id': id,
+                'instruction': 'end_of_response',
+                'count': len(result)
+            }))
         
         # 返回JSON响应信息
         return result
     
 
+    def __subscribe_players_data(self, websocket: Any, id: Any, arguments: dict) -> list[str]:
+        metrics = arguments.get('metrics') or PLAYER_DATA_ITEMS
+        if not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics):
+            return [make_error_response(id, 'metrics must be a list of metric names')]
+        unknown = [item for item in metrics if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            return [make_error_response(id, f'Unknown metrics: {", ".join(unknown)}')]
+        item_indexes = [PLAYER_DATA_ITEM_INDEX[item] for item in metrics]
+        since_version = int(arguments.get('since_version', 0))
+        with player_data_records_lock:
+            version = player_data_records.version
+            epoch = player_data_records.epoch
+        # 服务器数据已被重置（如插件重启），或版本号无效时，重新推送全部数据
+        if arguments.get('epoch', epoch) != epoch or since_version > version or since_version < 0:
+            since_version = 0
+        sub = PlayersDataSubscription(websocket, id, item_indexes,
+                                      int(arguments.get('min_interval', 0)), since_version)
+        self.subscriptions[websocket] = sub
+        result = [json.dumps({
+            'id': id,
+            'instruction': 'players_data_subscribed',
+            'epoch': epoch,
+            'version': version
+        })]
+        # 立即推送自 since_version 以来的变化
+        delta = self.__build_delta(sub)
+        if delta is not None:
+            result.append(delta)
+        return result
+
+
+    async def __query_players_data(self, id: Any, arguments: dict) -> str:
+        try:
+            query = PlayerDataQuery.parse(arguments)
+        except ValueError as ex:
+            return make_error_response(id, str(ex))
+        if query.players is not None and len(query.players) > QUERY_MAX_PLAYERS:
+            return make_error_response(id, f'players must not list more than {QUERY_MAX_PLAYERS} players')
+
+        def compute(store: PlayerDataStore, archived: tuple[list[str], list[array], list[array]]) -> tuple:
+            # 只取出满足条件的玩家的所需数据条目
+            slots, archived = query.select(store, online_players, archived)
+            names = store.names
+            columns = store.columns
+            players = [names[slot] for slot in slots] + [player for player, _ in archived]
+            values = [[columns[item_index][slot] for slot in slots] + [row[item_index] for _, row in archived]
+                      for item_index in query.item_indexes]
+            return players, values, store.epoch, store.version
+
+        players, values, epoch, version = await self.__with_archived_players(
+            lambda store: query.archive_candidates(store, online_players), compute)
+        return json.dumps({
+            'id': id,
+            'instruction': 'players_data',
+            'time': current_hour(),
+            'epoch': epoch,
+            'version': version,
+            'items': [PLAYER_DATA_ITEMS[item_index] for item_index in query.item_indexes],
+            'players': players,
+            'values': values
+        })
+
+
+    async def __with_archived_players(self, candidates: Callable[[PlayerDataStore], Collection[str] | str | None],
+                                      compute: Callable[[PlayerDataStore, tuple[list[str], list[array], list[array]]],
+                                                        Any]) -> Any:
+        """
+        以 with_archived_players 计算结果。启用了存档时在线程池中执行，以免读取存档（及等待锁）阻塞事件循环。
+        """
+
+        if player_data_records.archive is None:
+            return with_archived_players(candidates, compute)
+        return await asyncio.get_running_loop().run_in_executor(None, with_archived_players, candidates, compute)
+
+
+    async def __get_leaderboard(self, id: Any, arguments: dict) -> str:
+        metric = arguments.get('metric')
+        item_index = PLAYER_DATA_ITEM_INDEX.get(metric) if isinstance(metric, str) else None
+        if item_index is None:
+            return make_error_response(id, f'Unknown metric: {metric}')
+        try:
+            limit = int(arguments.get('limit', LEADERBOARD_DEFAULT_LIMIT))
+            offset = int(arguments.get('offset', 0))
+            after = arguments.get('after')
+            if after is not None:
+                after = (int(after[0]), str(after[1]))
+        except (TypeError, ValueError, IndexError, KeyError):
+            return make_error_response(id, 'Invalid limit, offset or after')
+        if limit < 0 or limit > LEADERBOARD_MAX_LIMIT or offset < 0:
+            return make_error_response(id, f'limit must be between 0 and {LEADERBOARD_MAX_LIMIT}, ' +
+                                       f'and offset must not be negative')
+        players = arguments.get('players') or []
+        if not isinstance(players, list) or not all(isinstance(p, str) for p in players):
+            return make_error_response(id, 'players must be a list of player names')
+        if len(players) > LEADERBOARD_MAX_PLAYERS:
+            return make_error_response(id, f'players must not list more than {LEADERBOARD_MAX_PLAYERS} players')
+
+        def compute(store: PlayerDataStore, archived: tuple[list[str], list[array], list[array]]) -> tuple | None:
+            rank = store.ranks.get(item_index)
+            if rank is None:
+                return None
+            # 以 after（上一页最后一项的 [值, 玩家名称]）分页时，数据在两次请求之间发生变化也不会重复或遗漏未变化的玩家
+            page_offset = rank.position_after(after[1], after[0]) if after is not None else offset
+            entries = rank.page(page_offset, limit)
+            # 存档中的玩家的值在锁外读取，读取之后已被移回内存的玩家以内存中的数据为准
+            archived_values = dict(zip(archived[0], archived[1][item_index]))
+            column = store.columns[item_index]
+            ranks_of_players = []
+            for player in players:
+                slot = store.index.get(player)
+                value = column[slot] if slot is not None else archived_values.get(player)
+                if value is None:
+                    continue
+                ranks_of_players.append({
+                    'name': player,
+                    'value': value,
+                    'rank': rank.rank_of(value),
+                    'position': rank.position_of(player, value)
+                })
+            return page_offset, entries, len(rank), ranks_of_players, store.epoch, store.version
+
+        result = await self.__with_archived_players(
+            lambda store: [player for player in players if player not in store.index] or None, compute)
+        if result is None:
+            return make_error_response(id, f'Metric {metric} is not ranked (see leaderboardMetrics)')
+        offset, entries, total, ranks_of_players, epoch, version = result
+        response = {
+            'id': id,
+            'instruction': 'leaderboard',
+            'metric': metric,
+            'epoch': epoch,
+            'version': version,
+            'total': total,
+            'offset': offset,
+            'entries': [{'rank': entry_rank, 'name': player, 'value': value} for entry_rank, player, value in entries],
+            # 下一页的 after 参数，已到末尾时为 null
+            'next': [entries[-1][2], entries[-1][1]] if len(entries) > 0 and offset + len(entries) < total else None
+        }
+        if len(players) > 0:
+            response['players'] = ranks_of_players
+        return json.dumps(response)
+
+
+    def __get_players_rates(self, id: Any, arguments: dict) -> str:
+        metrics = arguments.get('metrics') or PLAYER_DATA_ITEMS
+        if not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics):
+            return make_error_response(id, 'metrics must be a list of metric names')
+        unknown = [item for item in metrics if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            return make_error_response(id, f'Unknown metrics: {", ".join(unknown)}')
+        item_indexes = [PLAYER_DATA_ITEM_INDEX[item] for item in metrics]
+        players = arguments.get('players')
+        if players is not None and (not isinstance(players, list) or not all(isinstance(p, str) for p in players)):
+            return make_error_response(id, 'players must be a list of player names')
+        try:
+            window = float(arguments['window']) if 'window' in arguments else math.inf
+        except (TypeError, ValueError):
+            return make_error_response(id, 'Invalid window')
+        if not window > 0:
+            return make_error_response(id, 'window must be positive')
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            rates = player_data_records.rates
+            if rates is None:
+                return make_error_response(id, 'Rate tracking is disabled (see rateBuckets)')
+            now = time.time()
+            data = []
+            for player in players if players is not None else list(rates.entries):
+                result = rates.query(player, item_indexes, window, now)
+                if result is not None:
+                    data.append({'name': player, 'span': result[0], 'data': result[1]})
+            width = rates.width
+            window = math.ceil(min(window, rates.buckets * width) / width) * width
+        return json.dumps({
+            'id': id,
+            'instruction': 'players_rates',
+            'time': now,
+            'window': window,
+            'bucket': width,
+            'data': data
+        })
+
+
+    async def __get_players_history(self, id: Any, arguments: dict) -> str:
+        if player_history is None:
+            return make_error_response(id, 'History is not enabled on this server')
+        players = arguments.get('players')
+        if players is not None and (not isinstance(players, list) or not all(isinstance(p, str) for p in players)):
+            return make_error_response(id, 'players must be a list of player names')
+        metrics = arguments.get('metrics')
+        if metrics is not None and (not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics)):
+            return make_error_response(id, 'metrics must be a list of metric names')
+        unknown = [item for item in metrics or [] if item not in PLAYER_DATA_ITEM_INDEX]
+        if len(unknown) > 0:
+            return make_error_response(id, f'Unknown metrics: {", ".join(unknown)}')
+        try:
+            end = int(arguments.get('end', time.time()))
+            start = int(arguments.get('start', end - 3600))
+            step = int(arguments.get('step', 0))
+        except (TypeError, ValueError):
+            return make_error_response(id, 'Invalid time range or step')
+        if start > end or step < 0 or (step > 0 and (end - start) // step > HISTORY_MAX_POINTS):
+            return make_error_response(id, 'Invalid time range or step')
+        if step == 0 and end - start > HISTORY_MAX_RAW_RANGE:
+            return make_error_response(id, f'The time range must not exceed {HISTORY_MAX_RAW_RANGE} s without step')
+        # 查询可能需要读取大量历史记录，放到线程池中执行，避免阻塞事件循环
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, player_history.query, players, metrics or None, start, end, step, HISTORY_MAX_POINTS)
+        except ValueError as ex:
+            return make_error_response(id, str(ex))
+        return json.dumps({
+            'id': id,
+            'instruction': 'players_history',
+            'start': start,
+            'end': end,
+            'step': step,
+            'data': data
+        })
+
+
+# RCON数据包的类型：命令的回复、执行命令、登录（登录的回复的类型与执行命令相同）
+RCON_TYPE_RESPONSE: int = 0
+RCON_TYPE_COMMAND: int = 2
+RCON_TYPE_LOGIN: int = 3
+# RCON数据包头：数据包长度（不含本字段）、数据包ID、类型，均为小端序32位整型；数据包以两个空字节结尾
+RCON_HEADER_STRUCT: struct.Struct = struct.Struct('<iii')
+# 命令（UTF-8编码）的最大长度（字节）。原版服务器每次读取至多1460字节并将其视为一个完整的数据包，
+# 更长的命令会使其断开连接
+RCON_MAX_COMMAND_LENGTH: int = 1446
+# 较长的回复会被拆分为多个ID相同的数据包，除最后一个以外，各数据包的内容均为该长度（字节）
+RCON_REPLY_CHUNK_SIZE: int = 4096
+# 连接及登录的超时时间（s）
+RCON_CONNECT_TIMEOUT: float = 5.0
+# 连接或登录失败后，重连间隔（s）的下限及上限（按指数退避）
+RCON_RECONNECT_MIN: float = 1.0
+RCON_RECONNECT_MAX: float = 30.0
+
+
+# 经RCON发送的一组命令（按顺序在同一连接上发送），收到全部回复后，以各命令的回复为参数执行回调
+class RconCommandGroup(object):
+    __slots__ = ('commands', 'callback', 'replies')
+
+    def __init__(self, commands: list[str], callback: Callable[[list[str]], None]):
+        self.commands: list[str] = commands
+        self.callback: Callable[[list[str]], None] = callback
+        self.replies: list[str] = []
+
+
+# 一个RCON连接。MC服务器按顺序处理同一连接上的命令，回复的顺序与命令的发送顺序一致
+class RconConnection(object):
+    def __init__(self, index: int):
+        # 连接的序号（用于输出日志）
+        self.index: int = index
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        # 是否已连接并登录
+        self.connected: bool = False
+        # 下一个数据包ID
+        self.next_id: int = 1
+        # 尚未发送的命令，每项为 (命令组, 命令在组中的下标)
+        self.queue: deque[tuple[RconCommandGroup, int]] = deque()
+        # 已发送、等待回复的数据包，每项为 (数据包ID, 命令组, 命令在组中的下标)，命令组为 None 的是标记数据包
+        self.in_flight: deque[tuple[int, RconCommandGroup | None, int]] = deque()
+        # 已收到的当前回复的内容（回复被拆分为多个数据包时）
+        self.reply: bytearray = bytearray()
+        # 最近一次连接失败的原因
+        self.last_error: str | None = None
+
+
+    def load(self) -> int:
+        return len(self.queue) + len(self.in_flight)
+
+
+# 经RCON向MC服务器发送命令的传输方式：维护多个RCON连接，命令的结果直接在其回复中返回，
+# 无需从控制台输出中解析，也不受控制台中其他输出的影响。
+# 批量采集等依赖数据包中共享存储的命令组始终经同一连接按顺序发送，以免不同连接上的命令交错执行；其余命令发往负载最小的连接。
+# 每个连接上最多有 max_pipelined 个命令同时等待回复（为1时收到回复后再发送下一条命令）。
+class RconTransport(object):
+    def __init__(self, address: str, port: int, password: str, connections: int, max_pipelined: int):
+        self.address: str = address
+        self.port: int = port
+        self.password: str = password
+        # 每个连接上同时等待回复的命令数上限
+        self.max_pipelined: int = max(max_pipelined, 1)
+        self.connections: list[RconConnection] = [RconConnection(i) for i in range(max(connections, 1))]
+        # 运行时的事件循环，启动后才可用
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # 待分配到各连接的命令组（可在任意线程中添加），每项为 (命令组, 是否须经同一连接按顺序发送)
+        self.submissions: deque[tuple[RconCommandGroup, bool]] = deque()
+        # 是否已安排分配待分配的命令组
+        self.dispatch_scheduled: bool = False
+        # 各连接均已完成首次连接尝试（无论成功与否）的信号，启动预热在此之后进行，以便经RCON发送
+        self.attempted: asyncio.Event = asyncio.Event()
+        self.attempted_connections: set[int] = set()
+
+        # 统计信息
+        self.commands_sent: int = 0
+        self.replies_received: int = 0
+        # 因连接断开而未收到回复的命令数
+        self.commands_lost: int = 0
+        # 因没有可用的连接而改为经控制台发送的命令组数
+        self.fallbacks: int = 0
+        self.reconnects: int = 0
+
+
+    @property
+    def connected(self) -> bool:
+        return any(conn.connected for conn in self.connections)
+
+
+    def submit(self, commands: list[str], callback: Callable[[list[str]], None], ordered: bool = False) -> bool:
+        """
+        经RCON发送一组命令，收到全部回复后在运行时的事件循环中执行 callback。可在任意线程中调用。
+        ordered 为 True 时，该组命令与其他同样指定了 ordered 的命令组经同一连接按顺序发送。
+        没有可用的连接（或命令过长）时返回 False，由调用者改为经控制台发送；发送后连接断开的，不会执行回调。
+        """
+
+        loop = self.loop
+        if loop is None or loop.is_closed() or not self.connected or \
+                any(len(command.encode('utf-8')) > RCON_MAX_COMMAND_LENGTH for command in commands):
+            self.fallbacks += 1
+            return False
+        self.submissions.append((RconCommandGroup(commands, callback), ordered))
+        # 先安排分配再添加命令组可能遗漏，故先添加，再检查是否已安排
+        if not self.dispatch_scheduled:
+            self.dispatch_scheduled = True
+            try:
+                loop.call_soon_threadsafe(self.__dispatch)
+            except RuntimeError:
+                # 事件循环恰好已关闭
+                pass
+        return True
+
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        self.loop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(self.__maintain(conn, stop_event)) for conn in self.connections]
+        await stop_event.wait()
+        for conn in self.connections:
+            if conn.writer is not None:
+                conn.writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'connections': sum(1 for conn in self.connections if conn.connected),
+            'commands': self.commands_sent,
+            'replies': self.replies_received,
+            'lost': self.commands_lost,
+            'fallbacks': self.fallbacks,
+            'reconnects': self.reconnects
+        }
+
+
+    def __dispatch(self) -> None:
+        self.dispatch_scheduled = False
+        while len(self.submissions) > 0:
+            group, ordered = self.submissions.popleft()
+            connections = [conn for conn in self.connections if conn.connected]
+            if len(connections) == 0:
+                # 提交后连接恰好全部断开，该组命令的请求将超时
+                self.commands_lost += len(group.commands)
+                continue
+            conn = connections[0] if ordered else min(connections, key=RconConnection.load)
+            for index in range(len(group.commands)):
+                conn.queue.append((group, index))
+            self.__pump(conn)
+
+
+    def __pump(self, conn: RconConnection) -> None:
+        # 在同时等待回复的命令数上限之内，发送队列中的命令
+        while len(conn.queue) > 0 and len(conn.in_flight) < self.max_pipelined:
+            group, index = conn.queue.popleft()
+            self.__send(conn, RCON_TYPE_COMMAND, group.commands[index], group, index)
+            self.commands_sent += 1
+
+
+    def __send(self, conn: RconConnection, packet_type: int, body: str,
+               group: RconCommandGroup | None, index: int) -> int:
+        packet_id = conn.next_id
+        conn.next_id = packet_id + 1 if packet_id < 2147483647 else 1
+        data = body.encode('utf-8')
+        conn.writer.write(RCON_HEADER_STRUCT.pack(len(data) + 10, packet_id, packet_type) + data + b'\x00\x00')
+        conn.in_flight.append((packet_id, group, index))
+        return packet_id
+
+
+    async def __read_packet(self, conn: RconConnection) -> tuple[int, int, bytes]:
+        length = struct.unpack('<i', await conn.reader.readexactly(4))[0]
+        if length < 10:
+            raise ConnectionError(f'Malformed RCON packet of length {length}')
+        data = await conn.reader.readexactly(length)
+        packet_id, packet_type = struct.unpack_from('<ii', data)
+        return packet_id, packet_type, data[8:-2]
+
+
+    async def __login(self, conn: RconConnection) -> None:
+        conn.reader, conn.writer = await asyncio.open_connection(self.address, self.port)
+        packet_id = self.__send(conn, RCON_TYPE_LOGIN, self.password, None, 0)
+        conn.in_flight.clear()
+        while True:
+            response_id, packet_type, body = await self.__read_packet(conn)
+            if packet_type != RCON_TYPE_COMMAND:
+                continue
+            if response_id == -1:
+                raise ConnectionError('RCON authentication failed')
+            if response_id == packet_id:
+                return
+
+
+    async def __maintain(self, conn: RconConnection, stop_event: asyncio.Event) -> None:
+        # 建立并保持一个连接，断开后按指数退避重连
+        delay = RCON_RECONNECT_MIN
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(self.__login(conn), RCON_CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as ex:
+                error = str(ex) or type(ex).__name__
+                # 同一原因只输出一次，以免MC服务器未开启RCON时每次重连都输出日志
+                if error != conn.last_error and not stop_event.is_set():
+                    psi.logger.warning(f'Failed to connect to RCON at {self.address}:{self.port} ' +
+                                       f'(connection #{conn.index}), commands are sent through the console: {error}')
+                conn.last_error = error
+                self.__close(conn)
+                self.__mark_attempted(conn)
+                await wait_event(stop_event, delay)
+                delay = min(delay * 2.0, RCON_RECONNECT_MAX)
+                continue
+            if conn.last_error is not None:
+                self.reconnects += 1
+            psi.logger.info(f'RCON connection #{conn.index} to {self.address}:{self.port} established')
+            conn.last_error = None
+            conn.connected = True
+            self.__mark_attempted(conn)
+            delay = RCON_RECONNECT_MIN
+            try:
+                while True:
+                    self.__receive(conn, *await self.__read_packet(conn))
+            except (OSError, asyncio.IncompleteReadError) as ex:
+                if not stop_event.is_set():
+                    conn.last_error = str(ex) or type(ex).__name__
+                    psi.logger.warning(f'RCON connection #{conn.index} lost: {conn.last_error}')
+            self.__close(conn)
+
+
+    def __mark_attempted(self, conn: RconConnection) -> None:
+        if conn.index in self.attempted_connections:
+            return
+        self.attempted_connections.add(conn.index)
+        if len(self.attempted_connections) == len(self.connections):
+            self.attempted.set()
+
+
+    def __close(self, conn: RconConnection) -> None:
+        conn.connected = False
+        self.commands_lost += len(conn.queue) + sum(1 for _, group, _ in conn.in_flight if group is not None)
+        conn.queue.clear()
+        conn.in_flight.clear()
+        conn.reply = bytearray()
+        if conn.writer is not None:
+            conn.writer.close()
+            conn.writer = None
+        conn.reader = None
+
+
+    def __receive(self, conn: RconConnection, packet_id: int, packet_type: int, body: bytes) -> None:
+        # 被拆分的回复只有在收到ID不同的下一个数据包时才能确定已经结束
+        while len(conn.in_flight) > 0 and conn.in_flight[0][0] != packet_id:
+            self.__complete(conn)
+        if len(conn.in_flight) == 0:
+            return
+        conn.reply += body
+        if len(body) < RCON_REPLY_CHUNK_SIZE:
+            self.__complete(conn)
+        elif len(conn.in_flight) == 1:
+            # 回复可能尚未结束，而之后又没有等待回复的命令，发送一个标记数据包（MC服务器将回复 'Unknown request'），
+            # 以其回复确定本回复已经结束
+            self.__send(conn, RCON_TYPE_RESPONSE, '', None, 0)
+        self.__pump(conn)
+
+
+    def __complete(self, conn: RconConnection) -> None:
+        packet_id, group, index = conn.in_flight.popleft()
+        reply = conn.reply.decode('utf-8', 'replace')
+        conn.reply = bytearray()
+        if group is None:
+            return
+        self.replies_received += 1
+        group.replies.append(reply)
+        if len(group.replies) == len(group.commands):
+            try:
+                group.callback(group.replies)
+            except Exception as ex:
+                psi.logger.error(f'Error occurred while handling the RCON reply: {ex}')
+
+
+# 插件的运行时：在一个单独的线程中运行 asyncio 事件循环，轮询任务与 websocket 服务器均运行于其中，
+# 停止时由事件驱动，无需定期检查停止标志
+class MonitorRuntime(threading.Thread):
+    def __init__(self, monitor: ServerMonitor, server: WebsocketServer, rcon: RconTransport | None = None):
+        super().__init__()
+        self.name = 'MonitorRuntime'
+        self.daemon = False # 本线程不是守护线程，以确保数据同步及与远程网站服务器的交流不会被异常地中断
+
+        self.monitor: ServerMonitor = monitor
+        self.websocket_server: WebsocketServer = server
+        # RCON传输，未启用时为 None
+        self.rcon: RconTransport | None = rcon
+        # 本线程的 asyncio 事件循环，启动后才可用
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # 停止信号（只在事件循环内访问），启动后才可用
+        self.stop_event: asyncio.Event | None = None
+        # 是否已被要求停止
+        self.stopping: bool = False
+        # 轮询任务已结束的信号
+        self.monitor_stopped = threading.Event()
+
+
+    def run(self) -> None:
+        asyncio.run(self.__async_run())
+
+
+    async def __async_run(self) -> None:
+        self.stop_event = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        # 在事件循环启动前就已被要求停止
+        if self.stopping:
+            self.stop_event.set()
+        rcon_task = asyncio.ensure_future(self.rcon.run(self.stop_event)) if self.rcon is not None else None
+        monitor_task = asyncio.ensure_future(self.__run_monitor())
+        try:
+            await self.websocket_server.run(self.stop_event)
+        finally:
+            await monitor_task
+            if rcon_task is not None:
+                await rcon_task
+        psi.logger.info('The monitor runtime is stopping...')
+
+
+    async def __run_monitor(self) -> None:
+        try:
+            await self.monitor.run(self.stop_event)
+        finally:
+            self.monitor_stopped.set()
+
+
     def stop(self) -> None:
-        self.stop_event.set()
+        """
+        要求运行时停止，可在任意线程中调用。
+        """
+
+        self.stopping = True
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                # 事件循环恰好已关闭
+                pass
+
+
+# 卸载插件时，在 shutdownDrainTimeout 之外再等待运行时线程结束的时间（s）
+RUNTIME_STOP_MARGIN: float = 1.0
+# 重新加载插件时，移交给新实例的套接字在被领取前保留的最长时间（s），超时后关闭（如插件被卸载而非重新加载）
+LISTEN_SOCKET_HANDOFF_TIMEOUT: float = 10.0
+
+
+# 重新加载插件时，旧实例移交给新实例的监听套接字。
+# 旧实例卸载时复制一份监听套接字，在新实例领取之前，连接请求由操作系统保留在等待队列中，不会被拒绝。
+class ListenSocketHandoff(object):
+    def __init__(self, address: tuple[str, int], listen_socket: socket.socket):
+        self.lock = threading.Lock()
+        # 套接字所监听的地址（即创建时配置的IP地址与端口号）
+        self.address: tuple[str, int] = address
+        self.listen_socket: socket.socket | None = listen_socket
+        # 超时未被领取时关闭套接字
+        self.timer = threading.Timer(LISTEN_SOCKET_HANDOFF_TIMEOUT, self.release)
+        self.timer.daemon = True
+        self.timer.start()
+
+
+    def claim(self, address: tuple[str, int]) -> socket.socket | None:
+        """
+        领取所移交的套接字，若其监听的地址与 address 不一致，或已被领取，则返回 None。
+        """
+
+        self.timer.cancel()
+        with self.lock:
+            listen_socket = self.listen_socket
+            self.listen_socket = None
+        if listen_socket is not None and address != self.address:
+            listen_socket.close()
+            return None
+        return listen_socket
+
+
+    def release(self) -> None:
+        """
+        关闭尚未被领取的套接字。
+        """
+
+        listen_socket = self.claim(self.address)
+        if listen_socket is not None:
+            listen_socket.close()
 
 
 # 插件配置数据
@@ -342,103 +4144,511 @@ plugin_config: PluginConfig = None
 psi: PluginServerInterface = None
 # 记录当前在线玩家（玩家名称）的列表
 online_players: list[str] = []
-# 函数执行结果的回调队列
-mc_func_schedules: Queue[MCFuncResultSchedule] = Queue()
-# 用于记录服务器上玩家数据的字典。键为玩家名称，值为 PlayerData 对象
-player_data_records: dict[str, PlayerData] = {}
+# 控制台输出的分类器
+console_line_classifier: ConsoleLineClassifier = ConsoleLineClassifier()
+# 插件自身的运行指标
+monitor_metrics: MonitorMetrics = MonitorMetrics()
+# 等待函数执行结果的请求表
+pending_requests: PendingRequestTable = PendingRequestTable(5000)
+# 用于记录服务器上玩家数据的存储结构
+player_data_records: PlayerDataStore = PlayerDataStore()
+# 玩家数据的历史记录存储，未启用时为 None
+player_history: PlayerHistoryStore = None
+# 玩家数据快照的编码结果缓存
+snapshot_cache: SnapshotCache = SnapshotCache()
 # 用于确保并发数据安全的线程同步锁
 player_data_records_lock = None
-# 一些需要用到的线程
-server_monitor_thread: ServerMonitorThread = None
-websocket_thread: WebsocketThread = None
+# 插件的运行时，及运行于其中的轮询任务与 websocket 服务器
+monitor_runtime: MonitorRuntime = None
+server_monitor: ServerMonitor = None
+websocket_server: WebsocketServer = None
+# RCON传输，未启用时为 None
+rcon_transport: RconTransport = None
+# 是否有经控制台发送、结果尚暂存于数据包中待取回的逐条查询
+console_results_pending: bool = False
+# 数据包不支持带关联ID的逐条查询（旧版本数据包）时为 True，经控制台发送的逐条查询改用 msm:get_data
+untagged_get_data: bool = False
+# 经控制台发送一组命令（逐条查询、取回其结果的2条命令、批量采集的3条命令）时持有的锁。
+# 轮询任务（运行时线程）与玩家加入游戏等事件（MCDR线程）都会发送命令，各组命令须连续发送，不与其他线程的命令交错
+console_command_lock = threading.Lock()
+# 卸载插件时移交给新实例的监听套接字
+listen_socket_handoff: ListenSocketHandoff = None
+
+
+# 将待采集的玩家列表写入数据包的命令存储中的命令
+COLLECT_PLAYERS_COMMAND: str = 'data modify storage msm:collect players set value [%s]'
+
+
+def execute_list_players() -> int:
+    request_id = pending_requests.register(MCFuncResultSchedule('list', {}, list_players_callback))
+    if rcon_transport is not None and rcon_transport.submit(
+            ['list'], lambda replies: resolve_rcon_replies(request_id, 'list', replies)):
+        return request_id
+    # list 命令的输出无法携带关联ID，由 on_info 将其匹配给最早发出的 list 请求
+    psi.execute('list')
+    return request_id
+
+
+def list_players_callback(func: str, args: dict, players: list[str]) -> None:
+    # 以 list 命令输出的玩家替换在线玩家列表。控制台输出与玩家加入、离开的事件按先后顺序处理，
+    # 此后的事件将在此基础上继续更新在线玩家列表
+    online_players[:] = list(dict.fromkeys(players))
+    # 玩家的数据已被移出到存档时，将其移回内存（经RCON取得的结果在运行时的事件循环中回调，需在线程池中读取存档）
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is not None:
+        loop.run_in_executor(None, restore_players, players)
+    else:
+        restore_players(players)
 
 
 def execute_msm_get_data(player: str, entry: str) -> int:
-    # 生成符合MC命令语法的MC函数命令
-    command = 'function msm:get_data {player:%s,entry:%s}' % (player, entry)
-    # 将命令发送到MC服务器执行
-    psi.execute(command)
-    # 记录该函数执行结果的回调
+    global console_results_pending
+
+    # 先登记该函数执行结果的回调，取得本次请求的关联ID
     args = {'player': player, 'entry': entry}
-    mc_func_schedules.put(MCFuncResultSchedule('msm:get_data', args, msm_get_data_callback))
+    request_id = pending_requests.register(MCFuncResultSchedule('msm:get_data', args, msm_get_data_callback))
+    # 经RCON发送时，函数的返回值直接在命令的回复中，无需暂存于数据包中再取回
+    if rcon_transport is not None and rcon_transport.submit(
+            ['function msm:get_data {player:%s,entry:%s}' % (player, entry)],
+            lambda replies: resolve_rcon_replies(request_id, 'msm:get_data', replies)):
+        return request_id
+    with console_command_lock:
+        if untagged_get_data:
+            # 旧版本数据包：执行结果直接输出到控制台，由 on_info 按输出的先后顺序匹配给最早发出的请求
+            pending_requests.retag(request_id, UNTAGGED_GET_DATA)
+            psi.execute('function msm:get_data {player:%s,entry:%s}' % (player, entry))
+            return request_id
+        # 生成符合MC命令语法的MC函数命令，关联ID随命令一同发送
+        command = 'function msm:get_data_tagged {player:%s,entry:%s,id:%d}' % (player, entry, request_id)
+        # 将命令发送到MC服务器执行，执行结果暂存于数据包中，由 execute_msm_fetch_results 统一取回
+        psi.execute(command)
+        console_results_pending = True
+    return request_id
+
+
+def execute_msm_fetch_results() -> int:
+    """
+    取回经控制台发送的逐条查询的结果，返回发送的命令数（所有逐条查询均经RCON发送，或数据包不支持带关联ID的查询时无需取回）。
+    """
+
+    global console_results_pending
+
+    with console_command_lock:
+        if untagged_get_data or (not console_results_pending and rcon_transport is not None and rcon_transport.connected):
+            return 0
+        console_results_pending = False
+        # 读取所有尚未取回的逐条查询结果，该结果将以一行SNBT文本的形式输出到控制台，由 on_info 统一解析
+        psi.execute('data get storage msm:results pending')
+        # 清空结果缓冲区（MC服务器按顺序执行控制台命令，且持有锁时其他线程不会发送逐条查询，两条命令之间不会有新的结果写入）
+        psi.execute('data modify storage msm:results pending set value []')
+    return 2
+
+
+def make_collect_entries(players: list[str], changed_only: bool, full_players: Collection[str]) -> list[str]:
+    return ['{player:"%s",mode:"%s"}' % (
+        player, 'player_changed' if changed_only and player not in full_players else 'player') for player in players]
+
+
+def split_collect_entries(entries: list[str]) -> list[list[str]]:
+    """
+    将批量采集的玩家列表按RCON命令的长度上限分为多段。
+    """
+
+    limit = RCON_MAX_COMMAND_LENGTH - len(COLLECT_PLAYERS_COMMAND % '')
+    chunks = [[]]
+    length = 0
+    for entry in entries:
+        if len(chunks[-1]) > 0 and length + len(entry) + 1 > limit:
+            chunks.append([])
+            length = 0
+        chunks[-1].append(entry)
+        length += len(entry) + 1
+    return chunks
+
+
+def plan_collect_chunks(players: list[str], changed_only: bool = False,
+                        full_players: Collection[str] = ()) -> list[list[str]]:
+    """
+    取得批量采集指定玩家时的分段（每段为按顺序排列的玩家，需3条命令），参数与 execute_msm_collect_all 相同。
+    经控制台发送时只有一段。
+    """
+
+    if rcon_transport is None or not rcon_transport.connected:
+        return [players]
+    chunks = []
+    start = 0
+    for chunk in split_collect_entries(make_collect_entries(players, changed_only, full_players)):
+        chunks.append(players[start:start + len(chunk)])
+        start += len(chunk)
+    return chunks
+
+
+def execute_msm_collect_all(players: list[str], changed_only: bool = False, full_players: Collection[str] = ()) -> int:
+    """
+    批量采集指定玩家的数据。changed_only 为 True 时，只采集自上次采集以来发生变化的记分项，
+    但 full_players 中的玩家仍采集全部记分项。
+    """
+
+    # 先登记本次批量采集的回调，取得本次请求的关联ID
+    args = {'players': players}
+    request_id = pending_requests.register(MCFuncResultSchedule('msm:collect/all', args, msm_collect_all_callback))
+    entries = make_collect_entries(players, changed_only, full_players)
+    if rcon_transport is not None:
+        # 经RCON发送时，玩家列表按命令的长度上限分为多段依次采集（关联ID相同），收到全部回复后合并为一个结果。
+        # 各段的命令经同一连接按顺序发送，以免与其他批量采集交错执行
+        commands = []
+        for chunk in split_collect_entries(entries):
+            commands += [COLLECT_PLAYERS_COMMAND % ','.join(chunk), 'function msm:collect/all {id:%d}' % request_id,
+                         'data get storage msm:collect result']
+        if rcon_transport.submit(commands, lambda replies: resolve_rcon_replies(request_id, 'msm:collect/all', replies),
+                                 True):
+            return request_id
+    with console_command_lock:
+        # 将待采集的玩家列表（及各玩家的采集方式）写入数据包的命令存储中
+        psi.execute(COLLECT_PLAYERS_COMMAND % ','.join(entries))
+        # 一次性采集所有玩家的全部数据条目
+        psi.execute('function msm:collect/all {id:%d}' % request_id)
+        # 读取采集结果，该结果将以一行SNBT文本的形式输出到控制台，由 on_info 统一解析
+        psi.execute('data get storage msm:collect result')
+    return request_id
+
+
+def resolve_rcon_replies(request_id: int, mc_func: str, replies: list[str]) -> None:
+    """
+    解析经RCON发送的一组命令的回复（与控制台输出的格式相同，可能有多行），将其结果交给关联ID为 request_id 的请求。
+    """
+
+    result = None
+    for reply in replies:
+        for content in reply.split('\n'):
+            try:
+                line = console_line_classifier.classify(content)
+            except (ValueError, IndexError) as ex:
+                psi.logger.error(f'Error occurred while parsing the RCON reply: {ex}')
+                continue
+            if line is None:
+                continue
+            if line.kind == CONSOLE_LINE_FUNCTION_RESULT and mc_func == 'msm:get_data':
+                result = line.value
+            elif line.kind == CONSOLE_LINE_COLLECT_RESULT and mc_func == 'msm:collect/all':
+                # 分段采集时合并各段的结果
+                result = line.rows if result is None else result + line.rows
+            elif line.kind == CONSOLE_LINE_PLAYER_LIST and mc_func == 'list':
+                result = line.players
+    if result is None:
+        # 未能取得结果（如记分项尚无值），该请求将超时
+        return
+    pending_requests.resolve(request_id, mc_func, result)
+    if mc_func != 'list' and websocket_server is not None:
+        websocket_server.notify_data_changed()
+
+
+def msm_collect_all_callback(func: str, args: dict, rows: list[dict]) -> None:
+    global player_data_records
+
+    # 收到批量采集结果，清零轮询任务的未响应计数
+    if server_monitor is not None:
+        server_monitor.batch_unanswered = 0
+
+    # 访问player_data_records前先加锁，整批数据只加锁一次
+    # 注：只采集变化的记分项时，各行只包含发生变化的条目，未出现的玩家及条目保持原值
+    with player_data_records_lock:
+        for row in rows:
+            player = row.get('name')
+            if isinstance(player, str):
+                player_data_records.set_row(player, row)
 
 
 def msm_get_data_callback(func: str, args: dict, result: int) -> None:
     global player_data_records
 
-    # 获取本次回调对应的玩家名称
+    # 获取本次回调对应的玩家名称及数据条目
     player = args['player']
-    # 查询字典中是否已注册有该玩家的信息
-    exist_flag = False
+    item_index = PLAYER_DATA_ENTRY_INDEX.get(args['entry'])
+    if item_index is None:
+        return
+    # 访问player_data_records前先加锁，将MC服务器返回的信息更新到存储结构中去
+    with player_data_records_lock:
+        player_data_records.set(player, item_index, result)
+
+
+def archive_offline_players(limit: int) -> int:
+    """
+    内存中的玩家数超出 limit 时，将最久未活跃的离线玩家的数据移出到磁盘存档，返回移出的玩家数。
+    只在选出玩家及替换存档文件时加锁，读取原存档并写入新存档文件的过程在锁外进行。
+    """
+
     # 访问player_data_records前先加锁
     with player_data_records_lock:
-        for name, data in player_data_records.items():
-            if name == player:
-                data.name = player
-                # 若查找到，将MC服务器返回的信息更新到字典中去
-                match args['entry']:
-                    case 'msm_deathCount':
-                        data.deathCount = result
-                    case 'msm_playerKillCount':
-                        data.playerKillCount = result
-                    case 'msm_totalKillCount':
-                        data.totalKillCount = result
-                    case 'msm_health':
-                        data.health = result
-                    case 'msm_xp':
-                        data.xp = result
-                    case 'msm_level':
-                        data.level = result
-                    case 'msm_food':
-                        data.food = result
-                    case 'msm_air':
-                        data.air = result
-                    case 'msm_armor':
-                        data.armor = result
-                    case 'msm_placeBlockCount':
-                        data.placeBlockCount = result
-                    case 'msm_breakBlockCount':
-                        data.breakBlockCount = result
-                    case 'msm_onlineTime':
-                        data.onlineTime = result
-                player_data_records[player] = data
-                # 将标志变量置为True
-                exist_flag = True
-                break
-        # 若该玩家信息未注册，则创建新的PlayerData对象，并将MC服务器返回的信息更新到对象中
-        if not exist_flag:
-            data = PlayerData()
-            data.name = player
-            match args['entry']:
-                case 'msm_deathCount':
-                    data.deathCount = result
-                case 'msm_playerKillCount':
-                    data.playerKillCount = result
-                case 'msm_totalKillCount':
-                    data.totalKillCount = result
-                case 'msm_health':
-                    data.health = result
-                case 'msm_xp':
-                    data.xp = result
-                case 'msm_level':
-                    data.level = result
-                case 'msm_food':
-                    data.food = result
-                case 'msm_air':
-                    data.air = result
-                case 'msm_armor':
-                    data.armor = result
-                case 'msm_placeBlockCount':
-                    data.placeBlockCount = result
-                case 'msm_breakBlockCount':
-                    data.breakBlockCount = result
-                case 'msm_onlineTime':
-                    data.onlineTime = result
-            player_data_records[player] = data
-
-        # 打印调试信息
-        psi.logger.debug(f'Player {player} data updated: {player_data_records[player]}')
-        psi.logger.debug(f'Now the player data records: {player_data_records}')
+        records = player_data_records.plan_eviction(limit, online_players)
+        if len(records) == 0:
+            return 0
+        archive = player_data_records.archive
+        base = archive.state()
+        generation = archive.generation + 1
+    written = archive.write(generation, base, records)
+    with player_data_records_lock:
+        stale = player_data_records.evict(records, online_players)
+        archive.install(generation, written, base, stale)
+    return len(records) - len(stale)
+
+
+def snapshot_player_data() -> tuple[PlayerDataSnapshot, str]:
+    """
+    取得所有玩家数据的快照及其数据标识。只在锁内复制内存中的数据列，存档中的玩家在锁外从磁盘读取，
+    以免磁盘读取阻塞轮询任务及 on_info。
+    """
+
+    for _ in range(ARCHIVE_READ_ATTEMPTS):
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            snapshot = player_data_records.snapshot(False)
+            epoch = player_data_records.epoch
+            archive = player_data_records.archive
+            state = player_data_records.archive_state()
+        if state is None:
+            return snapshot, epoch
+        try:
+            names, columns, _ = archive.read_file(*state)
+        except FileNotFoundError:
+            # 读取前存档已被重写，重新取得快照
+            continue
+        snapshot.extend(names, columns)
+        return snapshot, epoch
+    with player_data_records_lock:
+        return player_data_records.snapshot(), player_data_records.epoch
+
+
+def player_data_changes_since(version: int, item_indexes: list[int]) -> tuple[list[tuple[str, int, int]], int, str]:
+    """
+    取得版本号 version 之后发生变化的数据（格式同 PlayerDataStore.changes_since），以及当前的数据版本号与数据标识。
+    与 snapshot_player_data 相同，需要读取存档时（如订阅者重新获取全部数据）在锁外读取。
+    """
+
+    for _ in range(ARCHIVE_READ_ATTEMPTS):
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            changes = player_data_records.changes_since(version, item_indexes, False)
+            current = player_data_records.version
+            epoch = player_data_records.epoch
+            archive = player_data_records.archive
+            state = player_data_records.archive_state(version)
+        if state is None:
+            return changes, current, epoch
+        try:
+            archived = archive.read_file(*state)
+        except FileNotFoundError:
+            continue
+        changes.extend(PlayerDataStore.archived_changes(archived, version, item_indexes))
+        return changes, current, epoch
+    with player_data_records_lock:
+        return (player_data_records.changes_since(version, item_indexes), player_data_records.version,
+                player_data_records.epoch)
+
+
+def with_archived_players(candidates: Callable[[PlayerDataStore], Collection[str] | str | None],
+                          compute: Callable[[PlayerDataStore, tuple[list[str], list[array], list[array]]], Any]) -> Any:
+    """
+    以存档中的部分玩家计算结果：先在锁内以 candidates 确定需从存档中读取的玩家（参数同 PlayerDataArchive.find_players，
+    无需读取时返回 None），在锁外读取存档后，再在锁内以 compute(player_data_records, 读取的玩家) 计算并返回结果。
+    读取期间存档被重写时重试，仍失败则改为在锁内读取。可能读取磁盘，不应在事件循环中调用。
+    """
+
+    for _ in range(ARCHIVE_READ_ATTEMPTS):
+        # 访问player_data_records前先加锁
+        with player_data_records_lock:
+            archive = player_data_records.archive
+            wanted = candidates(player_data_records) if archive is not None and len(archive) > 0 else None
+            if wanted is None:
+                return compute(player_data_records, PlayerDataArchive.empty())
+            state = archive.state()
+        try:
+            archived = archive.find_players(wanted, state)
+        except FileNotFoundError:
+            # 读取前存档已被重写，重新确定需读取的玩家
+            continue
+        with player_data_records_lock:
+            # 读取期间有玩家被移出到存档时，存档文件已被重写，读取的结果可能遗漏这些玩家
+            if player_data_records.archive is archive and archive.path == state[0]:
+                return compute(player_data_records, archived)
+    with player_data_records_lock:
+        archive = player_data_records.archive
+        wanted = candidates(player_data_records) if archive is not None and len(archive) > 0 else None
+        return compute(player_data_records,
+                       archive.find_players(wanted) if wanted is not None else PlayerDataArchive.empty())
+
+
+def restore_players(players: list[str]) -> None:
+    """
+    玩家的数据已被移出到存档时，将其移回内存。存档在锁外读取。
+    """
+
+    with_archived_players(lambda store: [player for player in players if player not in store.index] or None,
+                          lambda store, archived: store.restore_rows(archived))
+
+
+def collect_monitor_stats() -> dict[str, Any]:
+    """
+    汇总插件自身的运行指标（耗时类指标单位为ms）。
+    """
+
+    with player_data_records_lock:
+        players = len(player_data_records)
+        archived = len(player_data_records.archive) if player_data_records.archive is not None else 0
+        rate_tracked = len(player_data_records.rates) if player_data_records.rates is not None else 0
+    return {
+        'requests': pending_requests.stats(),
+        'request_latency_ms': {func: histogram.summary(1000.0)
+                               for func, histogram in monitor_metrics.request_latency.items()},
+        'pending_depth': monitor_metrics.pending_depth.summary(),
+        'poll_cycle_ms': monitor_metrics.poll_cycle.summary(1000.0),
+        'commands_sent': monitor_metrics.commands_sent.value,
+        'lock_wait_ms': monitor_metrics.lock_wait.summary(1000.0),
+        'lock_hold_ms': monitor_metrics.lock_hold.summary(1000.0),
+        'websocket': {
+            'connections': len(websocket_server.connections) if websocket_server is not None else 0,
+            'subscriptions': len(websocket_server.subscriptions) if websocket_server is not None else 0,
+            'requests': monitor_metrics.websocket_requests.value,
+            'dropped_responses': monitor_metrics.websocket_dropped.value,
+            'overflow_disconnects': monitor_metrics.websocket_overflowed.value,
+            'rejected_connections': monitor_metrics.websocket_rejected.value,
+            'encode_ms': monitor_metrics.websocket_encode.summary(1000.0),
+            'send_ms': monitor_metrics.websocket_send.summary(1000.0)
+        },
+        'snapshot_cache': snapshot_cache.stats(),
+        'players': players,
+        'players_archived': archived,
+        'players_rate_tracked': rate_tracked,
+        'warm_start': {
+            'ready': server_monitor.ready if server_monitor is not None else False,
+            'attempts': server_monitor.warm_start_attempts if server_monitor is not None else 0,
+            'players': server_monitor.warm_start_players if server_monitor is not None else 0,
+            'duration_ms': server_monitor.warm_start_duration * 1000.0 if server_monitor is not None else 0.0,
+            'ready_after_ms': server_monitor.ready_after * 1000.0 if server_monitor is not None else 0.0
+        },
+        'rcon': rcon_transport.stats() if rcon_transport is not None else None
+    }
+
+
+def render_monitor_metrics() -> str:
+    """
+    以 Prometheus 文本格式导出插件自身的运行指标。
+    """
+
+    lines = []
+
+    def add_metric(name: str, kind: str, help: str, samples: list[tuple[str, Any]]) -> None:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+
+    def add_histogram(name: str, help: str, histograms: list[tuple[str, MetricHistogram]]) -> None:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, histogram in histograms:
+            buckets, count, total = histogram.snapshot()
+            prefix = labels + ',' if labels else ''
+            cumulative = 0
+            for bound, bucket in zip(histogram.bounds, buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f'{name}_sum{suffix} {total}')
+            lines.append(f'{name}_count{suffix} {count}')
+
+    stats = pending_requests.stats()
+    with player_data_records_lock:
+        players = len(player_data_records)
+        archived = len(player_data_records.archive) if player_data_records.archive is not None else 0
+        rate_tracked = len(player_data_records.rates) if player_data_records.rates is not None else 0
+    cache_stats = snapshot_cache.stats()
+    add_histogram('msm_request_latency_seconds', 'Round-trip latency of commands from psi.execute to on_info.',
+                  [(f'func="{func}"', histogram) for func, histogram in monitor_metrics.request_latency.items()])
+    add_metric('msm_requests_total', 'counter', 'Requests to the Minecraft server by outcome.',
+               [(f'result="{result}"', stats[result])
+                for result in ('resolved', 'expired', 'orphaned', 'mismatched', 'untagged')])
+    add_metric('msm_pending_requests', 'gauge', 'Requests currently waiting for their result.',
+               [('', stats['pending'])])
+    add_histogram('msm_pending_requests_depth', 'Requests waiting for their result at the start of each poll.',
+                  [('', monitor_metrics.pending_depth)])
+    add_histogram('msm_poll_cycle_duration_seconds', 'Duration of each poll cycle.',
+                  [('', monitor_metrics.poll_cycle)])
+    add_metric('msm_commands_sent_total', 'counter', 'Commands sent to the Minecraft server.',
+               [('', monitor_metrics.commands_sent.value)])
+    add_histogram('msm_lock_wait_seconds', 'Time spent waiting for the player data lock.',
+                  [('', monitor_metrics.lock_wait)])
+    add_histogram('msm_lock_hold_seconds', 'Time the player data lock was held.',
+                  [('', monitor_metrics.lock_hold)])
+    add_histogram('msm_websocket_encode_seconds', 'Time spent processing a websocket request and encoding its responses.',
+                  [('', monitor_metrics.websocket_encode)])
+    add_histogram('msm_websocket_send_seconds', 'Time spent sending each websocket message.',
+                  [('', monitor_metrics.websocket_send)])
+    add_metric('msm_websocket_connections', 'gauge', 'Active websocket connections.',
+               [('', len(websocket_server.connections) if websocket_server is not None else 0)])
+    add_metric('msm_websocket_subscriptions', 'gauge', 'Active player data subscriptions.',
+               [('', len(websocket_server.subscriptions) if websocket_server is not None else 0)])
+    add_metric('msm_websocket_requests_total', 'counter', 'Websocket requests received.',
+               [('', monitor_metrics.websocket_requests.value)])
+    add_metric('msm_websocket_dropped_responses_total', 'counter', 'Responses dropped because the send queue was full.',
+               [('', monitor_metrics.websocket_dropped.value)])
+    add_metric('msm_websocket_overflow_disconnects_total', 'counter', 'Connections closed because the send queue overflowed.',
+               [('', monitor_metrics.websocket_overflowed.value)])
+    add_metric('msm_websocket_rejected_connections_total', 'counter', 'Connections rejected by the connection limit.',
+               [('', monitor_metrics.websocket_rejected.value)])
+    add_metric('msm_snapshot_cache_lookups_total', 'counter', 'Snapshot cache lookups by outcome.',
+               [('result="hit"', cache_stats['hits']), ('result="miss"', cache_stats['misses'])])
+    add_metric('msm_players', 'gauge', 'Players with recorded data.', [('', players)])
+    add_metric('msm_players_archived', 'gauge', 'Players whose data has been moved to the on-disk archive.',
+               [('', archived)])
+    add_metric('msm_players_rate_tracked', 'gauge', 'Players with sliding-window rate statistics.',
+               [('', rate_tracked)])
+    add_metric('msm_ready', 'gauge', 'Whether the startup resync has completed.',
+               [('', int(server_monitor is not None and server_monitor.ready))])
+    if rcon_transport is not None:
+        rcon_stats = rcon_transport.stats()
+        add_metric('msm_rcon_connections', 'gauge', 'Established RCON connections.', [('', rcon_stats['connections'])])
+        add_metric('msm_rcon_commands_total', 'counter', 'Commands sent over RCON.', [('', rcon_stats['commands'])])
+        add_metric('msm_rcon_lost_commands_total', 'counter', 'Commands whose RCON connection was lost before the reply.',
+                   [('', rcon_stats['lost'])])
+        add_metric('msm_rcon_fallbacks_total', 'counter', 'Command groups sent through the console as RCON was unavailable.',
+                   [('', rcon_stats['fallbacks'])])
+    add_metric('msm_warm_start_seconds', 'gauge', 'Time from plugin load to a complete snapshot after the startup resync.',
+               [('', server_monitor.ready_after if server_monitor is not None else 0.0)])
+    return '\n'.join(lines) + '\n'
+
+
+def on_command_stats(source: CommandSource) -> None:
+    # 以可读的形式输出插件自身的运行指标
+    stats = collect_monitor_stats()
+    requests = stats['requests']
+    latency = stats['request_latency_ms']
+    poll = stats['poll_cycle_ms']
+    ws = stats['websocket']
+    source.reply(f'{PLUGIN_METADATA["name"]} stats:')
+    source.reply(f'- Requests: {requests["pending"]} pending, {requests["resolved"]} resolved, ' +
+                 f'{requests["expired"]} expired, {requests["orphaned"]} orphaned; latency p50/p99 ' +
+                 ', '.join(f'{func} {summary["p50"]:g}/{summary["p99"]:g}ms' for func, summary in latency.items()))
+    source.reply(f'- Polling: {poll["count"]} cycles, p50/p99 {poll["p50"]:g}/{poll["p99"]:g}ms, ' +
+                 f'{stats["commands_sent"]} commands sent')
+    source.reply(f'- Data lock: wait p99 {stats["lock_wait_ms"]["p99"]:g}ms, hold p99 {stats["lock_hold_ms"]["p99"]:g}ms')
+    source.reply(f'- Websocket: {ws["connections"]} connections, {ws["subscriptions"]} subscriptions, ' +
+                 f'{ws["requests"]} requests, encode p99 {ws["encode_ms"]["p99"]:g}ms, ' +
+                 f'send p99 {ws["send_ms"]["p99"]:g}ms, {ws["dropped_responses"]} responses dropped')
+    source.reply(f'- Players: {stats["players"]} recorded, {stats["players_archived"]} archived on disk, ' +
+                 f'{stats["players_rate_tracked"]} with rate statistics')
+    warm_start = stats['warm_start']
+    source.reply(f'- Warm start: ' + (f'{warm_start["players"]} players resynced in {warm_start["duration_ms"]:.0f}ms, ' +
+                                      f'ready {warm_start["ready_after_ms"]:.0f}ms after loading'
+                                      if warm_start['ready'] else f'in progress ({warm_start["attempts"]} attempts)'))
+    rcon = stats['rcon']
+    if rcon is not None:
+        source.reply(f'- RCON: {rcon["connections"]} connections, {rcon["commands"]} commands, ' +
+                     f'{rcon["lost"]} lost, {rcon["fallbacks"]} sent through the console instead')
 
 
 # ---------------
@@ -449,77 +4659,206 @@ def msm_get_data_callback(func: str, args: dict, result: int) -> None:
 def on_load(server: PluginServerInterface, old) -> None:
     global plugin_config
     global psi
-    global online_players, schedules, player_data_records
+    global online_players, player_data_records
+    global pending_requests, player_history
     global player_data_records_lock
-    global server_monitor_thread, websocket_thread
+    global monitor_runtime, server_monitor, websocket_server, rcon_transport
 
     # 保存 PluginServerInterface 对象以供全局使用
     psi = server
+    load_start = time.monotonic()
 
     # 从 MCDR 加载插件配置
     plugin_config = psi.load_config_simple('config.json', target_class=PluginConfig)
 
-    # 重新加载插件时，保持原有的数据不变
+    # 重新加载插件时，保持原有的数据不变（旧实例的磁盘存档随后沿用）
+    old_archive = getattr(getattr(old, 'player_data_records', None), 'archive', None) if old else None
+    old_rates = getattr(getattr(old, 'player_data_records', None), 'rates', None) if old else None
     if old:
         online_players = old.online_players if hasattr(old, 'online_players')\
             and old.online_players != None else []
-        schedules = old.schedules if hasattr(old, 'schedules')\
-            and old.schedules != None else []
-        player_data_records = old.player_data_records if hasattr(old, 'player_data_records')\
-            and old.player_data_records != None else {}
-
-    # 重建线程同步锁
-    player_data_records_lock = threading.RLock()
-
-    # 重建并启动相关线程
-    server_monitor_thread = ServerMonitorThread(plugin_config.serverMonitorThreadInterval)
-    server_monitor_thread.start()
-    websocket_thread = WebsocketThread(
+        # 复制旧实例的数据时持有其锁，以免旧实例尚未结束的任务（如线程池中移出到存档的任务）同时修改数据
+        old_lock = getattr(old, 'player_data_records_lock', None)
+        with old_lock if old_lock is not None else contextlib.nullcontext():
+            player_data_records = PlayerDataStore.migrate(old.player_data_records, getattr(old, 'PLAYER_DATA_ITEMS', None))\
+                if hasattr(old, 'player_data_records') and old.player_data_records != None else PlayerDataStore()
+
+    # 限制了内存中的玩家数时，打开离线玩家数据的磁盘存档（重新加载插件时沿用旧实例的存档，
+    # 即使已不再限制，也需沿用，以免其中的数据丢失）
+    if plugin_config.maxResidentPlayers > 0 or old_archive is not None:
+        player_data_records.archive = PlayerDataArchive(os.path.join(psi.get_data_folder(), 'archive'),
+                                                        player_data_records.epoch, old_archive)
+
+    # 建立滑动窗口统计（重新加载插件时沿用旧实例的统计数据）
+    if plugin_config.rateBuckets > 0:
+        player_data_records.rates = PlayerRateTracker(plugin_config.rateBucketSeconds, plugin_config.rateBuckets,
+                                                      old_rates)
+
+    # 为配置的数据条目建立排名索引（包括存档中的玩家）
+    player_data_records.enable_ranking([PLAYER_DATA_ITEM_INDEX[item] for item in plugin_config.leaderboardMetrics
+                                        if item in PLAYER_DATA_ITEM_INDEX])
+
+    # 重建线程同步锁（并统计等待及持有锁的时间）
+    player_data_records_lock = InstrumentedLock(threading.RLock(), monitor_metrics.lock_wait, monitor_metrics.lock_hold)
+    # 重建请求表，并接管旧实例中尚未收到结果的请求
+    pending_requests = PendingRequestTable(plugin_config.requestTimeout, monitor_metrics)
+    if old and getattr(old, 'pending_requests', None) is not None:
+        pending_requests.adopt(old.pending_requests, {
+            'msm:get_data': msm_get_data_callback,
+            UNTAGGED_GET_DATA: msm_get_data_callback,
+            'msm:collect/all': msm_collect_all_callback,
+            'list': list_players_callback
+        })
+    # 领取旧实例移交的监听套接字，以免重新绑定端口
+    listen_socket = None
+    if old and getattr(old, 'listen_socket_handoff', None) is not None:
+        listen_socket = old.listen_socket_handoff.claim((plugin_config.commIP, plugin_config.commPort))
+    # 打开历史记录存储
+    if plugin_config.historyEnabled:
+        player_history = PlayerHistoryStore(os.path.join(psi.get_data_folder(), 'history'),
+                                            plugin_config.historyFsyncInterval)
+
+    # 重建并启动运行时
+    server_monitor = ServerMonitor(
+        plugin_config.serverMonitorThreadInterval,
+        plugin_config.batchedCollection,
+        plugin_config.collectChangesOnly,
+        plugin_config.fullCollectionInterval,
+        plugin_config.historyInterval,
+        PollScheduler(
+            plugin_config.metricPollIntervals,
+            plugin_config.commandBudgetPerSecond,
+            plugin_config.latencyBackoffThreshold
+        ),
+        plugin_config.schedulerStatsInterval,
+        plugin_config.maxResidentPlayers
+    )
+    websocket_server = WebsocketServer(
         plugin_config.websocketThreadInterval,
         plugin_config.commIP,
-        plugin_config.commPort
+        plugin_config.commPort,
+        plugin_config.websocketCompression,
+        plugin_config.shutdownDrainTimeout,
+        plugin_config.websocketMaxConnections,
+        plugin_config.websocketMaxPipelinedRequests,
+        plugin_config.websocketSendQueueLimit,
+        plugin_config.websocketSendQueuePolicy,
+        plugin_config.websocketIdleTimeout,
+        plugin_config.metricsPath,
+        listen_socket
     )
-    websocket_thread.start()
+    # 启用RCON传输时，建立RCON连接池（密码为空时使用 MCDR 配置文件中的 rcon 设置）
+    rcon_transport = None
+    if plugin_config.transport == 'rcon':
+        address, port, password = plugin_config.rconAddress, plugin_config.rconPort, plugin_config.rconPassword
+        if password == '':
+            mcdr_rcon = psi.get_mcdr_config().get('rcon', {})
+            address = mcdr_rcon.get('address', address)
+            port = mcdr_rcon.get('port', port)
+            password = mcdr_rcon.get('password', password)
+        rcon_transport = RconTransport(address, port, password, plugin_config.rconConnections,
+                                       plugin_config.rconMaxPipelined)
+    elif plugin_config.transport != 'console':
+        server.logger.warning(f'Unknown transport \'{plugin_config.transport}\', using the console')
+    # 无需启动预热时，直接开始常规轮询
+    if not plugin_config.warmStart or (old and getattr(getattr(old, 'server_monitor', None), 'ready', False)):
+        server_monitor.ready = True
+    monitor_runtime = MonitorRuntime(server_monitor, websocket_server, rcon_transport)
+    monitor_runtime.start()
 
-    server.logger.info(f'Plugin {PLUGIN_METADATA['name']} is now loaded')
+    # 注册查看运行指标的命令
+    server.register_help_message('!!msm stats', 'Show the statistics of MC Server Monitor')
+    server.register_command(Literal('!!msm').then(Literal('stats').runs(on_command_stats)))
+
+    server.logger.info(f'Plugin {PLUGIN_METADATA["name"]} is now loaded ' +
+                       f'in {(time.monotonic() - load_start) * 1000.0:.1f}ms')
 
 
 def on_player_joined(server: PluginServerInterface, player: str, info: Info) -> None:
-    # 当玩家加入，记录玩家到在线玩家列表
-    online_players.append(player)
+    # 当玩家加入，记录玩家到在线玩家列表（启动预热时可能已由 list 命令的输出记录）
+    if player not in online_players:
+        online_players.append(player)
     server.logger.info(f'Player {player} joined the game')
     server.logger.info(f'Online players: {online_players}')
+    # 玩家的数据已被移出到存档时，将其移回内存
+    restore_players([player])
     
     # for debug purpose
     execute_msm_get_data(player, 'msm_onlineTime')
+    # 批量采集模式下轮询任务不会取回逐条查询的结果，需在此取回
+    execute_msm_fetch_results()
 
 
 def on_player_left(server: PluginServerInterface, player: str) -> None:
-    # 当玩家离开，从在线玩家列表中移除
-    online_players.remove(player)
+    # 当玩家离开，从在线玩家列表中移除（插件加载前就已在线、且在启动预热完成前离开的玩家不在列表中）
+    if player in online_players:
+        online_players.remove(player)
     server.logger.info(f'Player {player} left the game')
     server.logger.info(f'Online players: {online_players}')
 
 
 def on_info(server: PluginServerInterface, info: Info) -> None:
-    # 使用正则表达式判断该输出是否为MC服务器函数的执行结果
-    pattern = r"Function [:\w]+ returned \d+"
-    if not info.is_user and re.fullmatch(pattern, info.content):
-        # 若是，解析该执行结果
-        parts = info.content.split(' ')
-        func = parts[1] # 取得函数名
-        res = int(parts[3]) # 取得函数执行结果
-
-        # 若回调列表不为空，取队列中回调并执行
-        if not mc_func_schedules.empty():
-            sched = mc_func_schedules.get()
-            if sched.mc_func == func:
-                sched.execute(res)
+    if info.is_user:
+        return
+    # 对控制台输出进行分类，绝大多数与本插件无关的输出会被前缀预筛选直接排除
+    try:
+        line = console_line_classifier.classify(info.content)
+    except (ValueError, IndexError) as ex:
+        server.logger.error(f'Error occurred while parsing the server output: {ex}')
+        return
+    if line is None:
+        return
+    if line.kind == CONSOLE_LINE_FUNCTION_RESULT:
+        # 未携带关联ID的执行结果：旧版本数据包下的逐条查询（msm:get_data）匹配给最早发出的不带关联ID的请求，
+        # 其他函数的结果，或没有等待中的请求时（如由其他插件或玩家手动执行），仅作计数
+        if line.func == 'msm:get_data':
+            if pending_requests.resolve_oldest(UNTAGGED_GET_DATA, line.value) and websocket_server is not None:
+                websocket_server.notify_data_changed()
+        else:
+            pending_requests.count_untagged()
+    elif line.kind == CONSOLE_LINE_QUERY_RESULTS:
+        # 逐条查询的结果，按关联ID分别匹配对应的请求
+        for request_id, value in line.results:
+            pending_requests.resolve(request_id, 'msm:get_data', value)
+        # 收到带关联ID的查询结果，说明数据包支持 msm:get_data_tagged
+        if len(line.results) > 0 and server_monitor is not None:
+            server_monitor.tagged_unanswered = 0
+        # 本轮轮询的数据已更新完毕，通知向订阅者推送变化
+        if websocket_server is not None:
+            websocket_server.notify_data_changed()
+    elif line.kind == CONSOLE_LINE_COLLECT_RESULT:
+        # 批量采集的结果
+        pending_requests.resolve(line.request_id, 'msm:collect/all', line.rows)
+        if websocket_server is not None:
+            websocket_server.notify_data_changed()
+    elif line.kind == CONSOLE_LINE_PLAYER_LIST:
+        # 在线玩家列表（list 命令的输出），匹配给最早发出的 list 请求，没有等待中的请求时（如由玩家手动执行）仅作计数
+        pending_requests.resolve_oldest('list', line.players)
 
 
 def on_unload(server: PluginServerInterface) -> None:
+    global listen_socket_handoff
+
     print(f'Unloading plugin {PLUGIN_METADATA["name"]}...')
 
-    # 卸载插件时，停止相关线程
-    server_monitor_thread.stop()
-    websocket_thread.stop()
+    # 复制一份监听套接字，以便重新加载插件时移交给新实例
+    if websocket_server.listen_socket is not None:
+        try:
+            listen_socket_handoff = ListenSocketHandoff((websocket_server.ip, websocket_server.port),
+                                                        websocket_server.listen_socket.dup())
+        except OSError as ex:
+            server.logger.error(f'Error occurred while handing off the websocket listening socket: {ex}')
+
+    # 要求运行时停止。先等待轮询任务结束，以免新旧实例同时向MC服务器发送命令
+    monitor_runtime.stop()
+    if not monitor_runtime.monitor_stopped.wait(float(server_monitor.interval) / 1000.0 * 2):
+        server.logger.warning('The server monitor did not stop in time')
+    # 再等待运行时线程结束：已建立的websocket连接处理完当前请求后关闭，最长 shutdownDrainTimeout 后被强制断开，
+    # 以免旧实例的线程在重新加载后残留
+    monitor_runtime.join(websocket_server.drain_timeout + RUNTIME_STOP_MARGIN)
+    if monitor_runtime.is_alive():
+        server.logger.warning('The monitor runtime did not stop in time')
+
+    # 轮询任务结束后，再关闭历史记录存储
+    if player_history is not None:
+        player_history.close()
@@ -0,0 +1,107 @@
+"""
+测试的公共工具。
+
+测试与基准测试一样，直接从 plugins/ 目录加载插件源文件，并以 benchmarks/fake_server.py 中的
+FakeServerInterface 模拟MC服务器，因此运行前需安装插件的依赖（mcdreforged、websockets）。
+
+用法：
+    python -m pytest -q tests
+"""
+
+import os
+import socket
+import sys
+import time
+from typing import Any, Callable
+
+import pytest
+
+TESTS_DIR: str = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT: str = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+sys.path.insert(0, REPO_ROOT)
+
+from common import load_plugin  # noqa: E402
+from fake_server import FakeServerInterface  # noqa: E402
+
+
+def free_port() -> int:
+    """
+    取得一个当前空闲的本地TCP端口。
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 10.0, interval: float = 0.01) -> None:
+    """
+    等待 condition 成立，超时则测试失败。
+    """
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail(f'condition not met within {timeout:g}s')
+        time.sleep(interval)
+
+
+@pytest.fixture
+def start_server():
+    """
+    启动模拟的MC服务器并加载插件，返回 (服务器, websocket地址)；测试结束时停止所有启动的服务器。
+    config 覆盖插件的缺省配置，其余关键字参数传给 FakeServerInterface。
+    """
+
+    servers = []
+
+    def start(players: int, config: dict[str, Any] | None = None, rcon_password: str | None = None,
+              join: bool = True, **kwargs) -> tuple[FakeServerInterface, str]:
+        port = free_port()
+        config = {
+            'commIP': '127.0.0.1',
+            'commPort': port,
+            'historyEnabled': False,
+            'schedulerStatsInterval': 0,
+            **(config or {})
+        }
+        server = FakeServerInterface(load_plugin(), players, config=config, **kwargs)
+        if rcon_password is not None:
+            server.start_rcon(config['rconPort'], rcon_password)
+        server.start(join=join)
+        servers.append(server)
+        # 等待 websocket 服务器开始监听
+        wait_until(lambda: server.plugin.websocket_server.listen_socket is not None)
+        return server, f'ws://127.0.0.1:{port}'
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def reload_plugin(server: FakeServerInterface) -> None:
+    """
+    模拟 MCDR 重新加载插件：卸载旧实例，加载新的插件模块并迁移旧实例的数据（监听套接字随之移交）。
+    """
+
+    old = server.plugin
+    old.on_unload(server)
+    server.plugin = load_plugin()
+    server.plugin.on_load(server, old)
+
+
+def store_complete(server: FakeServerInterface) -> bool:
+    """
+    插件是否已就绪，且插件中所有玩家的数据与游戏内一致（适用于数据不再变化的情形，onlineTime 每刻都在变化，不参与比较）。
+    """
+
+    msm = server.plugin
+    if msm.server_monitor is None or not msm.server_monitor.ready:
+        return False
+    with server.lock:
+        expected = {player: dict(scores) for player, scores in server.scores.items()}
+    with msm.player_data_records_lock:
+        rows = {player: msm.player_data_records.get_row(player) for player in expected}
+    return all(rows[player] is not None and all(rows[player][item] == value for item, value in scores.items()
+                                                if item != 'onlineTime') for player, scores in expected.items())
@@ -0,0 +1,142 @@
+"""
+离线玩家数据存档的测试：数据全部在内存中与大部分已移出到存档时，get_row、按条件查询、排行榜及快照的结果一致，
+以及读取存档时不持有 player_data_records_lock（读取期间存档被重写时重新读取）。
+"""
+
+import asyncio
+import json
+import random
+import threading
+
+import pytest
+
+from common import load_plugin
+
+msm = load_plugin()
+
+PLAYERS = ['player_%03d' % i for i in range(200)]
+ONLINE = ['player_003', 'player_150']
+RESIDENT_LIMIT = 20
+QUERIES = [
+    {},
+    {'pattern': 'player_1*', 'metrics': ['deathCount', 'xp']},
+    {'players': ['player_007', 'player_003', 'player_150', 'player_199', 'nobody']},
+    {'online_only': True},
+    {'where': ['deathCount >= 5', 'xp < 50'], 'metrics': ['deathCount']}
+]
+
+
+def build_store(folder: str | None) -> msm.PlayerDataStore:
+    rand = random.Random(0)
+    store = msm.PlayerDataStore()
+    if folder is not None:
+        store.archive = msm.PlayerDataArchive(folder, store.epoch)
+    for player in PLAYERS:
+        # 取值范围较小，存在大量并列的玩家
+        store.set_row(player, {item: rand.randint(0, 9) if item == 'deathCount' else rand.randint(0, 100)
+                               for item in msm.PLAYER_DATA_ITEMS})
+    store.enable_ranking([msm.PLAYER_DATA_ITEM_INDEX['deathCount']])
+    return store
+
+
+@pytest.fixture
+def stores(monkeypatch, tmp_path):
+    """
+    返回数据相同的两个存储结构：(数据全部在内存中的, 除 RESIDENT_LIMIT 名以外的离线玩家已移出到存档的)。
+    """
+
+    monkeypatch.setattr(msm, 'player_data_records_lock', threading.RLock())
+    monkeypatch.setattr(msm, 'online_players', list(ONLINE))
+    resident = build_store(None)
+    archived = build_store(str(tmp_path))
+    monkeypatch.setattr(msm, 'player_data_records', archived)
+    assert msm.archive_offline_players(RESIDENT_LIMIT) > 0
+    assert len(archived.names) <= RESIDENT_LIMIT and len(archived) == len(PLAYERS)
+    assert all(player in archived.index for player in ONLINE)
+    return resident, archived
+
+
+def request(instruction: str, arguments: dict) -> dict:
+    server = msm.WebsocketServer(0, '127.0.0.1', 0, False, 0, 0, 1, 0, msm.SEND_QUEUE_POLICY_DROP, 0, '')
+
+    async def run() -> list:
+        return await server._WebsocketServer__process_message(None, {'id': 1, 'instruction': instruction,
+                                                                     'arguments': arguments})
+
+    responses = asyncio.run(run())
+    assert len(responses) == 1
+    return json.loads(responses[0])
+
+
+def outputs(monkeypatch, store: msm.PlayerDataStore) -> dict:
+    monkeypatch.setattr(msm, 'player_data_records', store)
+    result = {'rows': {player: store.get_row(player) for player in PLAYERS + ['nobody']}}
+    for i, arguments in enumerate(QUERIES):
+        reply = request('query_players_data', arguments)
+        assert reply['instruction'] == 'players_data'
+        # 内存中的玩家与存档中的玩家的先后顺序不同，按玩家名称比较
+        result[f'query {i}'] = (reply['items'], sorted(zip(reply['players'], zip(*reply['values']))))
+    pages = []
+    after = None
+    while True:
+        reply = request('get_leaderboard', {'metric': 'deathCount', 'limit': 30,
+                                            'players': ['player_003', 'player_042', 'player_199', 'nobody'],
+                                            **({'after': after} if after is not None else {})})
+        pages.append((reply['total'], reply['offset'], reply['entries'], reply['players']))
+        after = reply['next']
+        if after is None:
+            break
+    result['leaderboard'] = pages
+    snapshot, _ = msm.snapshot_player_data()
+    result['snapshot'] = sorted((name, tuple(row)) for name, row in snapshot.rows())
+    return result
+
+
+def test_resident_and_archived_outputs_match(monkeypatch, stores):
+    resident, archived = stores
+    expected = outputs(monkeypatch, resident)
+    assert len(expected['leaderboard']) == -(-len(PLAYERS) // 30)
+    assert outputs(monkeypatch, archived) == expected
+    # 查询不会将存档中的玩家移回内存
+    assert len(archived.names) <= RESIDENT_LIMIT
+
+
+def test_archive_read_outside_lock(monkeypatch, stores):
+    resident, archived = stores
+    expected = outputs(monkeypatch, resident)
+    find_players = archived.archive.find_players
+    reads = []
+
+    def checked_find_players(players, state=None):
+        # get_row 等在锁内读取存档（state 为 None），只检查在锁外读取的情形
+        if state is not None:
+            # 在另一线程中尝试获取锁，以确认读取存档时不持有锁
+            acquired = []
+
+            def try_acquire() -> None:
+                if msm.player_data_records_lock.acquire(timeout=0):
+                    acquired.append(True)
+                    msm.player_data_records_lock.release()
+
+            thread = threading.Thread(target=try_acquire)
+            thread.start()
+            thread.join()
+            reads.append(len(acquired) > 0)
+        result = find_players(players, state)
+        if len(reads) == 1 and state is not None:
+            # 第一次读取之后有更多玩家被移出，存档被重写，读取的结果已过时，应重新读取
+            msm.archive_offline_players(RESIDENT_LIMIT // 2)
+        return result
+
+    monkeypatch.setattr(archived.archive, 'find_players', checked_find_players)
+    path = archived.archive.path
+    assert outputs(monkeypatch, archived) == expected
+    assert archived.archive.path != path and len(archived.names) <= RESIDENT_LIMIT // 2
+    assert len(reads) > len(QUERIES) and all(reads)
+    # 加入游戏的玩家在锁外读取后移回内存
+    reads.clear()
+    msm.restore_players(['player_042', 'player_043'])
+    assert reads == [True]
+    assert 'player_042' in archived.index and 'player_043' in archived.index
+    assert archived.get_row('player_042') == resident.get_row('player_042')
+    assert len(archived) == len(PLAYERS)
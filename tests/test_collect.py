@@ -0,0 +1,32 @@
+"""
+批量采集模式下只采集变化的记分项（collectChangesOnly）的测试：每刻都在变化的 onlineTime 不使玩家被视为有变化。
+"""
+
+import time
+
+from conftest import store_complete, wait_until
+
+FAST_POLL = {'serverMonitorThreadInterval': 100, 'metricPollIntervals': {'fast': 100, 'normal': 100, 'slow': 100}}
+
+
+def test_online_time_does_not_count_as_change(start_server):
+    server, _ = start_server(20, FAST_POLL)
+    msm = server.plugin
+    wait_until(lambda: store_complete(server))
+    with msm.player_data_records_lock:
+        version = msm.player_data_records.version
+        online_time = msm.player_data_records.get_row('player_3')['onlineTime']
+    # 只有 onlineTime 在变化时，多轮采集均没有数据发生变化
+    time.sleep(1.0)
+    with msm.player_data_records_lock:
+        assert msm.player_data_records.version == version
+    # 玩家有其他记分项变化时，顺带采集其 onlineTime
+    with server.lock:
+        server.scores['player_3']['deathCount'] += 1
+    wait_until(lambda: store_complete(server))
+    with msm.player_data_records_lock:
+        assert msm.player_data_records.get_row('player_3')['onlineTime'] > online_time
+        assert msm.player_data_records.changes_since(version, msm.ALL_ITEM_INDEXES) == [
+            ('player_3', msm.PLAYER_DATA_ITEM_INDEX['deathCount'], server.scores['player_3']['deathCount']),
+            ('player_3', msm.PLAYER_DATA_ITEM_INDEX['onlineTime'],
+             msm.player_data_records.get_row('player_3')['onlineTime'])]
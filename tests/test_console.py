@@ -0,0 +1,104 @@
+"""
+控制台输出的分类与解析（ConsoleLineClassifier）及 SNBT 解析器（parse_snbt）的单元测试。
+"""
+
+import pytest
+
+from common import load_plugin
+
+msm = load_plugin()
+
+classifier = msm.ConsoleLineClassifier()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('{}', {}),
+    ('[]', []),
+    ('{a: 1, b: -2}', {'a': 1, 'b': -2}),
+    ('{ a : 1 , b : [ 1 , 2 ] }', {'a': 1, 'b': [1, 2]}),
+    ('[1b, 2s, 3L, 4]', [1, 2, 3, 4]),
+    ('[1.5f, -2.25d, 3.0]', [1.5, -2.25, 3.0]),
+    ('[I; 1, 2, 3]', [1, 2, 3]),
+    ('[B;]', []),
+    ('{name: "Steve", "key with spaces": \'v\'}', {'name': 'Steve', 'key with spaces': 'v'}),
+    (r'{s: "a \"quoted\" \\ text"}', {'s': 'a "quoted" \\ text'}),
+    ('{s: minecraft.stone, t: true}', {'s': 'minecraft.stone', 't': 'true'}),
+    ('{a: {b: {c: [{d: 1}]}}}', {'a': {'b': {'c': [{'d': 1}]}}}),
+])
+def test_parse_snbt(text, expected):
+    assert msm.parse_snbt(text) == expected
+
+
+@pytest.mark.parametrize('text', ['{a: 1', '{a 1}', '[1, 2', '{a: 1} x', '', '{a: 1;}', '[1 2]'])
+def test_parse_snbt_errors(text):
+    with pytest.raises((ValueError, IndexError)):
+        msm.parse_snbt(text)
+
+
+@pytest.mark.parametrize('content', [
+    '<Steve> hello',
+    'Saving the game (this may take a moment!)',
+    'Function msm:get_data returned',
+    'There are many players online',
+    'Storage msm:other has the following contents: {}',
+    'Found no elements matching pending',
+])
+def test_unrelated_lines(content):
+    assert classifier.classify(content) is None
+
+
+def test_function_result():
+    line = classifier.classify('Function msm:get_data returned -5')
+    assert line.kind == msm.CONSOLE_LINE_FUNCTION_RESULT
+    assert line.func == 'msm:get_data' and line.value == -5
+    line = classifier.classify('Function other:some/func.v2 returned 1')
+    assert line.func == 'other:some/func.v2' and line.value == 1
+
+
+@pytest.mark.parametrize('content, players', [
+    ('There are 2 of a max of 20 players online: Steve, Alex', ['Steve', 'Alex']),
+    ('There are 1 of a max of 20 players online: Steve', ['Steve']),
+    ('There are 0 of a max of 20 players online: ', []),
+    ('There are 0 of a max of 20 players online:', []),
+])
+def test_player_list(content, players):
+    line = classifier.classify(content)
+    assert line.kind == msm.CONSOLE_LINE_PLAYER_LIST and line.players == players
+
+
+@pytest.mark.parametrize('payload, results', [
+    ('[]', []),
+    ('[{id: 1, value: 20}, {id: 2, value: -3}]', [(1, 20), (2, -3)]),
+    # 两个键的先后顺序不固定
+    ('[{value: 7, id: 3}]', [(3, 7)]),
+    # 格式与快速路径不符时退回通用的SNBT解析
+    ('[{id: 4, value: 8L}, {id:5,value:9}]', [(4, 8), (5, 9)]),
+])
+def test_query_results(payload, results):
+    line = classifier.classify(classifier.RESULTS_PREFIX + payload)
+    assert line.kind == msm.CONSOLE_LINE_QUERY_RESULTS and line.results == results
+
+
+def test_collect_result():
+    line = classifier.classify(classifier.COLLECT_RESULT_PREFIX +
+                               '{id: 12, players: [{name: "Steve", deathCount: 1, health: 20}, {name: "Alex", xp: -1}]}')
+    assert line.kind == msm.CONSOLE_LINE_COLLECT_RESULT and line.request_id == 12
+    assert line.rows == [{'name': 'Steve', 'deathCount': 1, 'health': 20}, {'name': 'Alex', 'xp': -1}]
+    line = classifier.classify(classifier.COLLECT_RESULT_PREFIX + '{id: 13, players: []}')
+    assert line.request_id == 13 and line.rows == []
+
+
+def test_collect_result_fallback():
+    # 带数值后缀或键的顺序不同时，退回通用的SNBT解析，结果相同
+    line = classifier.classify(classifier.COLLECT_RESULT_PREFIX +
+                               '{players: [{name: "Steve", deathCount: 1b}], id: 14}')
+    assert line.request_id == 14 and line.rows == [{'name': 'Steve', 'deathCount': 1}]
+    # 没有关联ID的输出与本插件无关
+    assert classifier.classify(classifier.COLLECT_RESULT_PREFIX + '{players: []}') is None
+
+
+def test_malformed_output_raises():
+    with pytest.raises((ValueError, IndexError)):
+        classifier.classify(classifier.RESULTS_PREFIX + '[{id: 1, value: }]')
+    with pytest.raises((ValueError, IndexError)):
+        classifier.classify(classifier.COLLECT_RESULT_PREFIX + '{id: 1, players: [{name: "Steve", xp: }]}')
@@ -0,0 +1,385 @@
+"""
+多服务器聚合网关（msm_gateway）的测试：合并视图本身，及以多个模拟的MC服务器（各自加载插件）作为上游服务器的端到端测试，
+包括上游服务器晚于网关启动或重启时重新建立连接。
+"""
+
+import asyncio
+import json
+import socket
+from typing import Any
+
+import pytest
+import websockets
+
+from bench_gateway import GatewayThread
+from common import load_plugin
+from conftest import free_port, store_complete, wait_until
+from msm_gateway import MergedView
+from msm_gateway.view import PLAYER_DATA_ITEM_INDEX
+
+PLAYERS = 6
+# 比较时不含每刻都在变化的 onlineTime
+STABLE_ITEMS = [item for item in PLAYER_DATA_ITEM_INDEX if item != 'onlineTime']
+
+
+def entries(server_scores: dict[str, int], name: str) -> list[dict]:
+    return [{'name': name, 'type': item, 'quantity': value, 'time': 0} for item, value in server_scores.items()]
+
+
+def test_view_apply_and_changes_since():
+    view = MergedView()
+    notified = []
+    view.listeners.append(lambda: notified.append(view.version))
+    assert view.apply('a', entries({'deathCount': 1, 'xp': 5}, 'alice')) == 2
+    assert view.apply('b', entries({'deathCount': 2}, 'alice') + entries({'deathCount': 3}, 'bob')) == 2
+    assert (len(view), view.server_rows, view.version) == (3, {'a': 1, 'b': 2}, 2)
+    # 值未变化的数据及未知的数据条目不计为变化，版本号不变
+    assert view.apply('a', entries({'deathCount': 1, 'unknown': 7}, 'alice')) == 0
+    assert view.version == 2 and notified == [1, 2]
+
+    death, xp = PLAYER_DATA_ITEM_INDEX['deathCount'], PLAYER_DATA_ITEM_INDEX['xp']
+    assert view.changes_since(0, [death, xp]) == [
+        ('a', 'alice', death, 1), ('a', 'alice', xp, 5), ('b', 'alice', death, 2), ('b', 'bob', death, 3)]
+    assert view.apply('a', entries({'xp': 6}, 'alice')) == 1
+    assert view.changes_since(2, [death, xp]) == [('a', 'alice', xp, 6)]
+    assert view.changes_since(2, [death]) == []
+    assert view.changes_since(1, [death, xp], {'b'}) == [('b', 'alice', death, 2), ('b', 'bob', death, 3)]
+    assert view.changes_since(view.version, [death, xp]) == []
+
+
+def test_view_remove_server():
+    view = MergedView()
+    view.apply('a', entries({'deathCount': 1}, 'alice') + entries({'deathCount': 2}, 'bob'))
+    view.apply('b', entries({'deathCount': 3}, 'alice'))
+    epoch, version = view.epoch, view.version
+    assert view.remove_server('c') == 0
+    assert (view.epoch, view.version) == (epoch, version)
+    assert view.remove_server('a') == 2
+    # 行被删除后视图的数据标识改变，以使订阅者重新取得全部数据
+    assert view.epoch != epoch and view.version > version
+    assert [(row.server, row.name) for row in view.select()] == [('b', 'alice')]
+    assert view.server_rows == {'b': 1}
+    death = PLAYER_DATA_ITEM_INDEX['deathCount']
+    assert view.ranking(death, None, None)[0] == [(-3, 'alice', 'b')]
+
+
+@pytest.mark.parametrize('merge,expected', [('sum', 8), ('max', 5), ('min', 1)])
+def test_view_ranking_merge(merge, expected):
+    view = MergedView()
+    view.apply('a', entries({'xp': 5}, 'alice') + entries({'xp': 4}, 'bob'))
+    view.apply('b', entries({'xp': 2}, 'alice') + entries({'xp': 9}, 'carol'))
+    view.apply('c', entries({'xp': 1}, 'alice'))
+    keys, values = view.ranking(PLAYER_DATA_ITEM_INDEX['xp'], merge, None)
+    assert values[(-expected, 'alice')] == expected
+    assert keys == sorted([(-expected, 'alice'), (-4, 'bob'), (-9, 'carol')])
+    # 只合并指定服务器上的行
+    keys, values = view.ranking(PLAYER_DATA_ITEM_INDEX['xp'], merge, ['b', 'c'])
+    assert sorted(values.values()) == sorted([{'sum': 3, 'max': 2, 'min': 1}[merge], 9])
+
+
+async def exchange(url: str, requests: list[dict]) -> list[list[dict]]:
+    """
+    在一个连接上依次发送各请求，返回各请求的全部响应（不含结束标志）。
+    """
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        results = []
+        for i, request in enumerate(requests):
+            await websocket.send(json.dumps({'id': i, 'instruction': request['instruction'],
+                                             'arguments': {**request.get('arguments', {}), 'end_marker': True}}))
+            responses = []
+            while True:
+                message = json.loads(await asyncio.wait_for(websocket.recv(), 30))
+                if message['instruction'] == 'end_of_response':
+                    break
+                responses.append(message)
+            results.append(responses)
+        return results
+
+
+def call(url: str, instruction: str, arguments: dict | None = None) -> dict:
+    """
+    发送一个请求并返回其唯一的响应。
+    """
+
+    responses = asyncio.run(exchange(url, [{'instruction': instruction, 'arguments': arguments or {}}]))[0]
+    assert len(responses) == 1
+    return responses[0]
+
+
+def expected_rows(servers: dict[str, Any]) -> dict[tuple[str, str], dict[str, int]]:
+    rows = {}
+    for name, server in servers.items():
+        with server.lock:
+            for player, scores in server.scores.items():
+                rows[(name, player)] = {item: scores[item] for item in STABLE_ITEMS}
+    return rows
+
+
+def view_rows(url: str) -> dict[tuple[str, str], dict[str, int]]:
+    reply = call(url, 'get_all_players_data', {'format': 'columnar'})
+    return {
+        (server, player): {item: reply['values'][reply['items'].index(item)][index] for item in STABLE_ITEMS}
+        for index, (server, player) in enumerate(zip(reply['servers'], reply['players']))
+    }
+
+
+@pytest.fixture
+def start_gateway():
+    """
+    在单独的线程中启动连接到各上游服务器（{服务器名称: websocket地址}）的网关，返回 (网关线程, 网关的websocket地址)。
+    """
+
+    gateways = []
+
+    def start(urls: dict[str, str]) -> tuple[GatewayThread, str]:
+        port = free_port()
+        gateway = GatewayThread(urls, port)
+        gateway.start()
+        gateway.started.wait()
+        gateways.append(gateway)
+
+        def listening() -> bool:
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return True
+            except OSError:
+                return False
+
+        wait_until(listening)
+        return gateway, f'ws://127.0.0.1:{port}'
+
+    yield start
+    for gateway in gateways:
+        gateway.stop()
+
+
+@pytest.fixture
+def cluster(start_server, start_gateway):
+    """
+    两个同名玩家（各服务器上的数据不同）的上游服务器 a、b 及连接到它们的网关；
+    a 记录历史记录而不统计滑动窗口，b 则相反。返回 (各服务器, 网关线程, 网关的websocket地址)。
+    """
+
+    servers, urls = {}, {}
+    for seed, (name, config) in enumerate((('a', {'historyEnabled': True, 'historyInterval': 100, 'rateBuckets': 0}),
+                                           ('b', {}))):
+        servers[name], urls[name] = start_server(PLAYERS, config, seed=seed + 1)
+    for server in servers.values():
+        wait_until(lambda: store_complete(server))
+    gateway, url = start_gateway(urls)
+    wait_until(lambda: view_rows(url) == expected_rows(servers))
+    return servers, gateway, url
+
+
+def test_gateway_merge(cluster):
+    servers, _, url = cluster
+    rows = expected_rows(servers)
+    players = sorted({player for _, player in rows})
+    for merge, func in (('sum', sum), ('max', max), ('min', min)):
+        reply = call(url, 'query_players_data', {'metrics': STABLE_ITEMS, 'merge': merge})
+        assert reply['players'] == players
+        assert reply['servers'] == [['a', 'b']] * len(players)
+        for item_index, item in enumerate(STABLE_ITEMS):
+            assert reply['values'][item_index] == [func(rows[(server, player)][item] for server in ('a', 'b'))
+                                                   for player in players]
+        # where 中的条件作用于合并后的值
+        threshold = sorted(reply['values'][STABLE_ITEMS.index('xp')])[len(players) // 2]
+        filtered = call(url, 'query_players_data', {'metrics': ['xp'], 'merge': merge, 'where': [f'xp >= {threshold}']})
+        assert all(value >= threshold for value in filtered['values'][0])
+        assert len(filtered['players']) == sum(value >= threshold for value in reply['values'][STABLE_ITEMS.index('xp')])
+    reply = call(url, 'query_players_data', {'metrics': ['xp'], 'merge': 'avg'})
+    assert reply['instruction'] == 'error'
+
+
+@pytest.mark.parametrize('merge', [None, 'sum'])
+def test_gateway_leaderboard_pagination(cluster, merge):
+    servers, _, url = cluster
+    rows = expected_rows(servers)
+    if merge is None:
+        expected = sorted((-scores['deathCount'], player, server) for (server, player), scores in rows.items())
+    else:
+        totals: dict[str, int] = {}
+        for (_, player), scores in rows.items():
+            totals[player] = totals.get(player, 0) + scores['deathCount']
+        expected = sorted((-value, player) for player, value in totals.items())
+    # 以 after 逐页翻阅，各页拼接起来即为完整的排行榜，且与 offset 分页的结果一致
+    arguments: dict[str, Any] = {'metric': 'deathCount', 'limit': 5}
+    if merge is not None:
+        arguments['merge'] = merge
+    pages = []
+    after = None
+    while True:
+        reply = call(url, 'get_leaderboard', {**arguments, **({'after': after} if after is not None else {})})
+        assert reply['total'] == len(expected)
+        pages.append(reply['entries'])
+        after = reply['next']
+        if after is None:
+            break
+    got = [(-entry['value'], entry['name']) + ((entry['server'],) if merge is None else ()) for page in pages
+           for entry in page]
+    assert got == expected
+    assert len(pages) == -(-len(expected) // 5)
+    by_offset = call(url, 'get_leaderboard', {**arguments, 'offset': 5})
+    assert by_offset['entries'] == pages[1]
+    # 排名按值计算，值相同的项排名相同
+    for page in pages:
+        for entry in page:
+            assert entry['rank'] == 1 + sum(key[0] < -entry['value'] for key in expected)
+
+
+def test_gateway_subscribe_resume(cluster):
+    servers, _, url = cluster
+
+    async def subscribe(arguments: dict, changes: int) -> tuple[dict, list[dict]]:
+        # 订阅后接收推送，直至收到 changes 项数据（或超时后返回已收到的）
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data',
+                                             'arguments': {'metrics': STABLE_ITEMS, **arguments}}))
+            subscribed = json.loads(await asyncio.wait_for(websocket.recv(), 10))
+            received = []
+            try:
+                while len(received) < changes:
+                    message = json.loads(await asyncio.wait_for(websocket.recv(), 1.0))
+                    assert message['instruction'] == 'players_data_delta'
+                    assert message['epoch'] == subscribed['epoch']
+                    received.extend(message['data'])
+            except asyncio.TimeoutError:
+                pass
+            return subscribed, received
+
+    subscribed, full = asyncio.run(subscribe({}, 2 * PLAYERS * len(STABLE_ITEMS)))
+    assert subscribed['instruction'] == 'players_data_subscribed'
+    assert len(full) == 2 * PLAYERS * len(STABLE_ITEMS)
+    assert {(entry['server'], entry['name']) for entry in full} == set(expected_rows(servers))
+
+    # 订阅结束后上游服务器 b 的数据发生变化，以 since_version 续传时只收到这之后的变化
+    server = servers['b']
+    with server.lock:
+        server.scores['player_1']['xp'] += 100
+        value = server.scores['player_1']['xp']
+    wait_until(lambda: view_rows(url)[('b', 'player_1')]['xp'] == value)
+    resumed, changes = asyncio.run(subscribe({'epoch': subscribed['epoch'], 'since_version': subscribed['version']},
+                                             len(full)))
+    assert resumed['epoch'] == subscribed['epoch'] and resumed['version'] > subscribed['version']
+    assert [(entry['server'], entry['name'], entry['type'], entry['quantity']) for entry in changes] == [
+        ('b', 'player_1', 'xp', value)]
+    # 数据标识不一致或版本号无效时从头推送全部数据
+    for arguments in ({'epoch': 'stale', 'since_version': resumed['version']},
+                      {'epoch': subscribed['epoch'], 'since_version': resumed['version'] + 100}):
+        _, changes = asyncio.run(subscribe(arguments, len(full)))
+        assert len(changes) == len(full)
+    # 含未知的数据条目时回复错误，而不是忽略
+    reply = call(url, 'subscribe_players_data', {'metrics': ['xp', 'nope']})
+    assert reply['instruction'] == 'error' and reply['message'] == 'Unknown metrics: nope'
+
+
+def test_gateway_upstream_epoch_change(cluster):
+    servers, gateway, url = cluster
+
+    async def watch() -> list[dict]:
+        # 订阅网关，直至收到数据标识改变后的推送
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data',
+                                             'arguments': {'metrics': ['xp']}}))
+            subscribed = json.loads(await asyncio.wait_for(websocket.recv(), 10))
+            ready.set()
+            pushes = []
+            while True:
+                message = json.loads(await asyncio.wait_for(websocket.recv(), 30))
+                pushes.append(message)
+                if message['epoch'] != subscribed['epoch']:
+                    return pushes
+
+    async def run() -> list[dict]:
+        task = asyncio.ensure_future(watch())
+        await ready.wait()
+        await asyncio.get_running_loop().run_in_executor(None, restart)
+        return await task
+
+    def restart():
+        # 模拟插件重启：旧实例不移交数据及监听套接字，新实例的数据从头计数；重启期间 player_0 已离开游戏
+        server = servers['a']
+        old = server.plugin
+        old.on_unload(server)
+        old.listen_socket_handoff.release()
+        with server.lock:
+            server.players.remove('player_0')
+            del server.scores['player_0']
+        server.plugin = load_plugin()
+        server.plugin.on_load(server, None)
+
+    ready = asyncio.Event()
+    old_epoch = gateway.upstreams[0].epoch
+    pushes = asyncio.run(run())
+    # 数据标识改变后，订阅者收到的是剩余全部数据（不含已离开的 player_0）
+    last = pushes[-1]
+    wait_until(lambda: ('a', 'player_0') not in view_rows(url))
+    assert gateway.upstreams[0].epoch != old_epoch
+    assert ('a', 'player_0') not in {(entry['server'], entry['name']) for entry in last['data']}
+    assert {(entry['server'], entry['name']) for entry in last['data']} <= set(expected_rows(servers))
+    wait_until(lambda: view_rows(url) == expected_rows(servers))
+    assert call(url, 'get_servers')['data'][0]['players'] == PLAYERS - 1
+
+
+def test_gateway_forward_partial_errors(cluster):
+    servers, _, url = cluster
+    wait_until(lambda: len(call(url, 'get_players_history', {'metrics': ['xp']}).get('data', [])) == PLAYERS)
+    reply = call(url, 'get_players_history', {'metrics': ['xp']})
+    assert reply['instruction'] == 'players_history'
+    assert {(entry['server'], entry['name']) for entry in reply['data']} == {
+        ('a', player) for player in servers['a'].players}
+    assert reply['errors'] == {'b': 'History is not enabled on this server'}
+
+    reply = call(url, 'get_players_rates', {'metrics': ['xp', 'deathCount']})
+    assert reply['instruction'] == 'players_rates'
+    assert {entry['server'] for entry in reply['data']} == {'b'}
+    assert set(reply['errors']) == {'a'}
+    # 限定服务器时只转发到这些服务器；全部出错时回复错误信息
+    reply = call(url, 'get_players_rates', {'servers': ['a']})
+    assert reply['instruction'] == 'error' and reply['message'].startswith('a: ')
+    reply = call(url, 'get_players_history', {'servers': ['a'], 'metrics': 'xp'})
+    assert reply['instruction'] == 'error'
+
+
+def test_gateway_forward_unreachable_upstream(start_server, start_gateway):
+    server, server_url = start_server(PLAYERS)
+    wait_until(lambda: store_complete(server))
+    _, url = start_gateway({'up': server_url, 'down': f'ws://127.0.0.1:{free_port()}'})
+    wait_until(lambda: len(view_rows(url)) == PLAYERS)
+    reply = call(url, 'get_players_rates', {'metrics': ['xp']})
+    assert {entry['server'] for entry in reply['data']} == {'up'}
+    assert set(reply['errors']) == {'down'}
+    statuses = {status['name']: status for status in call(url, 'get_servers')['data']}
+    assert statuses['up']['connected'] and not statuses['down']['connected']
+    assert statuses['down']['last_error'] is not None
+
+
+def test_gateway_reconnects_to_upstream(start_server, start_gateway):
+    # 上游服务器在网关启动之后才启动
+    port = free_port()
+    gateway, url = start_gateway({'late': f'ws://127.0.0.1:{port}'})
+    status = call(url, 'get_servers')['data'][0]
+    assert not status['connected'] and view_rows(url) == {}
+    server, _ = start_server(PLAYERS, {'commPort': port})
+    wait_until(lambda: store_complete(server))
+    wait_until(lambda: view_rows(url) == expected_rows({'late': server}))
+    status = call(url, 'get_servers')['data'][0]
+    assert status['connected'] and status['reconnects'] >= 1
+
+    def forwarded() -> bool:
+        reply = call(url, 'get_players_rates', {'metrics': ['xp']})
+        return reply['instruction'] == 'players_rates' and not reply.get('errors')
+
+    # 转发的请求同样经重新建立的连接发送
+    wait_until(forwarded)
+    # 插件重启（不移交监听套接字）后，订阅及转发请求所用的连接均重新建立
+    old = server.plugin
+    old.on_unload(server)
+    old.listen_socket_handoff.release()
+    wait_until(lambda: not call(url, 'get_servers')['data'][0]['connected'])
+    server.plugin = load_plugin()
+    server.plugin.on_load(server, None)
+    wait_until(lambda: call(url, 'get_servers')['data'][0]['connected'])
+    wait_until(forwarded)
+    wait_until(lambda: view_rows(url) == expected_rows({'late': server}))
@@ -0,0 +1,132 @@
+"""
+玩家数据历史记录（PlayerHistoryStore）的单元测试：记录与原始查询、每个序列的起点、降采样、点数上限、
+跨天的分段，以及重新打开后的查询。
+"""
+
+import calendar
+import threading
+
+import pytest
+
+from common import load_plugin
+
+msm = load_plugin()
+
+# 测试所用的时刻：某一天（UTC）的 00:10:00，当天的记录均在其后
+DAY_START = calendar.timegm((2024, 9, 9, 0, 10, 0))
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """
+    以独立的玩家数据存储代替插件的全局数据，返回 (玩家数据存储, 打开历史记录存储的函数)。
+    """
+
+    records = msm.PlayerDataStore()
+    monkeypatch.setattr(msm, 'player_data_records', records)
+    monkeypatch.setattr(msm, 'player_data_records_lock', threading.RLock())
+    opened = []
+
+    def open_history(folder: str) -> msm.PlayerHistoryStore:
+        history = msm.PlayerHistoryStore(folder, 0)
+        opened.append(history)
+        return history
+
+    yield records, open_history
+    for history in opened:
+        history.close()
+
+
+def series_of(result: list[dict]) -> dict[tuple[str, str], list[tuple[int, int]]]:
+    return {(series['name'], series['type']): [tuple(point) for point in series['points']] for series in result}
+
+
+def test_record_and_query(store, tmp_path):
+    records, open_history = store
+    history = open_history(str(tmp_path))
+    records.set_row('Steve', {'deathCount': 1, 'xp': 10})
+    records.set_row('Alex', {'deathCount': 5})
+    # 首次写入时记录所有数据作为关键帧
+    assert history.record(DAY_START) == 2 * len(msm.PLAYER_DATA_ITEMS)
+    # 之后只记录发生变化的数据
+    assert history.record(DAY_START + 5) == 0
+    records.set_row('Steve', {'deathCount': 2})
+    assert history.record(DAY_START + 10) == 1
+    records.set_row('Steve', {'deathCount': 3, 'xp': 12})
+    assert history.record(DAY_START + 20) == 2
+    assert sorted(history.known_players()) == ['Alex', 'Steve']
+
+    result = series_of(history.query(['Steve'], ['deathCount', 'xp'], DAY_START - 100, DAY_START + 100, 0))
+    assert result == {
+        ('Steve', 'deathCount'): [(DAY_START, 1), (DAY_START + 10, 2), (DAY_START + 20, 3)],
+        ('Steve', 'xp'): [(DAY_START, 10), (DAY_START + 20, 12)]
+    }
+    # 序列的第一个点为 start 时刻已知的值
+    result = series_of(history.query(['Steve'], ['deathCount'], DAY_START + 15, DAY_START + 100, 0))
+    assert result == {('Steve', 'deathCount'): [(DAY_START + 15, 2), (DAY_START + 20, 3)]}
+    # 查询范围的两端均包含在内
+    result = series_of(history.query(['Steve'], ['deathCount'], DAY_START + 10, DAY_START + 20, 0))
+    assert result == {('Steve', 'deathCount'): [(DAY_START + 10, 2), (DAY_START + 20, 3)]}
+    # 不限定玩家及数据条目时返回全部序列；未知的玩家被忽略
+    assert len(history.query(None, None, DAY_START, DAY_START + 100, 0)) == 2 * len(msm.PLAYER_DATA_ITEMS)
+    assert history.query(['nobody'], None, DAY_START, DAY_START + 100, 0) == []
+    result = series_of(history.query(['Alex', 'nobody'], ['deathCount'], DAY_START, DAY_START + 100, 0))
+    assert result == {('Alex', 'deathCount'): [(DAY_START, 5)]}
+
+
+def test_downsample(store, tmp_path):
+    records, open_history = store
+    history = open_history(str(tmp_path))
+    for i in range(10):
+        records.set_row('Steve', {'deathCount': i})
+        history.record(DAY_START + i * 7)
+    result = series_of(history.query(['Steve'], ['deathCount'], DAY_START, DAY_START + 69, 20))
+    # 每个区间取区间内最后的值：[0,20) 为 t=0,7,14，[20,40) 为 t=21,28,35，依此类推
+    assert result == {('Steve', 'deathCount'): [(DAY_START, 2), (DAY_START + 20, 5), (DAY_START + 40, 8),
+                                                (DAY_START + 60, 9)]}
+    # 无变化的区间沿用之前的值；查询范围开始之前的值作为第一个区间的值
+    result = series_of(history.query(['Steve'], ['deathCount'], DAY_START + 64, DAY_START + 200, 50))
+    assert result == {('Steve', 'deathCount'): [(DAY_START + 64, 9), (DAY_START + 114, 9), (DAY_START + 164, 9)]}
+
+
+def test_max_points(store, tmp_path):
+    records, open_history = store
+    history = open_history(str(tmp_path))
+    for i in range(30):
+        records.set_row('Steve', {'deathCount': i})
+        history.record(DAY_START + i)
+    assert len(history.query(['Steve'], ['deathCount'], DAY_START, DAY_START + 100, 0, 30)[0]['points']) == 30
+    with pytest.raises(ValueError):
+        history.query(['Steve'], ['deathCount'], DAY_START, DAY_START + 100, 0, 29)
+    # 降采样时不受点数上限的限制
+    assert len(history.query(['Steve'], ['deathCount'], DAY_START, DAY_START + 100, 10, 5)[0]['points']) == 11
+
+
+def test_across_days_and_reopen(store, tmp_path):
+    records, open_history = store
+    history = open_history(str(tmp_path))
+    records.set_row('Steve', {'deathCount': 1})
+    history.record(DAY_START)
+    records.set_row('Steve', {'deathCount': 2})
+    history.record(DAY_START + 3600)
+    # 进入新的一天时，新分段以所有数据的关键帧开头
+    next_day = DAY_START + 86400
+    records.set_row('Alex', {'deathCount': 7})
+    assert history.record(next_day) == 2 * len(msm.PLAYER_DATA_ITEMS)
+    records.set_row('Steve', {'deathCount': 3})
+    history.record(next_day + 60)
+    assert len({name[:8] for name in (p.name for p in tmp_path.iterdir()) if name.endswith('.seg')}) == 2
+
+    expected = {('Steve', 'deathCount'): [(DAY_START, 1), (DAY_START + 3600, 2), (next_day, 2), (next_day + 60, 3)]}
+    assert series_of(history.query(['Steve'], ['deathCount'], DAY_START, next_day + 100, 0)) == expected
+    # 查询范围从第二天开始时，以当天的关键帧作为起点
+    assert series_of(history.query(['Steve'], ['deathCount'], next_day + 30, next_day + 100, 0)) == {
+        ('Steve', 'deathCount'): [(next_day + 30, 2), (next_day + 60, 3)]}
+
+    # 关闭后不再接受查询；重新打开后玩家列表及历史记录均保留
+    history.close()
+    with pytest.raises(ValueError):
+        history.query(None, None, DAY_START, next_day, 0)
+    reopened = open_history(str(tmp_path))
+    assert reopened.known_players() == ['Steve', 'Alex']
+    assert series_of(reopened.query(['Steve'], ['deathCount'], DAY_START, next_day + 100, 0)) == expected
@@ -0,0 +1,118 @@
+"""
+排行榜的测试：排名索引（RankIndex）与对全部玩家排序的结果比较（包括分块的拆分与移除），
+以及 get_leaderboard 指令的并列排名、以 after 分页，及指定玩家的排名。
+"""
+
+import asyncio
+import json
+import random
+
+import websockets
+
+from common import load_plugin
+from conftest import store_complete, wait_until
+
+msm = load_plugin()
+
+
+def check_index(rank: msm.RankIndex, values: dict[str, int], rand: random.Random) -> None:
+    expected = sorted((-value, player) for player, value in values.items())
+    assert len(rank) == len(expected)
+    assert [(-value, player) for _, player, value in rank.page(0, len(expected) + 1)] == expected
+    for player, value in rand.sample(sorted(values.items()), min(len(values), 10)):
+        assert rank.rank_of(value) == 1 + sum(key[0] < -value for key in expected)
+        assert expected[rank.position_of(player, value)] == (-value, player)
+        assert rank.position_after(player, value) == rank.position_of(player, value) + 1
+    # 分页：排名按值计算，值相同的项排名相同
+    start = rand.randrange(len(expected) + 1)
+    page = rank.page(start, 7)
+    assert [(-value, player) for _, player, value in page] == expected[start:start + 7]
+    assert all(entry_rank == 1 + sum(key[0] < -value for key in expected) for entry_rank, _, value in page)
+    # 不在列表中的 (值, 玩家名称) 之后的位置
+    key = (rand.randint(-1, 21), 'player_%03d_' % rand.randrange(100))
+    assert rank.position_after(key[1], key[0]) == sum(other <= (-key[0], key[1]) for other in expected)
+
+
+def test_rank_index_matches_sorting(monkeypatch):
+    # 以很小的分块长度，使分块频繁地拆分及移除
+    monkeypatch.setattr(msm, 'RANK_BLOCK_SIZE', 4)
+    rand = random.Random(1)
+    values = {'player_%03d' % i: rand.randint(0, 20) for i in range(60)}
+    rank = msm.RankIndex(sorted((-value, player) for player, value in values.items()))
+    check_index(rank, values, rand)
+    for step in range(400):
+        player = 'player_%03d' % rand.randrange(100)
+        value = rand.randint(0, 20)
+        if player in values:
+            rank.update(player, values[player], value)
+        else:
+            rank.add(player, value)
+        values[player] = value
+        # 将大量玩家集中到同一个值，再分散开，以使部分分块被清空
+        if step == 200:
+            for player in values:
+                rank.update(player, values[player], 20)
+                values[player] = 20
+        if step % 20 == 0:
+            check_index(rank, values, rand)
+    check_index(rank, values, rand)
+    assert msm.RankIndex().page(0, 10) == [] and msm.RankIndex().rank_of(5) == 1
+
+
+def test_get_leaderboard(start_server):
+    server, url = start_server(12)
+    with server.lock:
+        # 存在大量并列的值
+        for i, scores in enumerate(server.scores.values()):
+            scores['deathCount'] = i % 4
+    wait_until(lambda: store_complete(server))
+
+    async def call(arguments: dict) -> dict:
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({'id': 1, 'instruction': 'get_leaderboard',
+                                             'arguments': {'metric': 'deathCount', **arguments}}))
+            return json.loads(await asyncio.wait_for(websocket.recv(), 10))
+
+    def expected() -> list[tuple[int, str]]:
+        with server.lock:
+            return sorted((-scores['deathCount'], player) for player, scores in server.scores.items())
+
+    reply = asyncio.run(call({'limit': 100}))
+    assert reply['instruction'] == 'leaderboard' and reply['total'] == 12 and reply['next'] is None
+    assert [(-entry['value'], entry['name']) for entry in reply['entries']] == expected()
+    # 值相同的玩家排名相同，其后的排名跳过并列的名次
+    assert [entry['rank'] for entry in reply['entries']] == [1, 1, 1, 4, 4, 4, 7, 7, 7, 10, 10, 10]
+
+    # 以 after 分页：两页之间数据发生变化，不会重复或遗漏未变化的玩家
+    first = asyncio.run(call({'limit': 5}))
+    assert first['next'] == [first['entries'][-1]['value'], first['entries'][-1]['name']]
+    moved = first['entries'][0]['name']
+    with server.lock:
+        server.scores[moved]['deathCount'] = -1
+    wait_until(lambda: store_complete(server))
+    second = asyncio.run(call({'limit': 5, 'after': first['next']}))
+    assert second['offset'] == 4
+    names = [entry['name'] for entry in first['entries'] + second['entries']]
+    assert len(set(names)) == len(names) == 10
+    assert [(-entry['value'], entry['name']) for entry in second['entries']] == expected()[4:9]
+    # offset 分页的结果与 after 分页一致
+    assert asyncio.run(call({'limit': 5, 'offset': 4}))['entries'] == second['entries']
+
+    # 指定玩家的排名及其在列表中的位置；未知的玩家被忽略
+    players = [moved, 'player_5', 'nobody']
+    reply = asyncio.run(call({'limit': 0, 'players': players}))
+    assert reply['entries'] == [] and reply['next'] is None
+    keys = expected()
+    for entry in reply['players']:
+        key = (-entry['value'], entry['name'])
+        assert entry['rank'] == 1 + sum(other[0] < key[0] for other in keys)
+        assert entry['position'] == keys.index(key)
+    assert [entry['name'] for entry in reply['players']] == [moved, 'player_5']
+    assert reply['players'][0]['rank'] == 12 and reply['players'][0]['value'] == -1
+
+    # 参数有误
+    assert asyncio.run(call({'limit': 'x'}))['message'] == 'Invalid limit, offset or after'
+    assert asyncio.run(call({'after': [1]}))['message'] == 'Invalid limit, offset or after'
+    assert asyncio.run(call({'players': 'player_1'}))['message'] == 'players must be a list of player names'
+    assert asyncio.run(call({'metric': 'nope'}))['message'] == 'Unknown metric: nope'
+    assert asyncio.run(call({'metric': 'health'}))['message'].startswith('Metric health is not ranked')
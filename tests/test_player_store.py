@@ -0,0 +1,114 @@
+"""
+玩家数据存储结构（PlayerDataStore）的单元测试：单项及整行更新、版本号、变化查询、按前缀查找、快照，
+以及重新加载插件时的数据迁移。
+"""
+
+from common import load_plugin
+
+msm = load_plugin()
+
+DEATH = msm.PLAYER_DATA_ITEM_INDEX['deathCount']
+HEALTH = msm.PLAYER_DATA_ITEM_INDEX['health']
+
+
+def test_set_and_versions():
+    store = msm.PlayerDataStore()
+    assert store.get_row('Steve') is None and store.row_version('Steve') == 0
+    # 新增的玩家视为其所有数据均发生了变化
+    store.set('Steve', DEATH, 3)
+    assert len(store) == 1 and 'Steve' in store
+    assert store.version == 2
+    assert store.get_row('Steve')['deathCount'] == 3
+    assert store.row_version('Steve') == 2
+    # 值未变化时版本号不变
+    store.set('Steve', DEATH, 3)
+    assert store.version == 2
+    store.set('Alex', HEALTH, 20)
+    assert store.version == 4 and store.row_version('Steve') == 2 and store.row_version('Alex') == 4
+
+
+def test_set_row():
+    store = msm.PlayerDataStore()
+    store.set_row('Steve', {'deathCount': 1, 'health': 20, 'unknown': 5})
+    version = store.version
+    row = store.get_row('Steve')
+    assert row['deathCount'] == 1 and row['health'] == 20 and row['xp'] == 0
+    assert sorted(row) == sorted(msm.PLAYER_DATA_ITEMS)
+    # 同一行内的所有变化共用一个版本号；未出现的条目保持原值
+    store.set_row('Steve', {'deathCount': 2, 'xp': 7})
+    assert store.version == version + 1
+    assert store.versions[DEATH][store.index['Steve']] == store.version
+    assert store.versions[HEALTH][store.index['Steve']] == version
+    assert store.get_row('Steve')['health'] == 20
+    # 没有变化时版本号不变
+    store.set_row('Steve', {'deathCount': 2})
+    assert store.version == version + 1
+
+
+def test_changes_since():
+    store = msm.PlayerDataStore()
+    store.set_row('Steve', {'deathCount': 1, 'health': 20})
+    store.set_row('Alex', {'deathCount': 4})
+    version = store.version
+    assert store.changes_since(version, [DEATH, HEALTH]) == []
+    store.set('Steve', HEALTH, 15)
+    store.set('Alex', DEATH, 5)
+    assert sorted(store.changes_since(version, [DEATH, HEALTH])) == [('Alex', DEATH, 5), ('Steve', HEALTH, 15)]
+    # 只包含指定的数据条目
+    assert store.changes_since(version, [DEATH]) == [('Alex', DEATH, 5)]
+    # 从0开始查询时包含所有数据
+    assert len(store.changes_since(0, list(range(len(msm.PLAYER_DATA_ITEMS))))) == 2 * len(msm.PLAYER_DATA_ITEMS)
+
+
+def test_slots_with_prefix():
+    store = msm.PlayerDataStore()
+    for player in ['bob', 'alice', 'alex', 'al', 'Alan']:
+        store.set(player, DEATH, 1)
+    assert sorted(store.names[slot] for slot in store.slots_with_prefix('al')) == ['al', 'alex', 'alice']
+    assert store.slots_with_prefix('z') == []
+    # 新增玩家后重建按名称排序的索引
+    store.set('albert', DEATH, 1)
+    assert sorted(store.names[slot] for slot in store.slots_with_prefix('alb')) == ['albert']
+
+
+def test_snapshot_is_independent():
+    store = msm.PlayerDataStore()
+    store.set_row('Steve', {'deathCount': 1})
+    snapshot = store.snapshot()
+    store.set_row('Steve', {'deathCount': 2})
+    store.set_row('Alex', {'deathCount': 3})
+    assert len(snapshot) == 1
+    assert [(name, values[DEATH]) for name, values in snapshot.rows()] == [('Steve', 1)]
+
+
+def test_migrate_keeps_versions():
+    old = msm.PlayerDataStore()
+    old.set_row('Steve', {'deathCount': 1, 'health': 20})
+    old.set_row('Alex', {'xp': 9})
+    store = msm.PlayerDataStore.migrate(old, list(msm.PLAYER_DATA_ITEMS))
+    # 数据条目未变化时保留版本号及标识，订阅者重新连接后只需获取增量数据
+    assert store.epoch == old.epoch and store.version == old.version
+    assert store.get_row('Steve') == old.get_row('Steve') and store.get_row('Alex') == old.get_row('Alex')
+    assert store.changes_since(0, [DEATH]) == old.changes_since(0, [DEATH])
+    # 迁移后的数据与旧实例互不影响
+    store.set('Steve', DEATH, 5)
+    assert old.get_row('Steve')['deathCount'] == 1
+
+
+def test_migrate_changed_items():
+    old = msm.PlayerDataStore()
+    old.set_row('Steve', {'deathCount': 1, 'health': 20})
+    # 数据条目发生变化时按名称重新写入，标识随之改变
+    store = msm.PlayerDataStore.migrate(old, ['deathCount', 'health'])
+    assert store.epoch != old.epoch
+    assert store.get_row('Steve') == old.get_row('Steve')
+
+
+def test_migrate_legacy_dict():
+    class PlayerData(object):
+        def __init__(self, **values):
+            self.__dict__.update(values)
+
+    store = msm.PlayerDataStore.migrate({'Steve': PlayerData(deathCount=2, xp=5), 'Alex': PlayerData()})
+    assert store.get_row('Steve')['deathCount'] == 2 and store.get_row('Steve')['xp'] == 5
+    assert store.get_row('Alex') == {item: 0 for item in msm.PLAYER_DATA_ITEMS}
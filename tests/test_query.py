@@ -0,0 +1,82 @@
+"""
+玩家数据查询（PlayerDataQuery）的单元测试：查询参数的解析与校验，以及按玩家名称、名称模式、在线玩家及数值条件的筛选。
+"""
+
+import pytest
+
+from common import load_plugin
+
+msm = load_plugin()
+
+DEATH = msm.PLAYER_DATA_ITEM_INDEX['deathCount']
+XP = msm.PLAYER_DATA_ITEM_INDEX['xp']
+
+
+def test_parse_defaults():
+    query = msm.PlayerDataQuery.parse({})
+    assert query.players is None and query.pattern is None and query.pattern_regex is None
+    assert query.pattern_prefix == '' and not query.online_only and query.predicates == []
+    # 未指定数据条目时返回全部数据条目
+    assert query.item_indexes == msm.ALL_ITEM_INDEXES
+
+
+def test_parse_arguments():
+    query = msm.PlayerDataQuery.parse({
+        'players': ['Steve', 'Alex'], 'pattern': 'St?ve*', 'metrics': ['xp', 'deathCount'], 'online_only': 1,
+        'where': ['deathCount > 10', '  xp<=-5 ', 'xp!=3']
+    })
+    assert query.players == ['Steve', 'Alex'] and query.online_only is True
+    # 数据条目保持请求中的顺序
+    assert query.item_indexes == [XP, DEATH]
+    # 名称前缀截止到第一个通配符
+    assert query.pattern_prefix == 'St'
+    assert query.pattern_regex.match('Steve_1') and not query.pattern_regex.match('Stev')
+    assert [(item, value) for item, _, value in query.predicates] == [(DEATH, 10), (XP, -5), (XP, 3)]
+    compare = [function for _, function, _ in query.predicates]
+    assert compare[0](11, 10) and not compare[0](10, 10)
+    assert compare[1](-5, -5) and not compare[1](-4, -5)
+    assert compare[2](2, 3) and not compare[2](3, 3)
+    assert msm.PlayerDataQuery.parse({'pattern': '[ab]*'}).pattern_prefix == ''
+
+
+@pytest.mark.parametrize('arguments, message', [
+    ({'players': 'Steve'}, 'players must be a list of player names'),
+    ({'players': ['Steve', 3]}, 'players must be a list of player names'),
+    ({'pattern': 5}, 'pattern must be a string'),
+    ({'metrics': 'xp'}, 'metrics must be a list of metric names'),
+    ({'metrics': ['xp', None]}, 'metrics must be a list of metric names'),
+    ({'metrics': ['xp', 'nope', 'bad']}, 'Unknown metrics: nope, bad'),
+    ({'where': 'xp > 1'}, 'where must be a list of conditions'),
+    ({'where': ['xp >> 1']}, 'Invalid condition: xp >> 1'),
+    ({'where': ['nope > 1']}, 'Invalid condition: nope > 1'),
+    ({'where': ['xp > 1.5']}, 'Invalid condition: xp > 1.5'),
+    ({'where': [{'xp': 1}]}, "Invalid condition: {'xp': 1}")
+])
+def test_parse_invalid(arguments, message):
+    with pytest.raises(ValueError) as info:
+        msm.PlayerDataQuery.parse(arguments)
+    assert str(info.value) == message
+
+
+def test_select():
+    store = msm.PlayerDataStore()
+    for name, deaths, xp in [('Steve', 12, 5), ('Stella', 3, 40), ('Alex', 20, 40), ('Stan', 15, 1)]:
+        store.set_row(name, {'deathCount': deaths, 'xp': xp})
+
+    def select(arguments: dict, online: list[str] = ()) -> list[str]:
+        slots, archived = msm.PlayerDataQuery.parse(arguments).select(store, online)
+        assert archived == []
+        return [store.names[slot] for slot in slots]
+
+    assert select({}) == ['Steve', 'Stella', 'Alex', 'Stan']
+    assert select({'pattern': 'St*'}) == ['Steve', 'Stella', 'Stan']
+    assert select({'pattern': 'St?n'}) == ['Stan']
+    # 所有数值条件均须满足
+    assert select({'where': ['deathCount >= 12', 'xp < 10']}) == ['Steve', 'Stan']
+    assert select({'pattern': 'St*', 'where': ['xp == 40']}) == ['Stella']
+    # 名称列表中重复或未知的玩家被忽略
+    assert select({'players': ['Alex', 'Alex', 'nobody', 'Steve']}) == ['Steve', 'Alex']
+    # 只查询在线玩家时，与名称列表取交集
+    assert select({'online_only': True}, ['Stan', 'Alex', 'nobody']) == ['Alex', 'Stan']
+    assert select({'online_only': True, 'players': ['Steve', 'Alex']}, ['Alex']) == ['Alex']
+    assert select({'online_only': True}, []) == []
@@ -0,0 +1,165 @@
+"""
+滑动窗口统计（PlayerRateTracker）与逐次变化记录的暴力重算结果的一致性测试，以及不限窗口（未指定 window）的查询。
+"""
+
+import asyncio
+import json
+import math
+import random
+
+import pytest
+import websockets
+
+from common import load_plugin
+
+msm = load_plugin()
+
+
+class NaiveRates(object):
+    """
+    保存每一次变化，查询时按与 PlayerRateTracker.query 相同的定义直接重算。
+    """
+
+    def __init__(self, width: float, buckets: int):
+        self.width: float = width
+        self.buckets: int = buckets
+        # 各玩家开始统计的时刻，及各数据条目的 [(时刻, 值), ...]
+        self.since: dict[str, float] = {}
+        self.log: dict[str, dict[int, list[tuple[float, int]]]] = {}
+
+    def observe(self, player: str, item_index: int, value: int, now: float) -> None:
+        self.since.setdefault(player, now)
+        self.log.setdefault(player, {}).setdefault(item_index, []).append((now, value))
+
+    def query(self, player: str, item_indexes: list[int], window: float, now: float) -> tuple[float, dict] | None:
+        if player not in self.since:
+            return None
+        width = self.width
+        count = max(math.ceil(min(window, width * self.buckets) / width), 1)
+        first_bucket = int(now // width) - count + 1
+        start = max(first_bucket * width, self.since[player])
+        span = now - start
+        result = {}
+        for item_index in item_indexes:
+            points = self.log[player].get(item_index)
+            if points is None:
+                continue
+            item = msm.PLAYER_DATA_ITEMS[item_index]
+            if item in msm.PLAYER_DATA_COUNTERS:
+                # 首个值只作为基准；值变小时视为重置，重置后的值即为增量
+                delta = 0
+                resets = 0
+                for (_, previous), (t, value) in zip(points, points[1:]):
+                    if int(t // width) >= first_bucket:
+                        if value >= previous:
+                            delta += value - previous
+                        else:
+                            delta += value
+                            resets += 1
+                result[item] = {'delta': delta, 'rate': delta / span if span > 0 else 0.0, 'resets': resets}
+            else:
+                # 值随时间分段保持不变，首个值视为自开始统计时即为该值（只用于积分）
+                segments = [(self.since[player], points[0][0], points[0][1], False)]
+                for k, (t, value) in enumerate(points):
+                    end = points[k + 1][0] if k + 1 < len(points) else now
+                    segments.append((t, end, value, True))
+                integral = 0.0
+                held = []
+                for seg_start, seg_end, value, observed in segments:
+                    overlap = min(seg_end, now) - max(seg_start, start)
+                    if overlap > 0:
+                        integral += value * overlap
+                        if observed:
+                            held.append(value)
+                current = points[-1][1]
+                result[item] = {
+                    'current': current,
+                    'min': min(held + [current]),
+                    'max': max(held + [current]),
+                    'avg': integral / span if span > 0 else float(current)
+                }
+        return span, result
+
+
+def assert_same(expected: tuple[float, dict] | None, actual: tuple[float, dict] | None) -> None:
+    assert (expected is None) == (actual is None)
+    if expected is None:
+        return
+    assert actual[0] == pytest.approx(expected[0])
+    assert sorted(actual[1]) == sorted(expected[1])
+    for item, stats in expected[1].items():
+        for key, value in stats.items():
+            assert actual[1][item][key] == pytest.approx(value, rel=1e-9, abs=1e-6), (item, key)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_query_matches_naive_recomputation(seed):
+    rand = random.Random(seed)
+    width = rand.choice([1, 5, 10])
+    buckets = rand.choice([1, 3, 6, 12])
+    tracker = msm.PlayerRateTracker(width, buckets)
+    naive = NaiveRates(float(width), buckets)
+    players = ['player_%d' % i for i in range(3)]
+    values = {(player, item_index): rand.randint(0, 20)
+              for player in players for item_index in range(len(msm.PLAYER_DATA_ITEMS))}
+    now = 1_700_000_000.0 + rand.random() * width
+    # 模拟数倍于整个窗口的时长，使环形缓冲区多次回绕；其间穿插长时间没有变化的间隔
+    for _ in range(400):
+        now += rand.expovariate(1.0 / width) * (rand.choice([0.2, 1.0, 5.0]))
+        player = rand.choice(players)
+        item_index = rand.randrange(len(msm.PLAYER_DATA_ITEMS))
+        value = values[(player, item_index)]
+        if msm.PLAYER_DATA_ITEMS[item_index] in msm.PLAYER_DATA_COUNTERS:
+            # 累计型条目偶尔被重置
+            value = rand.randint(0, 3) if rand.random() < 0.05 else value + rand.randint(0, 5)
+        else:
+            value = rand.randint(0, 20)
+        values[(player, item_index)] = value
+        tracker.observe(player, item_index, value, now)
+        naive.observe(player, item_index, value, now)
+        if rand.random() < 0.2:
+            query_now = now + rand.random() * width * 2
+            window = rand.choice([0.5, width, width * 2.5, width * buckets, math.inf])
+            item_indexes = rand.sample(range(len(msm.PLAYER_DATA_ITEMS)), rand.randint(1, 6))
+            for query_player in players + ['nobody']:
+                assert_same(naive.query(query_player, item_indexes, window, query_now),
+                            tracker.query(query_player, item_indexes, window, query_now))
+
+
+def test_reload_keeps_statistics():
+    tracker = msm.PlayerRateTracker(10, 6)
+    for i in range(30):
+        tracker.observe('player', msm.PLAYER_DATA_ITEM_INDEX['deathCount'], i, 1000.0 + i * 3)
+        tracker.observe('player', msm.PLAYER_DATA_ITEM_INDEX['health'], i % 7, 1000.0 + i * 3 + 1)
+    reloaded = msm.PlayerRateTracker(10, 6, tracker)
+    indexes = list(range(len(msm.PLAYER_DATA_ITEMS)))
+    assert reloaded.query('player', indexes, 60, 1100.0) == tracker.query('player', indexes, 60, 1100.0)
+
+
+def test_unbounded_window():
+    tracker = msm.PlayerRateTracker(10, 6)
+    death = msm.PLAYER_DATA_ITEM_INDEX['deathCount']
+    for i in range(40):
+        tracker.observe('player', death, i, 1000.0 + i * 3)
+    # 不限窗口（math.inf）或超过环形缓冲区总长度的窗口，均截断为整个缓冲区
+    full = tracker.query('player', [death], 60, 1120.0)
+    assert tracker.query('player', [death], math.inf, 1120.0) == full
+    assert tracker.query('player', [death], 1e300, 1120.0) == full
+
+
+def test_request_without_window(start_server):
+    _, url = start_server(2)
+
+    async def run(arguments: dict) -> dict:
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({'id': 1, 'instruction': 'get_players_rates', 'arguments': arguments}))
+            return json.loads(await asyncio.wait_for(websocket.recv(), 10))
+
+    # 未指定 window 时为不限窗口，回复的 window 为整个缓冲区的长度
+    config = msm.PluginConfig()
+    reply = asyncio.run(run({}))
+    assert reply['instruction'] == 'players_rates'
+    assert reply['window'] == config.rateBuckets * config.rateBucketSeconds
+    assert asyncio.run(run({'window': 1e300}))['window'] == reply['window']
+    assert asyncio.run(run({'window': 0}))['message'] == 'window must be positive'
+    assert asyncio.run(run({'metrics': 'xp'}))['message'] == 'metrics must be a list of metric names'
@@ -0,0 +1,207 @@
+"""
+RCON传输（transport: 'rcon'）的测试，以 FakeServerInterface.start_rcon 启动的模拟 RCON 服务器代替MC服务器：
+数据包的拆分与回复的匹配、登录失败、RCON不可用时回退为经控制台发送、断线重连、并发请求下不丢失结果，
+以及结果不依赖控制台输出。
+"""
+
+import concurrent.futures
+import logging
+import threading
+
+import pytest
+
+from conftest import free_port, store_complete, wait_until
+
+PASSWORD = 'secret'
+# 各数据条目均以较短的间隔轮询，使数据的变化很快被采集到
+FAST_POLL = {'fast': 100, 'normal': 100, 'slow': 100}
+
+
+def rcon_config(**overrides) -> dict:
+    return {'transport': 'rcon', 'rconPort': free_port(), 'rconPassword': PASSWORD, 'rconConnections': 2,
+            'metricPollIntervals': FAST_POLL, **overrides}
+
+
+def submit(msm, commands: list[str], ordered: bool = False) -> concurrent.futures.Future:
+    """
+    经插件的RCON传输发送一组命令，返回在收到全部回复后完成的 Future。
+    """
+
+    future = concurrent.futures.Future()
+    assert msm.rcon_transport.submit(commands, future.set_result, ordered)
+    return future
+
+
+def list_reply(players: list[str]) -> str:
+    return 'There are %d of a max of %d players online: %s' % (
+        len(players), max(len(players), 20), ', '.join(players))
+
+
+def pad_players(server, length: int) -> str:
+    """
+    加入若干玩家，使 list 命令的回复恰好为 length 字节，返回该回复。
+    """
+
+    with server.lock:
+        players = list(server.players)
+        while len(list_reply(players + ['x' * 100]).encode('utf-8')) < length:
+            players.append('filler_%d' % len(players))
+        # 最后加入一名名称长度合适的玩家
+        for extra in range(1, 200):
+            if len(list_reply(players + ['p' * extra]).encode('utf-8')) == length:
+                players.append('p' * extra)
+                for player in players[len(server.players):]:
+                    server.scores[player] = {item: 0 for item in server.items}
+                server.players[:] = players
+                return list_reply(players)
+    pytest.fail(f'cannot pad the list reply to {length} bytes')
+
+
+def expected_get_data(server, player: str, item: str) -> str:
+    with server.lock:
+        return 'Function msm:get_data returned %d' % server.scores[player][item]
+
+
+@pytest.mark.parametrize('pipelined', [1, 4])
+def test_replies_match_commands(start_server, pipelined):
+    config = rcon_config(rconMaxPipelined=pipelined)
+    server, _ = start_server(100, config, rcon_password=PASSWORD)
+    msm = server.plugin
+    wait_until(lambda: msm.rcon_transport.connected and store_complete(server))
+    # 回复恰好为4096字节的整数倍时，须由之后的数据包（或标记数据包的回复）确定其已结束
+    exact = pad_players(server, 3 * 4096)
+    assert submit(msm, ['list']).result(10) == [exact]
+    with server.lock:
+        server.scores['q' * 100] = {item: 0 for item in server.items}
+        server.players.append('q' * 100)
+        longer = list_reply(server.players)
+    assert len(longer.encode('utf-8')) > 3 * 4096
+
+    # 多个线程同时提交命令组，各组的回复须与其命令一一对应（长短回复交错，与插件自身的轮询命令并发）
+    players = server.players[:50]
+    groups = []
+    for i in range(200):
+        player = players[i % len(players)]
+        commands = ['function msm:get_data {player:%s,entry:msm_xp}' % player]
+        if i % 5 == 0:
+            commands = ['list'] + commands + ['list']
+        groups.append(commands)
+    futures: list[concurrent.futures.Future | None] = [None] * len(groups)
+
+    def worker(offset: int) -> None:
+        for index in range(offset, len(groups), 8):
+            futures[index] = submit(msm, groups[index], ordered=index % 3 == 0)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # xp 不会变化（change_rate 为0），因此回复的值即为当前的值
+    for commands, future in zip(groups, futures):
+        replies = future.result(10)
+        assert len(replies) == len(commands)
+        for command, reply in zip(commands, replies):
+            if command == 'list':
+                assert reply == longer
+            else:
+                player = command.split('player:')[1].split(',')[0]
+                assert reply == expected_get_data(server, player, 'xp')
+    stats = msm.rcon_transport.stats()
+    assert stats['lost'] == 0 and stats['connections'] == 2
+
+
+def test_authentication_failure_falls_back_to_console(start_server, caplog):
+    caplog.set_level(logging.WARNING)
+    server, _ = start_server(20, rcon_config(rconPassword='wrong'), rcon_password=PASSWORD)
+    msm = server.plugin
+    wait_until(lambda: store_complete(server))
+    assert 'RCON authentication failed' in caplog.text
+    assert not msm.rcon_transport.connected
+    assert msm.rcon_transport.stats()['fallbacks'] > 0
+    assert server.rcon_commands == 0
+
+
+def test_console_fallback_without_rcon_server(start_server, caplog):
+    caplog.set_level(logging.WARNING)
+    server, _ = start_server(20, rcon_config())
+    msm = server.plugin
+    wait_until(lambda: store_complete(server))
+    assert 'Failed to connect to RCON' in caplog.text
+    # 同一原因只输出一次警告
+    assert caplog.text.count('(connection #0)') == 1
+    # 数据的变化仍经控制台采集
+    with server.lock:
+        server.scores['player_3']['deathCount'] += 7
+    wait_until(lambda: store_complete(server))
+    assert msm.rcon_transport.stats()['fallbacks'] > 0
+    assert server.rcon_commands == 0 and server.commands_received > 0
+
+
+def test_reconnect(start_server):
+    config = rcon_config()
+    server, _ = start_server(20, config)
+    msm = server.plugin
+    transport = msm.rcon_transport
+    wait_until(lambda: store_complete(server))
+    assert not transport.connected
+
+    # RCON服务器晚于插件启动：按退避间隔重试，连接后命令改经RCON发送
+    server.start_rcon(config['rconPort'], PASSWORD)
+    wait_until(lambda: transport.stats()['connections'] == 2, 30)
+    assert transport.stats()['reconnects'] == 2
+    wait_until(lambda: server.rcon_commands > 0)
+
+    # RCON服务器重启：连接断开期间回退为经控制台发送，之后自动重连
+    server.stop_rcon()
+    wait_until(lambda: not transport.connected)
+    with server.lock:
+        server.scores['player_5']['level'] += 3
+    wait_until(lambda: store_complete(server))
+    server.start_rcon(config['rconPort'], PASSWORD)
+    wait_until(lambda: transport.stats()['connections'] == 2, 30)
+    assert transport.stats()['reconnects'] == 4
+    assert submit(msm, ['function msm:get_data {player:player_5,entry:msm_level}']).result(10) == [
+        expected_get_data(server, 'player_5', 'level')]
+
+
+@pytest.mark.parametrize('batched', [True, False])
+def test_no_lost_results_under_load(start_server, batched):
+    players = 200
+    config = rcon_config(batchedCollection=batched, rconConnections=4, rconMaxPipelined=8,
+                         commandBudgetPerSecond=100000)
+    server, _ = start_server(players, config, rcon_password=PASSWORD, change_rate=500)
+    msm = server.plugin
+    wait_until(lambda: msm.rcon_transport.connected and msm.server_monitor.ready)
+    resolved = msm.pending_requests.stats()['resolved']
+    # RCON连接建立前（如玩家加入游戏时）发送的命令经控制台发送，不计在内
+    fallbacks = msm.rcon_transport.stats()['fallbacks']
+    # 插件的轮询与额外提交的命令并发进行
+    futures = [submit(msm, ['function msm:get_data {player:player_%d,entry:msm_deathCount}' % (i % players)])
+               for i in range(2000)]
+    for future in futures:
+        assert future.result(30)[0].startswith('Function msm:get_data returned ')
+    # 插件自身的轮询在此期间照常进行（批量采集模式下每轮采集只计一个请求）
+    wait_until(lambda: msm.pending_requests.stats()['resolved'] > resolved + 2)
+    # 停止随机变化后，插件中的数据与游戏内一致
+    server.change_rate = 0
+    wait_until(lambda: store_complete(server), 30)
+    request_stats = msm.pending_requests.stats()
+    assert request_stats['expired'] == 0 and request_stats['mismatched'] == 0
+    rcon_stats = msm.rcon_transport.stats()
+    assert rcon_stats['lost'] == 0 and rcon_stats['fallbacks'] == fallbacks and rcon_stats['reconnects'] == 0
+
+
+def test_results_independent_of_console(start_server):
+    # 控制台输出全部丢失，且玩家在插件加载前就已在线：list 及采集命令的结果均只能经RCON的回复取得
+    server, _ = start_server(20, rcon_config(), rcon_password=PASSWORD, join=False, loss=1.0)
+    msm = server.plugin
+    wait_until(lambda: store_complete(server))
+    assert sorted(msm.online_players) == sorted(server.players)
+    assert msm.server_monitor.warm_start_attempts == 1
+    with server.lock:
+        server.scores['player_7']['deathCount'] += 2
+    wait_until(lambda: store_complete(server))
+    request_stats = msm.pending_requests.stats()
+    assert request_stats['expired'] == 0 and request_stats['untagged'] == 0
+    assert msm.rcon_transport.stats()['fallbacks'] == 0
@@ -0,0 +1,69 @@
+"""
+重新加载插件的测试：旧实例的运行时线程随卸载结束、等待中的请求（包括 list 请求）由新实例接管，
+以及迁移玩家数据时持有旧实例的锁。
+"""
+
+import threading
+import time
+
+from common import load_plugin
+from conftest import reload_plugin, store_complete, wait_until
+
+
+def runtime_threads() -> list[threading.Thread]:
+    return [thread for thread in threading.enumerate() if thread.name == 'MonitorRuntime']
+
+
+def test_reload_joins_runtime(start_server):
+    server, _ = start_server(10)
+    wait_until(lambda: store_complete(server))
+    for _ in range(3):
+        old = server.plugin
+        reload_plugin(server)
+        # 卸载时等待运行时线程结束，重新加载后只有新实例的运行时线程
+        assert not old.monitor_runtime.is_alive()
+        assert runtime_threads() == [server.plugin.monitor_runtime]
+    wait_until(lambda: store_complete(server))
+
+
+def test_pending_list_request_survives_reload(start_server):
+    # 控制台输出延迟到达，使 list 命令的输出在重新加载之后才到达
+    server, _ = start_server(10, output_delay=1.0)
+    wait_until(lambda: store_complete(server), 30)
+    request_id = server.plugin.execute_list_players()
+    start = time.monotonic()
+    reload_plugin(server)
+    assert time.monotonic() - start < 1.0
+    msm = server.plugin
+    # 新实例接管旧实例的 list 请求，其输出到达后按先后顺序匹配给该请求
+    assert msm.pending_requests.entries[request_id].mc_func == 'list'
+    wait_until(lambda: request_id not in msm.pending_requests.entries)
+    stats = msm.pending_requests.stats()
+    assert stats['untagged'] == 0 and stats['expired'] == 0
+
+
+def test_migrate_holds_old_lock(start_server):
+    server, _ = start_server(10)
+    wait_until(lambda: store_complete(server))
+    old = server.plugin
+    old.on_unload(server)
+    held = threading.Event()
+
+    def hold() -> None:
+        # 模拟旧实例尚未结束、正在修改玩家数据的任务
+        with old.player_data_records_lock:
+            held.set()
+            time.sleep(0.3)
+            old.player_data_records.set('late_player', old.PLAYER_DATA_ITEM_INDEX['deathCount'], 9)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    start = time.monotonic()
+    server.plugin = load_plugin()
+    server.plugin.on_load(server, old)
+    # 迁移等待该任务完成，其修改不会丢失
+    assert time.monotonic() - start >= 0.25
+    thread.join()
+    with server.plugin.player_data_records_lock:
+        assert server.plugin.player_data_records.get_row('late_player')['deathCount'] == 9
@@ -0,0 +1,184 @@
+"""
+请求表（PendingRequestTable）的单元测试：按关联ID匹配结果、超时、找不到请求及MC函数不一致的计数、
+按先后顺序匹配无法携带关联ID的结果，以及经控制台发送命令时的回退与并发。
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from common import load_plugin
+from conftest import store_complete, wait_until
+
+msm = load_plugin()
+
+
+def make_request(table, mc_func: str = 'msm:get_data', results: list | None = None) -> int:
+    """
+    登记一个请求，其回调将 (MC函数名称, 参数, 结果) 追加到 results 中，返回其关联ID。
+    """
+
+    callback = (lambda func, args, result: results.append((func, args, result))) if results is not None \
+        else (lambda func, args, result: None)
+    return table.register(msm.MCFuncResultSchedule(mc_func, {'n': len(table.entries)}, callback))
+
+
+def test_resolve_by_request_id():
+    table = msm.PendingRequestTable(5000)
+    results = []
+    first = make_request(table, results=results)
+    second = make_request(table, results=results)
+    assert second == first + 1
+    # 结果可以乱序到达
+    assert table.resolve(second, 'msm:get_data', 20)
+    assert table.resolve(first, 'msm:get_data', 10)
+    assert results == [('msm:get_data', {'n': 1}, 20), ('msm:get_data', {'n': 0}, 10)]
+    stats = table.stats()
+    assert stats['pending'] == 0 and stats['resolved'] == 2
+    assert stats['orphaned'] == stats['mismatched'] == stats['expired'] == 0
+
+
+def test_orphaned_and_mismatched_results():
+    table = msm.PendingRequestTable(5000)
+    results = []
+    request_id = make_request(table, 'msm:collect/all', results)
+    # 找不到对应请求的结果（如已超时，或并非由本插件发起）
+    assert not table.resolve(request_id + 100, 'msm:collect/all', [])
+    # MC函数不一致的结果不会使请求出队，该请求自己的结果之后仍可匹配
+    assert not table.resolve(request_id, 'msm:get_data', 1)
+    assert table.resolve(request_id, 'msm:collect/all', [])
+    # 已匹配的请求再次收到结果时视为找不到请求
+    assert not table.resolve(request_id, 'msm:collect/all', [])
+    assert len(results) == 1
+    stats = table.stats()
+    assert stats['resolved'] == 1 and stats['orphaned'] == 2 and stats['mismatched'] == 1
+
+
+def test_expire_per_request_deadline():
+    table = msm.PendingRequestTable(5000)
+    results = []
+    expired_id = make_request(table, results=results)
+    kept_id = make_request(table, results=results)
+    # 各请求按自己的超时时刻过期
+    table.entries[expired_id].deadline = time.monotonic() - 0.001
+    assert table.expire() == 1
+    assert table.expire() == 0
+    assert expired_id not in table.entries and kept_id in table.entries
+    # 过期请求的结果迟到时不执行回调，计为找不到请求
+    assert not table.resolve(expired_id, 'msm:get_data', 1)
+    assert table.resolve(kept_id, 'msm:get_data', 2)
+    assert results == [('msm:get_data', {'n': 1}, 2)]
+    stats = table.stats()
+    assert stats['expired'] == 1 and stats['orphaned'] == 1 and stats['resolved'] == 1
+
+
+def test_timeout_sets_deadline():
+    table = msm.PendingRequestTable(200)
+    request_id = make_request(table)
+    sched = table.entries[request_id]
+    assert sched.deadline - sched.sent_at == pytest.approx(0.2)
+    # 超时时间无效时使用缺省值
+    assert msm.PendingRequestTable(0).timeout == 5000
+
+
+def test_request_id_wraps_around():
+    table = msm.PendingRequestTable(5000)
+    table.next_id = 2147483647
+    assert make_request(table) == 2147483647
+    assert make_request(table) == 1
+
+
+def test_resolve_oldest_in_order():
+    table = msm.PendingRequestTable(5000)
+    results = []
+    make_request(table, 'list', results)
+    make_request(table, msm.UNTAGGED_GET_DATA, results)
+    make_request(table, 'list', results)
+    # 按登记的先后顺序匹配同一MC函数的请求，不影响其他MC函数的请求
+    assert table.resolve_oldest('list', ['a'])
+    assert table.resolve_oldest('list', ['b'])
+    assert results == [('list', {'n': 0}, ['a']), ('list', {'n': 2}, ['b'])]
+    # 没有等待中的请求时仅作计数
+    assert not table.resolve_oldest('list', ['c'])
+    stats = table.stats()
+    assert stats['untagged'] == 1 and stats['pending'] == 1 and stats['orphaned'] == 0
+
+
+def test_retag_orders_by_send_time():
+    table = msm.PendingRequestTable(5000)
+    results = []
+    first = make_request(table, results=results)
+    second = make_request(table, results=results)
+    # 后登记的请求先发送时，以发送的先后顺序匹配
+    table.retag(second, msm.UNTAGGED_GET_DATA)
+    table.retag(first, msm.UNTAGGED_GET_DATA)
+    assert table.resolve_oldest(msm.UNTAGGED_GET_DATA, 2)
+    assert table.resolve_oldest(msm.UNTAGGED_GET_DATA, 1)
+    assert results == [(msm.UNTAGGED_GET_DATA, {'n': 1}, 2), (msm.UNTAGGED_GET_DATA, {'n': 0}, 1)]
+
+
+def test_adopt_pending_requests():
+    old = msm.PendingRequestTable(5000)
+    make_request(old, 'msm:get_data')
+    make_request(old, 'list')
+    dropped = make_request(old, 'unknown')
+    table = msm.PendingRequestTable(5000)
+    results = []
+    table.adopt(old, {
+        'msm:get_data': lambda func, args, result: results.append(('get_data', result)),
+        'list': lambda func, args, result: results.append(('list', result))
+    })
+    # 沿用旧请求表的关联ID，找不到对应回调的请求被丢弃
+    assert table.next_id == old.next_id
+    assert dropped not in table.entries
+    assert table.resolve(1, 'msm:get_data', 5)
+    assert table.resolve_oldest('list', [])
+    assert results == [('get_data', 5), ('list', [])]
+
+
+def test_legacy_datapack_fallback(start_server, caplog):
+    # 旧版本数据包不支持批量采集及带关联ID的查询：依次回退为逐条采集、不带关联ID的查询，数据仍能完整采集
+    config = {'serverMonitorThreadInterval': 200, 'requestTimeout': 1000,
+              'metricPollIntervals': {'fast': 200, 'normal': 200, 'slow': 200}}
+    server, _ = start_server(10, config, legacy_datapack=True)
+    msm_instance = server.plugin
+    wait_until(lambda: msm_instance.untagged_get_data, 20)
+    assert 'falling back to per-entry collection' in caplog.text
+    assert 'falling back to untagged queries' in caplog.text
+    wait_until(lambda: store_complete(server))
+    # 数据的变化仍能被采集
+    with server.lock:
+        server.scores['player_4']['deathCount'] += 5
+    wait_until(lambda: store_complete(server))
+    assert msm_instance.pending_requests.stats()['mismatched'] == 0
+
+
+def test_concurrent_console_commands_keep_results(start_server):
+    # 玩家加入游戏（MCDR线程）发送的查询与轮询任务的查询及取回结果的命令并发，结果不会被清空
+    config = {'batchedCollection': False, 'serverMonitorThreadInterval': 100,
+              'metricPollIntervals': {'fast': 100, 'normal': 100, 'slow': 100}, 'commandBudgetPerSecond': 100000}
+    server, _ = start_server(50, config)
+    msm_instance = server.plugin
+    wait_until(lambda: store_complete(server))
+
+    def join(offset: int) -> None:
+        for i in range(200):
+            msm_instance.on_player_joined(server, 'player_%d' % ((offset + i) % 50), None)
+
+    # 缩短线程切换间隔，使各线程的命令更容易交错
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=join, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    wait_until(lambda: msm_instance.pending_requests.stats()['pending'] == 0)
+    stats = msm_instance.pending_requests.stats()
+    assert stats['expired'] == 0 and stats['mismatched'] == 0 and stats['orphaned'] == 0
+    assert not msm_instance.untagged_get_data
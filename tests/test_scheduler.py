@@ -0,0 +1,117 @@
+"""
+轮询调度器（PollScheduler）的单元测试：各数据条目的轮询间隔、到期的先后顺序、活跃玩家的加速、
+延迟过高时的退避与恢复，以及离线玩家的调度状态的清理。
+"""
+
+import threading
+
+import pytest
+
+from common import load_plugin
+
+msm = load_plugin()
+
+INTERVALS = {'fast': 1000, 'normal': 4000, 'slow': 10000}
+HEALTH = msm.PLAYER_DATA_ITEM_INDEX['health']
+XP = msm.PLAYER_DATA_ITEM_INDEX['xp']
+FAST_ITEMS = [msm.PLAYER_DATA_ITEM_INDEX[item] for item, cls in msm.PLAYER_DATA_ITEM_CLASSES.items() if cls == 'fast']
+NORMAL_ITEMS = [msm.PLAYER_DATA_ITEM_INDEX[item] for item, cls in msm.PLAYER_DATA_ITEM_CLASSES.items()
+                if cls == 'normal']
+
+
+@pytest.fixture
+def records(monkeypatch):
+    records = msm.PlayerDataStore()
+    monkeypatch.setattr(msm, 'player_data_records', records)
+    monkeypatch.setattr(msm, 'player_data_records_lock', threading.RLock())
+    return records
+
+
+def test_intervals():
+    scheduler = msm.PollScheduler({**INTERVALS, 'xp': 500}, 0, 0)
+    assert scheduler.item_intervals[HEALTH] == 1.0
+    assert scheduler.item_intervals[msm.PLAYER_DATA_ITEM_INDEX['deathCount']] == 10.0
+    # 单个数据条目的间隔优先于其类别的间隔
+    assert scheduler.item_intervals[XP] == 0.5
+    # 无效的预算及阈值使用缺省值
+    assert scheduler.budget == 500 and scheduler.latency_threshold == 1.0
+
+
+def test_due_order(records):
+    scheduler = msm.PollScheduler(INTERVALS, 500, 1000)
+    players = ['a', 'b', 'c']
+    # 尚未轮询过的玩家，所有数据条目均立即到期
+    assert scheduler.due(players, 100.0) == [(player, msm.ALL_ITEM_INDEXES) for player in players]
+    for player in players:
+        scheduler.mark_polled(player, msm.ALL_ITEM_INDEXES, 100.0)
+    assert scheduler.due(players, 100.5) == []
+    # 各数据条目按其类别的间隔到期
+    assert scheduler.due(['a'], 101.0) == [('a', FAST_ITEMS)]
+    assert scheduler.due(['a'], 104.0) == [('a', sorted(FAST_ITEMS + NORMAL_ITEMS))]
+    # 按逾期时间从长到短排列
+    scheduler.mark_polled('a', FAST_ITEMS, 101.5)
+    scheduler.mark_polled('c', FAST_ITEMS, 101.2)
+    assert [player for player, _ in scheduler.due(players, 102.6)] == ['b', 'c', 'a']
+    # 新加入的玩家排在最前
+    assert scheduler.due(players + ['d'], 102.6)[0] == ('d', msm.ALL_ITEM_INDEXES)
+
+
+def test_hot_players(records):
+    scheduler = msm.PollScheduler(INTERVALS, 500, 1000)
+    records.set_row('a', {'health': 20})
+    records.set_row('b', {'health': 20})
+    scheduler.update(['a', 'b'], 0.0)
+    for player in ('a', 'b'):
+        scheduler.mark_polled(player, msm.ALL_ITEM_INDEXES, 100.0)
+    # 数据在上次轮询后发生变化的玩家，轮询间隔缩短为一半
+    records.set('a', HEALTH, 10)
+    scheduler.update(['a', 'b'], 0.0)
+    assert scheduler.hot_players == {'a'}
+    assert scheduler.due(['a', 'b'], 100.5) == [('a', FAST_ITEMS)]
+    # 之后没有变化时恢复原来的间隔
+    scheduler.update(['a', 'b'], 0.0)
+    assert scheduler.hot_players == set()
+    assert scheduler.due(['a', 'b'], 100.5) == []
+
+
+def test_backoff(records):
+    scheduler = msm.PollScheduler(INTERVALS, 500, 1000)
+    scheduler.mark_polled('a', msm.ALL_ITEM_INDEXES, 100.0)
+    # 延迟超过阈值时加倍退避，最多为 SCHEDULER_MAX_BACKOFF 倍
+    for expected in (2.0, 4.0, 8.0, 8.0):
+        scheduler.update(['a'], 1.5)
+        assert scheduler.backoff == expected
+    assert scheduler.due(['a'], 107.9) == []
+    assert scheduler.due(['a'], 108.0) == [('a', FAST_ITEMS)]
+    # 延迟介于阈值的一半与阈值之间时保持不变，回落到一半以下后逐渐恢复
+    scheduler.update(['a'], 0.7)
+    assert scheduler.backoff == 8.0
+    for expected in (4.0, 2.0, 1.0, 1.0):
+        scheduler.update(['a'], 0.1)
+        assert scheduler.backoff == expected
+
+
+def test_offline_players_are_forgotten(records):
+    scheduler = msm.PollScheduler(INTERVALS, 500, 1000)
+    records.set_row('a', {'health': 20})
+    scheduler.update(['a'], 0.0)
+    scheduler.mark_polled('a', msm.ALL_ITEM_INDEXES, 100.0)
+    records.set('a', HEALTH, 5)
+    scheduler.update(['a'], 0.0)
+    assert 'a' in scheduler.hot_players
+    scheduler.update([], 0.0)
+    assert scheduler.last_polled == {} and scheduler.row_versions == {} and scheduler.hot_players == set()
+    # 重新加入后视为新玩家，所有数据条目立即到期
+    assert scheduler.due(['a'], 100.1) == [('a', msm.ALL_ITEM_INDEXES)]
+
+
+def test_stats_reset():
+    scheduler = msm.PollScheduler(INTERVALS, 500, 1000)
+    scheduler.mark_polled('a', [HEALTH, XP], 1.0)
+    scheduler.commands_sent += 3
+    scheduler.entries_deferred += 4
+    stats = scheduler.stats()
+    assert stats['entries_polled'] == 2 and stats['commands_sent'] == 3 and stats['entries_deferred'] == 4
+    assert stats['backoff'] == 1.0 and stats['hot_players'] == 0
+    stats = scheduler.stats()
+    assert stats['entries_polled'] == stats['commands_sent'] == stats['entries_deferred'] == 0
@@ -0,0 +1,145 @@
+"""
+插件的数据变化订阅（subscribe_players_data）的测试：全量推送与以 since_version 续传、数据标识（epoch）改变时重新推送、
+推送的最小间隔（min_interval），以及参数的校验。
+"""
+
+import asyncio
+import json
+import time
+
+import websockets
+
+from conftest import reload_plugin, store_complete, wait_until
+
+PLAYERS = 20
+# onlineTime 每刻都在变化，不参与比较
+STABLE_ITEMS = ['deathCount', 'playerKillCount', 'totalKillCount', 'health', 'xp', 'level', 'food', 'air', 'armor',
+                'placeBlockCount', 'breakBlockCount']
+FAST_POLL = {'serverMonitorThreadInterval': 100, 'metricPollIntervals': {'fast': 100, 'normal': 100, 'slow': 100}}
+
+
+async def subscribe(url: str, arguments: dict, changes: int, duration: float = 1.0) -> tuple[dict, list[tuple]]:
+    """
+    订阅数据变化，接收推送直至收到 changes 项数据，或 duration 秒内没有新的推送。
+    返回订阅的回复，及各次推送的 (收到的时刻, 推送的消息)。
+    """
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        await websocket.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data',
+                                         'arguments': {'metrics': STABLE_ITEMS, **arguments}}))
+        subscribed = json.loads(await asyncio.wait_for(websocket.recv(), 10))
+        deltas = []
+        received = 0
+        try:
+            while received < changes:
+                message = json.loads(await asyncio.wait_for(websocket.recv(), duration))
+                assert message['instruction'] == 'players_data_delta' and message['id'] == 'sub'
+                assert message['epoch'] == subscribed['epoch']
+                deltas.append((time.monotonic(), message))
+                received += len(message['data'])
+        except asyncio.TimeoutError:
+            pass
+        return subscribed, deltas
+
+
+def entries_of(deltas: list[tuple]) -> list[tuple[str, str, int]]:
+    return [(entry['name'], entry['type'], entry['quantity']) for _, message in deltas for entry in message['data']]
+
+
+def test_subscribe_and_resume(start_server):
+    server, url = start_server(PLAYERS)
+    wait_until(lambda: store_complete(server))
+    full_count = PLAYERS * len(STABLE_ITEMS)
+    subscribed, deltas = asyncio.run(subscribe(url, {}, full_count))
+    assert subscribed['instruction'] == 'players_data_subscribed'
+    with server.lock:
+        expected = {(player, item, scores[item]) for player, scores in server.scores.items() for item in STABLE_ITEMS}
+    assert set(entries_of(deltas)) == expected
+    assert deltas[-1][1]['version'] >= subscribed['version']
+
+    # 订阅结束后数据发生变化，以 since_version 续传时只收到这之后的变化
+    with server.lock:
+        server.scores['player_2']['xp'] += 50
+        value = server.scores['player_2']['xp']
+    wait_until(lambda: store_complete(server))
+    resumed, deltas = asyncio.run(subscribe(url, {'epoch': subscribed['epoch'],
+                                                  'since_version': subscribed['version']}, full_count))
+    assert resumed['epoch'] == subscribed['epoch'] and resumed['version'] > subscribed['version']
+    assert entries_of(deltas) == [('player_2', 'xp', value)]
+    # 只订阅部分数据条目时，不推送其他数据条目的变化
+    _, deltas = asyncio.run(subscribe(url, {'metrics': ['deathCount'], 'epoch': subscribed['epoch'],
+                                            'since_version': subscribed['version']}, full_count))
+    assert deltas == []
+
+    # 数据标识不一致，或版本号无效时，从头推送全部数据
+    for arguments in ({'epoch': 'stale', 'since_version': resumed['version']},
+                      {'epoch': subscribed['epoch'], 'since_version': resumed['version'] + 100},
+                      {'epoch': subscribed['epoch'], 'since_version': -1}):
+        _, deltas = asyncio.run(subscribe(url, arguments, full_count))
+        assert len(entries_of(deltas)) == full_count
+
+
+def test_resume_after_reload(start_server):
+    server, url = start_server(PLAYERS)
+    wait_until(lambda: store_complete(server))
+    subscribed, _ = asyncio.run(subscribe(url, {}, PLAYERS * len(STABLE_ITEMS)))
+    # 重新加载插件后数据标识及版本号保持不变，续传时只收到重新加载之后的变化
+    reload_plugin(server)
+    with server.lock:
+        server.scores['player_7']['deathCount'] += 3
+        value = server.scores['player_7']['deathCount']
+    wait_until(lambda: store_complete(server))
+    resumed, deltas = asyncio.run(subscribe(url, {'epoch': subscribed['epoch'],
+                                                  'since_version': subscribed['version']}, 1))
+    assert resumed['epoch'] == subscribed['epoch']
+    assert entries_of(deltas) == [('player_7', 'deathCount', value)]
+
+
+def test_min_interval(start_server):
+    server, url = start_server(PLAYERS, FAST_POLL, change_rate=200)
+    wait_until(lambda: server.plugin.server_monitor.ready)
+    min_interval = 0.4
+
+    async def run() -> tuple[list[tuple], dict]:
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data', 'arguments': {
+                'metrics': STABLE_ITEMS, 'min_interval': int(min_interval * 1000)}}))
+            await asyncio.wait_for(websocket.recv(), 10)
+            deltas = []
+            state = {}
+            start = time.monotonic()
+            while True:
+                if time.monotonic() - start > 2.5 and server.change_rate > 0:
+                    # 停止随机变化，此后收到的推送应使订阅者的数据与游戏内一致
+                    server.change_rate = 0
+                try:
+                    message = json.loads(await asyncio.wait_for(websocket.recv(), 2.0))
+                except asyncio.TimeoutError:
+                    return deltas, state
+                deltas.append((time.monotonic(), message))
+                for entry in message['data']:
+                    state[(entry['name'], entry['type'])] = entry['quantity']
+
+    deltas, state = asyncio.run(run())
+    # 数据持续变化时，相邻两次推送的间隔不小于 min_interval（留出少量的调度误差）
+    assert len(deltas) >= 4
+    gaps = [later[0] - earlier[0] for earlier, later in zip(deltas[1:], deltas[2:])]
+    assert min(gaps) >= min_interval - 0.05
+    # 推送被推迟时，期间的变化合并到下一次推送中，不会丢失
+    with server.lock:
+        expected = {(player, item): scores[item] for player, scores in server.scores.items() for item in STABLE_ITEMS}
+    assert state == expected
+
+
+def test_subscribe_invalid_metrics(start_server):
+    _, url = start_server(1)
+
+    async def run(arguments: dict) -> dict:
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({'id': 1, 'instruction': 'subscribe_players_data', 'arguments': arguments}))
+            return json.loads(await asyncio.wait_for(websocket.recv(), 10))
+
+    reply = asyncio.run(run({'metrics': ['xp', 'nope', 'bad']}))
+    assert reply['instruction'] == 'error' and reply['message'] == 'Unknown metrics: nope, bad'
+    reply = asyncio.run(run({'metrics': 'xp'}))
+    assert reply['instruction'] == 'error' and reply['message'] == 'metrics must be a list of metric names'
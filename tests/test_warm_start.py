@@ -0,0 +1,55 @@
+"""
+启动预热（warmStart）的测试：插件加载前就已在线的玩家经预热同步、未启用预热时不同步，
+重新加载插件时跳过预热，以及收不到 list 命令的输出时放弃预热。
+"""
+
+import time
+
+from conftest import reload_plugin, store_complete, wait_until
+
+
+def test_warm_start_syncs_online_players(start_server):
+    # 玩家在插件加载前就已在线，不会触发加入游戏的事件
+    server, _ = start_server(30, join=False)
+    msm = server.plugin
+    wait_until(lambda: store_complete(server))
+    assert sorted(msm.online_players) == sorted(server.players)
+    stats = msm.collect_monitor_stats()['warm_start']
+    assert stats['ready'] and stats['attempts'] == 1 and stats['players'] == 30
+    assert stats['ready_after_ms'] >= stats['duration_ms'] > 0
+    # 预热后的第一轮轮询不再重复采集已同步的玩家
+    assert all(player in msm.server_monitor.scheduler.last_polled for player in server.players)
+
+
+def test_cold_start_misses_online_players(start_server):
+    server, _ = start_server(10, {'warmStart': False}, join=False)
+    msm = server.plugin
+    # 未启用预热时插件立即就绪，但不知道已在线的玩家，其数据不会被同步
+    assert msm.server_monitor.ready
+    time.sleep(0.5)
+    assert msm.online_players == [] and not store_complete(server)
+    assert msm.collect_monitor_stats()['warm_start']['attempts'] == 0
+
+
+def test_reload_skips_warm_start(start_server):
+    server, _ = start_server(10, join=False)
+    wait_until(lambda: store_complete(server))
+    commands = server.commands_received
+    reload_plugin(server)
+    msm = server.plugin
+    # 旧实例已完成预热，新实例沿用迁移的数据，直接开始常规轮询
+    assert msm.server_monitor.ready and msm.server_monitor.warm_start_attempts == 0
+    assert sorted(msm.online_players) == sorted(server.players)
+    assert store_complete(server)
+    time.sleep(0.3)
+    assert msm.server_monitor.warm_start_attempts == 0
+    assert server.commands_received - commands < 3 * len(server.players)
+
+
+def test_warm_start_gives_up_without_player_list(start_server):
+    # 控制台输出全部丢失，list 命令始终收不到结果
+    server, _ = start_server(5, {'requestTimeout': 200}, join=False, loss=1.0)
+    msm = server.plugin
+    wait_until(lambda: msm.server_monitor.ready)
+    assert msm.server_monitor.warm_start_attempts == msm.WARM_START_MAX_ATTEMPTS
+    assert msm.server_monitor.warm_start_players == 0 and msm.online_players == []
@@ -0,0 +1,222 @@
+"""
+websocket 服务器的请求流水线、有界发送队列（drop/disconnect 策略）及空闲超时的测试，以多个模拟的客户端并发请求。
+"""
+
+import asyncio
+import json
+import socket
+import time
+from typing import Any
+
+import pytest
+import websockets
+
+from conftest import store_complete, wait_until
+
+PLAYERS = 50
+
+
+async def pipelined_client(url: str, client: int, requests: list[dict]) -> list[Any]:
+    """
+    不等待响应，连续发送所有请求，再接收直至每个请求的结束标志均已收到，返回按到达顺序排列的所有消息。
+    """
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        for i, request in enumerate(requests):
+            request = {**request, 'id': f'{client}-{i}'}
+            request['arguments'] = {**request.get('arguments', {}), 'end_marker': True}
+            await websocket.send(json.dumps(request))
+        messages = []
+        ended = 0
+        while ended < len(requests):
+            message = json.loads(await asyncio.wait_for(websocket.recv(), 30))
+            messages.append(message)
+            if message['instruction'] == 'end_of_response':
+                ended += 1
+        return messages
+
+
+def test_pipelined_responses_stay_in_order(start_server):
+    server, url = start_server(PLAYERS, {'websocketMaxPipelinedRequests': 4})
+    wait_until(lambda: store_complete(server))
+    requests = [
+        {'instruction': 'get_all_players_data'},
+        {'instruction': 'get_all_players_data', 'arguments': {'format': 'columnar'}},
+        {'instruction': 'query_players_data', 'arguments': {'metrics': ['xp', 'level']}},
+        {'instruction': 'get_leaderboard', 'arguments': {'metric': 'deathCount', 'limit': 5}},
+        {'instruction': 'get_monitor_stats'},
+        {'instruction': 'no_such_instruction'}
+    ] * 3
+    clients = 16
+
+    async def run() -> list[list[Any]]:
+        return await asyncio.gather(*(pipelined_client(url, client, requests) for client in range(clients)))
+
+    for client, messages in enumerate(asyncio.run(run())):
+        by_id: dict[str, list[dict]] = {}
+        for message in messages:
+            by_id.setdefault(message['id'], []).append(message)
+        assert sorted(by_id) == sorted(f'{client}-{i}' for i in range(len(requests)))
+        for id, responses in by_id.items():
+            request = requests[int(id.split('-')[1])]
+            # 每个请求恰好一个结束标志，位于该请求的所有响应之后，且计数与此前的响应数一致
+            *body, end = responses
+            assert end['instruction'] == 'end_of_response'
+            assert end['count'] == len(body)
+            assert all(message['instruction'] != 'end_of_response' for message in body)
+            if request['instruction'] == 'get_all_players_data' and 'arguments' not in request:
+                assert len(body) == PLAYERS * len(server.plugin.PLAYER_DATA_ITEMS)
+                assert all(message['instruction'] == 'all_players_data' for message in body)
+                # 同一请求的逐条响应按快照中的顺序排列：每个玩家的各数据条目连续且按 PLAYER_DATA_ITEMS 的顺序
+                items = server.plugin.PLAYER_DATA_ITEMS
+                assert [message['data']['type'] for message in body] == items * PLAYERS
+                names = [message['data']['name'] for message in body[::len(items)]]
+                assert len(set(names)) == PLAYERS
+            elif request['instruction'] == 'no_such_instruction':
+                assert body == []
+            else:
+                assert len(body) == 1
+
+
+def test_pipelined_requests_are_processed_concurrently(start_server):
+    # 请求数达到上限后暂停读取，但不影响已读取的请求的处理与响应
+    server, url = start_server(PLAYERS, {'websocketMaxPipelinedRequests': 2})
+    wait_until(lambda: store_complete(server))
+    requests = [{'instruction': 'get_monitor_stats'}] * 40
+
+    async def run() -> list[list[Any]]:
+        return await asyncio.gather(*(pipelined_client(url, client, requests) for client in range(8)))
+
+    for messages in asyncio.run(run()):
+        assert len(messages) == 2 * len(requests)
+        assert sum(message['instruction'] == 'end_of_response' for message in messages) == len(requests)
+
+
+async def stalled_client(url: str, requests: int, players: int) -> tuple[list[Any], int | None]:
+    """
+    以很小的接收缓冲区连接，连续发送 requests 个 get_all_players_data 请求后暂不读取，
+    使服务器的待发送队列积压；随后读取全部消息直至连接关闭或收到所有结束标志，返回 (消息, 关闭码)。
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    host, port = url[len('ws://'):].rsplit(':', 1)
+    sock.connect((host, int(port)))
+    async with websockets.connect(url, sock=sock, max_size=None, max_queue=1) as websocket:
+        for i in range(requests):
+            await websocket.send(json.dumps({'id': i, 'instruction': 'get_all_players_data',
+                                             'arguments': {'end_marker': True}}))
+        # 不读取响应，等待服务器处理完所有请求
+        await asyncio.sleep(1.0)
+        messages = []
+        ended = 0
+        try:
+            while ended < requests:
+                message = json.loads(await asyncio.wait_for(websocket.recv(), 30))
+                messages.append(message)
+                if message['instruction'] == 'end_of_response':
+                    ended += 1
+        except websockets.ConnectionClosed as ex:
+            return messages, ex.rcvd.code if ex.rcvd is not None else None
+        return messages, None
+
+
+def test_slow_reader_responses_are_dropped(start_server):
+    players = 500
+    server, url = start_server(players, {'websocketSendQueueLimit': 65536, 'websocketSendQueuePolicy': 'drop'})
+    wait_until(lambda: store_complete(server))
+    requests = 5
+    messages, code = asyncio.run(stalled_client(url, requests, players))
+    assert code is None
+    by_id: dict[int, list[dict]] = {}
+    for message in messages:
+        by_id.setdefault(message['id'], []).append(message)
+    full = [id for id, responses in by_id.items() if len(responses) > 2]
+    dropped = [id for id, responses in by_id.items()
+               if [message['instruction'] for message in responses] == ['error', 'end_of_response']]
+    # 第一个请求的响应进入了空的队列，之后的请求因队列已满而被丢弃，各自只收到错误信息及结束标志
+    assert full == [0]
+    assert len(by_id[0]) == players * len(server.plugin.PLAYER_DATA_ITEMS) + 1
+    assert sorted(dropped) == list(range(1, requests))
+    assert all(by_id[id][0]['message'] == 'Send queue is full' and by_id[id][1]['count'] == 1 for id in dropped)
+    assert server.plugin.monitor_metrics.websocket_dropped.value == requests - 1
+
+
+def test_slow_reader_is_disconnected(start_server):
+    players = 500
+    server, url = start_server(players, {'websocketSendQueueLimit': 65536, 'websocketSendQueuePolicy': 'disconnect'})
+    wait_until(lambda: store_complete(server))
+    messages, code = asyncio.run(stalled_client(url, 5, players))
+    assert code == 1008
+    # 断开前已进入队列的只有第一个请求的响应（且未能全部发送）
+    assert all(message['id'] == 0 for message in messages)
+    assert len(messages) < players * len(server.plugin.PLAYER_DATA_ITEMS) + 1
+    assert server.plugin.monitor_metrics.websocket_overflowed.value == 1
+    wait_until(lambda: len(server.plugin.websocket_server.connections) == 0)
+
+
+def test_idle_connection_is_closed(start_server):
+    server, url = start_server(PLAYERS, {'websocketIdleTimeout': 300})
+
+    async def run() -> tuple[float, bool]:
+        async with websockets.connect(url) as idle, websockets.connect(url) as subscriber:
+            await subscriber.send(json.dumps({'id': 'sub', 'instruction': 'subscribe_players_data'}))
+            start = asyncio.get_running_loop().time()
+            with pytest.raises(websockets.ConnectionClosed):
+                while True:
+                    await asyncio.wait_for(idle.recv(), 5)
+            closed_after = asyncio.get_running_loop().time() - start
+            # 订阅了数据变化的连接不视为空闲
+            await asyncio.sleep(0.6)
+            await subscriber.send(json.dumps({'id': 'stats', 'instruction': 'get_monitor_stats'}))
+            while True:
+                message = json.loads(await asyncio.wait_for(subscriber.recv(), 5))
+                if message['id'] == 'stats':
+                    return closed_after, True
+
+    closed_after, subscriber_alive = asyncio.run(run())
+    assert 0.2 <= closed_after < 2.0
+    assert subscriber_alive
+
+
+def test_small_responses_are_not_delayed(start_server):
+    # 监听套接字由插件自己创建，asyncio 不会为接受的连接设置 TCP_NODELAY；未设置时响应与其后的结束标志之间
+    # 将因对端的延迟确认而相隔约40ms
+    server, url = start_server(PLAYERS)
+    wait_until(lambda: store_complete(server))
+
+    async def run() -> tuple[list[float], list[int]]:
+        async with websockets.connect(url) as websocket:
+            elapsed = []
+            for i in range(20):
+                start = time.perf_counter()
+                await websocket.send(json.dumps({'id': i, 'instruction': 'get_leaderboard',
+                                                 'arguments': {'metric': 'deathCount', 'limit': 1, 'end_marker': True}}))
+                while json.loads(await asyncio.wait_for(websocket.recv(), 10))['instruction'] != 'end_of_response':
+                    pass
+                elapsed.append(time.perf_counter() - start)
+            options = [websocket.transport.get_extra_info('socket').getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+                       for websocket in list(server.plugin.websocket_server.connections)]
+            return elapsed, options
+
+    elapsed, options = asyncio.run(run())
+    assert len(options) == 1 and options[0] != 0
+    assert sorted(elapsed)[len(elapsed) // 2] < 0.02
+
+
+def test_invalid_request_ends_response(start_server):
+    _, url = start_server(1)
+
+    async def run() -> list[dict]:
+        async with websockets.connect(url) as websocket:
+            # 缺少指令的请求在处理时出错，客户端要求了结束标志时仍应在错误信息后收到结束标志
+            await websocket.send(json.dumps({'id': 7, 'arguments': {'end_marker': True}}))
+            # 无法解析的请求只回传错误信息
+            await websocket.send('{not json')
+            await websocket.send(json.dumps({'id': 8, 'instruction': 'get_monitor_stats'}))
+            return [json.loads(await asyncio.wait_for(websocket.recv(), 10)) for _ in range(4)]
+
+    messages = asyncio.run(run())
+    assert [(message['id'], message['instruction']) for message in messages] == [
+        (7, 'error'), (7, 'end_of_response'), (None, 'error'), (8, 'monitor_stats')]
+    assert messages[1]['count'] == 1